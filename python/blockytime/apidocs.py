@@ -0,0 +1,91 @@
+"""Swagger UI served from a docs app that is only built when first requested.
+
+flasgger (with jsonschema and friends) is the slowest import of the server, and
+Swagger() has to run before the app handles its first request. Instead the main
+app is wrapped in LazyApiDocs, which hands the docs paths to a separate Flask
+app carrying a copy of the main app's routes; flasgger is imported and that app
+built on the first request to the docs.
+"""
+
+import logging
+import threading
+from typing import Any, Callable, Dict, Iterable, Optional
+
+from flask import Flask
+
+log = logging.getLogger(__name__)
+
+# Paths registered by flasgger's blueprint and spec route
+DOCS_PREFIXES = ("/apidocs", "/apispec", "/flasgger_static")
+
+SWAGGER_CONFIG: Dict[str, Any] = {
+    "title": "BlockyTime API",
+    "uiversion": 3,
+    "version": "1.0.0",
+    "description": """
+    API for viewing and editing BlockyTime time-tracking data.
+
+    This API provides endpoints for:
+    * Reading and writing 15-minute time blocks
+    * Aggregated statistics and trends
+    * Sleep analysis
+    * App configuration
+    """,
+    "termsOfService": "",
+    "contact": {"name": "API Support", "email": "support@example.com"},
+    "license": {
+        "name": "Private License",
+    },
+}
+
+WSGIApp = Callable[[Dict[str, Any], Callable[..., Any]], Iterable[bytes]]
+
+
+def build_docs_app(app: Flask) -> Flask:
+    """Flask app serving Swagger docs for the routes of app."""
+    from flasgger import Swagger
+
+    docs = Flask(__name__, root_path=app.root_path)
+    docs.config["SWAGGER"] = SWAGGER_CONFIG
+    for rule in app.url_map.iter_rules():
+        if rule.endpoint == "static" or rule.rule.startswith(DOCS_PREFIXES):
+            continue
+        # The copies are only introspected for the spec, never dispatched to
+        docs.add_url_rule(
+            rule.rule,
+            endpoint=rule.endpoint,
+            view_func=app.view_functions[rule.endpoint],
+            methods=rule.methods,
+            defaults=rule.defaults,
+        )
+    Swagger(docs)
+    return docs
+
+
+class LazyApiDocs:
+    """WSGI middleware sending DOCS_PREFIXES to the docs app, everything else to app."""
+
+    def __init__(self, app: Flask):
+        self._app = app
+        self._wsgi_app: WSGIApp = app.wsgi_app
+        self._docs: Optional[Flask] = None
+        self._lock = threading.Lock()
+
+    def _docs_app(self) -> Flask:
+        with self._lock:
+            if self._docs is None:
+                self._docs = build_docs_app(self._app)
+                log.info("API docs app built")
+            return self._docs
+
+    def __call__(
+        self, environ: Dict[str, Any], start_response: Callable[..., Any]
+    ) -> Iterable[bytes]:
+        if environ.get("PATH_INFO", "").startswith(DOCS_PREFIXES):
+            docs: Iterable[bytes] = self._docs_app().wsgi_app(environ, start_response)
+            return docs
+        return self._wsgi_app(environ, start_response)
+
+
+def install_api_docs(app: Flask) -> None:
+    app.wsgi_app = LazyApiDocs(app)  # type: ignore[method-assign]
@@ -1,44 +1,373 @@
-"""Backup rotation utility for DB.db.
+"""Deduplicated backups of DB.db.
 
-Pull-backup rotation (N = BLOCKY_MAX_BACKUPS, default 10):
-  Slots .1 – .N; overflow .N+1 is removed on success.
+Snapshots are stored content-addressed in backups/ next to DB.db:
 
-Push-backup rotation (M = BLOCKY_MAX_PUSH_BACKUPS, default 10):
-  Same scheme applied to DB.db.pre-push (different base path).
-  Slots .1 – .M; overflow .M+1 is removed on success.
+  backups/chunks/ab/abcd…       CHUNK_SIZE slices of the database file, zlib
+                                compressed, named by the SHA-256 of the slice
+  backups/manifests/<id>.json   one per snapshot: label, time, size, SHA-256
+                                of the file and its chunk hashes in order
+
+Chunks are aligned with SQLite pages, and a sync from the phone rewrites only
+a few pages, so snapshots share almost all chunks and keeping hundreds of
+them costs little more disk than one copy.
+
+Databases are read with SQLite's online backup API (copy_database), a few
+hundred pages per step. The source is only locked while a step runs, so the
+app keeps reading and writing; SQLite restarts the copy when another
+connection writes in between, so the copy is always consistent.
+BackgroundSnapshots runs snapshots in a thread for /api/v1/admin/snapshot.
+
+Each snapshot has a label: PULL before pull-db changes DB.db, PRE_PUSH for the
+phone's database before push-db overwrites it, MANUAL for the admin endpoint. After a snapshot, its label is
+pruned by a RetentionPolicy and chunks no snapshot uses are deleted:
+
+  Keep the newest BLOCKY_MAX_BACKUPS (pre-push: BLOCKY_MAX_PUSH_BACKUPS),
+  plus the newest snapshot of each of the last BLOCKY_BACKUP_KEEP_DAILY days,
+  BLOCKY_BACKUP_KEEP_WEEKLY weeks and BLOCKY_BACKUP_KEEP_MONTHLY months.
+
+scripts/backups.py lists, restores and prunes snapshots.
 """
 
+import fcntl
+import hashlib
+import json
 import logging
 import os
+import sqlite3
+import threading
+import time
+import zlib
+from contextlib import contextmanager
+from dataclasses import asdict, dataclass, field
+from datetime import datetime
+from typing import Any, Callable, Dict, Iterator, List, Optional, Set, Tuple, Union
 
 log = logging.getLogger(__name__)
 
 MAX_BACKUPS: int = int(os.environ.get("BLOCKY_MAX_BACKUPS", "10"))
 MAX_PUSH_BACKUPS: int = int(os.environ.get("BLOCKY_MAX_PUSH_BACKUPS", "10"))
+KEEP_DAILY: int = int(os.environ.get("BLOCKY_BACKUP_KEEP_DAILY", "14"))
+KEEP_WEEKLY: int = int(os.environ.get("BLOCKY_BACKUP_KEEP_WEEKLY", "8"))
+KEEP_MONTHLY: int = int(os.environ.get("BLOCKY_BACKUP_KEEP_MONTHLY", "12"))
+# A multiple of the 4 KiB SQLite page size; 16 KiB measured best for syncs
+CHUNK_SIZE: int = int(os.environ.get("BLOCKY_BACKUP_CHUNK_SIZE", str(16 * 1024)))
+# Pages per online backup step, 1 MiB with 4 KiB pages
+SNAPSHOT_STEP_PAGES: int = int(os.environ.get("BLOCKY_SNAPSHOT_STEP_PAGES", "256"))
+BACKUP_DIR = "backups"
+
+PULL = "pull"
+PRE_PUSH = "pre-push"
+MANUAL = "manual"
+
+# Called with pages copied and total pages after each backup step
+Progress = Callable[[int, int], None]
+
+
+@dataclass
+class RetentionPolicy:
+    last: int
+    daily: int = KEEP_DAILY
+    weekly: int = KEEP_WEEKLY
+    monthly: int = KEEP_MONTHLY
+
+
+RETENTION: Dict[str, RetentionPolicy] = {
+    PULL: RetentionPolicy(MAX_BACKUPS),
+    PRE_PUSH: RetentionPolicy(MAX_PUSH_BACKUPS),
+    MANUAL: RetentionPolicy(MAX_BACKUPS),
+}
+
+
+@dataclass
+class Snapshot:
+    id: str
+    label: str
+    created: float
+    size: int
+    sha256: str
+    chunk_size: int
+    chunks: List[str] = field(default_factory=list)
 
+    def summary(self) -> Dict[str, Any]:
+        """Everything but the chunk list, for listings."""
+        result = asdict(self)
+        del result["chunks"]
+        result["created"] = datetime.fromtimestamp(self.created).isoformat()
+        return result
 
-def rotate_backups(output_path: str, max_backups: int = MAX_BACKUPS) -> None:
-    """Rotate existing backups before overwriting output_path.
 
-    Shifts .N → .N+1 (overflow), .N-1 → .N, …, .1 → .2, output_path → .1.
-    Call cleanup_overflow() after a successful operation to remove the overflow slot.
+def copy_database(
+    src_path: str,
+    dst: Union[str, sqlite3.Connection],
+    progress: Optional[Progress] = None,
+) -> None:
+    """Online backup of the database at src_path into dst, a path or connection.
+
+    Copies SNAPSHOT_STEP_PAGES pages per step without blocking the app's reads
+    or writes; the result is the database as of the last step.
     """
-    for n in range(max_backups, 0, -1):
-        src = f"{output_path}.{n}"
-        dst = f"{output_path}.{n + 1}"
-        if os.path.exists(src):
-            os.replace(src, dst)
-            log.debug("rotate_backups: %s → %s", src, dst)
-
-    if os.path.exists(output_path):
-        dst = f"{output_path}.1"
-        os.replace(output_path, dst)
-        log.debug("rotate_backups: %s → %s", output_path, dst)
-
-
-def cleanup_overflow(output_path: str, max_backups: int = MAX_BACKUPS) -> None:
-    """Remove the overflow slot (max_backups+1) after a successful operation."""
-    overflow = f"{output_path}.{max_backups + 1}"
-    if os.path.exists(overflow):
-        os.remove(overflow)
-        log.debug("cleanup_overflow: removed %s", overflow)
+    src = sqlite3.connect(src_path)
+    dst_con = sqlite3.connect(dst) if isinstance(dst, str) else dst
+
+    def on_step(status: int, remaining: int, total: int) -> None:
+        if progress is not None:
+            progress(total - remaining, total)
+
+    try:
+        src.backup(dst_con, pages=SNAPSHOT_STEP_PAGES, progress=on_step)
+    finally:
+        if isinstance(dst, str):
+            dst_con.close()
+        src.close()
+
+
+def _read_database(path: str, progress: Optional[Progress] = None) -> bytes:
+    """Consistent image of the database at path, page for page."""
+    dst = sqlite3.connect(":memory:")
+    try:
+        copy_database(path, dst, progress)
+        return dst.serialize()
+    finally:
+        dst.close()
+
+
+def retained(snapshots: List[Snapshot], policy: RetentionPolicy) -> Set[str]:
+    """Ids of the snapshots policy keeps; snapshots are ordered newest first."""
+    kept = {s.id for s in snapshots[: policy.last]}
+    periods: List[Tuple[int, Callable[[datetime], Any]]] = [
+        (policy.daily, lambda d: d.date()),
+        (policy.weekly, lambda d: d.isocalendar()[:2]),
+        (policy.monthly, lambda d: (d.year, d.month)),
+    ]
+    for count, period in periods:
+        seen: Set[Any] = set()
+        for s in snapshots:
+            if len(seen) >= count:
+                break
+            key = period(datetime.fromtimestamp(s.created))
+            if key not in seen:
+                seen.add(key)
+                kept.add(s.id)
+    return kept
+
+
+class BackupStore:
+    def __init__(self, root: str):
+        self.root = root
+        self._chunks = os.path.join(root, "chunks")
+        self._manifests = os.path.join(root, "manifests")
+
+    @contextmanager
+    def _locked(self) -> Iterator[None]:
+        """Serialize writers, including other processes (the CLI scripts)."""
+        os.makedirs(self._manifests, exist_ok=True)
+        os.makedirs(self._chunks, exist_ok=True)
+        with open(os.path.join(self.root, "lock"), "w") as lock:
+            fcntl.flock(lock, fcntl.LOCK_EX)
+            try:
+                yield
+            finally:
+                fcntl.flock(lock, fcntl.LOCK_UN)
+
+    def _chunk_path(self, digest: str) -> str:
+        return os.path.join(self._chunks, digest[:2], digest)
+
+    def _write_chunk(self, digest: str, data: bytes) -> bool:
+        path = self._chunk_path(digest)
+        if os.path.exists(path):
+            return False
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        tmp = f"{path}.tmp"
+        with open(tmp, "wb") as f:
+            f.write(zlib.compress(data))
+        os.replace(tmp, path)
+        return True
+
+    def snapshot(
+        self, db_path: str, label: str, progress: Optional[Progress] = None
+    ) -> Snapshot:
+        """Store the database at db_path; only chunks not stored yet are written."""
+        started = time.monotonic()
+        data = _read_database(db_path, progress)
+        created = time.time()
+        digest = hashlib.sha256(data).hexdigest()
+        stamp = datetime.fromtimestamp(created).strftime("%Y%m%dT%H%M%S%f")
+        snapshot = Snapshot(
+            f"{stamp}-{label}-{digest[:8]}",
+            label,
+            created,
+            len(data),
+            digest,
+            CHUNK_SIZE,
+        )
+        written = 0
+        with self._locked():
+            for i in range(0, len(data), CHUNK_SIZE):
+                chunk = data[i : i + CHUNK_SIZE]
+                chunk_digest = hashlib.sha256(chunk).hexdigest()
+                written += self._write_chunk(chunk_digest, chunk)
+                snapshot.chunks.append(chunk_digest)
+            path = os.path.join(self._manifests, f"{snapshot.id}.json")
+            with open(f"{path}.tmp", "w") as f:
+                json.dump(asdict(snapshot), f)
+            os.replace(f"{path}.tmp", path)
+        log.info(
+            f"Backed up {db_path} as {snapshot.id}: {written} of "
+            f"{len(snapshot.chunks)} chunks new, {time.monotonic() - started:.3f} seconds"
+        )
+        return snapshot
+
+    def snapshots(self, label: Optional[str] = None) -> List[Snapshot]:
+        """Stored snapshots, newest first."""
+        if not os.path.isdir(self._manifests):
+            return []
+        result = []
+        for name in os.listdir(self._manifests):
+            if not name.endswith(".json"):
+                continue
+            with open(os.path.join(self._manifests, name)) as f:
+                snapshot = Snapshot(**json.load(f))
+            if label is None or snapshot.label == label:
+                result.append(snapshot)
+        return sorted(result, key=lambda s: s.created, reverse=True)
+
+    def get(self, snapshot_id: str) -> Snapshot:
+        """The snapshot with this id, or the only one it is a prefix of."""
+        matches = [s for s in self.snapshots() if s.id.startswith(snapshot_id)]
+        if len(matches) != 1:
+            raise KeyError(f"{len(matches)} snapshots match {snapshot_id}")
+        return matches[0]
+
+    def restore(self, snapshot_id: str, dest_path: str) -> Snapshot:
+        """Rebuild the file of a snapshot at dest_path, replacing it atomically."""
+        snapshot = self.get(snapshot_id)
+        tmp = f"{dest_path}.restore"
+        digest = hashlib.sha256()
+        with open(tmp, "wb") as f:
+            for chunk_digest in snapshot.chunks:
+                with open(self._chunk_path(chunk_digest), "rb") as chunk:
+                    data = zlib.decompress(chunk.read())
+                digest.update(data)
+                f.write(data)
+        if digest.hexdigest() != snapshot.sha256:
+            os.remove(tmp)
+            raise ValueError(f"Chunks of {snapshot.id} are corrupt")
+        os.replace(tmp, dest_path)
+        log.info(f"Restored {snapshot.id} to {dest_path}")
+        return snapshot
+
+    def prune(self, label: str, policy: RetentionPolicy) -> List[Snapshot]:
+        """Delete snapshots of label the policy does not keep, and their chunks."""
+        with self._locked():
+            snapshots = self.snapshots(label)
+            kept = retained(snapshots, policy)
+            removed = [s for s in snapshots if s.id not in kept]
+            for s in removed:
+                os.remove(os.path.join(self._manifests, f"{s.id}.json"))
+            if removed:
+                self._collect_garbage()
+        return removed
+
+    def _collect_garbage(self) -> int:
+        used = {digest for s in self.snapshots() for digest in s.chunks}
+        removed = 0
+        for prefix in os.listdir(self._chunks):
+            for name in os.listdir(os.path.join(self._chunks, prefix)):
+                if name not in used:
+                    os.remove(os.path.join(self._chunks, prefix, name))
+                    removed += 1
+        log.info(f"Removed {removed} unused backup chunks")
+        return removed
+
+    def disk_usage(self) -> int:
+        """Bytes used by chunks and manifests."""
+        total = 0
+        for directory, _, names in os.walk(self.root):
+            total += sum(os.path.getsize(os.path.join(directory, n)) for n in names)
+        return total
+
+
+def open_store(db_path: str) -> BackupStore:
+    """The backup store next to db_path."""
+    return BackupStore(
+        os.path.join(os.path.dirname(os.path.abspath(db_path)), BACKUP_DIR)
+    )
+
+
+def backup_database(
+    store: BackupStore,
+    path: str,
+    label: str = PULL,
+    progress: Optional[Progress] = None,
+    prune: bool = True,
+) -> Snapshot:
+    """Snapshot the database at path and prune snapshots of its label.
+
+    The server passes prune=False and leaves pruning to its prune-backups job
+    (see maintenance.py).
+    """
+    snapshot = store.snapshot(path, label, progress)
+    if prune:
+        store.prune(label, RETENTION[label])
+    return snapshot
+
+
+@dataclass
+class SnapshotJob:
+    id: int
+    label: str
+    started: float
+    state: str = "running"  # running, done or failed
+    pages: int = 0
+    total_pages: int = 0
+    snapshot: Optional[Dict[str, Any]] = None
+    error: Optional[str] = None
+    seconds: Optional[float] = None
+
+    def to_dict(self) -> Dict[str, Any]:
+        return asdict(self)
+
+
+class BackgroundSnapshots:
+    """Backs up one database in a background thread, one snapshot at a time."""
+
+    def __init__(self, db_path: str, max_jobs: int = 20):
+        self._db_path = db_path
+        self._store = open_store(db_path)
+        self._max_jobs = max_jobs
+        self._jobs: Dict[int, SnapshotJob] = {}
+        self._lock = threading.Lock()
+
+    def start(self, label: str = MANUAL) -> SnapshotJob:
+        """Start a snapshot, or return the one still running."""
+        with self._lock:
+            running = [j for j in self._jobs.values() if j.state == "running"]
+            if running:
+                return running[0]
+            job = SnapshotJob(max(self._jobs, default=0) + 1, label, time.time())
+            self._jobs[job.id] = job
+            for old in sorted(self._jobs)[: -self._max_jobs]:
+                del self._jobs[old]
+        threading.Thread(
+            target=self._run, args=(job,), name=f"snapshot-{job.id}", daemon=True
+        ).start()
+        return job
+
+    def get(self, job_id: int) -> Optional[SnapshotJob]:
+        return self._jobs.get(job_id)
+
+    def _run(self, job: SnapshotJob) -> None:
+        started = time.monotonic()
+
+        def progress(pages: int, total: int) -> None:
+            job.pages, job.total_pages = pages, total
+
+        try:
+            snapshot = backup_database(self._store, self._db_path, job.label, progress)
+            job.snapshot = snapshot.summary()
+            job.state = "done"
+        except Exception as e:
+            log.error(f"Snapshot of {self._db_path} failed: {e}", exc_info=True)
+            job.error = str(e)
+            job.state = "failed"
+        job.seconds = round(time.monotonic() - started, 3)
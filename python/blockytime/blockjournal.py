@@ -0,0 +1,209 @@
+"""Journaled, group-committed queue for block edits.
+
+Painting in the TimeTable sends a PUT per stroke, and committing each one to
+SQLite costs a few fsyncs. With a BlockWriteQueue, BlockService.update_blocks
+appends the edits to an append-only journal (one JSON line per call, flushed to
+the OS but not fsynced) and returns; a background thread applies the queued
+edits to the database in one transaction when delay_ms have passed since the
+first of them, or as soon as max_edits dates are pending. Edits to the same
+date are coalesced, so only the last state of each block is written.
+
+The journal is rotated to <path>.flushing while a batch is applied and removed
+once the transaction commits. On start-up, both files are replayed before
+anything else reads the database, so queued edits survive the server being
+killed or crashing. They do not survive a power loss within delay_ms of the
+edit: that is the price of not fsyncing per stroke.
+
+Readers see queued edits only after flush(); BlockService flushes before its
+own reads and writes, and server.create_app before every other request.
+"""
+
+import json
+import logging
+import os
+import threading
+import time
+from dataclasses import asdict, dataclass
+from typing import Callable, Dict, Iterable, List, Optional, TextIO
+
+from .metrics import BLOCK_WRITE_BATCH_EDITS, BLOCK_WRITE_COALESCED
+
+log = logging.getLogger(__name__)
+
+
+@dataclass
+class BlockEdit:
+    date: int
+    operation: str  # "upsert" or "delete"
+    type_uid: Optional[int] = None
+    project_uid: Optional[int] = None
+    comment: str = ""
+
+
+def coalesce(edits: Iterable[BlockEdit]) -> Dict[int, BlockEdit]:
+    """Last edit of each date, in order of each date's first edit."""
+    latest: Dict[int, BlockEdit] = {}
+    for edit in edits:
+        latest[edit.date] = edit
+    return latest
+
+
+def read_journal(path: str) -> List[BlockEdit]:
+    """Edits recorded in a journal file, skipping a torn last line."""
+    edits: List[BlockEdit] = []
+    if not os.path.exists(path):
+        return edits
+    with open(path) as f:
+        for line_no, line in enumerate(f, 1):
+            try:
+                edits.extend(BlockEdit(**e) for e in json.loads(line))
+            except (ValueError, TypeError) as e:
+                log.warning(f"Skipping unreadable line {line_no} of {path}: {e}")
+    return edits
+
+
+class BlockWriteQueue:
+    def __init__(
+        self,
+        path: str,
+        apply: Callable[[List[BlockEdit]], None],
+        delay_ms: int,
+        max_edits: int,
+    ):
+        """apply must write the given edits to the database in one transaction."""
+        self.path = path
+        self.flushing_path = f"{path}.flushing"
+        self._apply = apply
+        self._delay = delay_ms / 1000
+        self._max_edits = max_edits
+        self._pending: Dict[int, BlockEdit] = {}
+        self._first_pending: Optional[float] = None
+        self._file: Optional[TextIO] = None
+        # Guards _pending and the journal files; held only briefly
+        self._lock = threading.Lock()
+        self._wake = threading.Condition(self._lock)
+        # Serializes flushes, which run apply outside _lock
+        self._flush_lock = threading.Lock()
+        self._closed = False
+        self._thread: Optional[threading.Thread] = None
+
+    def start(self) -> int:
+        """Replay edits left in the journal, then start the committer thread.
+
+        Returns the number of replayed dates.
+        """
+        edits = read_journal(self.flushing_path) + read_journal(self.path)
+        replayed = len(coalesce(edits))
+        if edits:
+            log.info(f"Replaying {len(edits)} journaled block edits from {self.path}")
+            self._apply(list(coalesce(edits).values()))
+        for path in (self.flushing_path, self.path):
+            if os.path.exists(path):
+                os.remove(path)
+        self._thread = threading.Thread(
+            target=self._run, name="block-write-queue", daemon=True
+        )
+        self._thread.start()
+        return replayed
+
+    def submit(self, edits: List[BlockEdit]) -> None:
+        """Journal edits and queue them for the next group commit."""
+        line = json.dumps([asdict(e) for e in edits], separators=(",", ":"))
+        with self._lock:
+            if self._closed:
+                raise RuntimeError("Block write queue is closed")
+            if self._file is None:
+                self._file = open(self.path, "a")
+            self._file.write(line + "\n")
+            self._file.flush()
+            for edit in edits:
+                if edit.date in self._pending:
+                    BLOCK_WRITE_COALESCED.inc()
+                self._pending[edit.date] = edit
+            if self._first_pending is None:
+                self._first_pending = time.monotonic()
+            self._wake.notify()
+
+    def pending(self) -> int:
+        with self._lock:
+            return len(self._pending)
+
+    def flush(self) -> int:
+        """Apply all queued edits now. Returns the number of dates written."""
+        with self._flush_lock:
+            with self._lock:
+                if not self._pending:
+                    return 0
+                batch = self._pending
+                self._pending = {}
+                self._first_pending = None
+                self._rotate()
+            try:
+                self._apply(list(batch.values()))
+            except Exception:
+                # Put the batch back behind anything queued since; the rotated
+                # journal is kept and merged into on the next attempt
+                with self._lock:
+                    batch.update(self._pending)
+                    self._pending = batch
+                    self._first_pending = time.monotonic()
+                raise
+            os.remove(self.flushing_path)
+            BLOCK_WRITE_BATCH_EDITS.observe(len(batch))
+            log.info(f"Group-committed {len(batch)} block edits")
+            return len(batch)
+
+    def close(self) -> None:
+        """Flush what is queued and stop the committer thread."""
+        with self._lock:
+            self._closed = True
+            self._wake.notify()
+        if self._thread is not None:
+            self._thread.join()
+        try:
+            self.flush()
+        except Exception as e:
+            log.error(f"Could not commit queued block edits, left in {self.path}: {e}")
+        with self._lock:
+            if self._file is not None:
+                self._file.close()
+                self._file = None
+
+    def _rotate(self) -> None:
+        """Move the journal aside for the batch being applied. Called with _lock."""
+        if self._file is not None:
+            self._file.close()
+            self._file = None
+        if not os.path.exists(self.path):
+            return
+        if os.path.exists(self.flushing_path):
+            # A failed flush left its journal behind; keep both
+            with open(self.flushing_path, "a") as dst, open(self.path) as src:
+                dst.write(src.read())
+            os.remove(self.path)
+        else:
+            os.replace(self.path, self.flushing_path)
+
+    def _run(self) -> None:
+        while True:
+            with self._lock:
+                while not self._closed and (
+                    self._first_pending is None
+                    or (
+                        len(self._pending) < self._max_edits
+                        and time.monotonic() - self._first_pending < self._delay
+                    )
+                ):
+                    timeout = (
+                        None
+                        if self._first_pending is None
+                        else self._first_pending + self._delay - time.monotonic()
+                    )
+                    self._wake.wait(timeout)
+                if self._closed:
+                    return
+            try:
+                self.flush()
+            except Exception as e:
+                log.error(f"Group commit of block edits failed, will retry: {e}")
+                time.sleep(self._delay)
@@ -0,0 +1,149 @@
+"""Precomputed local-day, week and month boundaries shared by all services.
+
+A CalendarIndex holds sorted int64 arrays with the UTC timestamps of every local
+midnight, week start and month start of one timezone, so that
+date -> epoch is an array lookup and epoch -> bucket is one ``np.searchsorted``
+for a whole array of timestamps.
+"""
+
+from datetime import date, datetime
+from enum import Enum
+from functools import lru_cache
+from typing import Dict, List
+
+import numpy as np
+
+from .constants import DEFAULT_TZ
+from .timezones import (
+    EPOCH_ORDINAL,
+    SECONDS_PER_DAY,
+    TABLE_END_YEAR,
+    TABLE_START_YEAR,
+    IntArrayLike,
+    TimezoneTable,
+    get_timezone_table,
+)
+
+
+class Granularity(Enum):
+    DAY = "DAY"
+    WEEK = "WEEK"
+    MONTH = "MONTH"
+
+
+# Labels match the SQLite strftime formats the trends API has always returned
+LABEL_FORMATS: Dict[Granularity, str] = {
+    Granularity.DAY: "%Y-%m-%d",
+    Granularity.WEEK: "%Y-%W-1",
+    Granularity.MONTH: "%Y-%m-01",
+}
+
+
+class CalendarIndex:
+    """Local calendar boundaries of one timezone over whole years.
+
+    Weeks start on Monday and, like SQLite's ``%Y-%W``, are split at the new year,
+    so every week bucket lies within a single calendar year.
+    """
+
+    def __init__(
+        self,
+        tz: TimezoneTable,
+        start_year: int = TABLE_START_YEAR,
+        end_year: int = TABLE_END_YEAR,
+    ):
+        self.tz = tz
+        self.first_day = date(start_year, 1, 1).toordinal() - EPOCH_ORDINAL
+        last_day = date(end_year, 1, 1).toordinal() - EPOCH_ORDINAL
+        days = np.arange(self.first_day, last_day, dtype=np.int64)
+        dates = days.astype("datetime64[D]")
+
+        # 1970-01-01 was a Thursday, so Monday is (day + 3) % 7 == 0
+        is_monday = (days + 3) % 7 == 0
+        is_month_start = dates.astype("datetime64[M]").astype("datetime64[D]") == dates
+        is_year_start = dates.astype("datetime64[Y]").astype("datetime64[D]") == dates
+
+        self.day_starts: np.ndarray = tz.day_start(days)
+        self.week_starts: np.ndarray = self.day_starts[is_monday | is_year_start]
+        self.month_starts: np.ndarray = self.day_starts[is_month_start]
+        self._starts: Dict[Granularity, np.ndarray] = {
+            Granularity.DAY: self.day_starts,
+            Granularity.WEEK: self.week_starts,
+            Granularity.MONTH: self.month_starts,
+        }
+
+    def starts(self, granularity: Granularity) -> np.ndarray:
+        """Sorted UTC timestamps at which each bucket of the granularity begins."""
+        return self._starts[granularity]
+
+    def epoch(self, d: date) -> int:
+        """UTC timestamp of local midnight at the start of the given date."""
+        i = d.toordinal() - EPOCH_ORDINAL - self.first_day
+        if 0 <= i < len(self.day_starts):
+            return int(self.day_starts[i])
+        return self.tz.midnight(d)
+
+    def local_epoch(self, d: date, seconds: int) -> int:
+        """UTC timestamp of the local wall-clock time ``seconds`` after midnight of d."""
+        day = d.toordinal() - EPOCH_ORDINAL
+        return int(self.tz.from_local(day * SECONDS_PER_DAY + seconds))
+
+    def localize(self, d: date) -> datetime:
+        """Timezone-aware datetime for local midnight at the start of the given date."""
+        return datetime.fromtimestamp(self.epoch(d), self.tz.zone)
+
+    def day_epochs(self, days: IntArrayLike) -> np.ndarray:
+        """UTC timestamps of local midnight for day numbers (days since 1970-01-01)."""
+        day_arr = np.asarray(days, dtype=np.int64)
+        i = day_arr - self.first_day
+        if day_arr.size and (i.min() < 0 or i.max() >= len(self.day_starts)):
+            return self.tz.day_start(day_arr)
+        epochs: np.ndarray = self.day_starts[i]
+        return epochs
+
+    def bucket(self, ts: IntArrayLike, granularity: Granularity) -> np.ndarray:
+        """Index into ``starts(granularity)`` of the bucket containing each timestamp."""
+        idx: np.ndarray = (
+            np.searchsorted(self._starts[granularity], ts, side="right") - 1
+        )
+        return idx
+
+    def floor(self, ts: int, granularity: Granularity) -> int:
+        """Start of the bucket containing ts."""
+        starts = self._starts[granularity]
+        return int(starts[max(int(self.bucket(ts, granularity)), 0)])
+
+    def ceil(self, ts: int, granularity: Granularity) -> int:
+        """First bucket start at or after ts."""
+        starts = self._starts[granularity]
+        i = int(np.searchsorted(starts, ts, side="left"))
+        return int(starts[min(i, len(starts) - 1)])
+
+    def bucket_dates(self, idx: IntArrayLike, granularity: Granularity) -> List[date]:
+        """Local start date of each bucket index."""
+        epochs = self._starts[granularity][np.asarray(idx, dtype=np.int64)]
+        days = self.tz.local_day(epochs)
+        return [date.fromordinal(int(day) + EPOCH_ORDINAL) for day in days]
+
+    def labels(self, idx: IntArrayLike, granularity: Granularity) -> List[str]:
+        """Trend labels (see LABEL_FORMATS) of each bucket index."""
+        fmt = LABEL_FORMATS[granularity]
+        return [d.strftime(fmt) for d in self.bucket_dates(idx, granularity)]
+
+
+@lru_cache(maxsize=None)
+def get_calendar_index(name: str = DEFAULT_TZ) -> CalendarIndex:
+    """Return the shared CalendarIndex for an IANA zone, building it on first use."""
+    return CalendarIndex(get_timezone_table(name))
+
+
+def parse_local_date(date_str: str, name: str = DEFAULT_TZ) -> datetime:
+    """Parse YYYY-MM-DD to a timezone-aware datetime at local midnight."""
+    d = datetime.strptime(date_str, "%Y-%m-%d").date()
+    return get_calendar_index(name).localize(d)
+
+
+def local_date(ts: int, name: str = DEFAULT_TZ) -> date:
+    """Local calendar date of a UTC timestamp."""
+    day = int(get_timezone_table(name).local_day(ts))
+    return date.fromordinal(day + EPOCH_ORDINAL)
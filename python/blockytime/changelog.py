@@ -0,0 +1,110 @@
+"""Revision numbers and a change log for block edits.
+
+BlockService records every date it writes or deletes in a ChangeLog and bumps
+its revision, so clients can ask for the blocks that changed since a revision
+they have seen (GET /api/v1/blocks/changes) instead of re-fetching whole ranges,
+and can send the revision their edits are based on with a PUT to detect
+conflicting edits from another tab.
+
+The log lives in memory and keeps the last MAX_CHANGED_DATES dates. Revisions
+start from the current time in milliseconds, so they keep increasing across
+restarts; a revision older than what the log covers (before a restart, after
+pull-db, or evicted) cannot be answered with deltas and clients are told to
+reload instead. Edits made by other processes (ai_tools, the iOS app) are not
+tracked.
+"""
+
+import os
+import threading
+import time
+from collections import OrderedDict
+from dataclasses import dataclass, field
+from typing import Iterable, List, Optional
+
+MAX_CHANGED_DATES = int(os.getenv("BLOCKYTIME_MAX_CHANGED_DATES", "20000"))
+
+
+class RevisionConflictError(Exception):
+    """Dates being written changed after the revision the client expected."""
+
+    def __init__(self, revision: int, dates: List[int]):
+        super().__init__(
+            f"{len(dates)} blocks changed since the expected revision, "
+            f"current revision is {revision}"
+        )
+        self.revision = revision
+        self.dates = dates
+
+
+@dataclass
+class Changes:
+    revision: int
+    # True when since is older than the log, and the client should reload
+    reset: bool
+    dates: List[int] = field(default_factory=list)
+
+
+class ChangeLog:
+    def __init__(self, max_dates: int = MAX_CHANGED_DATES):
+        self._max_dates = max_dates
+        # date -> revision of its last change, oldest first
+        self._dates: OrderedDict[int, int] = OrderedDict()
+        self._lock = threading.RLock()
+        self._revision = 0
+        self._floor = 0
+        self.reset()
+
+    @property
+    def lock(self) -> threading.RLock:
+        """Held across check() and record() to make them atomic."""
+        return self._lock
+
+    @property
+    def revision(self) -> int:
+        return self._revision
+
+    def reset(self) -> int:
+        """Forget all changes, e.g. after the database was replaced."""
+        with self._lock:
+            self._dates.clear()
+            self._revision = max(self._revision + 1, int(time.time() * 1000))
+            self._floor = self._revision
+            return self._revision
+
+    def record(self, dates: Iterable[int]) -> int:
+        """Bump the revision for changes to dates and return it."""
+        with self._lock:
+            self._revision += 1
+            for d in dates:
+                self._dates.pop(d, None)
+                self._dates[d] = self._revision
+            while len(self._dates) > self._max_dates:
+                _, evicted = self._dates.popitem(last=False)
+                self._floor = evicted
+            return self._revision
+
+    def check(self, dates: Iterable[int], expected: Optional[int]) -> None:
+        """Raise RevisionConflictError if any of dates changed after expected."""
+        if expected is None:
+            return
+        with self._lock:
+            if expected < self._floor:
+                raise RevisionConflictError(self._revision, sorted(set(dates)))
+            conflicts = sorted(
+                {d for d in dates if self._dates.get(d, self._floor) > expected}
+            )
+            if conflicts:
+                raise RevisionConflictError(self._revision, conflicts)
+
+    def since(self, revision: int) -> Changes:
+        """Dates changed after revision, or reset if the log does not go back that far."""
+        with self._lock:
+            if revision < self._floor or revision > self._revision:
+                return Changes(self._revision, True)
+            dates = []
+            for d, rev in reversed(self._dates.items()):
+                if rev <= revision:
+                    break
+                dates.append(d)
+            dates.sort()
+            return Changes(self._revision, False, dates)
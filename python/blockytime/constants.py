@@ -1 +1,26 @@
-DEFAULT_TZ = "Asia/Hong_Kong"
+import os
+
+# IANA timezone used to bucket blocks into local days, hours and weekdays when a
+# request does not name one explicitly.
+DEFAULT_TZ = os.getenv("BLOCKYTIME_TZ", "Asia/Hong_Kong")
+
+# Whether to add the indexes declared on the models (see models.block) to the
+# database, which the iOS app's schema does not have. Set to 0 to leave DB.db
+# exactly as the app wrote it.
+CREATE_INDEXES = os.getenv("BLOCKYTIME_CREATE_INDEXES", "1") != "0"
+
+# Group commit of block edits (see blockjournal.py): PUT /api/v1/blocks returns
+# once edits are journaled, and they are written to DB.db after this many
+# milliseconds, or as soon as BLOCK_WRITE_MAX_EDITS blocks are pending. 0 writes
+# every PUT synchronously, without a journal.
+BLOCK_WRITE_DELAY_MS = int(os.getenv("BLOCKYTIME_BLOCK_WRITE_DELAY_MS", "200"))
+BLOCK_WRITE_MAX_EDITS = int(os.getenv("BLOCKYTIME_BLOCK_WRITE_MAX_EDITS", "500"))
+
+# Whether create_app starts the scheduler running maintenance jobs in the
+# background (see maintenance.py): ANALYZE, cache warming, backup pruning.
+SCHEDULER = os.getenv("BLOCKYTIME_SCHEDULER", "1") != "0"
+
+# Blocks per page of GET /api/v1/blocks?limit=... and BlockService.iter_blocks
+# when none is given, and the most a request may ask for.
+BLOCK_PAGE_SIZE = 1000
+MAX_BLOCK_PAGE_SIZE = 10000
@@ -0,0 +1,140 @@
+"""Checks, warm-up, change detection and a request gate for database files
+swapped in at runtime (admin pull-db)."""
+
+import logging
+import os
+import sqlite3
+import threading
+import time
+from contextlib import contextmanager
+from typing import Iterator
+
+from sqlalchemy import text
+from sqlalchemy.engine import Engine
+
+log = logging.getLogger(__name__)
+
+# Tables every BlockyTime database has, see data/blockytime.sql
+REQUIRED_TABLES = ("Block", "Type", "Project", "Category", "Config")
+# Dimension tables read by nearly every page
+DIMENSION_TABLES = ("Type", "Project", "Category", "Config", "Link")
+# The dashboard opens on the last few weeks of blocks
+WARM_BLOCK_SECONDS = 35 * 24 * 3600
+# How long a swap waits for running requests before renaming the file anyway
+SWAP_DRAIN_SECONDS = float(os.getenv("BLOCKYTIME_SWAP_DRAIN_SECONDS", "10"))
+# Offset of the file change counter in the database header
+CHANGE_COUNTER_OFFSET = 24
+
+
+def change_counter(path: str) -> int:
+    """The file change counter of the database at path, which SQLite bumps on
+    every committed write, whichever process made it; 0 if there is no file."""
+    try:
+        with open(path, "rb") as f:
+            f.seek(CHANGE_COUNTER_OFFSET)
+            return int.from_bytes(f.read(4), "big")
+    except FileNotFoundError:
+        return 0
+
+
+def validate_database_file(path: str) -> None:
+    """Raise ValueError unless path is a readable, consistent BlockyTime database."""
+    try:
+        con = sqlite3.connect(f"file:{path}?mode=ro", uri=True)
+    except sqlite3.Error as e:
+        raise ValueError(f"Cannot open {path}: {e}") from e
+    try:
+        (result,) = con.execute("PRAGMA quick_check").fetchone()
+        if result != "ok":
+            raise ValueError(f"{path} failed quick_check: {result}")
+        tables = {
+            name
+            for (name,) in con.execute(
+                "SELECT name FROM sqlite_master WHERE type = 'table'"
+            )
+        }
+        missing = [t for t in REQUIRED_TABLES if t not in tables]
+        if missing:
+            raise ValueError(f"{path} is missing tables {missing}")
+    except sqlite3.Error as e:
+        raise ValueError(f"Cannot read {path}: {e}") from e
+    finally:
+        con.close()
+
+
+def warm_database(engine: Engine) -> None:
+    """Open a pooled connection and page in the dimension tables and recent blocks."""
+    started = time.monotonic()
+    with engine.connect() as conn:
+        for table in DIMENSION_TABLES:
+            conn.execute(text(f'SELECT * FROM "{table}"')).all()
+        latest = conn.execute(text('SELECT max(date) FROM "Block"')).scalar()
+        if latest is not None:
+            conn.execute(
+                text('SELECT * FROM "Block" WHERE date >= :since'),
+                {"since": latest - WARM_BLOCK_SECONDS},
+            ).all()
+    log.info(f"Warmed database in {time.monotonic() - started:.3f} seconds")
+
+
+class DatabaseGate:
+    """Requests share the database file; a swap waits until none is using it.
+
+    SQLite finds the rollback journal by file name, so a connection still
+    reading the renamed-away file can pick up the journal of the new one and
+    fail with "disk I/O error", and writes to it fail as read-only. Requests
+    and maintenance jobs hold the gate while they run, and swapping closes it,
+    waits for them to drain and holds new ones back until the new services are
+    in place.
+    """
+
+    def __init__(self) -> None:
+        self._cond = threading.Condition()
+        self._active = 0
+        self._closed = False
+
+    def enter(self) -> None:
+        with self._cond:
+            self._cond.wait_for(lambda: not self._closed)
+            self._active += 1
+
+    def leave(self) -> None:
+        with self._cond:
+            self._active -= 1
+            self._cond.notify_all()
+
+    @contextmanager
+    def held(self) -> Iterator[None]:
+        """Hold the gate for the block, e.g. around a maintenance job."""
+        self.enter()
+        try:
+            yield
+        finally:
+            self.leave()
+
+    @property
+    def active(self) -> int:
+        """Requests and maintenance jobs holding the gate right now."""
+        return self._active
+
+    @contextmanager
+    def exclusive(
+        self, timeout: float = SWAP_DRAIN_SECONDS, holding: bool = False
+    ) -> Iterator[None]:
+        """Close the gate and wait for its holders to leave. With holding, the
+        caller holds the gate itself (see held) and waits for the others."""
+        own = 1 if holding else 0
+        with self._cond:
+            self._cond.wait_for(lambda: not self._closed)
+            self._closed = True
+            if not self._cond.wait_for(lambda: self._active == own, timeout):
+                log.warning(
+                    f"{self._active - own} requests still running after "
+                    f"{timeout} seconds"
+                )
+        try:
+            yield
+        finally:
+            with self._cond:
+                self._closed = False
+                self._cond.notify_all()
@@ -0,0 +1,317 @@
+"""Incremental sync of a database pulled from the phone into the local one.
+
+Usually only the last few days of blocks differ between the phone and the
+local DB.db, so instead of renaming the pulled file over DB.db, sync_database()
+attaches it and copies just the rows that differ, table by table, in one
+transaction:
+
+- Block is compared in date buckets (BUCKET_SECONDS) by row count and the sum
+  of a hash of every row; only the buckets that differ are diffed row by row.
+  Numbers are hashed in SQL and only non-empty text calls back into Python.
+- Other tables with an integer primary key are diffed row by row.
+- Tables without one (Config, Link, DBinfo) are replaced when they differ.
+
+Afterwards every table holds exactly the rows of the pulled file, and the
+report lists the block dates that changed, so caches can drop just those.
+Files whose tables or columns differ from the local ones raise SyncSchemaError
+before anything is written; those have to be swapped in whole.
+"""
+
+import logging
+import os
+import sqlite3
+import time
+import zlib
+from dataclasses import asdict, dataclass, field
+from typing import Any, Dict, List, Optional, Tuple
+
+log = logging.getLogger(__name__)
+
+BLOCK_TABLE = "Block"
+# Two weeks of blocks per bucket, so a typical pull diffs one or two of them
+BUCKET_SECONDS = int(os.getenv("BLOCKYTIME_SYNC_BUCKET_SECONDS", str(14 * 86400)))
+REMOTE = "pulled"
+# Row hashes are polynomials in the column values modulo this prime
+HASH_PRIME = 4294967291
+
+
+class SyncSchemaError(Exception):
+    """The pulled file does not have the tables and columns of the local one."""
+
+
+@dataclass
+class TableSync:
+    table: str
+    inserted: int = 0
+    updated: int = 0
+    deleted: int = 0
+    # Tables without a key are replaced as a whole when they differ
+    replaced: bool = False
+
+    @property
+    def changed(self) -> bool:
+        return bool(self.inserted or self.updated or self.deleted)
+
+
+@dataclass
+class SyncReport:
+    tables: List[TableSync] = field(default_factory=list)
+    # Dates of blocks written or deleted, before and after the sync
+    block_dates: List[int] = field(default_factory=list)
+    buckets: int = 0
+    changed_buckets: int = 0
+    seconds: float = 0.0
+
+    @property
+    def changed(self) -> bool:
+        return any(t.changed for t in self.tables)
+
+    @property
+    def blocks_only(self) -> bool:
+        """Only Block changed, so types, projects and configs can stay cached."""
+        return all(t.table == BLOCK_TABLE or not t.changed for t in self.tables)
+
+    def to_dict(self) -> Dict[str, Any]:
+        return {
+            "tables": [asdict(t) for t in self.tables if t.changed],
+            "block_dates": len(self.block_dates),
+            "first_block_date": min(self.block_dates, default=None),
+            "last_block_date": max(self.block_dates, default=None),
+            "buckets": self.buckets,
+            "changed_buckets": self.changed_buckets,
+            "seconds": round(self.seconds, 3),
+        }
+
+
+def _text_hash(value: Any) -> int:
+    return zlib.crc32(repr(value).encode())
+
+
+def _columns(con: sqlite3.Connection, schema: str, table: str) -> List[str]:
+    return [row[1] for row in con.execute(f'PRAGMA {schema}.table_info("{table}")')]
+
+
+def _row_hash_sql(con: sqlite3.Connection, table: str) -> str:
+    """SQL expression hashing a row of table, from its declared column types."""
+    expr = "0"
+    for row in con.execute(f'PRAGMA main.table_info("{table}")'):
+        column, type_ = f'"{row[1]}"', row[2].lower()
+        if "int" in type_ or type_ == "bool":
+            value = f"ifnull({column}, -1)"
+        else:
+            value = (
+                f"CASE WHEN {column} IS NULL THEN -1 WHEN {column} = '' THEN 0 "
+                f"ELSE text_hash({column}) END"
+            )
+        expr = f"(({expr}) * 1000003 + {value}) % {HASH_PRIME}"
+    return expr
+
+
+def _integer_key(con: sqlite3.Connection, schema: str, table: str) -> Optional[str]:
+    """The column of a single-column integer primary key, if the table has one."""
+    keys: List[Tuple[str, str]] = [
+        (row[1], row[2].lower())
+        for row in con.execute(f'PRAGMA {schema}.table_info("{table}")')
+        if row[5]
+    ]
+    if len(keys) == 1 and keys[0][1] == "integer":
+        return keys[0][0]
+    return None
+
+
+def _tables(con: sqlite3.Connection, schema: str) -> Dict[str, List[str]]:
+    names = [
+        name
+        for (name,) in con.execute(
+            f"SELECT name FROM {schema}.sqlite_master "
+            "WHERE type = 'table' AND name NOT LIKE 'sqlite_%' ORDER BY name"
+        )
+    ]
+    return {name: _columns(con, schema, name) for name in names}
+
+
+def _check_schema(con: sqlite3.Connection) -> Dict[str, List[str]]:
+    local = _tables(con, "main")
+    pulled = _tables(con, REMOTE)
+    if set(local) != set(pulled):
+        raise SyncSchemaError(
+            f"Tables differ: only local {sorted(set(local) - set(pulled))}, "
+            f"only pulled {sorted(set(pulled) - set(local))}"
+        )
+    for table, columns in local.items():
+        if set(columns) != set(pulled[table]):
+            raise SyncSchemaError(
+                f"Columns of {table} differ: local {columns}, pulled {pulled[table]}"
+            )
+    return local
+
+
+def _connect(db_path: str, source_path: str) -> sqlite3.Connection:
+    # Autocommit, so ATTACH works and the transaction is begun explicitly
+    con = sqlite3.connect(db_path, isolation_level=None)
+    con.create_function("text_hash", 1, _text_hash, deterministic=True)
+    con.execute(f"ATTACH DATABASE ? AS {REMOTE}", (source_path,))
+    return con
+
+
+def check_schema(db_path: str, source_path: str) -> None:
+    """Raise SyncSchemaError unless source_path can be synced into db_path."""
+    con = _connect(db_path, source_path)
+    try:
+        _check_schema(con)
+    finally:
+        con.close()
+
+
+def _bucket_hashes(
+    con: sqlite3.Connection, schema: str, row_hash: str
+) -> Dict[Any, Tuple[int, int]]:
+    return {
+        bucket: (count, digest)
+        for bucket, count, digest in con.execute(
+            f"SELECT ifnull(date / {BUCKET_SECONDS}, 'none') AS bucket, count(*), "
+            f'total({row_hash}) FROM {schema}."{BLOCK_TABLE}" GROUP BY bucket'
+        )
+    }
+
+
+def _sync_keyed(
+    con: sqlite3.Connection,
+    table: str,
+    key: str,
+    columns: str,
+    where: str,
+    report: SyncReport,
+) -> TableSync:
+    """Make the rows of table matching where equal to the pulled ones, by key."""
+    con.execute("DELETE FROM temp.sync_keys")
+    # Rows that are new or differ in any column
+    con.execute(
+        f'INSERT INTO temp.sync_keys SELECT "{key}", 0 FROM ('
+        f'SELECT {columns} FROM {REMOTE}."{table}" WHERE {where} '
+        f'EXCEPT SELECT {columns} FROM main."{table}" WHERE {where})'
+    )
+    # Rows gone from the pulled file; rows that moved out of where are upserted
+    # from the other side
+    con.execute(
+        f'INSERT INTO temp.sync_keys SELECT "{key}", 1 FROM main."{table}" '
+        f'WHERE {where} AND "{key}" NOT IN (SELECT "{key}" FROM {REMOTE}."{table}")'
+    )
+    keys = "SELECT key FROM temp.sync_keys WHERE removed = {}"
+    result = TableSync(table)
+    (result.updated,) = con.execute(
+        f'SELECT count(*) FROM main."{table}" WHERE "{key}" IN ({keys.format(0)})'
+    ).fetchone()
+    (result.inserted,) = con.execute(
+        "SELECT count(*) FROM temp.sync_keys WHERE removed = 0"
+    ).fetchone()
+    result.inserted -= result.updated
+    if table == BLOCK_TABLE:
+        report.block_dates.extend(
+            date
+            for (date,) in con.execute(
+                f'SELECT date FROM main."{table}" '
+                f'WHERE "{key}" IN (SELECT key FROM temp.sync_keys) '
+                f'UNION SELECT date FROM {REMOTE}."{table}" '
+                f'WHERE "{key}" IN ({keys.format(0)})'
+            )
+            if date is not None
+        )
+    result.deleted = con.execute(
+        f'DELETE FROM main."{table}" WHERE "{key}" IN ({keys.format(1)})'
+    ).rowcount
+    con.execute(
+        f'INSERT OR REPLACE INTO main."{table}" ({columns}) '
+        f'SELECT {columns} FROM {REMOTE}."{table}" WHERE "{key}" IN ({keys.format(0)})'
+    )
+    return result
+
+
+def _sync_unkeyed(con: sqlite3.Connection, table: str, columns: str) -> TableSync:
+    """Replace all rows of table when it differs from the pulled one."""
+    result = TableSync(table)
+    local = f'SELECT {columns} FROM main."{table}"'
+    pulled = f'SELECT {columns} FROM {REMOTE}."{table}"'
+    (local_count,) = con.execute(f"SELECT count(*) FROM ({local})").fetchone()
+    (pulled_count,) = con.execute(f"SELECT count(*) FROM ({pulled})").fetchone()
+    same = (
+        local_count == pulled_count
+        and con.execute(f"{pulled} EXCEPT {local} LIMIT 1").fetchone() is None
+        and con.execute(f"{local} EXCEPT {pulled} LIMIT 1").fetchone() is None
+    )
+    if not same:
+        con.execute(f'DELETE FROM main."{table}"')
+        con.execute(f'INSERT INTO main."{table}" ({columns}) {pulled}')
+        result.inserted, result.deleted, result.replaced = (
+            pulled_count,
+            local_count,
+            True,
+        )
+    return result
+
+
+def sync_database(db_path: str, source_path: str) -> SyncReport:
+    """Copy the rows of source_path that differ into db_path, in one transaction.
+
+    Other connections to db_path, e.g. the app's engine, keep working and see
+    all the changes or none; the caller invalidates what they cached.
+    """
+    started = time.monotonic()
+    report = SyncReport()
+    con = _connect(db_path, source_path)
+    try:
+        tables = _check_schema(con)
+        con.execute("BEGIN IMMEDIATE")
+        try:
+            con.execute(
+                "CREATE TEMP TABLE IF NOT EXISTS sync_keys "
+                "(key INTEGER PRIMARY KEY, removed INTEGER)"
+            )
+            for table, column_names in tables.items():
+                columns = ", ".join(f'"{c}"' for c in column_names)
+                key = _integer_key(con, "main", table)
+                if key is None:
+                    report.tables.append(_sync_unkeyed(con, table, columns))
+                elif table == BLOCK_TABLE:
+                    row_hash = _row_hash_sql(con, table)
+                    local = _bucket_hashes(con, "main", row_hash)
+                    pulled = _bucket_hashes(con, REMOTE, row_hash)
+                    changed = [
+                        b
+                        for b in set(local) | set(pulled)
+                        if local.get(b) != pulled.get(b)
+                    ]
+                    report.buckets = len(set(local) | set(pulled))
+                    report.changed_buckets = len(changed)
+                    con.execute("DROP TABLE IF EXISTS temp.sync_buckets")
+                    con.execute("CREATE TEMP TABLE sync_buckets (bucket PRIMARY KEY)")
+                    con.executemany(
+                        "INSERT INTO temp.sync_buckets VALUES (?)",
+                        [(b,) for b in changed],
+                    )
+                    where = (
+                        f"ifnull(date / {BUCKET_SECONDS}, 'none') "
+                        "IN (SELECT bucket FROM temp.sync_buckets)"
+                    )
+                    report.tables.append(
+                        _sync_keyed(con, table, key, columns, where, report)
+                    )
+                else:
+                    report.tables.append(
+                        _sync_keyed(con, table, key, columns, "1", report)
+                    )
+            con.execute("COMMIT")
+        except BaseException:
+            con.execute("ROLLBACK")
+            raise
+    finally:
+        con.close()
+    report.block_dates = sorted(set(report.block_dates))
+    report.seconds = time.monotonic() - started
+    log.info(
+        f"Synced {source_path} into {db_path} in {report.seconds:.3f} seconds: "
+        f"{report.changed_buckets} of {report.buckets} block buckets and "
+        f"{sum(t.changed for t in report.tables)} tables changed, "
+        f"{len(report.block_dates)} block dates"
+    )
+    return report
@@ -0,0 +1,23 @@
+from dataclasses import dataclass, field
+from typing import Any, Dict, List
+
+from .base_dto import BaseDTO
+from .block_dto import BlockDTO
+
+
+@dataclass
+class BlockChangesDTO(BaseDTO):
+    revision: int
+    # The client is too far behind for deltas and should reload its blocks
+    reset: bool
+    blocks: List[BlockDTO] = field(default_factory=list)  # current state
+    deleted: List[int] = field(default_factory=list)  # dates without a block
+
+    def to_dict(self) -> Dict[str, Any]:
+        return {
+            **super().to_dict(),
+            "revision": self.revision,
+            "reset": self.reset,
+            "blocks": [block.to_dict() for block in self.blocks],
+            "deleted": self.deleted,
+        }
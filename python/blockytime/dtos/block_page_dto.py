@@ -0,0 +1,20 @@
+from dataclasses import dataclass, field
+from typing import Any, Dict, List, Optional
+
+from .base_dto import BaseDTO
+from .block_dto import BlockDTO
+
+
+@dataclass
+class BlockPageDTO(BaseDTO):
+    blocks: List[BlockDTO] = field(default_factory=list)  # ordered by date
+    # Date of the last block, to pass as after for the next page; None on the
+    # last page
+    next_after: Optional[int] = None
+
+    def to_dict(self) -> Dict[str, Any]:
+        return {
+            **super().to_dict(),
+            "blocks": [block.to_dict() for block in self.blocks],
+            "next": self.next_after,
+        }
@@ -0,0 +1,18 @@
+from dataclasses import dataclass
+from typing import Any, Dict
+
+from .base_dto import BaseDTO
+from .block_dto import BlockDTO
+
+
+@dataclass
+class CommentMatchDTO(BaseDTO):
+    block: BlockDTO
+    rank: float  # bm25 score of the comment, lower is a better match
+
+    def to_dict(self) -> Dict[str, Any]:
+        return {
+            **super().to_dict(),
+            "block": self.block.to_dict(),
+            "rank": self.rank,
+        }
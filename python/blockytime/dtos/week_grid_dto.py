@@ -0,0 +1,23 @@
+from dataclasses import dataclass, field
+from typing import Any, Dict, List
+
+from .base_dto import BaseDTO
+
+
+@dataclass
+class WeekGridDTO(BaseDTO):
+    start_date: str  # YYYY-MM-DD, local first day
+    slot_minutes: int  # 30, or 15 when quarter hours are not pixelated
+    # cells[day][slot] is the type uid shown in that slot, 0 where empty
+    cells: List[List[int]] = field(default_factory=list)
+    # uid -> name and color of every type in cells
+    types: Dict[int, Dict[str, Any]] = field(default_factory=dict)
+
+    def to_dict(self) -> Dict[str, Any]:
+        return {
+            **super().to_dict(),
+            "startDate": self.start_date,
+            "slotMinutes": self.slot_minutes,
+            "cells": self.cells,
+            "types": {str(uid): t for uid, t in self.types.items()},
+        }
@@ -0,0 +1,237 @@
+"""Streaming bulk import of blocks from JSON, NDJSON or CSV.
+
+Records are read lazily from a text stream, validated against the Type and
+Project uids loaded once per import, and written in chunks through
+BlockService.bulk_upsert, so back-filling years of history keeps memory bounded
+and never issues per-row lookups.
+
+Each record has the same shape as the set-blocks command input::
+
+    {"date": "YYYY-MM-DDTHH:MM" | unix_ts, "type_uid": int,
+     "project_uid": int | null, "comment": str}
+"""
+
+import csv
+import json
+import logging
+import re
+import time
+from dataclasses import dataclass, field
+from datetime import datetime
+from enum import Enum
+from itertools import islice
+from typing import (
+    Any,
+    Callable,
+    Dict,
+    Iterable,
+    Iterator,
+    List,
+    Optional,
+    Sequence,
+    Set,
+    TextIO,
+    Tuple,
+)
+
+import numpy as np
+from sqlalchemy.engine import Engine
+from sqlalchemy.orm import Session
+
+from .constants import DEFAULT_TZ
+from .interfaces.blockserviceinterface import BlockServiceInterface
+from .models.project import Project
+from .models.type_ import Type
+from .timezones import TimezoneTable, get_timezone_table
+
+log = logging.getLogger(__name__)
+
+DEFAULT_CHUNK_SIZE = 1000
+# Rejected records beyond this many are counted but not reported individually
+MAX_REPORTED_ERRORS = 100
+
+# ISO strings that carry their own UTC offset, e.g. 2025-01-01T08:00+08:00
+_TZ_SUFFIX = re.compile(r"\d{2}:\d{2}(:\d{2}(\.\d+)?)?(Z|[+-]\d{2}:?\d{2})$")
+
+
+class ImportFormat(Enum):
+    JSON = "json"  # a single JSON array
+    NDJSON = "ndjson"  # one JSON object per line
+    CSV = "csv"  # header row with date,type_uid,project_uid,comment
+
+
+@dataclass
+class ImportProgress:
+    read: int = 0
+    imported: int = 0
+    rejected: int = 0
+    chunks: int = 0
+    elapsed: float = 0.0
+    errors: List[Dict[str, Any]] = field(default_factory=list)
+
+    def to_dict(self) -> Dict[str, Any]:
+        return {
+            "read": self.read,
+            "imported": self.imported,
+            "rejected": self.rejected,
+            "chunks": self.chunks,
+            "elapsed": round(self.elapsed, 3),
+            "errors": self.errors,
+        }
+
+
+class DimensionCache:
+    """Type and project uids known to the database, loaded once."""
+
+    def __init__(self, engine: Engine):
+        with Session(engine) as session:
+            self.type_uids: Set[int] = {uid for (uid,) in session.query(Type.uid)}
+            self.project_uids: Set[int] = {uid for (uid,) in session.query(Project.uid)}
+
+
+def read_records(stream: TextIO, fmt: ImportFormat) -> Iterator[Any]:
+    """Yield raw records from a stream without loading NDJSON or CSV input whole."""
+    if fmt == ImportFormat.JSON:
+        data = json.load(stream)
+        if not isinstance(data, list):
+            raise ValueError("expecting a JSON array of blocks")
+        yield from data
+    elif fmt == ImportFormat.NDJSON:
+        for line in stream:
+            if line.strip():
+                yield json.loads(line)
+    else:
+        yield from csv.DictReader(stream)
+
+
+def parse_block_dates(values: Sequence[Any], tz: TimezoneTable) -> np.ndarray:
+    """Convert block dates (unix ints or ISO strings) to unix timestamps.
+
+    Naive ISO strings are parsed as one numpy datetime64 batch and localised with
+    the timezone table; only strings carrying their own UTC offset go through
+    datetime.fromisoformat. Raises ValueError if any value cannot be parsed.
+    """
+    result = np.empty(len(values), dtype=np.int64)
+    naive_idx: List[int] = []
+    naive_values: List[str] = []
+    for i, value in enumerate(values):
+        if isinstance(value, (int, float)):
+            result[i] = int(value)
+            continue
+        text = str(value).strip()
+        if text.isdigit():
+            result[i] = int(text)
+        elif _TZ_SUFFIX.search(text):
+            result[i] = int(datetime.fromisoformat(text).timestamp())
+        else:
+            naive_idx.append(i)
+            naive_values.append(text)
+    if naive_values:
+        parsed = np.array(naive_values, dtype="datetime64[s]")
+        if np.isnat(parsed).any():
+            raise ValueError("missing date")
+        result[naive_idx] = tz.from_local(parsed.astype(np.int64))
+    return result
+
+
+class BlockImporter:
+    def __init__(
+        self,
+        engine: Engine,
+        block_service: BlockServiceInterface,
+        timezone: str = DEFAULT_TZ,
+        chunk_size: int = DEFAULT_CHUNK_SIZE,
+        progress: Optional[Callable[[ImportProgress], None]] = None,
+    ):
+        if chunk_size <= 0:
+            raise ValueError("chunk_size must be positive")
+        self._block_service = block_service
+        self._tz = get_timezone_table(timezone)
+        self._chunk_size = chunk_size
+        self._progress = progress
+        self._dimensions = DimensionCache(engine)
+
+    def run(self, records: Iterable[Any]) -> ImportProgress:
+        """Validate and write records chunk by chunk; invalid records are skipped."""
+        status = ImportProgress()
+        started = time.monotonic()
+        it = iter(records)
+        while chunk := list(islice(it, self._chunk_size)):
+            self._import_chunk(chunk, status)
+            status.chunks += 1
+            status.elapsed = time.monotonic() - started
+            if self._progress is not None:
+                self._progress(status)
+        log.info(
+            f"Imported {status.imported} blocks in {status.chunks} chunks, "
+            f"rejected {status.rejected}, took {status.elapsed:.3f} seconds"
+        )
+        return status
+
+    def _reject(self, status: ImportProgress, row: int, message: str) -> None:
+        status.rejected += 1
+        if len(status.errors) < MAX_REPORTED_ERRORS:
+            status.errors.append({"row": row, "error": message})
+
+    def _parse_dates(
+        self, chunk: List[Any], first_row: int, status: ImportProgress
+    ) -> List[Optional[int]]:
+        values = [
+            item.get("date") if isinstance(item, dict) else None for item in chunk
+        ]
+        try:
+            return [int(ts) for ts in parse_block_dates(values, self._tz)]
+        except (TypeError, ValueError):
+            # Fall back to one record at a time to find the offending rows
+            dates: List[Optional[int]] = []
+            for i, value in enumerate(values):
+                try:
+                    dates.append(int(parse_block_dates([value], self._tz)[0]))
+                except (TypeError, ValueError) as e:
+                    self._reject(status, first_row + i, f"invalid date {value!r}: {e}")
+                    dates.append(None)
+            return dates
+
+    def _validate(
+        self, item: Dict[str, Any]
+    ) -> Tuple[Optional[str], int, Optional[int], str]:
+        try:
+            type_uid = int(item["type_uid"])
+        except (KeyError, TypeError, ValueError):
+            return "type_uid is required and must be an integer", 0, None, ""
+        if type_uid not in self._dimensions.type_uids:
+            return f"unknown type_uid {type_uid}", 0, None, ""
+        try:
+            project_uid = int(item.get("project_uid") or 0) or None
+        except (TypeError, ValueError):
+            return "project_uid must be an integer or null", 0, None, ""
+        if project_uid is not None and project_uid not in self._dimensions.project_uids:
+            return f"unknown project_uid {project_uid}", 0, None, ""
+        return None, type_uid, project_uid, item.get("comment") or ""
+
+    def _import_chunk(self, chunk: List[Any], status: ImportProgress) -> None:
+        first_row = status.read
+        status.read += len(chunk)
+        dates = self._parse_dates(chunk, first_row, status)
+
+        # Later records for the same date win, as they would row by row
+        rows: Dict[int, Tuple[int, Optional[int], str]] = {}
+        for i, (item, date_ts) in enumerate(zip(chunk, dates)):
+            if date_ts is None:
+                continue
+            if not isinstance(item, dict):
+                self._reject(status, first_row + i, "expecting an object")
+                continue
+            error, type_uid, project_uid, comment = self._validate(item)
+            if error is not None:
+                self._reject(status, first_row + i, error)
+                continue
+            rows[date_ts] = (type_uid, project_uid, comment)
+
+        if rows:
+            status.imported += self._block_service.bulk_upsert(
+                list(rows.keys()),
+                [row[0] for row in rows.values()],
+                [row[1] for row in rows.values()],
+                [row[2] for row in rows.values()],
+            )
@@ -0,0 +1,64 @@
+"""Flask request hooks feeding the metrics registry."""
+
+import logging
+import time
+
+from flask import Flask, Response, g, request
+
+from .metrics import (
+    HTTP_REQUEST_SECONDS,
+    HTTP_REQUEST_SQL_SECONDS,
+    HTTP_REQUEST_SQL_STATEMENTS,
+    REGISTRY,
+    start_sql_tally,
+    stop_sql_tally,
+)
+
+log = logging.getLogger(__name__)
+
+CONTENT_TYPE = "text/plain; version=0.0.4; charset=utf-8"
+
+
+def current_endpoint() -> str:
+    """Route pattern of the current request, e.g. /api/v1/stats."""
+    rule = request.url_rule
+    return rule.rule if rule is not None else "unmatched"
+
+
+def instrument_app(app: Flask) -> None:
+    """Record latency and SQL usage of every request, and log one line per request."""
+
+    @app.before_request
+    def start_timer() -> None:
+        g.metrics_started = time.perf_counter()
+        g.metrics_sql_token = start_sql_tally()
+
+    @app.after_request
+    def record_request(response: Response) -> Response:
+        started = g.pop("metrics_started", None)
+        token = g.pop("metrics_sql_token", None)
+        if started is None or token is None:
+            return response
+        elapsed = time.perf_counter() - started
+        tally = stop_sql_tally(token)
+        endpoint = current_endpoint()
+        HTTP_REQUEST_SECONDS.observe(
+            elapsed,
+            endpoint=endpoint,
+            method=request.method,
+            status=str(response.status_code),
+        )
+        sql = ""
+        if tally is not None:
+            HTTP_REQUEST_SQL_STATEMENTS.observe(tally.statements, endpoint=endpoint)
+            HTTP_REQUEST_SQL_SECONDS.observe(tally.seconds, endpoint=endpoint)
+            sql = f" ({tally.statements} SQL statements, {tally.seconds:.3f}s)"
+        log.info(
+            f"{request.method} {request.full_path.rstrip('?')} "
+            f"{response.status_code} took {elapsed:.3f} seconds{sql}"
+        )
+        return response
+
+
+def metrics_response() -> Response:
+    return Response(REGISTRY.render(), content_type=CONTENT_TYPE)
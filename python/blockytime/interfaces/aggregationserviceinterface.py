@@ -0,0 +1,76 @@
+from datetime import date
+from enum import Enum
+from typing import TYPE_CHECKING, Any, Dict, List, Optional, Protocol, Sequence
+
+if TYPE_CHECKING:
+    from ..calendarindex import Granularity
+
+
+class Dimension(Enum):
+    TYPE = "TYPE"
+    PROJECT = "PROJECT"
+    CATEGORY = "CATEGORY"  # of the block's type
+
+
+class AggregationServiceInterface(Protocol):
+    def aggregate(
+        self,
+        start_date: date,
+        end_date: date,
+        group_by: Sequence[Dimension],
+        bucket: Optional["Granularity"] = None,
+        type_uids: Optional[List[int]] = None,
+        include_hidden: bool = True,
+        top: Optional[int] = None,
+        timezone: Optional[str] = None,
+    ) -> List[Dict[str, Any]]:
+        """
+        Blocks and hours in [start_date, end_date) per combination of the
+        group_by dimensions, and per local day, week or month with bucket.
+
+        Each row has the uid and name of each dimension (type_uid and type,
+        project_uid and project, category_uid and category; None where a block
+        has none), period_start (YYYY-MM-DD) with bucket, blocks and hours.
+        Rows are sorted by period, then hours descending, then first block.
+
+        Args:
+            group_by: Dimensions to group by; none gives one row per period
+            bucket: Optional local calendar period to group by as well
+            type_uids: Optional list of type UIDs to filter by
+            include_hidden: Whether to count blocks of hidden types
+            top: Optional number of rows to keep, per period with bucket
+            timezone: Optional IANA zone used for day boundaries and periods
+        """
+        ...
+
+    def get_totals(
+        self,
+        start_date: date,
+        end_date: date,
+        type_uids: Optional[List[int]] = None,
+        timezone: Optional[str] = None,
+    ) -> List[Dict[str, Any]]:
+        """
+        Blocks and hours per (type, project) in [start_date, end_date), sorted by
+        hours descending.
+        """
+        ...
+
+    def get_active_days(
+        self,
+        start_date: date,
+        end_date: date,
+        type_uid: Optional[int] = None,
+        timezone: Optional[str] = None,
+    ) -> List[str]:
+        """Sorted local dates (YYYY-MM-DD) with at least one (matching) block."""
+        ...
+
+    def get_daily_ledger(
+        self,
+        start_date: date,
+        end_date: date,
+        timezone: Optional[str] = None,
+    ) -> Dict[str, List[Dict[str, Any]]]:
+        """Blocks grouped by local date, each entry with its local HH:MM time."""
+        ...
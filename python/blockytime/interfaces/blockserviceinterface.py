@@ -1,7 +1,12 @@
 from datetime import datetime
-from typing import Protocol, Sequence
+from typing import Iterator, List, Optional, Protocol, Sequence
 
+from blockytime.constants import BLOCK_PAGE_SIZE
+from blockytime.dtos.block_changes_dto import BlockChangesDTO
 from blockytime.dtos.block_dto import BlockDTO
+from blockytime.dtos.block_page_dto import BlockPageDTO
+from blockytime.dtos.blockytimeconfig_dto import BlockyTimeConfig
+from blockytime.dtos.week_grid_dto import WeekGridDTO
 
 
 class BlockServiceInterface(Protocol):
@@ -13,9 +18,98 @@ class BlockServiceInterface(Protocol):
         """
         ...
 
-    def update_blocks(self, blocks: list[BlockDTO]) -> bool:
+    def get_blocks_page(
+        self,
+        start_date: datetime,
+        end_date: datetime,
+        limit: int,
+        after: Optional[int] = None,
+    ) -> BlockPageDTO:
         """
-        Update blocks
+        Up to limit blocks of a date range, by date, after the block dated
+        after if given (keyset pagination: pages stay consistent while blocks
+        before the cursor change)
+        """
+        ...
+
+    def iter_blocks(
+        self,
+        start_date: datetime,
+        end_date: datetime,
+        page_size: int = BLOCK_PAGE_SIZE,
+    ) -> Iterator[List[BlockDTO]]:
+        """
+        The blocks of a date range in pages of at most page_size, by date,
+        each read in its own query
+        """
+        ...
+
+    def get_week_grid(
+        self, start_date: datetime, config: BlockyTimeConfig, timezone: str
+    ) -> WeekGridDTO:
+        """
+        The type shown in every slot of the 7 local days from start_date, at
+        the resolution config asks for (30 minutes unless quarter hours are
+        not pixelated)
+        """
+        ...
+
+    def update_blocks(
+        self, blocks: list[BlockDTO], expected_revision: Optional[int] = None
+    ) -> bool:
+        """
+        Update blocks. With expected_revision, raises RevisionConflictError if
+        any of their dates changed after that revision.
+        """
+        ...
+
+    def update_blocks_with_revision(
+        self, blocks: list[BlockDTO], expected_revision: Optional[int] = None
+    ) -> Optional[int]:
+        """
+        Like update_blocks, but returns the revision of this change, or None
+        if the blocks were not written.
+        """
+        ...
+
+    def get_revision(self) -> int:
+        """
+        Revision of the last change to blocks made through this service
+        """
+        ...
+
+    def get_changes(self, since: int) -> BlockChangesDTO:
+        """
+        Current state of the blocks changed after revision since, or reset if
+        the change log does not go back that far
+        """
+        ...
+
+    def reset_changes(self) -> int:
+        """
+        Forget the change log, e.g. after the database was replaced. Returns
+        the new revision.
+        """
+        ...
+
+    def record_external_changes(self, dates: Sequence[int]) -> int:
+        """
+        Blocks at dates were changed in the database by something else, e.g.
+        a sync from the phone: drop them from caches and record them in the
+        change log. Returns the new revision.
+        """
+        ...
+
+    def bulk_upsert(
+        self,
+        dates: Sequence[int],
+        type_uids: Sequence[int],
+        project_uids: Sequence[Optional[int]],
+        comments: Sequence[str],
+    ) -> int:
+        """
+        Overwrite the blocks at the given dates in one transaction, without
+        per-row lookups. Returns the number of rows written.
         """
         ...
 
@@ -25,3 +119,17 @@ class BlockServiceInterface(Protocol):
         Returns the number of deleted rows.
         """
         ...
+
+    def flush(self) -> int:
+        """
+        Write edits queued by update_blocks to the database now. Returns the
+        number of blocks written; 0 when writes are not queued.
+        """
+        ...
+
+    def close(self) -> None:
+        """
+        Commit queued edits and stop queueing, e.g. before the service is
+        replaced. Later updates are written synchronously.
+        """
+        ...
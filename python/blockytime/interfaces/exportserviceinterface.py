@@ -0,0 +1,30 @@
+from datetime import date
+from enum import Enum
+from typing import IO, TYPE_CHECKING, Optional, Protocol
+
+if TYPE_CHECKING:
+    from ..calendarindex import Granularity
+
+
+class ExportFormat(Enum):
+    ARROW = "arrow"  # Arrow IPC file, requires pyarrow
+    NPZ = "npz"  # compressed NumPy archive, one array per column
+    CSV = "csv"
+
+
+class ExportServiceInterface(Protocol):
+    def export_blocks(
+        self,
+        start_date: date,
+        end_date: date,
+        out: IO[bytes],
+        fmt: ExportFormat,
+        rollup: Optional["Granularity"] = None,
+        timezone: Optional[str] = None,
+        chunk_size: int = ...,
+    ) -> int:
+        """Write blocks (or per-type/project rollups) in [start_date, end_date) to out.
+
+        Returns the number of rows written.
+        """
+        ...
@@ -0,0 +1,29 @@
+from datetime import datetime
+from typing import List, Optional, Protocol
+
+from ..dtos.comment_match_dto import CommentMatchDTO
+
+
+class SearchServiceInterface(Protocol):
+    def search_comments(
+        self,
+        query: str,
+        start_date: Optional[datetime] = None,
+        end_date: Optional[datetime] = None,
+        limit: int = 50,
+    ) -> List[CommentMatchDTO]:
+        """
+        Blocks whose comment contains every word of query (as a word prefix),
+        best match first.
+
+        Args:
+            query: Words to find; punctuation and search operators are ignored
+            start_date: Optional start inclusive
+            end_date: Optional end exclusive
+            limit: Maximum number of matches, at most search.MAX_RESULTS
+        """
+        ...
+
+    def rebuild_index(self) -> int:
+        """Re-index every comment; returns the number of commented blocks."""
+        ...
@@ -1,10 +1,12 @@
 from datetime import date
-from typing import Protocol
+from typing import TYPE_CHECKING, Protocol
 
-import numpy as np
-import pytz
 from blockytime.dtos.sleep_dto import SleepStatsDTO
 
+if TYPE_CHECKING:
+    import numpy as np
+    import pytz
+
 
 class SleepServiceInterface(Protocol):
     def get_sleep_stats(
@@ -12,7 +14,7 @@ class SleepServiceInterface(Protocol):
         start_date: date,
         end_date: date,
         cut_off_hour: int,
-        timezone: pytz.BaseTzInfo,
+        timezone: "pytz.BaseTzInfo",
     ) -> list[SleepStatsDTO]: ...
 
     def calculate_sleep_stats(
@@ -20,7 +22,7 @@ class SleepServiceInterface(Protocol):
         start_date: date,
         end_date: date,
         cut_off_hour: int,
-        timezone: pytz.BaseTzInfo,
+        timezone: "pytz.BaseTzInfo",
         start_time_cut_off_hour: int,
         end_time_cut_off_hour: int,
         filter_start_time_after: float,
@@ -28,13 +30,13 @@ class SleepServiceInterface(Protocol):
         decay_factor: float = 0.75,
         window_size: int = 14,
     ) -> tuple[
-        np.ndarray,
-        np.ndarray,
-        np.ndarray,
-        np.ndarray,
-        np.ndarray,
-        np.ndarray,
-        np.ndarray,
+        "np.ndarray",
+        "np.ndarray",
+        "np.ndarray",
+        "np.ndarray",
+        "np.ndarray",
+        "np.ndarray",
+        "np.ndarray",
     ]:
         """Calculate sleep statistics with moving averages.
 
@@ -14,6 +14,7 @@ class StatisticsServiceInterface(Protocol):
         hour: Optional[int] = None,  # 0-23
         minute: Optional[int] = None,  # 0-59, must be multiple of time_slot_minutes
         day_of_week: Optional[int] = None,
+        timezone: Optional[str] = None,  # IANA zone, defaults to the service's zone
     ) -> List[StatisticsDTO]:
         """
         Get statistics for a date range, optionally filtered by type and time slot.
@@ -26,6 +27,7 @@ class StatisticsServiceInterface(Protocol):
             hour: Optional hour to filter (0-23)
             minute: Optional minute to filter (must be multiple of time_slot_minutes)
             day_of_week: Optional day of week to filter (0-6)
+            timezone: Optional IANA zone used for day boundaries and time slots
 
         Returns:
             List of StatisticsDTO with duration and type information
@@ -1,6 +1,6 @@
 from datetime import date
 from enum import Enum
-from typing import List, Protocol
+from typing import List, Optional, Protocol
 
 from ..dtos.trenditem_dto import TrendDataDTO
 
@@ -13,5 +13,9 @@ class TrendGroupBy(Enum):
 
 class TrendServiceInterface(Protocol):
     def get_trends(
-        self, start_date: date, end_date: date, group_by: TrendGroupBy
+        self,
+        start_date: date,
+        end_date: date,
+        group_by: TrendGroupBy,
+        timezone: Optional[str] = None,
     ) -> List[TrendDataDTO]: ...
@@ -1,4 +1,5 @@
 import logging
+import os
 import sys
 from typing import Any
 
@@ -38,15 +39,29 @@ class ColoredFormatter(logging.Formatter):
         return result
 
 
-# Configure logging with the same detailed format
-logging.basicConfig(
-    level=logging.INFO,
-    format="%(asctime)s - %(threadName)s - %(name)s:%(funcName)s:%(lineno)d - %(levelname)s - %(message)s",
-    handlers=[logging.StreamHandler(sys.stdout), logging.FileHandler(LOG_PATH)],
-)
+log = logging.getLogger(__name__)
 
-# Set the custom formatter
-for handler in logging.getLogger().handlers:
-    handler.setFormatter(ColoredFormatter())
+_configured = False
 
-log = logging.getLogger(__name__)
+
+def configure_logging(log_path: str = LOG_PATH, level: int = logging.INFO) -> None:
+    """Log to stdout and log_path with colored levels. Only the first call has effect.
+
+    Called by entry points rather than on import, so importing blockytime modules
+    never touches the filesystem.
+    """
+    global _configured
+    if _configured:
+        return
+    _configured = True
+    os.makedirs(os.path.dirname(log_path), exist_ok=True)
+    # Configure logging with the same detailed format
+    logging.basicConfig(
+        level=level,
+        format="%(asctime)s - %(threadName)s - %(name)s:%(funcName)s:%(lineno)d - %(levelname)s - %(message)s",
+        handlers=[logging.StreamHandler(sys.stdout), logging.FileHandler(log_path)],
+    )
+
+    # Set the custom formatter
+    for handler in logging.getLogger().handlers:
+        handler.setFormatter(ColoredFormatter())
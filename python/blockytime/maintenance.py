@@ -0,0 +1,311 @@
+"""Maintenance jobs the server runs on its scheduler (see scheduler.py).
+
+- optimize: refresh the query planner's statistics, and VACUUM once a large
+  part of the file is free pages. Runs daily and after pull-db.
+- warm-caches: page in the dimension tables and recent blocks, and build the
+  numpy-backed services. Runs shortly after start-up, hourly and after
+  pull-db.
+- warm-dashboard: build the dashboard's responses (docs/dashboard.md) into
+  the response cache (see responsecache.py): statistics of the current and
+  next 30-minute slot, and this week's blocks and grid. Runs a minute before every
+  slot starts and after pull-db, so loading the dashboard is a cache hit.
+- index-comments: rebuild the full-text index of block comments (see
+  search.py) after pull-db. Searches keep it in step with other writes.
+- prune-backups: apply the retention policies of the backup store (see
+  backup.py), which snapshots no longer do inline.
+
+Jobs look services up when they run, so they follow reload_database.
+"""
+
+import logging
+import os
+import time
+from contextlib import nullcontext
+from datetime import datetime, timedelta
+from typing import Any, Dict, List, Optional, Tuple
+
+from sqlalchemy import Engine, text
+
+from .backup import RETENTION, open_store
+from .constants import CREATE_INDEXES, DEFAULT_TZ
+from .database import DatabaseGate, warm_database
+from .interfaces.aggregationserviceinterface import AggregationServiceInterface
+from .interfaces.blockserviceinterface import BlockServiceInterface
+from .interfaces.configserviceinterface import ConfigServiceInterface
+from .interfaces.searchserviceinterface import SearchServiceInterface
+from .interfaces.sleepserviceinterface import SleepServiceInterface
+from .interfaces.statisticsserviceinterface import StatisticsServiceInterface
+from .interfaces.trendserviceinterface import TrendServiceInterface
+from .responsecache import ResponseCache, cache_key, data_version
+from .routes.blocks import REVISION_HEADER
+from .scheduler import Scheduler
+from .services.di import ServiceProvider
+
+log = logging.getLogger(__name__)
+
+OPTIMIZE = "optimize"
+WARM_CACHES = "warm-caches"
+WARM_DASHBOARD = "warm-dashboard"
+INDEX_COMMENTS = "index-comments"
+PRUNE_BACKUPS = "prune-backups"
+
+OPTIMIZE_INTERVAL = float(os.getenv("BLOCKYTIME_OPTIMIZE_INTERVAL", str(86400)))
+WARM_INTERVAL = float(os.getenv("BLOCKYTIME_WARM_INTERVAL", str(3600)))
+PRUNE_INTERVAL = float(os.getenv("BLOCKYTIME_PRUNE_INTERVAL", str(86400)))
+# Leaves start-up, and the first requests after it, to themselves
+WARM_DELAY = float(os.getenv("BLOCKYTIME_WARM_DELAY", "10"))
+# Rows ANALYZE samples per index, which keeps it to milliseconds on big files
+ANALYSIS_LIMIT = 1000
+# VACUUM only pays off once this share of the file is free pages
+VACUUM_FREE_RATIO = 0.25
+DASHBOARD_SLOT_MINUTES = 30
+# The time range the dashboard opens with, and the one docs/dashboard.md uses
+DASHBOARD_LOOKBACK_DAYS = (7, 100)
+# Build the next slot's responses this long before it starts
+DASHBOARD_LEAD_SECONDS = 60.0
+# Services built on first use, which import numpy
+LAZY_SERVICES = (
+    StatisticsServiceInterface,
+    TrendServiceInterface,
+    SleepServiceInterface,
+    AggregationServiceInterface,
+)
+
+
+def optimize_database(
+    engine: Engine, gate: Optional[DatabaseGate] = None
+) -> Dict[str, Any]:
+    """Refresh planner statistics; VACUUM if a quarter of the file is free.
+
+    VACUUM rewrites the file under an exclusive lock, which would fail or
+    stall requests, so it runs with gate closed; the caller holds gate.
+    """
+    result: Dict[str, Any] = {"analyzed": False, "vacuumed": False}
+    with engine.connect() as conn:
+        # ANALYZE adds sqlite_stat1, which BLOCKYTIME_CREATE_INDEXES=0 rules out
+        if CREATE_INDEXES:
+            conn.exec_driver_sql(f"PRAGMA analysis_limit = {ANALYSIS_LIMIT}")
+            analyzed = conn.execute(
+                text("SELECT 1 FROM sqlite_master WHERE name = 'sqlite_stat1'")
+            ).first()
+            # optimize only re-analyzes tables that changed a lot since
+            conn.exec_driver_sql("PRAGMA optimize" if analyzed else "ANALYZE")
+            conn.commit()
+            result["analyzed"] = True
+        pages = conn.exec_driver_sql("PRAGMA page_count").scalar() or 0
+        free = conn.exec_driver_sql("PRAGMA freelist_count").scalar() or 0
+        result.update(pages=pages, free_pages=free)
+        if pages and free / pages >= VACUUM_FREE_RATIO:
+            conn.commit()
+            with gate.exclusive(holding=True) if gate else nullcontext():
+                conn.exec_driver_sql("VACUUM")
+            result["vacuumed"] = True
+    return result
+
+
+def warm_caches(service_provider: ServiceProvider) -> Dict[str, Any]:
+    """Page in the tables and recent blocks, and build the lazy services.
+
+    Responses themselves are cached by warm-dashboard: BlockService keeps
+    get_blocks results for a second only and statistics are not cached, so
+    computing them here would be thrown away.
+    """
+    started = time.monotonic()
+    warm_database(service_provider.get(Engine))
+    for interface in LAZY_SERVICES:
+        service_provider.get(interface)
+    return {"seconds": round(time.monotonic() - started, 3)}
+
+
+def next_dashboard_warm(now: float) -> float:
+    """DASHBOARD_LEAD_SECONDS before the next local slot boundary after now."""
+    import pytz
+
+    local = datetime.fromtimestamp(now, pytz.timezone(DEFAULT_TZ))
+    slot = DASHBOARD_SLOT_MINUTES * 60
+    into_slot = (local.minute * 60 + local.second) % slot + local.microsecond / 1e6
+    run = now - into_slot + slot - DASHBOARD_LEAD_SECONDS
+    return run if run > now else run + slot
+
+
+def _dashboard_requests(now: datetime) -> List[Tuple[str, Dict[str, str]]]:
+    """Path and arguments of the dashboard's requests at the time now, as the
+    web app sends them (TimeSlotCharts, WeekView and WeeklyGrid)."""
+    requests = []
+    today = now.date()
+    after = now + timedelta(minutes=DASHBOARD_SLOT_MINUTES)
+    for lookback in DASHBOARD_LOOKBACK_DAYS:
+        if after.date() == today:
+            next_range = (today - timedelta(days=lookback), today + timedelta(days=1))
+        else:
+            next_range = (today - timedelta(days=lookback - 1), today)
+        for moment, (start, end) in (
+            (now, (today - timedelta(days=lookback), today)),
+            (after, next_range),
+        ):
+            minute = moment.minute // DASHBOARD_SLOT_MINUTES * DASHBOARD_SLOT_MINUTES
+            requests.append(
+                (
+                    "/api/v1/stats",
+                    {
+                        "start_date": start.isoformat(),
+                        "end_date": end.isoformat(),
+                        "time_slot_minutes": str(DASHBOARD_SLOT_MINUTES),
+                        "hour": str(moment.hour),
+                        "minute": str(minute),
+                    },
+                )
+            )
+    monday = today - timedelta(days=today.weekday())
+    requests.append(
+        (
+            "/api/v1/blocks",
+            {
+                "start_date": monday.isoformat(),
+                "end_date": (monday + timedelta(days=7)).isoformat(),
+            },
+        )
+    )
+    requests.append(("/api/v1/blocks/week", {"start_date": monday.isoformat()}))
+    return requests
+
+
+def warm_dashboard(
+    service_provider: ServiceProvider, now: Optional[float] = None
+) -> Dict[str, int]:
+    """Put the dashboard's responses for now, and for the slot starting within
+    DASHBOARD_LEAD_SECONDS, into the response cache."""
+    import pytz
+
+    from .calendarindex import parse_local_date
+
+    cache = service_provider.get(ResponseCache)
+    # Read first, so entries built while the data changes are never served
+    version = data_version(service_provider)
+    block_service = service_provider.get(BlockServiceInterface)  # type: ignore[type-abstract]
+    statistics_service = service_provider.get(StatisticsServiceInterface)  # type: ignore[type-abstract]
+    timezone = pytz.timezone(DEFAULT_TZ)
+    now = time.time() if now is None else now
+    moments = [
+        datetime.fromtimestamp(now, timezone),
+        datetime.fromtimestamp(now + DASHBOARD_LEAD_SECONDS, timezone),
+    ]
+    requests = {
+        cache_key(path, args.items()): (path, args)
+        for moment in moments
+        for path, args in _dashboard_requests(moment)
+    }
+    result = {"built": 0, "cached": 0}
+    for key, (path, args) in requests.items():
+        if cache.get(key, version) is not None:
+            result["cached"] += 1
+            continue
+        start = parse_local_date(args["start_date"])
+        if path == "/api/v1/blocks/week":
+            grid = block_service.get_week_grid(
+                start,
+                service_provider.get(ConfigServiceInterface).get_config(),  # type: ignore[type-abstract]
+                DEFAULT_TZ,
+            )
+            cache.put_data(
+                key, version, grid.to_dict(), {REVISION_HEADER: str(version[1])}
+            )
+            result["built"] += 1
+            continue
+        end = parse_local_date(args["end_date"])
+        if path == "/api/v1/blocks":
+            blocks = block_service.get_blocks(start, end)
+            cache.put_data(
+                key,
+                version,
+                [block.to_dict() for block in blocks],
+                {REVISION_HEADER: str(version[1])},
+            )
+        else:
+            stats = statistics_service.get_statistics(
+                start,
+                end,
+                None,
+                int(args["time_slot_minutes"]),
+                int(args["hour"]),
+                int(args["minute"]),
+                None,
+                DEFAULT_TZ,
+            )
+            cache.put_data(key, version, [stat.to_dict() for stat in stats])
+        result["built"] += 1
+    return result
+
+
+def prune_backups(db_path: str) -> Dict[str, int]:
+    """Apply every label's retention policy; returns the snapshots removed."""
+    store = open_store(db_path)
+    return {
+        label: len(store.prune(label, policy)) for label, policy in RETENTION.items()
+    }
+
+
+def after_pull(scheduler: Scheduler, db_path: str) -> None:
+    """Queue the jobs that follow new data from the phone.
+
+    Without a running scheduler, e.g. in benchmarks, backups are pruned
+    right away and the rest is left for the next start.
+    """
+    if scheduler.started:
+        for name in (
+            OPTIMIZE,
+            WARM_DASHBOARD,
+            WARM_CACHES,
+            INDEX_COMMENTS,
+            PRUNE_BACKUPS,
+        ):
+            scheduler.trigger(name)
+    else:
+        prune_backups(db_path)
+
+
+def create_scheduler(service_provider: ServiceProvider, db_path: str) -> Scheduler:
+    """The server's scheduler, deferring jobs while requests hold the database.
+
+    Jobs hold the DatabaseGate while they run, so reload_database waits for
+    them before it renames the file and disposes of the engine they use.
+    optimize closes the gate for VACUUM. With one worker, busy() is only asked
+    while no job holds the gate.
+    """
+    gate = service_provider.get(DatabaseGate)
+    scheduler = Scheduler(max_workers=1, busy=lambda: gate.active > 0, guard=gate.held)
+    scheduler.add(
+        OPTIMIZE,
+        lambda: optimize_database(service_provider.get(Engine), gate),
+        OPTIMIZE_INTERVAL,
+        description="ANALYZE, and VACUUM when much of the file is free",
+    )
+    scheduler.add(
+        WARM_CACHES,
+        lambda: warm_caches(service_provider),
+        WARM_INTERVAL,
+        initial_delay=WARM_DELAY,
+        description="Page in recent blocks and build the numpy-backed services",
+    )
+    scheduler.add(
+        WARM_DASHBOARD,
+        lambda: warm_dashboard(service_provider),
+        description="Cache the dashboard's responses before each time slot",
+        schedule=next_dashboard_warm,
+    )
+    scheduler.add(
+        INDEX_COMMENTS,
+        lambda: {
+            "comments": service_provider.get(
+                SearchServiceInterface  # type: ignore[type-abstract]
+            ).rebuild_index()
+        },
+        description="Rebuild the full-text index of block comments",
+    )
+    scheduler.add(
+        PRUNE_BACKUPS,
+        lambda: prune_backups(db_path),
+        PRUNE_INTERVAL,
+        description="Apply the backup retention policies",
+    )
+    return scheduler
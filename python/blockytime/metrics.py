@@ -0,0 +1,357 @@
+"""In-process metrics rendered in the Prometheus text exposition format.
+
+Histograms, counters and gauges live in one MetricsRegistry (REGISTRY), fed by
+``utils.timeit``, instrument_engine and the Flask hooks in instrumentation.py,
+and rendered by ``/api/v1/admin/metrics``. This module does not import Flask,
+so the CLI can use it too.
+"""
+
+import bisect
+import contextvars
+import logging
+import threading
+import time
+from abc import ABC, abstractmethod
+from dataclasses import dataclass
+from typing import Any, Dict, List, Optional, Sequence, Tuple
+
+from sqlalchemy import event
+from sqlalchemy.engine import Engine, ExceptionContext
+
+log = logging.getLogger(__name__)
+
+LATENCY_BUCKETS = (
+    0.001,
+    0.0025,
+    0.005,
+    0.01,
+    0.025,
+    0.05,
+    0.1,
+    0.25,
+    0.5,
+    1.0,
+    2.5,
+    5.0,
+    10.0,
+)
+COUNT_BUCKETS = (0, 1, 2, 5, 10, 25, 50, 100, 250, 1000, 10000, 100000)
+
+LabelValues = Tuple[str, ...]
+
+
+def _escape(value: str) -> str:
+    return value.replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+
+def _format_labels(names: Sequence[str], values: Sequence[str]) -> str:
+    if not names:
+        return ""
+    pairs = ",".join(f'{n}="{_escape(v)}"' for n, v in zip(names, values))
+    return "{" + pairs + "}"
+
+
+def _format_value(value: float) -> str:
+    if value == float("inf"):
+        return "+Inf"
+    return repr(float(value)) if not float(value).is_integer() else str(int(value))
+
+
+class _Metric(ABC):
+    kind = ""
+
+    def __init__(self, name: str, documentation: str, labelnames: Sequence[str] = ()):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self._lock = threading.Lock()
+
+    def _key(self, labels: Dict[str, str]) -> LabelValues:
+        if set(labels) != set(self.labelnames):
+            raise ValueError(
+                f"{self.name} expects labels {self.labelnames}, got {tuple(labels)}"
+            )
+        return tuple(str(labels[n]) for n in self.labelnames)
+
+    @abstractmethod
+    def _samples(self) -> List[str]:
+        """Sample lines of the exposition format, without the header."""
+
+    def render(self) -> str:
+        header = [
+            f"# HELP {self.name} {self.documentation}",
+            f"# TYPE {self.name} {self.kind}",
+        ]
+        return "\n".join(header + self._samples())
+
+
+class Counter(_Metric):
+    kind = "counter"
+
+    def __init__(self, name: str, documentation: str, labelnames: Sequence[str] = ()):
+        super().__init__(name, documentation, labelnames)
+        self._values: Dict[LabelValues, float] = {}
+
+    def inc(self, amount: float = 1.0, **labels: str) -> None:
+        key = self._key(labels)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0.0) + amount
+
+    def value(self, **labels: str) -> float:
+        return self._values.get(self._key(labels), 0.0)
+
+    def _samples(self) -> List[str]:
+        with self._lock:
+            items = sorted(self._values.items())
+        return [
+            f"{self.name}{_format_labels(self.labelnames, k)} {_format_value(v)}"
+            for k, v in items
+        ]
+
+
+class Gauge(Counter):
+    kind = "gauge"
+
+    def set(self, value: float, **labels: str) -> None:
+        key = self._key(labels)
+        with self._lock:
+            self._values[key] = value
+
+
+@dataclass
+class _HistogramState:
+    buckets: List[int]
+    count: int = 0
+    total: float = 0.0
+
+
+class Histogram(_Metric):
+    kind = "histogram"
+
+    def __init__(
+        self,
+        name: str,
+        documentation: str,
+        labelnames: Sequence[str] = (),
+        buckets: Sequence[float] = LATENCY_BUCKETS,
+    ):
+        super().__init__(name, documentation, labelnames)
+        self.bounds = tuple(sorted(buckets))
+        self._states: Dict[LabelValues, _HistogramState] = {}
+
+    def observe(self, value: float, **labels: str) -> None:
+        key = self._key(labels)
+        i = bisect.bisect_left(self.bounds, value)
+        with self._lock:
+            state = self._states.get(key)
+            if state is None:
+                state = self._states[key] = _HistogramState([0] * len(self.bounds))
+            if i < len(self.bounds):
+                state.buckets[i] += 1
+            state.count += 1
+            state.total += value
+
+    def count(self, **labels: str) -> int:
+        state = self._states.get(self._key(labels))
+        return state.count if state else 0
+
+    def _samples(self) -> List[str]:
+        with self._lock:
+            items = sorted(
+                (k, list(s.buckets), s.count, s.total) for k, s in self._states.items()
+            )
+        lines: List[str] = []
+        for key, buckets, count, total in items:
+            cumulative = 0
+            for bound, n in zip(self.bounds, buckets):
+                cumulative += n
+                labels = _format_labels(
+                    self.labelnames + ("le",), key + (_format_value(bound),)
+                )
+                lines.append(f"{self.name}_bucket{labels} {cumulative}")
+            labels = _format_labels(self.labelnames + ("le",), key + ("+Inf",))
+            lines.append(f"{self.name}_bucket{labels} {count}")
+            labels = _format_labels(self.labelnames, key)
+            lines.append(f"{self.name}_sum{labels} {_format_value(total)}")
+            lines.append(f"{self.name}_count{labels} {count}")
+        return lines
+
+
+class MetricsRegistry:
+    def __init__(self) -> None:
+        self._metrics: Dict[str, _Metric] = {}
+        self._lock = threading.Lock()
+
+    def _register(self, metric: Any) -> Any:
+        with self._lock:
+            existing = self._metrics.get(metric.name)
+            if existing is not None:
+                if type(existing) is not type(metric):
+                    raise ValueError(f"{metric.name} is already registered")
+                return existing
+            self._metrics[metric.name] = metric
+            return metric
+
+    def counter(
+        self, name: str, documentation: str, labelnames: Sequence[str] = ()
+    ) -> Counter:
+        counter: Counter = self._register(Counter(name, documentation, labelnames))
+        return counter
+
+    def gauge(
+        self, name: str, documentation: str, labelnames: Sequence[str] = ()
+    ) -> Gauge:
+        gauge: Gauge = self._register(Gauge(name, documentation, labelnames))
+        return gauge
+
+    def histogram(
+        self,
+        name: str,
+        documentation: str,
+        labelnames: Sequence[str] = (),
+        buckets: Sequence[float] = LATENCY_BUCKETS,
+    ) -> Histogram:
+        histogram: Histogram = self._register(
+            Histogram(name, documentation, labelnames, buckets)
+        )
+        return histogram
+
+    def render(self) -> str:
+        with self._lock:
+            metrics = sorted(self._metrics.values(), key=lambda m: m.name)
+        return "\n".join(m.render() for m in metrics) + "\n"
+
+
+REGISTRY = MetricsRegistry()
+
+HTTP_REQUEST_SECONDS = REGISTRY.histogram(
+    "blockytime_http_request_duration_seconds",
+    "Time to handle HTTP requests, by route",
+    ["endpoint", "method", "status"],
+)
+HTTP_REQUEST_SQL_STATEMENTS = REGISTRY.histogram(
+    "blockytime_http_request_sql_statements",
+    "SQL statements executed per HTTP request, by route",
+    ["endpoint"],
+    COUNT_BUCKETS,
+)
+HTTP_REQUEST_SQL_SECONDS = REGISTRY.histogram(
+    "blockytime_http_request_sql_duration_seconds",
+    "Time spent in SQL per HTTP request, by route",
+    ["endpoint"],
+)
+RESPONSE_ITEMS = REGISTRY.histogram(
+    "blockytime_http_response_items",
+    "Items in JSON list responses, by route",
+    ["endpoint"],
+    COUNT_BUCKETS,
+)
+SERIALIZATION_SECONDS = REGISTRY.histogram(
+    "blockytime_http_serialization_duration_seconds",
+    "Time to encode (and compress) JSON responses, by route",
+    ["endpoint"],
+)
+RESPONSE_CACHE_REQUESTS = REGISTRY.counter(
+    "blockytime_response_cache_requests_total",
+    "Requests to cached routes, by route and hit or miss",
+    ["endpoint", "result"],
+)
+SERVICE_CALL_SECONDS = REGISTRY.histogram(
+    "blockytime_service_call_duration_seconds",
+    "Time spent in functions decorated with utils.timeit",
+    ["function"],
+)
+SQL_STATEMENT_SECONDS = REGISTRY.histogram(
+    "blockytime_sql_statement_duration_seconds",
+    "Time to execute SQL statements, by statement type",
+    ["operation"],
+)
+SQL_STATEMENT_ERRORS = REGISTRY.counter(
+    "blockytime_sql_statement_errors_total",
+    "SQL statements that raised, by statement type",
+    ["operation"],
+)
+SQL_ROWS_AFFECTED = REGISTRY.counter(
+    "blockytime_sql_rows_affected_total",
+    "Rows changed by INSERT, UPDATE and DELETE statements",
+    ["operation"],
+)
+BLOCK_WRITE_BATCH_EDITS = REGISTRY.histogram(
+    "blockytime_block_write_batch_edits",
+    "Coalesced block edits applied per group commit, see blockjournal.py",
+    (),
+    COUNT_BUCKETS,
+)
+BLOCK_WRITE_COALESCED = REGISTRY.counter(
+    "blockytime_block_write_coalesced_total",
+    "Queued block edits overwritten by a later edit to the same date",
+)
+STARTUP_SECONDS = REGISTRY.gauge(
+    "blockytime_startup_duration_seconds",
+    "Time taken by create_app",
+)
+START_TIME = REGISTRY.gauge(
+    "blockytime_process_start_time_seconds",
+    "Unix time at which the app finished starting",
+)
+
+
+@dataclass
+class SqlTally:
+    statements: int = 0
+    seconds: float = 0.0
+
+
+# SQL executed in the current context, see start_sql_tally
+_sql_tally: contextvars.ContextVar[Optional[SqlTally]] = contextvars.ContextVar(
+    "sql_tally", default=None
+)
+
+
+def _operation(statement: Optional[str]) -> str:
+    return statement.lstrip().split(None, 1)[0].upper() if statement else ""
+
+
+def instrument_engine(engine: Engine) -> None:
+    """Time every statement executed through engine."""
+
+    @event.listens_for(engine, "before_cursor_execute")
+    def before_cursor_execute(
+        conn: Any, cursor: Any, statement: str, *args: Any
+    ) -> None:
+        conn.info.setdefault("query_start", []).append(time.perf_counter())
+
+    @event.listens_for(engine, "after_cursor_execute")
+    def after_cursor_execute(
+        conn: Any, cursor: Any, statement: str, *args: Any
+    ) -> None:
+        elapsed = time.perf_counter() - conn.info["query_start"].pop()
+        operation = _operation(statement)
+        SQL_STATEMENT_SECONDS.observe(elapsed, operation=operation)
+        if operation in ("INSERT", "UPDATE", "DELETE") and cursor.rowcount > 0:
+            SQL_ROWS_AFFECTED.inc(cursor.rowcount, operation=operation)
+        tally = _sql_tally.get()
+        if tally is not None:
+            tally.statements += 1
+            tally.seconds += elapsed
+
+    @event.listens_for(engine, "handle_error")
+    def handle_error(context: ExceptionContext) -> None:
+        # after_cursor_execute does not run for a statement that raised
+        conn = context.connection
+        if conn is None or not conn.info.get("query_start"):
+            return
+        conn.info["query_start"].pop()
+        SQL_STATEMENT_ERRORS.inc(operation=_operation(context.statement))
+
+
+def start_sql_tally() -> contextvars.Token[Optional[SqlTally]]:
+    """Start counting SQL executed in this context (e.g. one request)."""
+    return _sql_tally.set(SqlTally())
+
+
+def stop_sql_tally(token: contextvars.Token[Optional[SqlTally]]) -> Optional[SqlTally]:
+    """Stop counting and return what was executed since start_sql_tally."""
+    tally = _sql_tally.get()
+    _sql_tally.reset(token)
+    return tally
@@ -1,9 +1,14 @@
-from sqlalchemy import ForeignKey, Integer, Text
+import logging
+
+from sqlalchemy import ForeignKey, Index, Integer, Text, text
+from sqlalchemy.engine import Engine
 from sqlalchemy.orm import Mapped, mapped_column, relationship
 
 from ..dtos.block_dto import BlockDTO
 from .base import Base
 
+log = logging.getLogger(__name__)
+
 
 class Block(Base):
     """
@@ -11,6 +16,18 @@ class Block(Base):
     """
 
     __tablename__ = "Block"
+    # Not in the iOS app's schema, see ensure_indexes. Reads and writes select
+    # blocks by date range or exact date. The comment index syncs from just the
+    # few commented blocks (see search.py).
+    __table_args__ = (
+        Index("ix_Block_date", "date"),
+        Index(
+            "ix_Block_commented",
+            "date",
+            "comment",
+            sqlite_where=text("comment != ''"),
+        ),
+    )
 
     uid: Mapped[int] = mapped_column(Integer, primary_key=True, autoincrement=True)
     date: Mapped[int] = mapped_column(Integer)
@@ -33,3 +50,10 @@ class Block(Base):
             project=self.project.to_dto() if self.project else None,
             comment=self.comment,
         )
+
+
+def ensure_indexes(engine: Engine) -> None:
+    """Create the indexes declared on Block that the database is missing."""
+    for index in Block.__table__.indexes:
+        index.create(engine, checkfirst=True)
+        log.info(f"Ensured index {index.name}")
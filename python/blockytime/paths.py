@@ -9,10 +9,17 @@ DATA_PATH = os.getenv(
 )
 DYNAMIC_PATH = os.path.join(DATA_PATH, "dynamic")
 
-# Ensure data paths exist
-os.makedirs(DATA_PATH, exist_ok=True)
-os.makedirs(DYNAMIC_PATH, exist_ok=True)
-
 # Define paths for different data types
 DB_PATH = os.path.join(DYNAMIC_PATH, "DB.db")
 LOG_PATH = os.path.join(DYNAMIC_PATH, "blockytime.log")
+# Request profiles captured with ?__profile=1, see profiling.py
+PROFILES_PATH = os.path.join(DYNAMIC_PATH, "profiles")
+# Unix socket of the long-lived ai_tools daemon (ai_tools serve)
+AI_TOOLS_SOCKET_PATH = os.getenv(
+    "BLOCKYTIME_AI_TOOLS_SOCKET", os.path.join(DYNAMIC_PATH, "ai_tools.sock")
+)
+
+
+def ensure_data_paths() -> None:
+    """Create the data directories. Not done on import, to keep imports side-effect free."""
+    os.makedirs(DYNAMIC_PATH, exist_ok=True)
@@ -0,0 +1,275 @@
+"""On-demand profiling of single requests.
+
+An admin adds ``?__profile=1`` (or the ``X-Blockytime-Profile: 1`` header) to a
+request. The request then runs under cProfile, every SQL statement it executes
+is timed and explained with EXPLAIN QUERY PLAN, and the result is saved under
+PROFILES_PATH. The response carries the profile id in X-Blockytime-Profile-Id,
+and profiles are listed and fetched through /api/v1/admin/profiles.
+
+Only loopback clients may profile, or, when BLOCKYTIME_ADMIN_TOKEN is set, only
+clients sending that token in the X-Blockytime-Admin-Token header.
+"""
+
+import cProfile
+import hmac
+import io
+import json
+import logging
+import os
+import pstats
+import re
+import time
+import uuid
+from contextvars import ContextVar
+from dataclasses import asdict, dataclass, field
+from datetime import datetime
+from functools import wraps
+from typing import Any, Callable, Dict, List, Optional, TypeVar
+
+from flask import Flask, Response, g, jsonify, request
+from sqlalchemy import event
+from sqlalchemy.engine import Engine
+
+from . import paths
+from .queryplan import explain_query_plan
+
+log = logging.getLogger(__name__)
+
+F = TypeVar("F", bound=Callable[..., Any])
+
+PROFILE_PARAM = "__profile"
+PROFILE_HEADER = "X-Blockytime-Profile"
+PROFILE_ID_HEADER = "X-Blockytime-Profile-Id"
+ADMIN_TOKEN_HEADER = "X-Blockytime-Admin-Token"
+ADMIN_TOKEN = os.getenv("BLOCKYTIME_ADMIN_TOKEN", "")
+LOOPBACK_ADDRESSES = {"127.0.0.1", "::1"}
+# Oldest profiles are deleted beyond this many
+MAX_PROFILES = int(os.getenv("BLOCKYTIME_MAX_PROFILES", "50"))
+# Functions listed in the text report, by cumulative time
+PROFILE_TOP_FUNCTIONS = 40
+
+PROFILE_ID_RE = re.compile(r"^\d{8}-\d{6}-[0-9a-f]{6}$")
+
+
+@dataclass
+class SqlStatement:
+    statement: str
+    parameters: Any
+    seconds: float
+    executemany: bool
+    plan: List[str] = field(default_factory=list)
+
+
+# Statements executed by the request being profiled in this context
+_statements: ContextVar[Optional[List[SqlStatement]]] = ContextVar(
+    "profiled_statements", default=None
+)
+
+
+def is_admin_request() -> bool:
+    if ADMIN_TOKEN:
+        token = request.headers.get(ADMIN_TOKEN_HEADER, "")
+        return hmac.compare_digest(token, ADMIN_TOKEN)
+    return request.remote_addr in LOOPBACK_ADDRESSES
+
+
+def admin_only(func: F) -> F:
+    """Reject the request with 403 unless is_admin_request()."""
+
+    @wraps(func)
+    def wrapper(*args: Any, **kwargs: Any) -> Any:
+        if not is_admin_request():
+            return jsonify({"data": None, "error": "Forbidden"}), 403
+        return func(*args, **kwargs)
+
+    return wrapper  # type: ignore
+
+
+def profile_requested() -> bool:
+    return (
+        request.args.get(PROFILE_PARAM) == "1"
+        or request.headers.get(PROFILE_HEADER) == "1"
+    )
+
+
+def capture_statements(engine: Engine) -> None:
+    """Record statements executed through engine while a request is profiled."""
+
+    @event.listens_for(engine, "before_cursor_execute")
+    def before_cursor_execute(
+        conn: Any, cursor: Any, statement: str, *args: Any
+    ) -> None:
+        if _statements.get() is not None:
+            conn.info.setdefault("profile_start", []).append(time.perf_counter())
+
+    @event.listens_for(engine, "after_cursor_execute")
+    def after_cursor_execute(
+        conn: Any,
+        cursor: Any,
+        statement: str,
+        parameters: Any,
+        context: Any,
+        executemany: bool,
+    ) -> None:
+        captured = _statements.get()
+        starts = conn.info.get("profile_start")
+        if captured is None or not starts:
+            return
+        captured.append(
+            SqlStatement(
+                statement=statement,
+                parameters=parameters,
+                seconds=time.perf_counter() - starts.pop(),
+                executemany=executemany,
+            )
+        )
+
+
+def explain(engine: Engine, statements: List[SqlStatement]) -> None:
+    """Fill in the EXPLAIN QUERY PLAN of each SELECT, one line per plan node."""
+    plans: Dict[str, List[str]] = {}
+    with engine.connect() as conn:
+        for s in statements:
+            if s.executemany or not s.statement.lstrip().upper().startswith(
+                ("SELECT", "WITH")
+            ):
+                continue
+            key = f"{s.statement}\0{s.parameters!r}"
+            if key not in plans:
+                try:
+                    plans[key] = explain_query_plan(conn, s.statement, s.parameters)
+                except Exception as e:
+                    plans[key] = [f"EXPLAIN failed: {e}"]
+            s.plan = plans[key]
+
+
+def _profile_file(profile_id: str, suffix: str) -> str:
+    return os.path.join(paths.PROFILES_PATH, f"{profile_id}{suffix}")
+
+
+def save_profile(
+    profiler: cProfile.Profile, report: Dict[str, Any], profile_id: str
+) -> None:
+    os.makedirs(paths.PROFILES_PATH, exist_ok=True)
+    profiler.dump_stats(_profile_file(profile_id, ".prof"))
+    with open(_profile_file(profile_id, ".json"), "w") as f:
+        json.dump(report, f, indent=2, default=str)
+    for old in list_profile_ids()[MAX_PROFILES:]:
+        for suffix in (".json", ".prof"):
+            if os.path.exists(_profile_file(old, suffix)):
+                os.remove(_profile_file(old, suffix))
+
+
+def list_profile_ids() -> List[str]:
+    """Ids of stored profiles, newest first."""
+    if not os.path.isdir(paths.PROFILES_PATH):
+        return []
+    ids = [
+        name[: -len(".json")]
+        for name in os.listdir(paths.PROFILES_PATH)
+        if name.endswith(".json") and PROFILE_ID_RE.match(name[: -len(".json")])
+    ]
+    return sorted(ids, reverse=True)
+
+
+def load_profile(profile_id: str) -> Optional[Dict[str, Any]]:
+    if not PROFILE_ID_RE.match(profile_id):
+        return None
+    try:
+        with open(_profile_file(profile_id, ".json")) as f:
+            report: Dict[str, Any] = json.load(f)
+    except FileNotFoundError:
+        return None
+    return report
+
+
+def profile_stats_path(profile_id: str) -> Optional[str]:
+    """Path of the pstats dump of a profile, for snakeviz and friends."""
+    if not PROFILE_ID_RE.match(profile_id):
+        return None
+    path = _profile_file(profile_id, ".prof")
+    return path if os.path.exists(path) else None
+
+
+def profile_summary(report: Dict[str, Any]) -> Dict[str, Any]:
+    keys = ("id", "created", "method", "path", "status", "seconds")
+    summary = {k: report.get(k) for k in keys}
+    summary["sql_statements"] = len(report.get("sql", []))
+    summary["sql_seconds"] = report.get("sql_seconds")
+    return summary
+
+
+def _build_report(
+    profile_id: str,
+    profiler: cProfile.Profile,
+    statements: List[SqlStatement],
+    seconds: float,
+    response: Response,
+) -> Dict[str, Any]:
+    stream = io.StringIO()
+    stats = pstats.Stats(profiler, stream=stream)
+    stats.sort_stats(pstats.SortKey.CUMULATIVE).print_stats(PROFILE_TOP_FUNCTIONS)
+    return {
+        "id": profile_id,
+        "created": datetime.now().isoformat(timespec="seconds"),
+        "method": request.method,
+        "path": request.full_path.rstrip("?"),
+        "status": response.status_code,
+        "seconds": round(seconds, 6),
+        "sql_seconds": round(sum(s.seconds for s in statements), 6),
+        "sql": [asdict(s) for s in statements],
+        "profile": stream.getvalue(),
+    }
+
+
+def install_profiler(app: Flask, get_engine: Callable[[], Engine]) -> None:
+    """Profile requests asking for it with ?__profile=1 or X-Blockytime-Profile.
+
+    SQL is only recorded for engines passed to capture_statements; get_engine
+    returns the current one, used to explain the recorded statements.
+    """
+
+    @app.before_request
+    def start_profile() -> Any:
+        if not profile_requested():
+            return None
+        if not is_admin_request():
+            return jsonify({"data": None, "error": "Profiling is admin only"}), 403
+        g.profile_token = _statements.set([])
+        g.profile_started = time.perf_counter()
+        g.profiler = cProfile.Profile()
+        g.profiler.enable()
+        return None
+
+    @app.after_request
+    def stop_profile(response: Response) -> Response:
+        profiler: Optional[cProfile.Profile] = g.pop("profiler", None)
+        if profiler is None:
+            return response
+        profiler.disable()
+        seconds = time.perf_counter() - g.pop("profile_started")
+        statements = _statements.get() or []
+        _statements.reset(g.pop("profile_token"))
+
+        profile_id = f"{datetime.now():%Y%m%d-%H%M%S}-{uuid.uuid4().hex[:6]}"
+        try:
+            explain(get_engine(), statements)
+            report = _build_report(profile_id, profiler, statements, seconds, response)
+            save_profile(profiler, report, profile_id)
+        except Exception:
+            log.error("Failed to save request profile", exc_info=True)
+            return response
+        response.headers[PROFILE_ID_HEADER] = profile_id
+        log.info(
+            f"Profiled {report['method']} {report['path']} as {profile_id}: "
+            f"{seconds:.3f} seconds, {len(statements)} SQL statements"
+        )
+        return response
+
+    @app.teardown_request
+    def discard_profile(exc: Optional[BaseException]) -> None:
+        # after_request is skipped when the request fails before a response
+        profiler: Optional[cProfile.Profile] = g.pop("profiler", None)
+        if profiler is not None:
+            profiler.disable()
+            _statements.reset(g.pop("profile_token"))
@@ -0,0 +1,326 @@
+"""Query plan regression checks for the SQL the services generate.
+
+Each entry of QUERIES calls a service method on a representative database
+(synthetic, with the indexes the server creates). Every statement it executes
+is captured and run through EXPLAIN QUERY PLAN, and the way it reaches the Block
+table is classified as an index lookup ("index"), a full scan ("scan") or not at
+all (None). check_plans compares that with a stored baseline
+(data/query_plans.json) and reports a regression wherever the baseline used an
+index on Block and the query now scans it; this typically happens when a
+refactor wraps Block.date in a function inside a WHERE clause.
+
+Used by testblockytime/test_queryplan.py and scripts/check_query_plans.py.
+"""
+
+import io
+import json
+import logging
+import os
+import re
+from contextlib import contextmanager
+from dataclasses import asdict, dataclass, field
+from datetime import date, datetime, timedelta
+from typing import Any, Callable, Dict, Iterator, List, Optional, Sequence
+
+from sqlalchemy import event
+from sqlalchemy.engine import Connection, Engine
+
+from .constants import DEFAULT_TZ
+
+log = logging.getLogger(__name__)
+
+BASELINE_PATH = os.path.join(os.path.dirname(__file__), "data", "query_plans.json")
+# Days of synthetic data in the representative database. SQLite plans without
+# ANALYZE statistics do not depend on the size of the table.
+REPRESENTATIVE_DAYS = 90
+
+EXPLAINABLE = ("SELECT", "WITH", "UPDATE", "DELETE")
+_BLOCK_INDEX_RE = re.compile(
+    r"\bSEARCH (TABLE )?Block\b.*\bUSING (COVERING |INTEGER PRIMARY KEY|INDEX)"
+)
+_BLOCK_SCAN_RE = re.compile(r"\bSCAN (TABLE )?Block\b")
+
+
+@dataclass
+class CapturedStatement:
+    statement: str
+    parameters: Any
+    executemany: bool
+
+
+@dataclass
+class StatementPlan:
+    statement: str
+    plan: List[str]
+    # "index", "scan" or None when the statement does not read Block
+    block_access: Optional[str] = None
+
+
+@dataclass
+class PlanFinding:
+    query: str
+    message: str
+    # Regressions fail the check, other findings ask for a new baseline
+    regression: bool = False
+
+
+@contextmanager
+def capture_statements(engine: Engine) -> Iterator[List[CapturedStatement]]:
+    """Collect the statements executed through engine inside the with block."""
+    captured: List[CapturedStatement] = []
+
+    def before_cursor_execute(
+        conn: Any,
+        cursor: Any,
+        statement: str,
+        parameters: Any,
+        context: Any,
+        executemany: bool,
+    ) -> None:
+        captured.append(CapturedStatement(statement, parameters, executemany))
+
+    event.listen(engine, "before_cursor_execute", before_cursor_execute)
+    try:
+        yield captured
+    finally:
+        event.remove(engine, "before_cursor_execute", before_cursor_execute)
+
+
+def explain_query_plan(conn: Connection, statement: str, parameters: Any) -> List[str]:
+    """EXPLAIN QUERY PLAN of statement, one line per plan node, indented by depth."""
+    rows = conn.exec_driver_sql(f"EXPLAIN QUERY PLAN {statement}", parameters).all()
+    # Rows are (id, parent, notused, detail)
+    depth: Dict[int, int] = {0: -1}
+    plan = []
+    for node_id, parent, _, detail in rows:
+        depth[node_id] = depth.get(parent, -1) + 1
+        plan.append("  " * depth[node_id] + detail)
+    return plan
+
+
+def is_explainable(statement: str) -> bool:
+    return statement.lstrip().upper().startswith(EXPLAINABLE)
+
+
+def block_access(plan: Sequence[str]) -> Optional[str]:
+    """How a plan reads the Block table: "index", "scan" or None."""
+    if any(_BLOCK_INDEX_RE.search(line) for line in plan):
+        return "index"
+    if any(_BLOCK_SCAN_RE.search(line) for line in plan):
+        return "scan"
+    return None
+
+
+def normalize_statement(statement: str) -> str:
+    return " ".join(statement.split())
+
+
+def explain_statements(
+    engine: Engine, statements: Sequence[CapturedStatement]
+) -> List[StatementPlan]:
+    """Plans of the distinct explainable statements, in order of first execution.
+
+    Repeats (e.g. lazy loads of the same relationship) are only explained once.
+    """
+    plans = []
+    seen = set()
+    with engine.connect() as conn:
+        for s in statements:
+            statement = normalize_statement(s.statement)
+            if s.executemany or statement in seen or not is_explainable(statement):
+                continue
+            seen.add(statement)
+            plan = explain_query_plan(conn, s.statement, s.parameters)
+            plans.append(StatementPlan(statement, plan, block_access(plan)))
+    return plans
+
+
+def _queries() -> Dict[str, Callable[[Engine, date, date], Any]]:
+    # Imported here: the services pull in numpy and the rest of the app
+    import pytz
+
+    from .calendarindex import Granularity, parse_local_date
+    from .dtos.block_dto import BlockDTO
+    from .dtos.type_dto import TypeDTO
+    from .interfaces.aggregationserviceinterface import Dimension
+    from .interfaces.exportserviceinterface import ExportFormat
+    from .interfaces.trendserviceinterface import TrendGroupBy
+    from .services.aggregationservice import AggregationService
+    from .services.blockservice import BlockService
+    from .services.exportservice import ExportService
+    from .services.sleepservice import SleepService
+    from .services.statisticsservice import StatisticsService
+    from .services.trendservice import TrendService
+
+    def local(d: date) -> datetime:
+        return parse_local_date(d.isoformat(), DEFAULT_TZ)
+
+    def get_blocks(engine: Engine, start: date, end: date) -> Any:
+        return BlockService(engine).get_blocks(
+            local(end - timedelta(days=7)), local(end)
+        )
+
+    def update_blocks(engine: Engine, start: date, end: date) -> Any:
+        ts = int(local(end - timedelta(days=1)).timestamp())
+        block = BlockDTO(date=ts, type_=TypeDTO(uid=1), operation="upsert")
+        return BlockService(engine).update_blocks([block])
+
+    def export_rollup(engine: Engine, start: date, end: date) -> Any:
+        return ExportService(engine).export_blocks(
+            start, end, io.BytesIO(), ExportFormat.CSV, Granularity.WEEK
+        )
+
+    def sleep_stats(engine: Engine, start: date, end: date) -> Any:
+        return SleepService(engine).get_sleep_stats(
+            start, end, 18, pytz.timezone(DEFAULT_TZ)
+        )
+
+    def aggregation(method: str) -> Callable[[Engine, date, date], Any]:
+        def run(engine: Engine, start: date, end: date) -> Any:
+            service = AggregationService(engine, DEFAULT_TZ)
+            return getattr(service, method)(start, end)
+
+        return run
+
+    def aggregate(engine: Engine, start: date, end: date) -> Any:
+        return AggregationService(engine, DEFAULT_TZ).aggregate(
+            start,
+            end,
+            [Dimension.CATEGORY, Dimension.PROJECT],
+            Granularity.WEEK,
+            include_hidden=False,
+            top=5,
+        )
+
+    def trends(group_by: TrendGroupBy) -> Callable[[Engine, date, date], Any]:
+        return lambda engine, start, end: TrendService(engine).get_trends(
+            start, end, group_by
+        )
+
+    queries: Dict[str, Callable[[Engine, date, date], Any]] = {
+        "blocks.get_blocks": get_blocks,
+        "blocks.update_blocks": update_blocks,
+        "statistics.get_statistics": lambda engine, start, end: StatisticsService(
+            engine
+        ).get_statistics(start, end),
+        "statistics.get_statistics.time_slot": lambda engine, start, end: (
+            StatisticsService(engine).get_statistics(
+                start, end, None, 30, hour=9, minute=30, day_of_week=1
+            )
+        ),
+        "sleep.get_sleep_stats": sleep_stats,
+        "aggregation.get_totals": aggregation("get_totals"),
+        "aggregation.get_active_days": aggregation("get_active_days"),
+        "aggregation.get_daily_ledger": aggregation("get_daily_ledger"),
+        "aggregation.aggregate.week": aggregate,
+        "export.export_blocks.rollup": export_rollup,
+    }
+    for group_by in TrendGroupBy:
+        queries[f"trends.get_trends.{group_by.value.lower()}"] = trends(group_by)
+    return queries
+
+
+def representative_database(path: str) -> Engine:
+    """Synthetic database at path, with the indexes the server creates."""
+    from sqlalchemy import create_engine
+
+    from .models.block import ensure_indexes
+    from .synthetic import generate_database
+
+    generate_database(path, REPRESENTATIVE_DAYS)
+    engine = create_engine(f"sqlite:///{path}")
+    ensure_indexes(engine)
+    return engine
+
+
+def collect_plans(
+    engine: Engine, start: date, end: date, only: Sequence[str] = ()
+) -> Dict[str, List[StatementPlan]]:
+    """Plans of the statements executed by each of QUERIES (or those in only)."""
+    results = {}
+    for name, query in _queries().items():
+        if only and name not in only:
+            continue
+        with capture_statements(engine) as captured:
+            query(engine, start, end)
+        results[name] = explain_statements(engine, captured)
+    return results
+
+
+def check_plans(
+    plans: Dict[str, List[StatementPlan]], baseline: Dict[str, Any]
+) -> List[PlanFinding]:
+    """Compare plans with a baseline as written by save_baseline."""
+    findings = []
+    stored: Dict[str, List[Dict[str, Any]]] = baseline.get("queries", {})
+    for name, statements in plans.items():
+        if name not in stored:
+            findings.append(PlanFinding(name, "not in the baseline"))
+            continue
+        expected = stored[name]
+        for i, (old, new) in enumerate(zip(expected, statements)):
+            if old["block_access"] == "index" and new.block_access == "scan":
+                findings.append(
+                    PlanFinding(
+                        name,
+                        f"statement {i + 1} now scans Block instead of using an "
+                        f"index:\n  {new.statement}\n  " + "\n  ".join(new.plan),
+                        regression=True,
+                    )
+                )
+            elif old["statement"] != new.statement or old["plan"] != new.plan:
+                findings.append(PlanFinding(name, f"statement {i + 1} changed"))
+        if len(expected) != len(statements):
+            findings.append(
+                PlanFinding(
+                    name,
+                    f"executes {len(statements)} statements, "
+                    f"the baseline {len(expected)}",
+                )
+            )
+    return findings
+
+
+def load_baseline(path: str = BASELINE_PATH) -> Dict[str, Any]:
+    if not os.path.exists(path):
+        return {}
+    with open(path) as f:
+        baseline: Dict[str, Any] = json.load(f)
+    return baseline
+
+
+def save_baseline(
+    plans: Dict[str, List[StatementPlan]], path: str = BASELINE_PATH
+) -> None:
+    baseline = load_baseline(path)
+    queries = baseline.setdefault("queries", {})
+    for name, statements in plans.items():
+        queries[name] = [asdict(s) for s in statements]
+    with open(path, "w") as f:
+        json.dump(baseline, f, indent=2, sort_keys=True)
+        f.write("\n")
+
+
+@dataclass
+class PlanReport:
+    plans: Dict[str, List[StatementPlan]]
+    findings: List[PlanFinding] = field(default_factory=list)
+
+    @property
+    def regressions(self) -> List[PlanFinding]:
+        return [f for f in self.findings if f.regression]
+
+
+def run_check(
+    db_path: str, baseline_path: str = BASELINE_PATH, only: Sequence[str] = ()
+) -> PlanReport:
+    """Build a representative database at db_path and check its plans."""
+    from .synthetic import DEFAULT_START
+
+    engine = representative_database(db_path)
+    try:
+        end = DEFAULT_START + timedelta(days=REPRESENTATIVE_DAYS)
+        plans = collect_plans(engine, DEFAULT_START, end, only)
+    finally:
+        engine.dispose()
+    return PlanReport(plans, check_plans(plans, load_baseline(baseline_path)))
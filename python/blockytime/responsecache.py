@@ -0,0 +1,136 @@
+"""Cache of encoded JSON responses for read-only API routes.
+
+Entries are keyed by the request path and its query arguments, sorted and
+without profiling flags, and stamped with the version of the data they were
+built from: the service generation, bumped when pull-db or reload_database
+swaps in new services; the block revision, bumped by every block write of
+this process, queued ones included (see changelog.py); and the file change
+counter of DB.db, bumped by every committed write of any process (ai_tools,
+its daemon, the importer). A lookup with any other version misses, so nothing
+has to be invalidated; stale entries age out of the LRU.
+
+Routes opt in with routes.decorators.cache_response. The warm-dashboard job
+(see maintenance.py) fills the cache ahead of the dashboard's requests.
+"""
+
+import gzip
+import json
+import os
+import threading
+import time
+from collections import OrderedDict
+from dataclasses import dataclass, field
+from typing import Any, Dict, Iterable, Optional, Tuple
+
+from sqlalchemy.engine import Engine
+
+from .database import change_counter
+from .interfaces.blockserviceinterface import BlockServiceInterface
+from .profiling import PROFILE_PARAM
+from .services.di import ServiceProvider
+
+# Version of the data a response was built from: (generation, block
+# revision, file change counter)
+Version = Tuple[int, int, int]
+
+MAX_ENTRIES = int(os.getenv("BLOCKYTIME_RESPONSE_CACHE_ENTRIES", "256"))
+# Entries are never stale, so only bounds how long unused ones are kept
+MAX_AGE_SECONDS = float(os.getenv("BLOCKYTIME_RESPONSE_CACHE_SECONDS", "3600"))
+# Same level as make_gzip_json_response
+GZIP_LEVEL = 5
+
+
+def cache_key(path: str, args: Iterable[Tuple[str, str]]) -> str:
+    """Normalized URL: the path and its query arguments in sorted order."""
+    query = "&".join(
+        f"{name}={value}" for name, value in sorted(args) if name != PROFILE_PARAM
+    )
+    return f"{path}?{query}"
+
+
+def data_version(service_provider: ServiceProvider) -> Version:
+    """Version of the data the services currently serve."""
+    block_service = service_provider.get(BlockServiceInterface)  # type: ignore[type-abstract]
+    db_path = service_provider.get(Engine).url.database
+    return (
+        service_provider.generation,
+        block_service.get_revision(),
+        change_counter(db_path) if db_path else 0,
+    )
+
+
+@dataclass
+class CachedResponse:
+    content: bytes
+    headers: Dict[str, str]
+    version: Version
+    created: float = field(default_factory=time.monotonic)
+    _gzipped: Optional[bytes] = None
+
+    def gzipped(self) -> bytes:
+        if self._gzipped is None:
+            self._gzipped = gzip.compress(self.content, GZIP_LEVEL)
+        return self._gzipped
+
+
+class ResponseCache:
+    def __init__(
+        self, max_entries: int = MAX_ENTRIES, max_age: float = MAX_AGE_SECONDS
+    ):
+        self._max_entries = max_entries
+        self._max_age = max_age
+        self._entries: OrderedDict[str, CachedResponse] = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key: str, version: Version) -> Optional[CachedResponse]:
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                return None
+            if (
+                entry.version != version
+                or time.monotonic() - entry.created > self._max_age
+            ):
+                del self._entries[key]
+                return None
+            self._entries.move_to_end(key)
+            return entry
+
+    def put(
+        self,
+        key: str,
+        version: Version,
+        content: bytes,
+        headers: Optional[Dict[str, str]] = None,
+        gzipped: Optional[bytes] = None,
+    ) -> CachedResponse:
+        """Store an encoded response body; gzipped is built on first use if
+        not given."""
+        entry = CachedResponse(content, dict(headers or {}), version, _gzipped=gzipped)
+        with self._lock:
+            self._entries[key] = entry
+            self._entries.move_to_end(key)
+            while len(self._entries) > self._max_entries:
+                self._entries.popitem(last=False)
+        return entry
+
+    def put_data(
+        self,
+        key: str,
+        version: Version,
+        data: Any,
+        headers: Optional[Dict[str, str]] = None,
+    ) -> CachedResponse:
+        """Store data as make_gzip_json_response would encode it, compressed
+        ahead of need."""
+        content = json.dumps({"data": data, "error": None}).encode("utf-8")
+        return self.put(
+            key, version, content, headers, gzip.compress(content, GZIP_LEVEL)
+        )
+
+    def clear(self) -> None:
+        with self._lock:
+            self._entries.clear()
+
+    def __len__(self) -> int:
+        return len(self._entries)
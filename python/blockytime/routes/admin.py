@@ -4,28 +4,141 @@ import logging
 import os
 import shutil
 import tempfile
+from typing import Callable, Optional
 
-from flask import Blueprint, jsonify
-from sqlalchemy import Engine
+from flask import Blueprint, jsonify, request, send_file
 
-from ..backup import MAX_PUSH_BACKUPS, cleanup_overflow, rotate_backups
-from ..routes.decorators import RouteReturn
+from ..backup import (
+    PRE_PUSH,
+    BackgroundSnapshots,
+    backup_database,
+    copy_database,
+    open_store,
+)
+from ..database import validate_database_file
+from ..dbsync import SyncSchemaError, check_schema, sync_database
+from ..instrumentation import metrics_response
+from ..interfaces.blockserviceinterface import BlockServiceInterface
+from ..maintenance import after_pull
+from ..profiling import (
+    admin_only,
+    list_profile_ids,
+    load_profile,
+    profile_stats_path,
+    profile_summary,
+)
+from ..routes.decorators import (
+    RouteReturn,
+    inject_blockservice,
+    make_gzip_json_response,
+)
+from ..scheduler import Scheduler
 
 log = logging.getLogger(__name__)
 
 BUNDLE_ID = "com.anniapp.Timeblocks"
 DB_FILENAME = "DB.db"
-OUTPUT_DIR = os.path.join(os.path.dirname(__file__), "..", "data", "dynamic")
-OUTPUT_PATH = os.path.join(OUTPUT_DIR, DB_FILENAME)
-PRE_PUSH_BACKUP_PATH = os.path.join(OUTPUT_DIR, "DB.db.pre-push")
 
 
-def create_admin_blueprint(engine: Engine) -> Blueprint:
+def create_admin_blueprint(
+    db_path: str,
+    reload_database: Callable[[Optional[str]], int],
+    scheduler: Scheduler,
+) -> Blueprint:
+    """Admin routes; reload_database renames the given file, if any, over
+    db_path, serves it with new services and returns the new generation (see
+    server.reload_database). scheduler runs the maintenance jobs (see
+    maintenance.py)."""
     bp = Blueprint("admin", __name__)
+    snapshots = BackgroundSnapshots(db_path)
+
+    @bp.route("/api/v1/admin/metrics", methods=["GET"])
+    @admin_only
+    def metrics() -> RouteReturn:
+        """Request, service and SQL metrics in the Prometheus text format."""
+        return metrics_response()
+
+    @bp.route("/api/v1/admin/profiles", methods=["GET"])
+    @admin_only
+    def list_profiles() -> RouteReturn:
+        """Stored request profiles, newest first (see profiling.py)."""
+        summaries = []
+        for profile_id in list_profile_ids():
+            report = load_profile(profile_id)
+            if report is not None:
+                summaries.append(profile_summary(report))
+        return make_gzip_json_response(summaries)
+
+    @bp.route("/api/v1/admin/profiles/<profile_id>", methods=["GET"])
+    @admin_only
+    def get_profile(profile_id: str) -> RouteReturn:
+        """
+        One request profile: cProfile report, SQL timings and query plans.
+        params: format (json|prof); prof downloads the pstats dump
+        """
+        if request.args.get("format", "json") == "prof":
+            path = profile_stats_path(profile_id)
+            if path is None:
+                return jsonify({"data": None, "error": "Profile not found"}), 404
+            return send_file(
+                os.path.abspath(path),
+                mimetype="application/octet-stream",
+                as_attachment=True,
+                download_name=f"{profile_id}.prof",
+            )
+        report = load_profile(profile_id)
+        if report is None:
+            return jsonify({"data": None, "error": "Profile not found"}), 404
+        return make_gzip_json_response(report)
+
+    @bp.route("/api/v1/admin/snapshot", methods=["POST"])
+    @admin_only
+    def start_snapshot() -> RouteReturn:
+        """
+        Back up the database into the backup store in a background thread.
+        Reads and writes carry on while it runs. Returns the job; while one is
+        running, that job is returned instead of starting another.
+        """
+        return make_gzip_json_response(snapshots.start().to_dict())
+
+    @bp.route("/api/v1/admin/snapshot/<int:job_id>", methods=["GET"])
+    def get_snapshot(job_id: int) -> RouteReturn:
+        """Progress of a snapshot job, and the snapshot once it is done."""
+        job = snapshots.get(job_id)
+        if job is None:
+            return jsonify({"data": None, "error": "Snapshot job not found"}), 404
+        return make_gzip_json_response(job.to_dict())
+
+    @bp.route("/api/v1/admin/snapshots", methods=["GET"])
+    def list_snapshots() -> RouteReturn:
+        """Snapshots in the backup store, newest first."""
+        return make_gzip_json_response(
+            [s.summary() for s in open_store(db_path).snapshots()]
+        )
+
+    @bp.route("/api/v1/admin/jobs", methods=["GET"])
+    def list_jobs() -> RouteReturn:
+        """Maintenance jobs: schedule, runs, and the last result or error."""
+        return make_gzip_json_response(scheduler.status())
+
+    @bp.route("/api/v1/admin/jobs/<name>", methods=["POST"])
+    @admin_only
+    def trigger_job(name: str) -> RouteReturn:
+        """Run a maintenance job as soon as no request is running."""
+        try:
+            status = scheduler.trigger(name)
+        except KeyError:
+            return jsonify({"data": None, "error": f"Unknown job {name}"}), 404
+        return make_gzip_json_response(status.to_dict())
 
     @bp.route("/api/v1/admin/pull-db", methods=["POST"])
-    def pull_db() -> RouteReturn:
-        """Pull DB.db from a USB-connected iPhone and reload the database."""
+    @inject_blockservice
+    def pull_db(block_service: BlockServiceInterface) -> RouteReturn:
+        """Pull DB.db from a USB-connected iPhone and sync it into the database.
+
+        Only rows that differ are written (see dbsync.py); a file with other
+        tables or columns is swapped in whole instead.
+        """
         try:
             from pymobiledevice3.lockdown import create_using_usbmux
             from pymobiledevice3.services.house_arrest import HouseArrestService
@@ -64,41 +177,67 @@ def create_admin_blueprint(engine: Engine) -> Blueprint:
             return jsonify({"status": "error", "message": msg}), 503
 
         remote_path = f"Documents/{DB_FILENAME}"
-        os.makedirs(OUTPUT_DIR, exist_ok=True)
-
-        # Rotate backups before overwriting
-        log.info("pull-db: rotating backups...")
-        rotate_backups(OUTPUT_PATH)
+        db_dir = os.path.dirname(os.path.abspath(db_path))
+        os.makedirs(db_dir, exist_ok=True)
 
-        tmp_dir = tempfile.mkdtemp(dir=OUTPUT_DIR)
+        # Pull next to DB.db, so the new file can be renamed over it atomically
+        tmp_dir = tempfile.mkdtemp(dir=db_dir)
         tmp_path = os.path.join(tmp_dir, DB_FILENAME)
         try:
-            service.pull(remote_path, tmp_dir)
-            shutil.move(tmp_path, OUTPUT_PATH)
-        except Exception as e:
-            msg = f"Could not pull {remote_path} from app container: {e}"
-            log.error(f"pull-db: {msg}")
-            shutil.rmtree(tmp_dir, ignore_errors=True)
-            return jsonify({"status": "error", "message": msg}), 500
+            try:
+                service.pull(remote_path, tmp_dir)
+            except Exception as e:
+                msg = f"Could not pull {remote_path} from app container: {e}"
+                log.error(f"pull-db: {msg}")
+                return jsonify({"status": "error", "message": msg}), 500
+            try:
+                validate_database_file(tmp_path)
+            except ValueError as e:
+                msg = f"Pulled database is unusable, keeping the current one: {e}"
+                log.error(f"pull-db: {msg}")
+                return jsonify({"status": "error", "message": msg}), 502
+
+            size_kb = os.path.getsize(tmp_path) / 1024
+            # Local edits land before the rows from the phone
+            block_service.flush()
+            sync = None
+            generation = None
+            try:
+                check_schema(db_path, tmp_path)
+            except SyncSchemaError as e:
+                # Backs up DB.db, renames the pulled file over it and swaps in
+                # a fresh engine and services, warmed up before they take traffic
+                log.info(f"pull-db: {e}, swapping in the pulled file")
+                generation = reload_database(tmp_path)
+            else:
+                backup_database(open_store(db_path), db_path, prune=False)
+                sync = sync_database(db_path, tmp_path)
+                if sync.blocks_only:
+                    block_service.record_external_changes(sync.block_dates)
+                    after_pull(scheduler, db_path)
+                else:
+                    # Types, projects or configs changed, which every service
+                    # may have cached
+                    generation = reload_database(None)
         finally:
             shutil.rmtree(tmp_dir, ignore_errors=True)
 
-        cleanup_overflow(OUTPUT_PATH)
-        log.info("pull-db: backup rotation complete")
-
-        abs_output = os.path.abspath(OUTPUT_PATH)
-        size_kb = os.path.getsize(abs_output) / 1024
-        log.info(f"pull-db: saved {size_kb:.1f} KB to {abs_output}")
-
-        # Dispose connection pool so next query reads the fresh DB file
-        engine.dispose()
-        log.info("pull-db: connection pool disposed, fresh connections will use new DB")
+        log.info(
+            f"pull-db: pulled {size_kb:.1f} KB into {os.path.abspath(db_path)}"
+            + (
+                f", serving database generation {generation}"
+                if generation is not None
+                else ""
+            )
+        )
 
         return jsonify(
             {
                 "status": "success",
                 "device": f"{device_name} (iOS {ios_version})",
                 "size_kb": round(size_kb, 1),
+                "sync": sync.to_dict() if sync is not None else None,
+                "generation": generation,
             }
         )
 
@@ -107,15 +246,15 @@ def create_admin_blueprint(engine: Engine) -> Blueprint:
         """Push local DB.db to a USB-connected iPhone.
 
         Before pushing, the iPhone's current DB is pulled and saved as a
-        rotating pre-push backup (DB.db.pre-push.1 … .N, controlled by
-        BLOCKY_MAX_PUSH_BACKUPS env var, default 10).
+        pre-push snapshot in the backup store (see backup.py). What is sent is
+        an online copy of DB.db, consistent even while it is being written.
         """
-        if not os.path.exists(OUTPUT_PATH):
+        if not os.path.exists(db_path):
             return (
                 jsonify(
                     {
                         "status": "error",
-                        "message": f"Local DB not found at {OUTPUT_PATH}",
+                        "message": f"Local DB not found at {db_path}",
                     }
                 ),
                 400,
@@ -159,36 +298,34 @@ def create_admin_blueprint(engine: Engine) -> Blueprint:
             return jsonify({"status": "error", "message": msg}), 503
 
         remote_path = f"Documents/{DB_FILENAME}"
-        os.makedirs(OUTPUT_DIR, exist_ok=True)
-
-        # Back up iPhone's current DB before overwriting it
-        log.info("push-db: backing up iPhone DB before push...")
-        rotate_backups(PRE_PUSH_BACKUP_PATH, MAX_PUSH_BACKUPS)
-        tmp_dir = tempfile.mkdtemp(dir=OUTPUT_DIR)
+        tmp_dir = tempfile.mkdtemp(dir=os.path.dirname(os.path.abspath(db_path)))
         tmp_path = os.path.join(tmp_dir, DB_FILENAME)
+        push_path = os.path.join(tmp_dir, f"{DB_FILENAME}.push")
         try:
-            service.pull(remote_path, tmp_dir)
-            shutil.move(tmp_path, PRE_PUSH_BACKUP_PATH)
-        except Exception as e:
-            msg = f"Could not back up iPhone DB before push: {e}"
-            log.error(f"push-db: {msg}")
-            shutil.rmtree(tmp_dir, ignore_errors=True)
-            return jsonify({"status": "error", "message": msg}), 500
+            # Back up iPhone's current DB before overwriting it
+            log.info("push-db: backing up iPhone DB before push...")
+            try:
+                service.pull(remote_path, tmp_dir)
+                snapshot = backup_database(open_store(db_path), tmp_path, PRE_PUSH)
+            except Exception as e:
+                msg = f"Could not back up iPhone DB before push: {e}"
+                log.error(f"push-db: {msg}")
+                return jsonify({"status": "error", "message": msg}), 500
+            log.info("push-db: iPhone DB backed up as %s", snapshot.id)
+
+            # Push a consistent copy of the local DB to the iPhone
+            copy_database(db_path, push_path)
+            size_kb = os.path.getsize(push_path) / 1024
+            log.info("push-db: pushing %s → %s ...", db_path, remote_path)
+            try:
+                service.push(push_path, remote_path)
+            except Exception as e:
+                msg = f"Could not push {db_path} to device: {e}"
+                log.error(f"push-db: {msg}")
+                return jsonify({"status": "error", "message": msg}), 500
         finally:
             shutil.rmtree(tmp_dir, ignore_errors=True)
-        cleanup_overflow(PRE_PUSH_BACKUP_PATH, MAX_PUSH_BACKUPS)
-        log.info("push-db: iPhone DB backed up to %s", PRE_PUSH_BACKUP_PATH)
-
-        # Push local DB to the iPhone
-        log.info("push-db: pushing %s → %s ...", OUTPUT_PATH, remote_path)
-        try:
-            service.push(OUTPUT_PATH, remote_path)
-        except Exception as e:
-            msg = f"Could not push {OUTPUT_PATH} to device: {e}"
-            log.error(f"push-db: {msg}")
-            return jsonify({"status": "error", "message": msg}), 500
 
-        size_kb = os.path.getsize(OUTPUT_PATH) / 1024
         log.info(f"push-db: pushed {size_kb:.1f} KB to {device_name}")
 
         return jsonify(
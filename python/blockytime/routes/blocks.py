@@ -1,45 +1,171 @@
 import logging
-import time
 from typing import List, Sequence
 
 from flask import Blueprint, jsonify, request
 
+from ..changelog import RevisionConflictError
+from ..constants import BLOCK_PAGE_SIZE, MAX_BLOCK_PAGE_SIZE
 from ..dtos.block_dto import BlockDTO
 from ..dtos.project_dto import ProjectDTO
 from ..dtos.type_dto import TypeDTO
 from ..interfaces.blockserviceinterface import BlockServiceInterface
+from ..interfaces.configserviceinterface import ConfigServiceInterface
+from ..interfaces.searchserviceinterface import SearchServiceInterface
 from ..routes.decorators import (
     RouteReturn,
+    cache_response,
     inject_blockservice,
+    inject_configservice,
+    inject_searchservice,
     make_gzip_json_response,
     parse_date_range_params,
+    parse_timezone_param,
 )
 
 log = logging.getLogger(__name__)
 
 bp = Blueprint("blocks", __name__)
 
+# Revision of the blocks a response reflects, see changelog.py
+REVISION_HEADER = "X-Blockytime-Revision"
+
 
 @bp.route("/api/v1/blocks", methods=["GET"])
+@cache_response
 @inject_blockservice
 def get_blocks(block_service: BlockServiceInterface) -> RouteReturn:
     """
-    params: start_date, end_date (YYYY-MM-DD)
+    params: start_date, end_date (YYYY-MM-DD), limit, after
+    With limit or after, returns one page of at most limit blocks (default
+    1000, at most 10000) dated after after, and next in the envelope: the
+    after of the next page, null on the last one. Without either, returns
+    every block in the range.
     """
-    starting_time = time.monotonic()
     try:
         start_date, end_date = parse_date_range_params()
+        paginated = "limit" in request.args or "after" in request.args
+        limit = int(request.args.get("limit", BLOCK_PAGE_SIZE))
+        if not 1 <= limit <= MAX_BLOCK_PAGE_SIZE:
+            raise ValueError(f"limit must be between 1 and {MAX_BLOCK_PAGE_SIZE}")
+        after = int(request.args["after"]) if "after" in request.args else None
     except ValueError as e:
         return jsonify({"error": str(e)}), 400
 
     try:
+        # Read first: changes made while reading are then reported again by
+        # /api/v1/blocks/changes rather than missed
+        revision = block_service.get_revision()
+        headers = {REVISION_HEADER: str(revision)}
+        if paginated:
+            page = block_service.get_blocks_page(start_date, end_date, limit, after)
+            return make_gzip_json_response(
+                [block.to_dict() for block in page.blocks],
+                headers,
+                {"next": page.next_after},
+            )
         blocks: Sequence[BlockDTO] = block_service.get_blocks(start_date, end_date)
-        return make_gzip_json_response([block.to_dict() for block in blocks])
+        return make_gzip_json_response([block.to_dict() for block in blocks], headers)
     except Exception as e:
         log.error("get_blocks failed", exc_info=True)
         return jsonify({"data": None, "error": str(e)}), 500
-    finally:
-        log.info(f"get_blocks took {time.monotonic() - starting_time} seconds")
+
+
+@bp.route("/api/v1/blocks/week", methods=["GET"])
+@cache_response
+@inject_blockservice
+@inject_configservice
+def get_week_grid(
+    block_service: BlockServiceInterface, config_service: ConfigServiceInterface
+) -> RouteReturn:
+    """
+    params: start_date (YYYY-MM-DD, usually a Monday), timezone
+    The week as a 7 x 48 matrix of type uids, 0 where there is no block, and
+    the name and color of each type in it. Slots are 30 minutes, or 15 when
+    the app records quarter hours and does not pixelate (slotMinutes says
+    which); a 30-minute slot shows the type of most of its blocks.
+    """
+    try:
+        timezone = parse_timezone_param()
+        # Imported here so that numpy loads on the first request, not at start-up
+        from ..calendarindex import parse_local_date
+
+        start_date_str = request.args.get("start_date")
+        if start_date_str is None:
+            raise ValueError("start_date is required")
+        start_date = parse_local_date(start_date_str, timezone)
+    except ValueError as e:
+        return jsonify({"error": str(e)}), 400
+
+    try:
+        revision = block_service.get_revision()
+        grid = block_service.get_week_grid(
+            start_date, config_service.get_config(), timezone
+        )
+        return make_gzip_json_response(grid.to_dict(), {REVISION_HEADER: str(revision)})
+    except Exception as e:
+        log.error("get_week_grid failed", exc_info=True)
+        return jsonify({"data": None, "error": str(e)}), 500
+
+
+@bp.route("/api/v1/blocks/search", methods=["GET"])
+@inject_searchservice
+def search_blocks(search_service: SearchServiceInterface) -> RouteReturn:
+    """
+    params: q, start_date, end_date (YYYY-MM-DD, both optional), limit
+    (default 50, at most 500), timezone
+    Blocks whose comment contains every word of q, each word matching the
+    start of a word, best match (lowest rank) first.
+    """
+    try:
+        query = request.args.get("q", "").strip()
+        if not query:
+            raise ValueError("q is required")
+        limit = int(request.args.get("limit", "50"))
+        if limit < 1:
+            raise ValueError("limit must be positive")
+        timezone = parse_timezone_param()
+        # Imported here so that numpy loads on the first request, not at start-up
+        from ..calendarindex import parse_local_date
+
+        start_date, end_date = (
+            parse_local_date(request.args[name], timezone)
+            if name in request.args
+            else None
+            for name in ("start_date", "end_date")
+        )
+    except ValueError as e:
+        return jsonify({"error": str(e)}), 400
+
+    try:
+        matches = search_service.search_comments(query, start_date, end_date, limit)
+        return make_gzip_json_response([match.to_dict() for match in matches])
+    except Exception as e:
+        log.error("search_blocks failed", exc_info=True)
+        return jsonify({"data": None, "error": str(e)}), 500
+
+
+@bp.route("/api/v1/blocks/changes", methods=["GET"])
+@inject_blockservice
+def get_block_changes(block_service: BlockServiceInterface) -> RouteReturn:
+    """
+    params: since (revision from a previous response)
+    Returns the revision, the current state of blocks changed since then and
+    the dates whose blocks were deleted. reset is true if the server cannot
+    tell, and the client should reload its blocks.
+    """
+    try:
+        since = int(request.args.get("since", ""))
+    except ValueError:
+        return jsonify({"error": "since must be a revision number"}), 400
+
+    try:
+        changes = block_service.get_changes(since)
+        return make_gzip_json_response(
+            changes.to_dict(), {REVISION_HEADER: str(changes.revision)}
+        )
+    except Exception as e:
+        log.error("get_block_changes failed", exc_info=True)
+        return jsonify({"data": None, "error": str(e)}), 500
 
 
 @bp.route("/api/v1/blocks", methods=["PUT"])
@@ -47,7 +173,15 @@ def get_blocks(block_service: BlockServiceInterface) -> RouteReturn:
 def update_blocks(block_service: BlockServiceInterface) -> RouteReturn:
     """
     params: blocks (list of BlockDTO)
+    query params: expected_revision (optional), the revision the edits are
+    based on; 409 if any of the blocks changed since
     """
+    expected_revision = None
+    if "expected_revision" in request.args:
+        try:
+            expected_revision = int(request.args["expected_revision"])
+        except ValueError:
+            return jsonify({"error": "expected_revision must be a number"}), 400
     try:
         if isinstance(request.json, list):
             blocks: List[BlockDTO] = []
@@ -124,10 +258,25 @@ def update_blocks(block_service: BlockServiceInterface) -> RouteReturn:
         return jsonify({"error": str(e)}), 500
 
     try:
-        if block_service.update_blocks(blocks):
-            return jsonify({"message": "Blocks updated successfully"}), 200
+        revision = block_service.update_blocks_with_revision(blocks, expected_revision)
+        if revision is not None:
+            response = jsonify(
+                {"message": "Blocks updated successfully", "revision": revision}
+            )
+            response.headers[REVISION_HEADER] = str(revision)
+            return response, 200
         else:
             return jsonify({"error": "Failed to update blocks"}), 500
+    except RevisionConflictError as e:
+        return (
+            jsonify(
+                {
+                    "data": {"revision": e.revision, "conflicts": e.dates},
+                    "error": str(e),
+                }
+            ),
+            409,
+        )
     except Exception as e:
         log.error("update_blocks service call failed", exc_info=True)
         return jsonify({"error": str(e)}), 500
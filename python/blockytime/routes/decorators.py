@@ -1,31 +1,45 @@
 import gzip
 import json
+import time
 from datetime import datetime
 from functools import wraps
-from typing import Any, Callable, Dict, Tuple, TypeVar, Union, cast
+from typing import Any, Callable, Dict, Optional, Tuple, TypeVar, Union, cast
 
-import pytz
-from flasgger import swag_from as _swag_from
 from flask import Response as FlaskResponse
 from flask import current_app, make_response, request
 
 from ..constants import DEFAULT_TZ
+from ..instrumentation import current_endpoint
+from ..interfaces.aggregationserviceinterface import AggregationServiceInterface
 from ..interfaces.blockserviceinterface import BlockServiceInterface
 from ..interfaces.configserviceinterface import ConfigServiceInterface
+from ..interfaces.exportserviceinterface import ExportServiceInterface
 from ..interfaces.projectserviceinterface import ProjectServiceInterface
+from ..interfaces.searchserviceinterface import SearchServiceInterface
 from ..interfaces.sleepserviceinterface import SleepServiceInterface
 from ..interfaces.statisticsserviceinterface import StatisticsServiceInterface
 from ..interfaces.trendserviceinterface import TrendServiceInterface
 from ..interfaces.typeserviceinterface import TypeServiceInterface
+from ..metrics import RESPONSE_CACHE_REQUESTS, RESPONSE_ITEMS, SERIALIZATION_SECONDS
+from ..profiling import profile_requested
+from ..responsecache import CachedResponse, ResponseCache, cache_key, data_version
 from ..services.di import FlaskWithServiceProvider, get_service_provider
 
 RouteReturn = Union[FlaskResponse, Tuple[FlaskResponse, int]]
 F = TypeVar("F", bound=Callable[..., Any])
 
 
-def make_gzip_json_response(data: Any) -> RouteReturn:
-    """Build a JSON response with gzip compression when the client supports it."""
-    ret = {"data": data, "error": None}
+def make_gzip_json_response(
+    data: Any,
+    headers: Optional[Dict[str, str]] = None,
+    envelope: Optional[Dict[str, Any]] = None,
+) -> RouteReturn:
+    """Build a JSON response with gzip compression when the client supports it.
+
+    envelope adds keys next to data and error, e.g. the cursor of the next page.
+    """
+    started = time.perf_counter()
+    ret = {"data": data, "error": None, **(envelope or {})}
     gzip_supported = "gzip" in request.headers.get("Accept-Encoding", "").lower()
     if gzip_supported:
         content = gzip.compress(json.dumps(ret).encode("utf-8"), 5)
@@ -36,11 +50,85 @@ def make_gzip_json_response(data: Any) -> RouteReturn:
     response.headers["Content-Length"] = str(len(content))
     if gzip_supported:
         response.headers["Content-Encoding"] = "gzip"
+    response.headers.update(headers or {})
+    endpoint = current_endpoint()
+    SERIALIZATION_SECONDS.observe(time.perf_counter() - started, endpoint=endpoint)
+    if isinstance(data, (list, dict)):
+        RESPONSE_ITEMS.observe(len(data), endpoint=endpoint)
+    return response, 200
+
+
+def _cached_response(entry: CachedResponse) -> RouteReturn:
+    gzip_supported = "gzip" in request.headers.get("Accept-Encoding", "").lower()
+    content = entry.gzipped() if gzip_supported else entry.content
+    response = make_response(content)
+    response.headers["Content-Type"] = "application/json"
+    response.headers["Content-Length"] = str(len(content))
+    if gzip_supported:
+        response.headers["Content-Encoding"] = "gzip"
+    response.headers.update(entry.headers)
     return response, 200
 
 
-def parse_date_range_params() -> Tuple[datetime, datetime]:
-    """Parse start_date and end_date from request args, localized to the default timezone.
+def cache_response(f: F) -> F:
+    """Serve the route's successful JSON responses from the ResponseCache.
+
+    Only for GET routes whose response depends on nothing but the query
+    arguments and the data version (see responsecache.py). Profiled requests
+    always run the route.
+    """
+
+    @wraps(f)
+    def wrapper(*args: Any, **kwargs: Any) -> Any:
+        service_provider = get_service_provider(
+            cast(FlaskWithServiceProvider, current_app)
+        )
+        cache = service_provider.get(ResponseCache)
+        key = cache_key(request.path, request.args.items(multi=True))
+        version = data_version(service_provider)
+        endpoint = current_endpoint()
+        if not profile_requested():
+            entry = cache.get(key, version)
+            if entry is not None:
+                RESPONSE_CACHE_REQUESTS.inc(endpoint=endpoint, result="hit")
+                return _cached_response(entry)
+        RESPONSE_CACHE_REQUESTS.inc(endpoint=endpoint, result="miss")
+        result = f(*args, **kwargs)
+        response, status = result if isinstance(result, tuple) else (result, 200)
+        if status == 200 and response.status_code == 200:
+            body = response.get_data()
+            gzipped = response.headers.get("Content-Encoding") == "gzip"
+            headers = {
+                name: value
+                for name, value in response.headers.items()
+                if name not in ("Content-Type", "Content-Length", "Content-Encoding")
+            }
+            cache.put(
+                key,
+                version,
+                gzip.decompress(body) if gzipped else body,
+                headers,
+                body if gzipped else None,
+            )
+        return result
+
+    return cast(F, wrapper)
+
+
+def parse_timezone_param() -> str:
+    """Parse the optional timezone request arg (IANA name), falling back to DEFAULT_TZ.
+
+    Raises ValueError if the zone is unknown.
+    """
+    from ..timezones import validate_zone
+
+    return validate_zone(request.args.get("timezone", DEFAULT_TZ))
+
+
+def parse_date_range_params(
+    timezone: Optional[str] = None,
+) -> Tuple[datetime, datetime]:
+    """Parse start_date and end_date from request args, localized to the request timezone.
 
     Raises ValueError with a descriptive message if a parameter is missing or malformed.
     """
@@ -50,9 +138,12 @@ def parse_date_range_params() -> Tuple[datetime, datetime]:
     end_date_str = request.args.get("end_date")
     if end_date_str is None:
         raise ValueError("end_date is required")
-    tz = pytz.timezone(DEFAULT_TZ)
-    start_date = tz.localize(datetime.strptime(start_date_str, "%Y-%m-%d"))
-    end_date = tz.localize(datetime.strptime(end_date_str, "%Y-%m-%d"))
+    # Imported here so that numpy loads on the first request, not at start-up
+    from ..calendarindex import parse_local_date
+
+    timezone = timezone or parse_timezone_param()
+    start_date = parse_local_date(start_date_str, timezone)
+    end_date = parse_local_date(end_date_str, timezone)
     return start_date, end_date
 
 
@@ -60,6 +151,8 @@ def swag_from(specs: Dict[str, Any] | str) -> Callable[[F], F]:
     def decorator(f: F) -> F:
         @wraps(f)
         def wrapped(*args: Any, **kwargs: Any) -> Any:
+            from flasgger import swag_from as _swag_from
+
             return _swag_from(specs)(f)(*args, **kwargs)
 
         return cast(F, wrapped)
@@ -98,6 +191,20 @@ def inject_typeservice(f: Callable[..., R]) -> Callable[..., R]:
     return wrapper
 
 
+def inject_searchservice(f: Callable[..., R]) -> Callable[..., R]:
+    """Inject search service as named argument"""
+
+    @wraps(f)
+    def wrapper(*args: Any, **kwargs: Any) -> R:
+        service_provider = get_service_provider(
+            cast(FlaskWithServiceProvider, current_app)
+        )
+        service = service_provider.get(SearchServiceInterface)  # type: ignore
+        return f(search_service=service, *args, **kwargs)
+
+    return wrapper
+
+
 def inject_configservice(f: Callable[..., R]) -> Callable[..., R]:
     """Inject config service as named argument"""
 
@@ -140,6 +247,20 @@ def inject_statisticsservice(f: Callable[..., R]) -> Callable[..., R]:
     return wrapper
 
 
+def inject_aggregationservice(f: Callable[..., R]) -> Callable[..., R]:
+    """Inject aggregation service as named argument"""
+
+    @wraps(f)
+    def wrapper(*args: Any, **kwargs: Any) -> R:
+        service_provider = get_service_provider(
+            cast(FlaskWithServiceProvider, current_app)
+        )
+        service = service_provider.get(AggregationServiceInterface)  # type: ignore
+        return f(aggregation_service=service, *args, **kwargs)
+
+    return wrapper
+
+
 def inject_trendservice(f: Callable[..., R]) -> Callable[..., R]:
     """Inject trend service as named argument"""
 
@@ -166,3 +287,17 @@ def inject_sleepservice(f: Callable[..., R]) -> Callable[..., R]:
         return f(sleep_service=service, *args, **kwargs)
 
     return wrapper
+
+
+def inject_exportservice(f: Callable[..., R]) -> Callable[..., R]:
+    """Inject export service as named argument"""
+
+    @wraps(f)
+    def wrapper(*args: Any, **kwargs: Any) -> R:
+        service_provider = get_service_provider(
+            cast(FlaskWithServiceProvider, current_app)
+        )
+        service = service_provider.get(ExportServiceInterface)  # type: ignore
+        return f(export_service=service, *args, **kwargs)
+
+    return wrapper
@@ -0,0 +1,70 @@
+import logging
+import tempfile
+from typing import BinaryIO, Dict, Optional, cast
+
+from flask import Blueprint, jsonify, request, send_file
+
+from ..interfaces.exportserviceinterface import ExportFormat, ExportServiceInterface
+from ..routes.decorators import (
+    RouteReturn,
+    inject_exportservice,
+    parse_date_range_params,
+    parse_timezone_param,
+)
+
+log = logging.getLogger(__name__)
+
+bp = Blueprint("exports", __name__)
+
+# Exports larger than this are spooled to disk rather than held in memory
+SPOOL_MAX_SIZE = 16 * 1024 * 1024
+
+MIMETYPES: Dict[ExportFormat, str] = {
+    ExportFormat.ARROW: "application/vnd.apache.arrow.file",
+    ExportFormat.NPZ: "application/octet-stream",
+    ExportFormat.CSV: "text/csv",
+}
+
+
+@bp.route("/api/v1/blocks/export", methods=["GET"])
+@inject_exportservice
+def export_blocks(export_service: ExportServiceInterface) -> RouteReturn:
+    """
+    params: start_date, end_date (YYYY-MM-DD), format (arrow|npz|csv),
+    rollup (DAY|WEEK|MONTH, optional), timezone
+    """
+    # numpy and the export writers load on the first export, not at start-up
+    from ..calendarindex import Granularity
+    from ..services.exportservice import arrow_available, default_export_format
+
+    try:
+        timezone = parse_timezone_param()
+        start_date, end_date = parse_date_range_params(timezone)
+        fmt_str = request.args.get("format")
+        fmt = ExportFormat(fmt_str) if fmt_str else default_export_format()
+        if fmt == ExportFormat.ARROW and not arrow_available():
+            raise ValueError("arrow format requires pyarrow, which is not installed")
+        rollup_str = request.args.get("rollup")
+        rollup: Optional["Granularity"] = (
+            Granularity(rollup_str.upper()) if rollup_str else None
+        )
+    except ValueError as e:
+        return jsonify({"error": str(e)}), 400
+
+    try:
+        out = tempfile.SpooledTemporaryFile(max_size=SPOOL_MAX_SIZE)
+        export_service.export_blocks(
+            start_date.date(), end_date.date(), out, fmt, rollup, timezone
+        )
+        out.seek(0)
+        name = "blocks" if rollup is None else f"blocks-{rollup.value.lower()}"
+        response = send_file(
+            cast(BinaryIO, out),
+            mimetype=MIMETYPES[fmt],
+            as_attachment=True,
+            download_name=f"{name}-{start_date.date()}-{end_date.date()}.{fmt.value}",
+        )
+        return response, 200
+    except Exception as e:
+        log.error("export_blocks failed", exc_info=True)
+        return jsonify({"data": None, "error": str(e)}), 500
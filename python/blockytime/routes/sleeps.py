@@ -1,11 +1,13 @@
 from datetime import datetime, timedelta
 
-import pytz
 from flask import Blueprint, jsonify, request
 
-from ..constants import DEFAULT_TZ
 from ..interfaces.sleepserviceinterface import SleepServiceInterface
-from ..routes.decorators import RouteReturn, inject_sleepservice
+from ..routes.decorators import (
+    RouteReturn,
+    inject_sleepservice,
+    parse_timezone_param,
+)
 
 bp = Blueprint("sleep", __name__)
 
@@ -28,11 +30,18 @@ def get_sleep_stats(sleep_service: SleepServiceInterface) -> RouteReturn:
     except ValueError:
         return jsonify({"error": "Invalid date format. Use YYYY-MM-DD"}), 400
 
+    try:
+        timezone = parse_timezone_param()
+    except ValueError as e:
+        return jsonify({"error": str(e)}), 400
+
+    import pytz
+
     stats = sleep_service.calculate_sleep_stats(
         start_date=start_date,
         end_date=end_date,
         cut_off_hour=18,
-        timezone=pytz.timezone(DEFAULT_TZ),
+        timezone=pytz.timezone(timezone),
         start_time_cut_off_hour=8,
         end_time_cut_off_hour=14,
         filter_start_time_after=20.0,  # 8 PM
@@ -1,32 +1,42 @@
 import logging
-import time
-from typing import List
+from typing import TYPE_CHECKING, List, Optional
 
 from flask import Blueprint, jsonify, request
 
 from ..dtos.statistics_dto import StatisticsDTO
+from ..interfaces.aggregationserviceinterface import (
+    AggregationServiceInterface,
+    Dimension,
+)
 from ..interfaces.statisticsserviceinterface import StatisticsServiceInterface
 from ..routes.decorators import (
     RouteReturn,
+    cache_response,
+    inject_aggregationservice,
     inject_statisticsservice,
     make_gzip_json_response,
     parse_date_range_params,
+    parse_timezone_param,
 )
 
+if TYPE_CHECKING:
+    from ..calendarindex import Granularity
+
 log = logging.getLogger(__name__)
 
 bp = Blueprint("stats", __name__)
 
 
 @bp.route("/api/v1/stats", methods=["GET"])
+@cache_response
 @inject_statisticsservice
 def get_stats(statistics_service: StatisticsServiceInterface) -> RouteReturn:
     """
     params: start_date, end_date (YYYY-MM-DD)
     """
-    starting_time = time.monotonic()
     try:
-        start_date, end_date = parse_date_range_params()
+        timezone = parse_timezone_param()
+        start_date, end_date = parse_date_range_params(timezone)
     except ValueError as e:
         return jsonify({"error": str(e)}), 400
 
@@ -45,10 +55,59 @@ def get_stats(statistics_service: StatisticsServiceInterface) -> RouteReturn:
             hour,
             minute,
             day_of_week,
+            timezone,
         )
         return make_gzip_json_response([stat.to_dict() for stat in stats])
     except Exception as e:
         log.error("get_stats failed", exc_info=True)
         return jsonify({"data": None, "error": str(e)}), 500
-    finally:
-        log.info(f"get_stats took {time.monotonic() - starting_time} seconds")
+
+
+@bp.route("/api/v1/stats/aggregate", methods=["GET"])
+@cache_response
+@inject_aggregationservice
+def get_aggregate(aggregation_service: AggregationServiceInterface) -> RouteReturn:
+    """
+    params: start_date, end_date (YYYY-MM-DD), group_by (comma-separated
+    TYPE, PROJECT, CATEGORY; optional), bucket (DAY|WEEK|MONTH, optional),
+    type_uid (repeatable), include_hidden (default 1), top, timezone
+    Blocks and hours per group, e.g. per category and week; with top, only
+    the top groups of each period.
+    """
+    # numpy loads on the first aggregate, not at start-up
+    from ..calendarindex import Granularity
+
+    try:
+        timezone = parse_timezone_param()
+        start_date, end_date = parse_date_range_params(timezone)
+        group_by = [
+            Dimension(name.strip().upper())
+            for name in request.args.get("group_by", "").split(",")
+            if name.strip()
+        ]
+        bucket_str = request.args.get("bucket")
+        bucket: Optional["Granularity"] = (
+            Granularity(bucket_str.upper()) if bucket_str else None
+        )
+        top = request.args.get("top", type=int, default=None)
+        if top is not None and top < 1:
+            raise ValueError("top must be positive")
+    except ValueError as e:
+        return jsonify({"error": str(e)}), 400
+
+    try:
+        type_uids = request.args.getlist("type_uid", type=int)
+        rows = aggregation_service.aggregate(
+            start_date.date(),
+            end_date.date(),
+            group_by,
+            bucket,
+            type_uids if type_uids else None,
+            request.args.get("include_hidden", "1") != "0",
+            top,
+            timezone,
+        )
+        return make_gzip_json_response(rows)
+    except Exception as e:
+        log.error("get_aggregate failed", exc_info=True)
+        return jsonify({"data": None, "error": str(e)}), 500
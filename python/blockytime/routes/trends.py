@@ -1,5 +1,4 @@
 import logging
-import time
 from typing import List
 
 from flask import Blueprint, jsonify, request
@@ -11,6 +10,7 @@ from ..routes.decorators import (
     inject_trendservice,
     make_gzip_json_response,
     parse_date_range_params,
+    parse_timezone_param,
 )
 
 log = logging.getLogger(__name__)
@@ -25,9 +25,9 @@ def get_trends(trend_service: TrendServiceInterface) -> RouteReturn:
     """
     params: start_date, end_date (YYYY-MM-DD)
     """
-    starting_time = time.monotonic()
     try:
-        start_date, end_date = parse_date_range_params()
+        timezone = parse_timezone_param()
+        start_date, end_date = parse_date_range_params(timezone)
     except ValueError as e:
         return jsonify({"error": str(e)}), 400
 
@@ -41,11 +41,9 @@ def get_trends(trend_service: TrendServiceInterface) -> RouteReturn:
             return jsonify({"error": f"Invalid group_by: {group_by}"}), 400
 
         trends: List[TrendDataDTO] = trend_service.get_trends(
-            start_date, end_date, group_by_enum
+            start_date, end_date, group_by_enum, timezone
         )
         return make_gzip_json_response([trend.to_dict() for trend in trends])
     except Exception as e:
         log.error("get_trends failed", exc_info=True)
         return jsonify({"data": None, "error": str(e)}), 500
-    finally:
-        log.info(f"get_trends took {time.monotonic() - starting_time} seconds")
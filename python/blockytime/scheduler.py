@@ -0,0 +1,214 @@
+"""A small in-process scheduler for maintenance jobs.
+
+Jobs run on worker threads, at most max_workers at a time and never two runs
+of the same job at once. A job is due when its interval has passed since it
+last ran, or when trigger() asks for it, e.g. after pull-db. Triggering a job
+that is running runs it once more afterwards, so it sees the latest data.
+
+Requests come first: while busy() says requests are running, due jobs wait,
+for at most max_defer seconds, so a burst of traffic delays maintenance but
+cannot starve it. Each run is wrapped in guard(), e.g. holding the
+DatabaseGate, so that a database swap waits for running jobs too.
+"""
+
+import logging
+import threading
+import time
+from contextlib import AbstractContextManager, nullcontext
+from dataclasses import asdict, dataclass
+from typing import Any, Callable, Dict, List, Optional
+
+log = logging.getLogger(__name__)
+
+# How often the scheduler looks at the clock and busy() while a job is due
+POLL_SECONDS = 0.05
+
+
+@dataclass
+class JobStatus:
+    name: str
+    description: str
+    interval: Optional[float]
+    runs: int = 0
+    failures: int = 0
+    running: bool = False
+    triggered: bool = False
+    last_started: Optional[float] = None
+    last_seconds: Optional[float] = None
+    last_result: Any = None
+    last_error: Optional[str] = None
+    next_run: Optional[float] = None
+
+    def to_dict(self) -> Dict[str, Any]:
+        return asdict(self)
+
+
+@dataclass
+class Job:
+    name: str
+    func: Callable[[], Any]
+    status: JobStatus
+    schedule: Optional[Callable[[float], float]] = None
+
+
+class Scheduler:
+    """Runs periodic and triggered jobs in the background of the server."""
+
+    def __init__(
+        self,
+        max_workers: int = 1,
+        busy: Callable[[], bool] = lambda: False,
+        max_defer: float = 30.0,
+        guard: Callable[[], AbstractContextManager[Any]] = nullcontext,
+    ):
+        self._max_workers = max_workers
+        self._busy = busy
+        self._max_defer = max_defer
+        self._guard = guard
+        self._jobs: Dict[str, Job] = {}
+        self._cond = threading.Condition()
+        self._running = 0
+        self._thread: Optional[threading.Thread] = None
+        self._stopping = False
+
+    def add(
+        self,
+        name: str,
+        func: Callable[[], Any],
+        interval: Optional[float] = None,
+        initial_delay: Optional[float] = None,
+        description: str = "",
+        schedule: Optional[Callable[[float], float]] = None,
+    ) -> None:
+        """Add a job; it runs every interval seconds, if given, the first time
+        after initial_delay (default: interval), and whenever triggered.
+        schedule, instead of an interval, maps the current time to the time of
+        the next run, e.g. just before a time slot starts. func's return value
+        is kept as the job's last result."""
+        now = time.time()
+        delay = interval if initial_delay is None else initial_delay
+        status = JobStatus(name, description, interval)
+        if schedule is not None:
+            status.next_run = schedule(now)
+        elif delay is not None:
+            status.next_run = now + delay
+        with self._cond:
+            self._jobs[name] = Job(name, func, status, schedule)
+            self._cond.notify_all()
+
+    def trigger(self, name: str) -> JobStatus:
+        """Run a job as soon as a worker is free. Raises KeyError if unknown."""
+        with self._cond:
+            job = self._jobs[name]
+            job.status.triggered = True
+            self._cond.notify_all()
+            return job.status
+
+    @property
+    def started(self) -> bool:
+        return self._thread is not None
+
+    def status(self) -> List[Dict[str, Any]]:
+        with self._cond:
+            return [job.status.to_dict() for job in self._jobs.values()]
+
+    def wait_idle(self, timeout: float) -> bool:
+        """Wait until no job is due or running; False if timeout passed first."""
+        with self._cond:
+            return self._cond.wait_for(
+                lambda: (
+                    self._running == 0
+                    and not any(j.status.triggered for j in self._jobs.values())
+                ),
+                timeout,
+            )
+
+    def start(self) -> None:
+        with self._cond:
+            if self._thread is not None:
+                return
+            self._stopping = False
+            self._thread = threading.Thread(
+                target=self._loop, name="scheduler", daemon=True
+            )
+        self._thread.start()
+
+    def stop(self, timeout: float = 5.0) -> None:
+        """Stop starting jobs and wait up to timeout for running ones."""
+        with self._cond:
+            thread, self._thread = self._thread, None
+            self._stopping = True
+            self._cond.notify_all()
+            self._cond.wait_for(lambda: self._running == 0, timeout)
+        if thread is not None:
+            thread.join(timeout)
+
+    def _due(self, now: float) -> List[Job]:
+        return [
+            job
+            for job in self._jobs.values()
+            if not job.status.running
+            and (
+                job.status.triggered
+                or (job.status.next_run is not None and job.status.next_run <= now)
+            )
+        ]
+
+    def _loop(self) -> None:
+        deferred_since: Optional[float] = None
+        with self._cond:
+            while not self._stopping:
+                now = time.time()
+                due = self._due(now)
+                if not due or self._running >= self._max_workers:
+                    deferred_since = None
+                    next_runs = [
+                        j.status.next_run
+                        for j in self._jobs.values()
+                        if j.status.next_run is not None and not j.status.running
+                    ]
+                    timeout = min(next_runs, default=now + 60) - now
+                    self._cond.wait(max(timeout, POLL_SECONDS))
+                    continue
+                if self._busy():
+                    deferred_since = deferred_since or now
+                    if now - deferred_since < self._max_defer:
+                        self._cond.wait(POLL_SECONDS)
+                        continue
+                deferred_since = None
+                # Triggered jobs first, then the one overdue the longest
+                job = min(
+                    due,
+                    key=lambda j: (not j.status.triggered, j.status.next_run or 0),
+                )
+                job.status.running, job.status.triggered = True, False
+                self._running += 1
+                threading.Thread(
+                    target=self._run, args=(job,), name=f"job-{job.name}", daemon=True
+                ).start()
+
+    def _run(self, job: Job) -> None:
+        status = job.status
+        started = time.monotonic()
+        status.last_started = time.time()
+        log.info(f"Running job {job.name}")
+        try:
+            with self._guard():
+                result = job.func()
+            status.last_result, status.last_error = result, None
+        except Exception as e:
+            log.error(f"Job {job.name} failed: {e}", exc_info=True)
+            status.failures += 1
+            status.last_error = str(e)
+        seconds = time.monotonic() - started
+        with self._cond:
+            status.runs += 1
+            status.running = False
+            status.last_seconds = round(seconds, 3)
+            if job.schedule is not None:
+                status.next_run = job.schedule(time.time())
+            elif status.interval is not None:
+                status.next_run = time.time() + status.interval
+            self._running -= 1
+            self._cond.notify_all()
+        log.info(f"Job {job.name} took {seconds:.3f} seconds")
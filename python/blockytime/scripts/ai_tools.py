@@ -8,29 +8,61 @@ Commands:
     get-types           List all types (with categories and linked projects)
     get-projects        List all projects
     get-blocks          Get raw blocks for a date range
-    set-blocks          Upsert blocks (JSON via --data or stdin)
+    set-blocks          Upsert blocks (JSON, NDJSON or CSV via --data, --input or stdin)
     delete-blocks       Delete all blocks in a date range
     get-daily-summary   Compact human-readable ledger grouped by day
     get-active-days     List days that have at least one block
     get-stats           Aggregated hours per type/project for a date range
+    aggregate           Hours grouped by type, project, category and period
+    search-comments     Blocks whose comment matches words, best match first
+    export              Write blocks or rollups to an Arrow, .npz or CSV file
+    batch               Run a JSON list of commands, reads sharing one snapshot
+    serve               Run as a daemon on a Unix socket (or --stdio) so that
+                        ai_tools_client calls skip start-up; see ai_tools_server
 """
 
 import argparse
+import io
 import json
+import os
+import sqlite3
 import sys
+import textwrap
+import threading
+from contextlib import contextmanager
+from contextvars import ContextVar
 from datetime import datetime
-from typing import Any, Dict, List, Optional
+from typing import Any, BinaryIO, Dict, Iterator, List, Optional, TextIO, Tuple
 
 import pytz
-from blockytime.constants import DEFAULT_TZ
-from blockytime.dtos.block_dto import BlockDTO
-from blockytime.dtos.project_dto import ProjectDTO
-from blockytime.dtos.type_dto import TypeDTO
-from blockytime.paths import DB_PATH
+from blockytime.calendarindex import Granularity, parse_local_date
+from blockytime.constants import BLOCK_PAGE_SIZE, CREATE_INDEXES, DEFAULT_TZ
+from blockytime.importer import (
+    DEFAULT_CHUNK_SIZE,
+    BlockImporter,
+    ImportFormat,
+    ImportProgress,
+    read_records,
+)
+from blockytime.interfaces.aggregationserviceinterface import Dimension
+from blockytime.interfaces.exportserviceinterface import ExportFormat
+from blockytime.models.block import ensure_indexes
+from blockytime.paths import AI_TOOLS_SOCKET_PATH, DB_PATH, ensure_data_paths
+from blockytime.search import MAX_RESULTS, CommentIndex
+from blockytime.services.aggregationservice import AggregationService
 from blockytime.services.blockservice import BlockService
+from blockytime.services.exportservice import (
+    DEFAULT_EXPORT_CHUNK_SIZE,
+    ExportService,
+    default_export_format,
+)
 from blockytime.services.projectservice import ProjectService
+from blockytime.services.searchservice import SearchService
 from blockytime.services.typeservice import TypeService
+from blockytime.timezones import zone_name
 from sqlalchemy import create_engine
+from sqlalchemy.engine import Engine
+from sqlalchemy.pool import StaticPool
 
 DEFAULT_TIMEZONE = DEFAULT_TZ
 
@@ -60,7 +92,9 @@ COMMANDS_DESCRIPTION = [
         "name": "get-blocks",
         "description": (
             "Return raw blocks (15-min time entries) for a date range. "
-            "Each block has a unix timestamp, type, project, and comment."
+            "Each block has a unix timestamp, type, project, and comment. With "
+            "--limit or --after, returns one page instead: {blocks, next}, where "
+            "next is the --after of the following page (null on the last one)."
         ),
         "args": [
             {"name": "--start-date", "format": "YYYY-MM-DD", "required": True},
@@ -69,6 +103,20 @@ COMMANDS_DESCRIPTION = [
                 "format": "YYYY-MM-DD (exclusive)",
                 "required": True,
             },
+            {
+                "name": "--limit",
+                "format": "int",
+                "required": False,
+                "note": "If given, return one page of at most this many blocks as "
+                "{blocks, next} instead of the whole range",
+            },
+            {
+                "name": "--after",
+                "format": "unix timestamp",
+                "required": False,
+                "note": "If given, return one page as {blocks, next}, of "
+                f"{BLOCK_PAGE_SIZE} blocks unless --limit is given",
+            },
             {"name": "--timezone", "default": DEFAULT_TIMEZONE, "required": False},
         ],
     },
@@ -76,16 +124,40 @@ COMMANDS_DESCRIPTION = [
         "name": "set-blocks",
         "description": (
             "Upsert (create or overwrite) blocks. "
-            "Supply a JSON array via --data or pipe to stdin. "
+            "Supply a JSON array, NDJSON or CSV via --data, --input or stdin. "
             'Each item: {"date": "YYYY-MM-DDTHH:MM" or unix_ts, '
-            '"type_uid": int, "project_uid": int|null, "comment": str}'
+            '"type_uid": int, "project_uid": int|null, "comment": str}. '
+            "Records with unknown type or project uids are rejected and reported; "
+            "the rest are committed in chunks."
         ),
         "args": [
             {
                 "name": "--data",
-                "format": "JSON string",
+                "format": "string in --format",
+                "required": False,
+                "note": "If omitted, input is read from --input or stdin",
+            },
+            {
+                "name": "--input",
+                "format": "file path",
+                "required": False,
+            },
+            {
+                "name": "--format",
+                "default": ImportFormat.JSON.value,
+                "required": False,
+                "note": "json, ndjson or csv (header: date,type_uid,project_uid,comment)",
+            },
+            {
+                "name": "--chunk-size",
+                "default": DEFAULT_CHUNK_SIZE,
                 "required": False,
-                "note": "If omitted, JSON is read from stdin",
+                "note": "Blocks committed per transaction",
+            },
+            {
+                "name": "--progress",
+                "required": False,
+                "note": "Flag; report progress on stderr after each chunk",
             },
             {
                 "name": "--timezone",
@@ -171,28 +243,193 @@ COMMANDS_DESCRIPTION = [
             {"name": "--timezone", "default": DEFAULT_TIMEZONE, "required": False},
         ],
     },
+    {
+        "name": "aggregate",
+        "description": (
+            "Return blocks and hours grouped by any combination of type, project "
+            "and category, and optionally by local day, week or month, computed "
+            "in one query. Rows carry <dimension>_uid and <dimension> (name) for "
+            "each group, period_start with --bucket, blocks and hours, sorted by "
+            "period, then hours descending. --top keeps the top rows of each "
+            "period; --exclude-hidden leaves out blocks of hidden types."
+        ),
+        "args": [
+            {"name": "--start-date", "format": "YYYY-MM-DD", "required": True},
+            {
+                "name": "--end-date",
+                "format": "YYYY-MM-DD (exclusive)",
+                "required": True,
+            },
+            {
+                "name": "--group-by",
+                "format": "TYPE | PROJECT | CATEGORY [...]",
+                "required": False,
+            },
+            {"name": "--bucket", "format": "DAY | WEEK | MONTH", "required": False},
+            {"name": "--type-uids", "format": "int [int ...]", "required": False},
+            {"name": "--exclude-hidden", "format": "flag", "required": False},
+            {"name": "--top", "format": "int", "required": False},
+            {"name": "--timezone", "default": DEFAULT_TIMEZONE, "required": False},
+        ],
+    },
+    {
+        "name": "search-comments",
+        "description": (
+            "Full-text search of block comments. Returns blocks whose comment "
+            "contains every word of the query, each word matching the start of a "
+            "word (e.g. 'dent' finds 'dentist'), best match first, with the "
+            "block's bm25 rank (lower is better). Dates are optional filters."
+        ),
+        "args": [
+            {"name": "--query", "format": "words", "required": True},
+            {"name": "--start-date", "format": "YYYY-MM-DD", "required": False},
+            {
+                "name": "--end-date",
+                "format": "YYYY-MM-DD (exclusive)",
+                "required": False,
+            },
+            {"name": "--limit", "default": 50, "required": False},
+            {"name": "--timezone", "default": DEFAULT_TIMEZONE, "required": False},
+        ],
+    },
+    {
+        "name": "export",
+        "description": (
+            "Write blocks for a date range to a columnar file for offline analysis: "
+            "Arrow IPC (if pyarrow is installed), NumPy .npz, or CSV. Columns are "
+            "date (unix ts), type_uid, project_uid (0 = none) and comment. With "
+            "--rollup, writes period_start, type_uid, project_uid, blocks and hours "
+            "per local day, week or month instead."
+        ),
+        "args": [
+            {"name": "--start-date", "format": "YYYY-MM-DD", "required": True},
+            {
+                "name": "--end-date",
+                "format": "YYYY-MM-DD (exclusive)",
+                "required": True,
+            },
+            {"name": "--output", "format": "path, or - for stdout", "required": True},
+            {
+                "name": "--format",
+                "format": "arrow | npz | csv",
+                "required": False,
+                "note": "Defaults to arrow if pyarrow is installed, else npz",
+            },
+            {"name": "--rollup", "format": "DAY | WEEK | MONTH", "required": False},
+            {"name": "--timezone", "default": DEFAULT_TIMEZONE, "required": False},
+        ],
+    },
+    {
+        "name": "batch",
+        "description": (
+            "Run several commands in one call and return their results as a JSON "
+            "array, in order. Input (via --data, --input or stdin) is a JSON array "
+            "whose items are either argv lists, e.g. "
+            '["get-stats", "--start-date", "2025-01-01", "--end-date", '
+            '"2025-02-01"], or objects like {"command": "get-stats", "args": '
+            '{"start_date": "2025-01-01", "end_date": "2025-02-01", '
+            '"type_uids": [1, 2]}}. Consecutive read commands see one consistent '
+            "snapshot of the database; set-blocks and delete-blocks are applied "
+            "in order and visible to the reads after them. Each result has "
+            "command, exit_code, output and error."
+        ),
+        "args": [
+            {
+                "name": "--data",
+                "format": "JSON array of commands",
+                "required": False,
+                "note": "If omitted, read from --input or stdin",
+            },
+            {"name": "--input", "format": "path", "required": False},
+            {
+                "name": "--stop-on-error",
+                "format": "flag",
+                "required": False,
+                "note": "Skip the remaining commands after one fails",
+            },
+        ],
+    },
 ]
 
+# Commands that modify DB.db; every other batch command only reads it
+WRITE_COMMANDS = {"set-blocks", "delete-blocks"}
+# Commands that cannot be nested inside a batch
+NON_BATCH_COMMANDS = {"batch", "serve"}
 
-def get_engine() -> Any:
-    return create_engine(f"sqlite:///{DB_PATH}")
 
+_engine: Optional[Engine] = None
+_engine_key: Optional[Tuple[int, int]] = None
+_engine_lock = threading.Lock()
+# Set while a batch runs consecutive reads inside one read transaction; per
+# context, since the daemon runs commands in threads of their own
+_snapshot_engine: ContextVar[Optional[Engine]] = ContextVar(
+    "snapshot_engine", default=None
+)
+# Directory relative paths of the running command are resolved against
+_command_cwd: ContextVar[Optional[str]] = ContextVar("command_cwd", default=None)
 
-def parse_date(date_str: str, tz: Any) -> datetime:
-    """Parse YYYY-MM-DD to timezone-aware datetime at midnight."""
-    dt = datetime.strptime(date_str, "%Y-%m-%d")
-    localized: datetime = tz.localize(dt)
-    return localized
 
+def get_engine() -> Engine:
+    """Return the engine for DB_PATH.
+
+    The engine (and its pooled connections) is reused across commands run by the
+    daemon until the database file is replaced, e.g. by pull-db. Within a batch,
+    reads share the batch's read transaction (see open_snapshot) instead.
+    """
+    global _engine, _engine_key
+    snapshot = _snapshot_engine.get()
+    if snapshot is not None:
+        return snapshot
+    try:
+        st = os.stat(DB_PATH)
+        key: Optional[Tuple[int, int]] = (st.st_dev, st.st_ino)
+    except FileNotFoundError:
+        key = None
+    with _engine_lock:
+        if _engine is None or key != _engine_key:
+            if _engine is not None:
+                _engine.dispose()
+            ensure_data_paths()
+            _engine = create_engine(f"sqlite:///{DB_PATH}")
+            _engine_key = key
+            if CREATE_INDEXES and key is not None:
+                ensure_indexes(_engine)
+        return _engine
+
+
+class _SnapshotConnection(sqlite3.Connection):
+    """Connection whose read transaction outlives the sessions using it: their
+    commit and rollback are no-ops. Closing it ends the transaction."""
+
+    def commit(self) -> None:
+        pass
+
+    def rollback(self) -> None:
+        pass
 
-def parse_block_date(value: Any, tz: Any) -> int:
-    """Convert a block date (ISO string or unix int) to a unix timestamp int."""
-    if isinstance(value, (int, float)):
-        return int(value)
-    dt = datetime.fromisoformat(str(value))
-    if dt.tzinfo is None:
-        dt = tz.localize(dt)
-    return int(dt.timestamp())
+
+def open_snapshot() -> Engine:
+    """Engine over one connection to DB.db holding a read transaction, so that
+    every read through it sees the database as of now.
+
+    Nothing is copied, but writers wait for the transaction: dispose of the
+    engine, which closes the connection, before writing.
+    """
+    con = sqlite3.connect(
+        DB_PATH,
+        isolation_level=None,
+        check_same_thread=False,
+        factory=_SnapshotConnection,
+    )
+    con.execute("BEGIN")
+    # A deferred transaction takes its snapshot at the first read
+    con.execute("SELECT count(*) FROM sqlite_master").fetchone()
+    return create_engine("sqlite://", creator=lambda: con, poolclass=StaticPool)
+
+
+def parse_date(date_str: str, tz: Any) -> datetime:
+    """Parse YYYY-MM-DD to timezone-aware datetime at midnight."""
+    return parse_local_date(date_str, zone_name(tz))
 
 
 # ---------------------------------------------------------------------------
@@ -219,43 +456,60 @@ def cmd_get_blocks(args: argparse.Namespace) -> None:
     start = parse_date(args.start_date, tz)
     end = parse_date(args.end_date, tz)
     service = BlockService(get_engine())
-    blocks = service.get_blocks(start, end)
-    print(json.dumps([b.to_dict() for b in blocks], indent=2))
+    if args.limit is not None or args.after is not None:
+        page = service.get_blocks_page(
+            start, end, args.limit or BLOCK_PAGE_SIZE, args.after
+        )
+        print(json.dumps(page.to_dict(), indent=2))
+        return
+    # The same text as json.dumps(blocks, indent=2), a page in memory at a time
+    first = True
+    for blocks in service.iter_blocks(start, end):
+        for b in blocks:
+            print("[" if first else ",")
+            print(textwrap.indent(json.dumps(b.to_dict(), indent=2), "  "), end="")
+            first = False
+    print("[]" if first else "\n]")
 
 
 def cmd_set_blocks(args: argparse.Namespace) -> None:
     if args.data:
-        data: List[Dict[str, Any]] = json.loads(args.data)
+        stream: TextIO = io.StringIO(args.data)
+    elif args.input:
+        stream = open(command_path(args.input), encoding="utf-8", newline="")
     else:
-        data = json.load(sys.stdin)
-
-    tz = pytz.timezone(args.timezone)
-
-    block_dtos: List[BlockDTO] = []
-    for item in data:
-        date_ts = parse_block_date(item["date"], tz)
-        type_uid: int = int(item["type_uid"])
-        project_uid: Optional[int] = item.get("project_uid") or None
-        block_dtos.append(
-            BlockDTO(
-                date=date_ts,
-                type_=TypeDTO(uid=type_uid),
-                project=(
-                    ProjectDTO(uid=project_uid) if project_uid is not None else None
-                ),
-                comment=item.get("comment", ""),
-                operation="upsert",
-            )
-        )
+        stream = sys.stdin
 
-    service = BlockService(get_engine())
-    if service.update_blocks(block_dtos):
-        print(json.dumps({"status": "ok", "upserted": len(block_dtos)}))
-    else:
+    def report(progress: ImportProgress) -> None:
         print(
-            json.dumps({"status": "error", "message": "update_blocks failed"}),
+            f"set-blocks: {progress.read} read, {progress.imported} imported, "
+            f"{progress.rejected} rejected in {progress.elapsed:.1f}s",
             file=sys.stderr,
         )
+
+    engine = get_engine()
+    importer = BlockImporter(
+        engine,
+        BlockService(engine),
+        timezone=args.timezone,
+        chunk_size=args.chunk_size,
+        progress=report if args.progress else None,
+    )
+    try:
+        result = importer.run(read_records(stream, ImportFormat(args.format)))
+    finally:
+        if stream is not sys.stdin:
+            stream.close()
+
+    output: Dict[str, Any] = {
+        "status": "ok" if result.rejected == 0 else "partial",
+        "upserted": result.imported,
+    }
+    if result.rejected:
+        output["rejected"] = result.rejected
+        output["errors"] = result.errors
+    print(json.dumps(output))
+    if result.rejected:
         sys.exit(1)
 
 
@@ -272,26 +526,8 @@ def cmd_get_daily_summary(args: argparse.Namespace) -> None:
     tz = pytz.timezone(args.timezone)
     start = parse_date(args.start_date, tz)
     end = parse_date(args.end_date, tz)
-    service = BlockService(get_engine())
-    blocks = service.get_blocks(start, end)
-
-    summary: Dict[str, List[Dict[str, Any]]] = {}
-    for b in blocks:
-        dt = datetime.fromtimestamp(b.date, tz=tz)
-        day_str = dt.strftime("%Y-%m-%d")
-        if day_str not in summary:
-            summary[day_str] = []
-        summary[day_str].append(
-            {
-                "time": dt.strftime("%H:%M"),
-                "type_uid": b.type_.uid if b.type_ else None,
-                "type": b.type_.name if b.type_ else None,
-                "project_uid": b.project.uid if b.project else None,
-                "project": b.project.name if b.project else None,
-                "comment": b.comment or "",
-            }
-        )
-
+    service = AggregationService(get_engine(), args.timezone)
+    summary = service.get_daily_ledger(start.date(), end.date())
     print(json.dumps(summary, indent=2))
 
 
@@ -299,47 +535,187 @@ def cmd_get_active_days(args: argparse.Namespace) -> None:
     tz = pytz.timezone(args.timezone)
     start = parse_date(args.start_date, tz)
     end = parse_date(args.end_date, tz)
-    service = BlockService(get_engine())
-    blocks = service.get_blocks(start, end)
+    service = AggregationService(get_engine(), args.timezone)
+    days = service.get_active_days(start.date(), end.date(), args.type_uid)
+    print(json.dumps(days, indent=2))
 
-    days: set[str] = set()
-    for b in blocks:
-        if args.type_uid is not None and b.type_ and b.type_.uid != args.type_uid:
-            continue
-        dt = datetime.fromtimestamp(b.date, tz=tz)
-        days.add(dt.strftime("%Y-%m-%d"))
 
-    print(json.dumps(sorted(days), indent=2))
+def cmd_get_stats(args: argparse.Namespace) -> None:
+    tz = pytz.timezone(args.timezone)
+    start = parse_date(args.start_date, tz)
+    end = parse_date(args.end_date, tz)
+    service = AggregationService(get_engine(), args.timezone)
+    result = service.get_totals(start.date(), end.date(), args.type_uids)
+    print(json.dumps(result, indent=2))
 
 
-def cmd_get_stats(args: argparse.Namespace) -> None:
+def cmd_aggregate(args: argparse.Namespace) -> None:
     tz = pytz.timezone(args.timezone)
     start = parse_date(args.start_date, tz)
     end = parse_date(args.end_date, tz)
-    service = BlockService(get_engine())
-    blocks = service.get_blocks(start, end)
+    service = AggregationService(get_engine(), args.timezone)
+    result = service.aggregate(
+        start.date(),
+        end.date(),
+        [Dimension(d) for d in args.group_by],
+        Granularity(args.bucket) if args.bucket else None,
+        args.type_uids,
+        not args.exclude_hidden,
+        args.top,
+    )
+    print(json.dumps(result, indent=2))
+
+
+def cmd_search_comments(args: argparse.Namespace) -> None:
+    tz = pytz.timezone(args.timezone)
+    start = parse_date(args.start_date, tz) if args.start_date else None
+    end = parse_date(args.end_date, tz) if args.end_date else None
+    service = SearchService(get_engine(), CommentIndex(DB_PATH))
+    matches = service.search_comments(args.query, start, end, args.limit)
+    print(json.dumps([m.to_dict() for m in matches], indent=2))
 
-    stats: Dict[tuple, Dict[str, Any]] = {}
-    for b in blocks:
-        type_uid = b.type_.uid if b.type_ else None
-        project_uid = b.project.uid if b.project else None
-        if args.type_uids and type_uid not in args.type_uids:
+
+def cmd_export(args: argparse.Namespace) -> None:
+    tz = pytz.timezone(args.timezone)
+    start = parse_date(args.start_date, tz)
+    end = parse_date(args.end_date, tz)
+    fmt = ExportFormat(args.format) if args.format else default_export_format()
+    rollup = Granularity(args.rollup) if args.rollup else None
+    service = ExportService(get_engine(), args.timezone)
+
+    if args.output == "-":
+        rows = service.export_blocks(
+            start.date(),
+            end.date(),
+            sys.stdout.buffer,
+            fmt,
+            rollup,
+            chunk_size=args.chunk_size,
+        )
+        sys.stdout.buffer.flush()
+    else:
+        with open(command_path(args.output), "wb") as out:
+            rows = service.export_blocks(
+                start.date(),
+                end.date(),
+                out,
+                fmt,
+                rollup,
+                chunk_size=args.chunk_size,
+            )
+
+    # The file itself may be going to stdout, so the summary goes to stderr there
+    print(
+        json.dumps(
+            {"status": "ok", "rows": rows, "format": fmt.value, "output": args.output}
+        ),
+        file=sys.stderr if args.output == "-" else sys.stdout,
+    )
+
+
+def batch_argv(item: Any) -> List[str]:
+    """Command line for one batch item, given as an argv list or command object."""
+    if isinstance(item, list) and item and all(isinstance(a, str) for a in item):
+        return item
+    if not isinstance(item, dict) or not isinstance(item.get("command"), str):
+        raise ValueError(
+            "each batch item must be an argv list or an object with a command"
+        )
+    argv = [item["command"]]
+    for key, value in (item.get("args") or {}).items():
+        flag = "--" + key.replace("_", "-")
+        if value is None or value is False:
             continue
-        key = (type_uid, project_uid)
-        if key not in stats:
-            stats[key] = {
-                "type_uid": type_uid,
-                "type": b.type_.name if b.type_ else None,
-                "project_uid": project_uid,
-                "project": b.project.name if b.project else None,
-                "blocks": 0,
-                "hours": 0.0,
-            }
-        stats[key]["blocks"] += 1
-        stats[key]["hours"] = round(stats[key]["blocks"] * 0.25, 2)
-
-    result = sorted(stats.values(), key=lambda x: -x["hours"])
-    print(json.dumps(result, indent=2))
+        if value is True:
+            argv.append(flag)
+        elif key == "data" and not isinstance(value, str):
+            argv += [flag, json.dumps(value)]
+        elif isinstance(value, list):
+            argv += [flag, *(str(v) for v in value)]
+        else:
+            argv += [flag, str(value)]
+    return argv
+
+
+def _batch_output(text: str) -> Any:
+    try:
+        return json.loads(text)
+    except ValueError:
+        return text or None
+
+
+def cmd_batch(args: argparse.Namespace) -> None:
+    if args.data:
+        items = json.loads(args.data)
+    elif args.input:
+        with open(command_path(args.input), encoding="utf-8") as f:
+            items = json.load(f)
+    else:
+        items = json.load(sys.stdin)
+    if not isinstance(items, list):
+        raise ValueError("expecting a JSON array of commands")
+
+    results: List[Dict[str, Any]] = []
+    failed = False
+    try:
+        for item in items:
+            try:
+                argv = batch_argv(item)
+                if argv[0] in NON_BATCH_COMMANDS:
+                    raise ValueError(f"{argv[0]} cannot be run inside a batch")
+            except ValueError as e:
+                results.append(
+                    {"command": None, "exit_code": 1, "output": None, "error": str(e)}
+                )
+                failed = True
+                continue
+            if failed and args.stop_on_error:
+                results.append({"command": argv[0], "skipped": True})
+                continue
+
+            # Reads share one snapshot until a write, which goes to DB.db itself
+            snapshot = _snapshot_engine.get()
+            if argv[0] in WRITE_COMMANDS:
+                if snapshot is not None:
+                    snapshot.dispose()
+                    _snapshot_engine.set(None)
+            elif snapshot is None:
+                _snapshot_engine.set(open_snapshot())
+
+            exit_code, stdout, stderr = run_command(argv)
+            failed = failed or exit_code != 0
+            results.append(
+                {
+                    "command": argv[0],
+                    "exit_code": exit_code,
+                    "output": _batch_output(stdout.decode("utf-8", errors="replace")),
+                    "error": _batch_output(stderr),
+                }
+            )
+    finally:
+        snapshot = _snapshot_engine.get()
+        if snapshot is not None:
+            snapshot.dispose()
+            _snapshot_engine.set(None)
+
+    print(json.dumps(results, indent=2))
+    if failed:
+        sys.exit(1)
+
+
+def cmd_serve(args: argparse.Namespace) -> None:
+    from blockytime.scripts.ai_tools_server import (
+        CommandDaemon,
+        serve_socket,
+        serve_stdio,
+    )
+
+    daemon = CommandDaemon(run_command)
+    get_engine()
+    if args.stdio:
+        serve_stdio(daemon, sys.stdin.buffer, sys.stdout.buffer)
+    else:
+        serve_socket(daemon, args.socket)
 
 
 # ---------------------------------------------------------------------------
@@ -367,12 +743,46 @@ def build_parser() -> argparse.ArgumentParser:
 
     p_get_blocks = sub.add_parser("get-blocks", help="Get blocks for a date range")
     add_date_range(p_get_blocks)
+    p_get_blocks.add_argument(
+        "--limit",
+        type=int,
+        default=None,
+        help="Return one page of at most this many blocks, instead of the range",
+    )
+    p_get_blocks.add_argument(
+        "--after",
+        type=int,
+        default=None,
+        help="Return the page after this date, the next of the previous page",
+    )
 
-    p_set_blocks = sub.add_parser("set-blocks", help="Upsert blocks from JSON")
+    p_set_blocks = sub.add_parser(
+        "set-blocks", help="Upsert blocks from JSON, NDJSON or CSV"
+    )
     p_set_blocks.add_argument(
         "--data",
         default=None,
-        help="JSON array of blocks; if omitted, read from stdin",
+        help="Blocks inline; if omitted, read from --input or stdin",
+    )
+    p_set_blocks.add_argument(
+        "--input", default=None, help="File to read blocks from instead of stdin"
+    )
+    p_set_blocks.add_argument(
+        "--format",
+        choices=[f.value for f in ImportFormat],
+        default=ImportFormat.JSON.value,
+        help="json (array), ndjson (one object per line) or csv (with header)",
+    )
+    p_set_blocks.add_argument(
+        "--chunk-size",
+        type=int,
+        default=DEFAULT_CHUNK_SIZE,
+        help="Blocks committed per transaction",
+    )
+    p_set_blocks.add_argument(
+        "--progress",
+        action="store_true",
+        help="Report progress on stderr after each chunk",
     )
     p_set_blocks.add_argument("--timezone", default=DEFAULT_TIMEZONE)
 
@@ -409,6 +819,114 @@ def build_parser() -> argparse.ArgumentParser:
         help="Only include these type UIDs",
     )
 
+    p_aggregate = sub.add_parser(
+        "aggregate", help="Hours grouped by type, project, category and period"
+    )
+    add_date_range(p_aggregate)
+    p_aggregate.add_argument(
+        "--group-by",
+        nargs="*",
+        type=str.upper,
+        choices=[d.value for d in Dimension],
+        default=[],
+        help="Dimensions to group by",
+    )
+    p_aggregate.add_argument(
+        "--bucket",
+        type=str.upper,
+        choices=[g.value for g in Granularity],
+        default=None,
+        help="Group by local day, week or month as well",
+    )
+    p_aggregate.add_argument(
+        "--type-uids",
+        nargs="*",
+        type=int,
+        default=None,
+        help="Only include these type UIDs",
+    )
+    p_aggregate.add_argument(
+        "--exclude-hidden",
+        action="store_true",
+        help="Leave out blocks of hidden types",
+    )
+    p_aggregate.add_argument(
+        "--top", type=int, default=None, help="Keep the top rows of each period"
+    )
+
+    p_search = sub.add_parser(
+        "search-comments", help="Blocks whose comment matches words"
+    )
+    p_search.add_argument("--query", required=True, help="Words to find")
+    p_search.add_argument("--start-date", default=None, help="Start date YYYY-MM-DD")
+    p_search.add_argument(
+        "--end-date", default=None, help="End date YYYY-MM-DD (exclusive)"
+    )
+    p_search.add_argument(
+        "--limit",
+        type=int,
+        default=50,
+        help=f"Maximum number of blocks, at most {MAX_RESULTS}",
+    )
+    p_search.add_argument("--timezone", default=DEFAULT_TIMEZONE)
+
+    p_export = sub.add_parser(
+        "export", help="Write blocks or rollups to an Arrow, .npz or CSV file"
+    )
+    add_date_range(p_export)
+    p_export.add_argument(
+        "--output", required=True, help="File to write, or - for stdout"
+    )
+    p_export.add_argument(
+        "--format",
+        choices=[f.value for f in ExportFormat],
+        default=None,
+        help="Defaults to arrow if pyarrow is installed, else npz",
+    )
+    p_export.add_argument(
+        "--rollup",
+        choices=[g.value for g in Granularity],
+        default=None,
+        help="Write per-period totals by type and project instead of blocks",
+    )
+    p_export.add_argument(
+        "--chunk-size",
+        type=int,
+        default=DEFAULT_EXPORT_CHUNK_SIZE,
+        help="Rows fetched from the database per batch",
+    )
+
+    p_batch = sub.add_parser(
+        "batch", help="Run a JSON list of commands and return all results"
+    )
+    p_batch.add_argument(
+        "--data",
+        default=None,
+        help="Commands inline; if omitted, read from --input or stdin",
+    )
+    p_batch.add_argument(
+        "--input", default=None, help="File to read commands from instead of stdin"
+    )
+    p_batch.add_argument(
+        "--stop-on-error",
+        action="store_true",
+        help="Skip the remaining commands after one fails",
+    )
+
+    p_serve = sub.add_parser(
+        "serve", help="Run as a daemon answering JSON-RPC requests"
+    )
+    p_serve.add_argument(
+        "--socket",
+        default=AI_TOOLS_SOCKET_PATH,
+        help="Unix socket to listen on (env BLOCKYTIME_AI_TOOLS_SOCKET)",
+    )
+    p_serve.add_argument(
+        "--stdio",
+        action="store_true",
+        help="Read requests from stdin and write responses to stdout instead",
+    )
+
     return parser
 
 
@@ -422,21 +940,137 @@ COMMAND_MAP = {
     "get-daily-summary": cmd_get_daily_summary,
     "get-active-days": cmd_get_active_days,
     "get-stats": cmd_get_stats,
+    "aggregate": cmd_aggregate,
+    "search-comments": cmd_search_comments,
+    "export": cmd_export,
+    "batch": cmd_batch,
+    "serve": cmd_serve,
 }
 
 
-def main() -> None:
-    parser = build_parser()
-    args = parser.parse_args()
-    handler = COMMAND_MAP.get(args.command)
-    if handler is None:
-        parser.print_help()
-        sys.exit(1)
+def dispatch(args: argparse.Namespace) -> int:
+    """Run the parsed command, returning its exit code.
+
+    Errors are reported as JSON on stderr; commands may still raise SystemExit.
+    """
+    handler = COMMAND_MAP[args.command]
     try:
         handler(args)
     except Exception as e:
         print(json.dumps({"status": "error", "message": str(e)}), file=sys.stderr)
-        sys.exit(1)
+        return 1
+    return 0
+
+
+class _CommandStream:
+    """Stands in for sys.stdin, sys.stdout or sys.stderr: forwards to the
+    stream of the command running in the current context, if any, and to the
+    original stream otherwise."""
+
+    def __init__(self, name: str, original: Any):
+        self.original = original
+        self.current: ContextVar[Optional[Any]] = ContextVar(
+            f"command_{name}", default=None
+        )
+
+    def _stream(self) -> Any:
+        stream = self.current.get()
+        return self.original if stream is None else stream
+
+    def __getattr__(self, name: str) -> Any:
+        return getattr(self._stream(), name)
+
+    def __iter__(self) -> Iterator[str]:
+        return iter(self._stream())
+
+
+_STREAM_NAMES = ("stdin", "stdout", "stderr")
+_streams_lock = threading.Lock()
+
+
+@contextmanager
+def command_streams(stdin: TextIO, stdout: TextIO, stderr: TextIO) -> Iterator[None]:
+    """Make sys.stdin, sys.stdout and sys.stderr the given streams for the
+    block, in the calling thread only.
+
+    sys's streams are replaced once by _CommandStream stand-ins, so commands
+    running at the same time in other threads keep their own.
+    """
+    with _streams_lock:
+        proxies: List[_CommandStream] = []
+        for name in _STREAM_NAMES:
+            proxy = getattr(sys, name)
+            if not isinstance(proxy, _CommandStream):
+                proxy = _CommandStream(name, proxy)
+                setattr(sys, name, proxy)
+            proxies.append(proxy)
+    tokens = [
+        proxy.current.set(stream)
+        for proxy, stream in zip(proxies, (stdin, stdout, stderr))
+    ]
+    try:
+        yield
+    finally:
+        for proxy, token in zip(proxies, tokens):
+            proxy.current.reset(token)
+
+
+def command_path(path: str) -> str:
+    """path relative to the directory the command was run from (see
+    run_command); "-" and absolute paths are returned as they are."""
+    cwd = _command_cwd.get()
+    if path == "-" or cwd is None:
+        return path
+    return os.path.join(cwd, path)
+
+
+def run_command(
+    argv: List[str],
+    stdin: Optional[str] = None,
+    stdout: Optional[BinaryIO] = None,
+    stderr: Optional[TextIO] = None,
+    cwd: Optional[str] = None,
+) -> Tuple[int, bytes, str]:
+    """Run one command line in this process, in the calling thread.
+
+    Output goes to stdout and stderr as it is written, if given, and is
+    captured otherwise. Relative paths in argv are resolved against cwd, if
+    given. Commands may run in several threads at once (see ai_tools_server):
+    each sees its own sys.stdin, sys.stdout and sys.stderr. Returns
+    (exit_code, stdout, stderr), with whatever was captured; stdout is bytes
+    since export may write binary files to it.
+    """
+    captured_stdout = io.BytesIO()
+    captured_stderr = io.StringIO()
+    stdout_text = io.TextIOWrapper(
+        captured_stdout if stdout is None else stdout,
+        encoding="utf-8",
+        write_through=True,
+    )
+    cwd_token = _command_cwd.set(cwd) if cwd is not None else None
+    try:
+        with command_streams(
+            io.StringIO(stdin or ""),
+            stdout_text,
+            captured_stderr if stderr is None else stderr,
+        ):
+            try:
+                exit_code = dispatch(build_parser().parse_args(argv))
+            except SystemExit as e:
+                exit_code = e.code if isinstance(e.code, int) else int(bool(e.code))
+    finally:
+        if cwd_token is not None:
+            _command_cwd.reset(cwd_token)
+        stdout_text.flush()
+        # Leaves stdout open for the caller
+        stdout_text.detach()
+    return exit_code, captured_stdout.getvalue(), captured_stderr.getvalue()
+
+
+def main() -> None:
+    parser = build_parser()
+    args = parser.parse_args()
+    sys.exit(dispatch(args))
 
 
 if __name__ == "__main__":
@@ -0,0 +1,144 @@
+"""Thin client for the ai_tools daemon.
+
+Usage:
+    python -m python.blockytime.scripts.ai_tools_client <command> [args]
+
+Forwards the command line to a running ``ai_tools serve`` over its Unix socket
+and relays its stdout, stderr and exit code, so each call skips interpreter
+start-up, imports and engine creation. Falls back to running the command in
+process when no daemon is listening.
+
+The wire protocol is newline-delimited JSON-RPC 2.0. Methods:
+
+    run       params {"argv": [...], "stdin": str | null, "cwd": str}
+              result {"exit_code": int}
+    ping      result {"pid": int, "uptime": float, "requests": int}
+    shutdown  result null
+
+While a command runs, the daemon sends its output ahead of the result as
+notifications:
+
+    output    params {"stream": "stdout" | "stderr", "data": str,
+                      "encoding": "utf-8" | "base64"}
+
+This module only depends on the standard library so that it starts quickly.
+"""
+
+import base64
+import json
+import os
+import socket
+import sys
+from typing import Any, BinaryIO, Callable, Dict, List, Optional, Tuple
+
+from blockytime.paths import AI_TOOLS_SOCKET_PATH
+
+# Commands that read their input from stdin when given no --data/--input
+STDIN_COMMANDS = {"set-blocks", "batch"}
+
+
+class DaemonError(Exception):
+    """The daemon answered with a JSON-RPC error."""
+
+
+def read_message(rfile: BinaryIO) -> Optional[Dict[str, Any]]:
+    line = rfile.readline()
+    if not line:
+        return None
+    message: Dict[str, Any] = json.loads(line)
+    return message
+
+
+def write_message(wfile: BinaryIO, message: Dict[str, Any]) -> None:
+    wfile.write(json.dumps(message).encode("utf-8") + b"\n")
+    wfile.flush()
+
+
+def encode_output(data: bytes) -> Tuple[str, str]:
+    """Return (text, encoding) for command output, base64 if it is not UTF-8."""
+    try:
+        return data.decode("utf-8"), "utf-8"
+    except UnicodeDecodeError:
+        return base64.b64encode(data).decode("ascii"), "base64"
+
+
+def decode_output(text: str, encoding: str) -> bytes:
+    if encoding == "base64":
+        return base64.b64decode(text)
+    return text.encode("utf-8")
+
+
+def call(
+    method: str,
+    params: Optional[Dict[str, Any]] = None,
+    path: str = AI_TOOLS_SOCKET_PATH,
+    on_output: Optional[Callable[[str, bytes], None]] = None,
+) -> Any:
+    """Send one JSON-RPC request to the daemon and return its result.
+
+    Output notifications are passed to on_output(stream, data) as they
+    arrive. Raises OSError if no daemon is listening on path, DaemonError if
+    the request failed or the connection was lost.
+    """
+    with socket.socket(socket.AF_UNIX, socket.SOCK_STREAM) as sock:
+        sock.connect(path)
+        request = {"jsonrpc": "2.0", "id": 1, "method": method, "params": params or {}}
+        try:
+            sock.sendall(json.dumps(request).encode("utf-8") + b"\n")
+            with sock.makefile("rb") as f:
+                response = read_message(f)
+                while response is not None and "method" in response:
+                    if on_output is not None and response["method"] == "output":
+                        output = response["params"]
+                        on_output(
+                            output["stream"],
+                            decode_output(output["data"], output["encoding"]),
+                        )
+                    response = read_message(f)
+        except OSError as e:
+            # The command may have run, so it must not be run again
+            raise DaemonError(f"lost the connection to the daemon: {e}") from e
+    if response is None:
+        raise DaemonError("daemon closed the connection")
+    if response.get("error"):
+        raise DaemonError(response["error"].get("message"))
+    return response.get("result")
+
+
+def reads_stdin(argv: List[str]) -> bool:
+    return (
+        bool(argv)
+        and argv[0] in STDIN_COMMANDS
+        and not any(arg.startswith(("--data", "--input")) for arg in argv)
+    )
+
+
+def write_output(stream: str, data: bytes) -> None:
+    out = sys.stdout.buffer if stream == "stdout" else sys.stderr.buffer
+    out.write(data)
+    out.flush()
+
+
+def main() -> None:
+    argv = sys.argv[1:]
+    stdin = sys.stdin.read() if reads_stdin(argv) else None
+    try:
+        result = call(
+            "run",
+            {"argv": argv, "stdin": stdin, "cwd": os.getcwd()},
+            on_output=write_output,
+        )
+        exit_code = result["exit_code"]
+    except OSError:
+        # No daemon listening: pay the start-up cost and run in process
+        from blockytime.scripts.ai_tools import run_command
+
+        exit_code, _, _ = run_command(argv, stdin, sys.stdout.buffer, sys.stderr)
+    except DaemonError as e:
+        print(json.dumps({"status": "error", "message": str(e)}), file=sys.stderr)
+        sys.exit(1)
+    sys.exit(exit_code)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,214 @@
+"""Long-lived ai_tools daemon (``ai_tools serve``).
+
+Keeps the interpreter, imports, SQLAlchemy engine and service caches warm
+between calls. Requests are JSON-RPC 2.0, one per line, either over a Unix
+socket or over stdin/stdout; see ai_tools_client for the protocol. A command's
+output is sent as it is written, in chunks of up to OUTPUT_CHUNK_SIZE bytes,
+so long listings and progress reach the client while it runs. Each client
+connection is served by a thread of its own, and commands from several
+clients run at the same time: each gets its own stdin, stdout and stderr, and
+resolves relative paths against the client's directory (see
+ai_tools.run_command), so a slow command holds up only its own client.
+"""
+
+import io
+import json
+import logging
+import os
+import socket
+import socketserver
+import threading
+import time
+from functools import partial
+from typing import Any, BinaryIO, Callable, Dict, List, Optional, TextIO, Tuple
+
+from blockytime.scripts.ai_tools_client import encode_output, write_message
+
+log = logging.getLogger(__name__)
+
+# (argv, stdin, stdout, stderr, cwd) -> (exit_code, captured stdout, stderr)
+RunCommand = Callable[
+    [List[str], Optional[str], BinaryIO, TextIO, Optional[str]],
+    Tuple[int, bytes, str],
+]
+# Sends one JSON-RPC message to the client
+Send = Callable[[Dict[str, Any]], None]
+
+# Buffered stdout is sent in chunks of this size; stderr line by line
+OUTPUT_CHUNK_SIZE = 64 * 1024
+
+PARSE_ERROR = -32700
+INVALID_REQUEST = -32600
+METHOD_NOT_FOUND = -32601
+INVALID_PARAMS = -32602
+
+
+class _OutputStream(io.RawIOBase):
+    """Sends what is written to it as output notifications of stream."""
+
+    def __init__(self, send: Send, stream: str):
+        self._send = send
+        self._stream = stream
+
+    def writable(self) -> bool:
+        return True
+
+    def write(self, data: Any) -> int:
+        chunk = bytes(data)
+        if chunk:
+            text, encoding = encode_output(chunk)
+            self._send(
+                {
+                    "jsonrpc": "2.0",
+                    "method": "output",
+                    "params": {
+                        "stream": self._stream,
+                        "data": text,
+                        "encoding": encoding,
+                    },
+                }
+            )
+        return len(chunk)
+
+
+class CommandDaemon:
+    def __init__(self, run_command: RunCommand):
+        self._run_command = run_command
+        self._started = time.monotonic()
+        self._requests = 0
+        self._requests_lock = threading.Lock()
+        self.stopping = threading.Event()
+
+    def _run(self, params: Dict[str, Any], send: Send) -> Dict[str, Any]:
+        argv = params.get("argv")
+        if not isinstance(argv, list) or not all(isinstance(a, str) for a in argv):
+            raise ValueError("argv must be a list of strings")
+        if argv and argv[0] == "serve":
+            raise ValueError("cannot run serve inside the daemon")
+        cwd = params.get("cwd")
+        stdout = io.BufferedWriter(_OutputStream(send, "stdout"), OUTPUT_CHUNK_SIZE)
+        stderr = io.TextIOWrapper(
+            io.BufferedWriter(_OutputStream(send, "stderr")),
+            encoding="utf-8",
+            line_buffering=True,
+        )
+        try:
+            exit_code, _, _ = self._run_command(
+                argv, params.get("stdin"), stdout, stderr, cwd
+            )
+        finally:
+            stdout.flush()
+            stderr.flush()
+        return {"exit_code": exit_code}
+
+    def handle(self, message: Any, send: Send) -> Dict[str, Any]:
+        """Answer one decoded JSON-RPC request; output notifications of a run
+        go to send before the answer."""
+        request_id = message.get("id") if isinstance(message, dict) else None
+
+        def error(code: int, text: str) -> Dict[str, Any]:
+            return {
+                "jsonrpc": "2.0",
+                "id": request_id,
+                "error": {"code": code, "message": text},
+            }
+
+        if not isinstance(message, dict) or not isinstance(message.get("method"), str):
+            return error(INVALID_REQUEST, "invalid request")
+        method = message["method"]
+        params = message.get("params") or {}
+        with self._requests_lock:
+            self._requests += 1
+        started = time.monotonic()
+        try:
+            if method == "run":
+                result: Any = self._run(params, send)
+            elif method == "ping":
+                result = {
+                    "pid": os.getpid(),
+                    "uptime": round(time.monotonic() - self._started, 3),
+                    "requests": self._requests,
+                }
+            elif method == "shutdown":
+                self.stopping.set()
+                result = None
+            else:
+                return error(METHOD_NOT_FOUND, f"unknown method {method}")
+        except ValueError as e:
+            return error(INVALID_PARAMS, str(e))
+        finally:
+            log.info(f"{method} took {time.monotonic() - started:.3f} seconds")
+        return {"jsonrpc": "2.0", "id": request_id, "result": result}
+
+    def handle_line(self, line: bytes, send: Send) -> Dict[str, Any]:
+        try:
+            message = json.loads(line)
+        except ValueError as e:
+            return {
+                "jsonrpc": "2.0",
+                "id": None,
+                "error": {"code": PARSE_ERROR, "message": str(e)},
+            }
+        return self.handle(message, send)
+
+
+class _Handler(socketserver.StreamRequestHandler):
+    server: "_Server"
+
+    def handle(self) -> None:
+        send = partial(write_message, self.wfile)  # type: ignore[arg-type]
+        for line in self.rfile:
+            if not line.strip():
+                continue
+            send(self.server.daemon.handle_line(line, send))
+            if self.server.daemon.stopping.is_set():
+                # shutdown() blocks until serve_forever returns, so not from here
+                threading.Thread(target=self.server.shutdown, daemon=True).start()
+                return
+
+
+class _Server(socketserver.ThreadingUnixStreamServer):
+    daemon_threads = True
+
+    def __init__(self, path: str, daemon: CommandDaemon):
+        self.daemon = daemon
+        super().__init__(path, _Handler)
+
+
+def _remove_stale_socket(path: str) -> None:
+    if not os.path.exists(path):
+        return
+    with socket.socket(socket.AF_UNIX, socket.SOCK_STREAM) as sock:
+        try:
+            sock.connect(path)
+        except OSError:
+            os.unlink(path)
+            return
+    raise RuntimeError(f"An ai_tools daemon is already listening on {path}")
+
+
+def serve_socket(daemon: CommandDaemon, path: str) -> None:
+    """Serve requests on a Unix socket (readable by the current user only)."""
+    os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+    _remove_stale_socket(path)
+    server = _Server(path, daemon)
+    os.chmod(path, 0o600)
+    log.info(f"ai_tools daemon listening on {path} (pid {os.getpid()})")
+    try:
+        server.serve_forever()
+    finally:
+        server.server_close()
+        if os.path.exists(path):
+            os.unlink(path)
+        log.info("ai_tools daemon stopped")
+
+
+def serve_stdio(daemon: CommandDaemon, rfile: BinaryIO, wfile: BinaryIO) -> None:
+    """Serve requests read from rfile, writing responses to wfile, until EOF."""
+    send = partial(write_message, wfile)
+    for line in rfile:
+        if not line.strip():
+            continue
+        send(daemon.handle_line(line, send))
+        if daemon.stopping.is_set():
+            return
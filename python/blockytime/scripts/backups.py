@@ -0,0 +1,61 @@
+"""List, restore and prune snapshots in the backup store next to DB.db.
+
+Usage:
+    python -m python.blockytime.scripts.backups list [--label LABEL]
+    python -m python.blockytime.scripts.backups restore ID [--to PATH]
+    python -m python.blockytime.scripts.backups snapshot [--label LABEL]
+    python -m python.blockytime.scripts.backups prune
+
+ID may be any unique prefix of a snapshot id. restore writes to DB.db.restored
+unless --to is given; stop the server before restoring over DB.db itself.
+"""
+
+import argparse
+import logging
+import os
+
+from blockytime.backup import PULL, RETENTION, backup_database, open_store
+
+OUTPUT_DIR = os.path.join(os.path.dirname(__file__), "..", "data", "dynamic")
+OUTPUT_PATH = os.path.join(OUTPUT_DIR, "DB.db")
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="Manage DB.db backups")
+    parser.add_argument("--db", default=OUTPUT_PATH, help="Database next to the store")
+    commands = parser.add_subparsers(dest="command", required=True)
+    list_parser = commands.add_parser("list", help="Snapshots, newest first")
+    list_parser.add_argument("--label", choices=sorted(RETENTION))
+    restore_parser = commands.add_parser("restore", help="Rebuild a snapshot's file")
+    restore_parser.add_argument("id")
+    restore_parser.add_argument("--to", help="Output path, default DB.db.restored")
+    snapshot_parser = commands.add_parser("snapshot", help="Back up DB.db now")
+    snapshot_parser.add_argument("--label", choices=sorted(RETENTION), default=PULL)
+    commands.add_parser("prune", help="Apply the retention policies")
+    args = parser.parse_args()
+
+    logging.basicConfig(level=logging.WARNING)
+    store = open_store(args.db)
+    if args.command == "list":
+        for s in store.snapshots(args.label):
+            summary = s.summary()
+            print(
+                f"{s.id}  {summary['created']}  {s.label:<8}  "
+                f"{s.size / 1024:>9.1f} KB  {len(s.chunks)} chunks"
+            )
+        print(f"Store uses {store.disk_usage() / 1024:.1f} KB in {store.root}")
+    elif args.command == "restore":
+        dest = args.to or f"{args.db}.restored"
+        snapshot = store.restore(args.id, dest)
+        print(f"Restored {snapshot.id} to {os.path.abspath(dest)}")
+    elif args.command == "snapshot":
+        snapshot = backup_database(store, args.db, args.label)
+        print(f"Backed up {os.path.abspath(args.db)} as {snapshot.id}")
+    else:
+        for label, policy in RETENTION.items():
+            removed = store.prune(label, policy)
+            print(f"{label}: removed {len(removed)} snapshots")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,422 @@
+"""Benchmarks of the services and HTTP routes on synthetic multi-year databases.
+
+Usage:
+    python -m python.blockytime.scripts.bench [--years 1 5 20] [--repeat 5]
+        [--only PATTERN ...] [--baseline PATH] [--save-baseline] [--check]
+
+Databases are generated by blockytime.synthetic (96 blocks a day, real schema)
+and cached under --cache-dir; every run works on a fresh copy, so write
+benchmarks never change the cached database. Each benchmark runs once to warm
+up and then --repeat times, and the median and minimum are reported next to
+the stored baseline (data/bench_baselines.json by default). A benchmark counts
+as a regression when its median is more than --tolerance slower than the
+baseline and at least MIN_REGRESSION_SECONDS slower in absolute terms; with
+--check the exit code is 1 if there is any.
+
+Logging is raised to WARNING so that per-block log lines do not dominate.
+"""
+
+import argparse
+import fnmatch
+import json
+import logging
+import os
+import platform
+import shutil
+import statistics
+import sys
+import tempfile
+import time
+from dataclasses import dataclass
+from datetime import date, datetime, timedelta
+from typing import Any, Callable, Dict, List, Optional, Sequence
+
+from blockytime.constants import CREATE_INDEXES, DEFAULT_TZ
+from blockytime.paths import DYNAMIC_PATH
+from blockytime.synthetic import DEFAULT_START, generate_database
+from blockytime.synthetic import VERSION as SYNTHETIC_VERSION
+
+BASELINE_PATH = os.path.join(
+    os.path.dirname(__file__), "..", "data", "bench_baselines.json"
+)
+CACHE_DIR = os.path.join(DYNAMIC_PATH, "bench")
+DEFAULT_YEARS = [1, 5]
+DEFAULT_REPEAT = 5
+DEFAULT_TOLERANCE = 0.25
+# Slowdowns smaller than this are noise, whatever the ratio
+MIN_REGRESSION_SECONDS = 0.002
+
+
+@dataclass
+class Benchmark:
+    name: str
+    run: Callable[[], Any]
+    # Called before every run, untimed (e.g. to drop a cache)
+    setup: Optional[Callable[[], None]] = None
+
+
+@dataclass
+class Timing:
+    median: float
+    min: float
+    runs: int
+
+    def to_dict(self) -> Dict[str, Any]:
+        return {
+            "median": round(self.median, 6),
+            "min": round(self.min, 6),
+            "runs": self.runs,
+        }
+
+
+def measure(benchmark: Benchmark, repeat: int) -> Timing:
+    samples: List[float] = []
+    for i in range(repeat + 1):
+        if benchmark.setup is not None:
+            benchmark.setup()
+        started = time.perf_counter()
+        benchmark.run()
+        if i > 0:  # the first run warms up caches and lazy imports
+            samples.append(time.perf_counter() - started)
+    return Timing(statistics.median(samples), min(samples), len(samples))
+
+
+def synthetic_database(years: int, cache_dir: str = CACHE_DIR, seed: int = 0) -> str:
+    """Path of a cached synthetic database of years years, generated if missing."""
+    path = os.path.join(
+        cache_dir, f"synthetic-{years}y-seed{seed}-v{SYNTHETIC_VERSION}.db"
+    )
+    if not os.path.exists(path):
+        os.makedirs(cache_dir, exist_ok=True)
+        end = date(DEFAULT_START.year + years, 1, 1)
+        # Generate next to the final path and rename, so a crash leaves no half file
+        tmp_path = f"{path}.tmp"
+        if os.path.exists(tmp_path):
+            os.remove(tmp_path)
+        started = time.perf_counter()
+        blocks = generate_database(tmp_path, (end - DEFAULT_START).days, seed=seed)
+        os.replace(tmp_path, path)
+        print(
+            f"Generated {path} ({blocks} blocks) in "
+            f"{time.perf_counter() - started:.1f} seconds",
+            file=sys.stderr,
+        )
+    return path
+
+
+def service_benchmarks(db_path: str, start: date, end: date) -> List[Benchmark]:
+    import pytz
+    from blockytime.calendarindex import parse_local_date
+    from blockytime.dtos.block_dto import BlockDTO
+    from blockytime.dtos.project_dto import ProjectDTO
+    from blockytime.dtos.type_dto import TypeDTO
+    from blockytime.interfaces.trendserviceinterface import TrendGroupBy
+    from blockytime.models.block import ensure_indexes
+    from blockytime.services.blockservice import BlockService
+    from blockytime.services.sleepservice import SleepService
+    from blockytime.services.statisticsservice import StatisticsService
+    from blockytime.services.trendservice import TrendService
+    from sqlalchemy import create_engine
+
+    engine = create_engine(f"sqlite:///{db_path}")
+    # Same indexes as create_app, so both groups measure what the server runs
+    if CREATE_INDEXES:
+        ensure_indexes(engine)
+    block_service = BlockService(engine)
+    statistics_service = StatisticsService(engine, DEFAULT_TZ)
+    trend_service = TrendService(engine, DEFAULT_TZ)
+    sleep_service = SleepService(engine)
+
+    def local(d: date) -> datetime:
+        return parse_local_date(d.isoformat(), DEFAULT_TZ)
+
+    week = (local(end - timedelta(days=7)), local(end))
+    year = (local(end - timedelta(days=365)), local(end))
+    last_day = (local(end - timedelta(days=1)), local(end))
+    # Write the last day back as it is, so repeated runs see the same data
+    day_blocks = [
+        BlockDTO(
+            date=b.date,
+            type_=TypeDTO(uid=b.type_.uid) if b.type_ is not None else None,
+            project=(ProjectDTO(uid=b.project.uid) if b.project is not None else None),
+            comment=b.comment,
+            operation="upsert",
+        )
+        for b in block_service.get_blocks(*last_day)
+        if b.type_ is not None
+    ]
+
+    def clear_block_cache() -> None:
+        block_service._cache.clear()
+
+    benchmarks = [
+        Benchmark(
+            "service.get_blocks.week",
+            lambda: block_service.get_blocks(*week),
+            clear_block_cache,
+        ),
+        Benchmark(
+            "service.get_blocks.year",
+            lambda: block_service.get_blocks(*year),
+            clear_block_cache,
+        ),
+        Benchmark(
+            "service.update_blocks.day",
+            lambda: block_service.update_blocks(day_blocks),
+        ),
+        Benchmark(
+            "service.get_statistics.all",
+            lambda: statistics_service.get_statistics(start, end),
+        ),
+    ]
+
+    def get_trends(group_by: TrendGroupBy) -> Callable[[], Any]:
+        return lambda: trend_service.get_trends(start, end, group_by)
+
+    for group_by in TrendGroupBy:
+        benchmarks.append(
+            Benchmark(
+                f"service.get_trends.{group_by.value.lower()}.all",
+                get_trends(group_by),
+            )
+        )
+    benchmarks.append(
+        Benchmark(
+            "service.calculate_sleep_stats.all",
+            # Same arguments as the /api/v1/sleep/stats route
+            lambda: sleep_service.calculate_sleep_stats(
+                start_date=start,
+                end_date=end,
+                cut_off_hour=18,
+                timezone=pytz.timezone(DEFAULT_TZ),
+                start_time_cut_off_hour=8,
+                end_time_cut_off_hour=14,
+                filter_start_time_after=20.0,
+                filter_end_time_after=27.0,
+            ),
+        )
+    )
+    return benchmarks
+
+
+def http_benchmarks(db_path: str, start: date, end: date) -> List[Benchmark]:
+    from blockytime.interfaces.blockserviceinterface import BlockServiceInterface
+    from blockytime.server import create_app
+    from blockytime.services.blockservice import BlockService
+
+    # Maintenance jobs would warm the caches some benchmarks measure cold
+    app = create_app(db_path, scheduler=False)
+    client = app.test_client()
+
+    def get(path: str) -> Callable[[], Any]:
+        def run() -> Any:
+            response = client.get(path, headers={"Accept-Encoding": "gzip"})
+            if response.status_code != 200:
+                raise RuntimeError(f"GET {path} returned {response.status_code}")
+            return response
+
+        return run
+
+    all_range = f"start_date={start}&end_date={end}"
+    week_range = f"start_date={end - timedelta(days=7)}&end_date={end}"
+    year_range = f"start_date={end - timedelta(days=365)}&end_date={end}"
+    day_range = f"start_date={end - timedelta(days=1)}&end_date={end}"
+    day = client.get(f"/api/v1/blocks?{day_range}").get_json()["data"]
+    payload = [
+        {
+            "date": b["date"],
+            "type_": {"uid": b["type_"]["uid"]},
+            "project": {"uid": b["project"]["uid"]} if b["project"] else None,
+            "comment": b["comment"],
+            "operation": "upsert",
+        }
+        for b in day
+        if b["type_"] is not None
+    ]
+
+    def put_blocks() -> Any:
+        response = client.put("/api/v1/blocks", json=payload)
+        if response.status_code != 200:
+            raise RuntimeError(f"PUT /api/v1/blocks returned {response.status_code}")
+        return response
+
+    def clear_block_cache() -> None:
+        service = app.service_provider.get(BlockServiceInterface)  # type: ignore[type-abstract]
+        assert isinstance(service, BlockService)
+        service._cache.clear()
+
+    return [
+        Benchmark(
+            "http.get_blocks.week",
+            get(f"/api/v1/blocks?{week_range}"),
+            clear_block_cache,
+        ),
+        Benchmark("http.put_blocks.day", put_blocks),
+        Benchmark("http.stats.year", get(f"/api/v1/stats?{year_range}")),
+        Benchmark("http.stats.all", get(f"/api/v1/stats?{all_range}")),
+        Benchmark(
+            "http.trends.week.all", get(f"/api/v1/trends?{all_range}&group_by=WEEK")
+        ),
+        Benchmark("http.sleep_stats.all", get(f"/api/v1/sleep/stats?{all_range}")),
+    ]
+
+
+GROUPS: Dict[str, Callable[[str, date, date], List[Benchmark]]] = {
+    "service": service_benchmarks,
+    "http": http_benchmarks,
+}
+
+
+def run_benchmarks(
+    db_path: str,
+    start: date,
+    end: date,
+    repeat: int = DEFAULT_REPEAT,
+    only: Sequence[str] = (),
+    groups: Sequence[str] = tuple(GROUPS),
+) -> Dict[str, Timing]:
+    """Time the benchmarks of groups whose names match only (fnmatch patterns)."""
+    results: Dict[str, Timing] = {}
+    for group in groups:
+        for benchmark in GROUPS[group](db_path, start, end):
+            if only and not any(fnmatch.fnmatch(benchmark.name, p) for p in only):
+                continue
+            results[benchmark.name] = measure(benchmark, repeat)
+    return results
+
+
+@dataclass
+class Comparison:
+    key: str
+    timing: Timing
+    baseline: Optional[float]
+    regression: bool
+
+    @property
+    def change(self) -> Optional[float]:
+        if not self.baseline:
+            return None
+        return self.timing.median / self.baseline - 1
+
+
+def compare(
+    results: Dict[str, Dict[str, Timing]],
+    baselines: Dict[str, Any],
+    tolerance: float = DEFAULT_TOLERANCE,
+) -> List[Comparison]:
+    """Compare results[dataset][benchmark] with the medians stored in baselines."""
+    comparisons = []
+    for dataset, timings in results.items():
+        stored = baselines.get("results", {}).get(dataset, {})
+        for name, timing in timings.items():
+            key = f"{dataset}/{name}"
+            baseline = stored.get(name, {}).get("median")
+            regression = (
+                baseline is not None
+                and timing.median > baseline * (1 + tolerance)
+                and timing.median - baseline > MIN_REGRESSION_SECONDS
+            )
+            comparisons.append(Comparison(key, timing, baseline, regression))
+    return comparisons
+
+
+def load_baselines(path: str) -> Dict[str, Any]:
+    if not os.path.exists(path):
+        return {}
+    with open(path) as f:
+        baselines: Dict[str, Any] = json.load(f)
+    return baselines
+
+
+def save_baselines(path: str, results: Dict[str, Dict[str, Timing]]) -> None:
+    """Store results in path, keeping the baselines of benchmarks not run."""
+    baselines = load_baselines(path)
+    stored = baselines.setdefault("results", {})
+    for dataset, timings in results.items():
+        for name, timing in timings.items():
+            stored.setdefault(dataset, {})[name] = timing.to_dict()
+    baselines["machine"] = platform.platform()
+    baselines["python"] = platform.python_version()
+    baselines["created"] = datetime.now().isoformat(timespec="seconds")
+    with open(path, "w") as f:
+        json.dump(baselines, f, indent=2, sort_keys=True)
+        f.write("\n")
+
+
+def print_report(comparisons: List[Comparison]) -> None:
+    width = max([len(c.key) for c in comparisons] + [9])
+    print(f"{'benchmark':<{width}}  {'median':>9}  {'min':>9}  {'baseline':>9}  change")
+    for c in comparisons:
+        baseline = f"{c.baseline:9.4f}" if c.baseline is not None else f"{'-':>9}"
+        change = f"{c.change:+.1%}" if c.change is not None else "-"
+        flag = "  REGRESSION" if c.regression else ""
+        print(
+            f"{c.key:<{width}}  {c.timing.median:9.4f}  {c.timing.min:9.4f}  "
+            f"{baseline}  {change}{flag}"
+        )
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(
+        description="Benchmark BlockyTime on synthetic databases"
+    )
+    parser.add_argument(
+        "--years",
+        type=int,
+        nargs="+",
+        default=DEFAULT_YEARS,
+        help="Sizes of the synthetic databases, in years of 96 blocks a day",
+    )
+    parser.add_argument("--repeat", type=int, default=DEFAULT_REPEAT)
+    parser.add_argument(
+        "--only", nargs="+", default=[], help="Benchmark name patterns, e.g. 'http.*'"
+    )
+    parser.add_argument(
+        "--group", nargs="+", choices=list(GROUPS), default=list(GROUPS)
+    )
+    parser.add_argument("--baseline", default=BASELINE_PATH)
+    parser.add_argument(
+        "--save-baseline",
+        action="store_true",
+        help="Store this run's timings as the new baseline",
+    )
+    parser.add_argument(
+        "--check", action="store_true", help="Exit with 1 if anything regressed"
+    )
+    parser.add_argument("--tolerance", type=float, default=DEFAULT_TOLERANCE)
+    parser.add_argument("--cache-dir", default=CACHE_DIR)
+    parser.add_argument("--output", help="Also write the results as JSON here")
+    args = parser.parse_args()
+
+    logging.basicConfig(level=logging.WARNING)
+    results: Dict[str, Dict[str, Timing]] = {}
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        for years in args.years:
+            db_path = os.path.join(tmp_dir, f"{years}y.db")
+            shutil.copyfile(synthetic_database(years, args.cache_dir), db_path)
+            end = date(DEFAULT_START.year + years, 1, 1)
+            results[f"{years}y"] = run_benchmarks(
+                db_path, DEFAULT_START, end, args.repeat, args.only, args.group
+            )
+
+    comparisons = compare(results, load_baselines(args.baseline), args.tolerance)
+    print_report(comparisons)
+    if args.output:
+        with open(args.output, "w") as f:
+            json.dump(
+                {
+                    dataset: {name: t.to_dict() for name, t in timings.items()}
+                    for dataset, timings in results.items()
+                },
+                f,
+                indent=2,
+            )
+    if args.save_baseline:
+        save_baselines(args.baseline, results)
+        print(f"Saved baselines to {args.baseline}", file=sys.stderr)
+    if args.check and any(c.regression for c in comparisons):
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,66 @@
+"""Check the query plans of the service SQL against the stored baseline.
+
+Usage:
+    python -m python.blockytime.scripts.check_query_plans [--only NAME ...]
+        [--baseline PATH] [--update] [--verbose]
+
+Runs every query of blockytime.queryplan on a fresh synthetic database and
+exits with 1 if one of them now scans the Block table where the baseline used
+an index. Other differences (changed SQL or plans, new queries) are printed as
+notes; after reviewing them, --update stores the current plans as the baseline.
+"""
+
+import argparse
+import logging
+import os
+import sys
+import tempfile
+
+from blockytime.queryplan import BASELINE_PATH, run_check, save_baseline
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(
+        description="Check service query plans against the stored baseline"
+    )
+    parser.add_argument("--only", nargs="+", default=[], help="Query names")
+    parser.add_argument("--baseline", default=BASELINE_PATH)
+    parser.add_argument(
+        "--update",
+        action="store_true",
+        help="Store the current plans as the new baseline",
+    )
+    parser.add_argument(
+        "--verbose", action="store_true", help="Print every plan, not just findings"
+    )
+    args = parser.parse_args()
+
+    logging.basicConfig(level=logging.WARNING)
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        report = run_check(os.path.join(tmp_dir, "DB.db"), args.baseline, args.only)
+
+    for name, statements in report.plans.items():
+        if args.verbose:
+            print(name)
+            for s in statements:
+                print(f"  [{s.block_access or '-'}] {s.statement}")
+                for line in s.plan:
+                    print(f"      {line}")
+    for finding in report.findings:
+        kind = "REGRESSION" if finding.regression else "note"
+        print(f"{kind}: {finding.query}: {finding.message}")
+    print(
+        f"{len(report.plans)} queries, {len(report.regressions)} regressions, "
+        f"{len(report.findings) - len(report.regressions)} notes",
+        file=sys.stderr,
+    )
+
+    if args.update:
+        save_baseline(report.plans, args.baseline)
+        print(f"Saved plans to {args.baseline}", file=sys.stderr)
+    elif report.regressions:
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,415 @@
+"""Load test of the HTTP API with simulated dashboard users.
+
+Usage:
+    python -m python.blockytime.scripts.loadtest [--users 1 4 16] [--duration 20]
+        [--years 5] [--think 0] [--mix home=5,edit=1] [--url URL] [--json PATH]
+
+Starts the app from server.create_app on a copy of a synthetic database (see
+scripts/bench) in a separate process, served by werkzeug's threaded server like
+``make run``, unless --url points at a running server. For each --users level,
+that many users then open pages for --duration seconds: each page issues the
+requests the frontend makes for it (see PAGES), one after the other, followed
+by --think seconds of idle time. "Today" is the last day of the database.
+
+Throughput, error rate and latency percentiles are reported per endpoint and
+concurrency level, so the level where latency degrades stands out.
+"""
+
+import argparse
+import json
+import logging
+import math
+import multiprocessing
+import os
+import random
+import shutil
+import sys
+import tempfile
+import threading
+import time
+import urllib.error
+import urllib.request
+from dataclasses import dataclass, field
+from datetime import date, timedelta
+from typing import Any, Callable, Dict, List, Optional, Sequence, Tuple
+
+from blockytime.scripts.bench import synthetic_database
+from blockytime.synthetic import DEFAULT_START
+
+DEFAULT_USERS = [1, 4, 16]
+DEFAULT_DURATION = 20.0
+DEFAULT_YEARS = 5
+REQUEST_TIMEOUT = 60.0
+PERCENTILES = (50, 90, 99)
+# Types users paint blocks with on the edit page (Sleep .. Leisure)
+EDIT_TYPE_UIDS = range(1, 8)
+
+# method, path and query; path is also the endpoint label
+Request = Tuple[str, str, Optional[Any]]
+
+
+@dataclass
+class Page:
+    """A page of the frontend and the requests it makes when opened on today."""
+
+    name: str
+    weight: float
+    requests: Callable[[date, random.Random], List[Request]]
+
+
+def _get(path: str, **params: Any) -> Request:
+    query = "&".join(f"{k}={v}" for k, v in params.items())
+    return ("GET", f"{path}?{query}" if query else path, None)
+
+
+def _monday(d: date) -> date:
+    return d - timedelta(days=d.weekday())
+
+
+def home_page(today: date, rng: random.Random) -> List[Request]:
+    # WeekView, sometimes browsing a few weeks back
+    monday = _monday(today) - timedelta(weeks=rng.choice([0, 0, 0, 1, 2]))
+    return [
+        _get("/api/v1/configs"),
+        _get("/api/v1/types"),
+        _get(
+            "/api/v1/blocks",
+            start_date=monday,
+            end_date=monday + timedelta(days=7),
+        ),
+    ]
+
+
+def statistics_page(today: date, rng: random.Random) -> List[Request]:
+    month_start = today.replace(day=1)
+    start, end = rng.choice(
+        [
+            (today, today + timedelta(days=1)),
+            (_monday(today), _monday(today) + timedelta(days=7)),
+            (month_start, today),
+            (today.replace(month=1, day=1), today),
+            (today - timedelta(days=30), today),
+        ]
+    )
+    return [
+        _get("/api/v1/types"),
+        _get("/api/v1/stats", start_date=start, end_date=end),
+    ]
+
+
+def dashboard_page(today: date, rng: random.Random) -> List[Request]:
+    # TimeSlotCharts (current and next half hour) and SleepDataSection
+    lookback = rng.choice([7, 14, 30, 90])
+    hour = rng.randrange(24)
+    minute = rng.choice([0, 30])
+    next_hour, next_minute = (hour, 30) if minute == 0 else ((hour + 1) % 24, 0)
+    return [
+        _get(
+            "/api/v1/stats",
+            start_date=today - timedelta(days=lookback),
+            end_date=today,
+            time_slot_minutes=30,
+            hour=hour,
+            minute=minute,
+        ),
+        _get(
+            "/api/v1/stats",
+            start_date=today - timedelta(days=lookback),
+            end_date=today + timedelta(days=1),
+            time_slot_minutes=30,
+            hour=next_hour,
+            minute=next_minute,
+        ),
+        _get(
+            "/api/v1/sleep/stats",
+            start_date=today.replace(month=1, day=1),
+            end_date=today + timedelta(days=1),
+            decay_factor=0.75,
+            window_size=14,
+        ),
+    ]
+
+
+def trends_page(today: date, rng: random.Random) -> List[Request]:
+    if rng.random() < 0.5:
+        start = today.replace(day=1)
+        end = (start + timedelta(days=32)).replace(day=1)
+        group_by = "DAY"
+    else:
+        start = today.replace(month=1, day=1)
+        end = start.replace(year=start.year + 1)
+        group_by = "MONTH"
+    return [_get("/api/v1/trends", start_date=start, end_date=end, group_by=group_by)]
+
+
+def edit_page(today: date, rng: random.Random) -> List[Request]:
+    # Paint a run of blocks in the week view, then refresh the week
+    from blockytime.calendarindex import parse_local_date
+
+    monday = _monday(today)
+    day = monday + timedelta(days=rng.randrange(7))
+    midnight = int(parse_local_date(day.isoformat()).timestamp())
+    first = rng.randrange(96 - 8)
+    type_uid = rng.choice(EDIT_TYPE_UIDS)
+    blocks = [
+        {
+            "date": midnight + (first + i) * 900,
+            "type_": {"uid": type_uid},
+            "project": None,
+            "comment": "",
+            "operation": "upsert",
+        }
+        for i in range(rng.randint(1, 8))
+    ]
+    return [
+        ("PUT", "/api/v1/blocks", blocks),
+        _get(
+            "/api/v1/blocks",
+            start_date=monday,
+            end_date=monday + timedelta(days=7),
+        ),
+    ]
+
+
+PAGES = [
+    Page("home", 5, home_page),
+    Page("statistics", 1.5, statistics_page),
+    Page("dashboard", 1.5, dashboard_page),
+    Page("trends", 1, trends_page),
+    Page("edit", 1, edit_page),
+]
+
+
+@dataclass
+class EndpointStats:
+    latencies: List[float] = field(default_factory=list)
+    errors: int = 0
+
+    def merge(self, other: "EndpointStats") -> None:
+        self.latencies.extend(other.latencies)
+        self.errors += other.errors
+
+
+def percentile(values: Sequence[float], q: float) -> float:
+    """Nearest-rank percentile of sorted values."""
+    if not values:
+        return 0.0
+    rank = max(1, math.ceil(q / 100 * len(values)))
+    return values[rank - 1]
+
+
+@dataclass
+class LoadResult:
+    users: int
+    seconds: float
+    endpoints: Dict[str, EndpointStats]
+
+    def summary(self) -> Dict[str, Dict[str, Any]]:
+        """Per endpoint (and "total") request count, rate, error rate, percentiles."""
+        total = EndpointStats()
+        for stats in self.endpoints.values():
+            total.merge(stats)
+        summary = {}
+        for name, stats in sorted(self.endpoints.items()) + [("total", total)]:
+            latencies = sorted(stats.latencies)
+            requests = len(latencies) + stats.errors
+            row: Dict[str, Any] = {
+                "requests": requests,
+                "rps": round(requests / self.seconds, 2),
+                "error_rate": round(stats.errors / requests, 4) if requests else 0.0,
+            }
+            for q in PERCENTILES:
+                row[f"p{q}"] = round(percentile(latencies, q), 4)
+            row["max"] = round(latencies[-1], 4) if latencies else 0.0
+            summary[name] = row
+        return summary
+
+
+def _send(base_url: str, request: Request) -> None:
+    method, path, body = request
+    data = json.dumps(body).encode("utf-8") if body is not None else None
+    req = urllib.request.Request(
+        base_url + path,
+        data=data,
+        method=method,
+        headers={"Content-Type": "application/json", "Accept-Encoding": "gzip"},
+    )
+    with urllib.request.urlopen(req, timeout=REQUEST_TIMEOUT) as response:
+        response.read()
+
+
+def run_load(
+    base_url: str,
+    today: date,
+    users: int,
+    duration: float,
+    pages: Sequence[Page] = PAGES,
+    think: float = 0.0,
+    seed: int = 0,
+) -> LoadResult:
+    """Simulate users users opening pages against base_url for duration seconds."""
+    deadline = time.monotonic() + duration
+    per_user: List[Dict[str, EndpointStats]] = [{} for _ in range(users)]
+    weights = [p.weight for p in pages]
+
+    def user(i: int) -> None:
+        rng = random.Random(seed * 1000 + i)
+        endpoints = per_user[i]
+        while time.monotonic() < deadline:
+            page = rng.choices(pages, weights)[0]
+            for request in page.requests(today, rng):
+                label = f"{request[0]} {request[1].split('?')[0]}"
+                stats = endpoints.setdefault(label, EndpointStats())
+                started = time.perf_counter()
+                try:
+                    _send(base_url, request)
+                except (urllib.error.URLError, OSError) as e:
+                    stats.errors += 1
+                    logging.debug(f"{label} failed: {e}")
+                else:
+                    stats.latencies.append(time.perf_counter() - started)
+            if think:
+                time.sleep(rng.uniform(0, 2 * think))
+
+    started = time.monotonic()
+    threads = [threading.Thread(target=user, args=(i,)) for i in range(users)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    endpoints: Dict[str, EndpointStats] = {}
+    for stats in per_user:
+        for label, s in stats.items():
+            endpoints.setdefault(label, EndpointStats()).merge(s)
+    return LoadResult(users, time.monotonic() - started, endpoints)
+
+
+def serve(db_path: str, port: int = 0, ready: Optional[Any] = None) -> None:
+    """Serve create_app(db_path) with werkzeug's threaded server until killed.
+
+    Sends the bound port to ready (a multiprocessing connection) once listening.
+    """
+    from blockytime.server import create_app
+    from werkzeug.serving import make_server
+
+    logging.basicConfig(level=logging.WARNING)
+    # werkzeug sets its own logger to INFO, one line per request
+    logging.getLogger("werkzeug").setLevel(logging.WARNING)
+    server = make_server("127.0.0.1", port, create_app(db_path), threaded=True)
+    if ready is not None:
+        ready.send(server.server_port)
+    server.serve_forever()
+
+
+def start_server(db_path: str) -> Tuple[multiprocessing.Process, str]:
+    """Start serve() in a child process, so that clients and server do not share a GIL."""
+    receiver, sender = multiprocessing.Pipe(duplex=False)
+    process = multiprocessing.Process(
+        target=serve, args=(db_path, 0, sender), daemon=True
+    )
+    process.start()
+    if not receiver.poll(60):
+        process.terminate()
+        raise RuntimeError("Server did not start within 60 seconds")
+    return process, f"http://127.0.0.1:{receiver.recv()}"
+
+
+def parse_mix(text: str) -> List[Page]:
+    """Pages with weights overridden by "name=weight,..."; unnamed pages keep theirs."""
+    weights = {}
+    for item in text.split(","):
+        name, _, weight = item.partition("=")
+        if name not in {p.name for p in PAGES}:
+            raise ValueError(f"Unknown page {name}")
+        weights[name] = float(weight)
+    return [Page(p.name, weights.get(p.name, p.weight), p.requests) for p in PAGES]
+
+
+def print_report(results: List[LoadResult]) -> None:
+    header = (
+        f"{'users':>5}  {'endpoint':<24}  {'requests':>8}  {'rps':>8}  {'errors':>7}"
+    )
+    header += "".join(f"  {f'p{q}':>8}" for q in PERCENTILES) + f"  {'max':>8}"
+    print(header)
+    for result in results:
+        for name, row in result.summary().items():
+            line = (
+                f"{result.users:>5}  {name:<24}  {row['requests']:>8}  "
+                f"{row['rps']:>8.1f}  {row['error_rate']:>7.1%}"
+            )
+            line += "".join(f"  {row[f'p{q}']:>8.4f}" for q in PERCENTILES)
+            print(line + f"  {row['max']:>8.4f}")
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(
+        description="Load test the BlockyTime API with simulated dashboard users"
+    )
+    parser.add_argument(
+        "--users",
+        type=int,
+        nargs="+",
+        default=DEFAULT_USERS,
+        help="Concurrent users, one run per value",
+    )
+    parser.add_argument(
+        "--duration", type=float, default=DEFAULT_DURATION, help="Seconds per run"
+    )
+    parser.add_argument(
+        "--years",
+        type=int,
+        default=DEFAULT_YEARS,
+        help="Size of the synthetic database, in years",
+    )
+    parser.add_argument(
+        "--think", type=float, default=0.0, help="Mean idle seconds between pages"
+    )
+    parser.add_argument("--mix", help="Page weights, e.g. home=5,edit=1")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument(
+        "--url",
+        help="Load an already running server instead (its database is modified)",
+    )
+    parser.add_argument("--today", help="YYYY-MM-DD, with --url")
+    parser.add_argument("--json", help="Also write the summaries as JSON here")
+    args = parser.parse_args()
+
+    pages = parse_mix(args.mix) if args.mix else PAGES
+    process: Optional[multiprocessing.Process] = None
+    tmp_dir = tempfile.mkdtemp()
+    try:
+        if args.url:
+            base_url = args.url.rstrip("/")
+            today = date.fromisoformat(args.today) if args.today else date.today()
+        else:
+            db_path = os.path.join(tmp_dir, "DB.db")
+            shutil.copyfile(synthetic_database(args.years), db_path)
+            process, base_url = start_server(db_path)
+            today = date(DEFAULT_START.year + args.years, 1, 1) - timedelta(days=1)
+        results = []
+        for users in args.users:
+            print(
+                f"Running {users} users for {args.duration} seconds...",
+                file=sys.stderr,
+            )
+            results.append(
+                run_load(base_url, today, users, args.duration, pages, args.think)
+            )
+    finally:
+        if process is not None:
+            process.terminate()
+            process.join()
+        shutil.rmtree(tmp_dir, ignore_errors=True)
+
+    print_report(results)
+    if args.json:
+        with open(args.json, "w") as f:
+            json.dump(
+                {str(r.users): r.summary() for r in results},
+                f,
+                indent=2,
+            )
+
+
+if __name__ == "__main__":
+    main()
@@ -1,11 +1,18 @@
-"""Pull DB.db from a USB-connected iPhone running BlockyTime."""
+"""Pull DB.db from a USB-connected iPhone running BlockyTime.
 
+When the local DB.db has the same tables, only the rows that differ are written
+to it (see dbsync.py); otherwise the pulled file replaces it. --source syncs
+from a local copy of the phone's DB.db instead of the device.
+"""
+
+import argparse
 import os
 import shutil
 import sys
 import tempfile
 
-from blockytime.backup import cleanup_overflow, rotate_backups
+from blockytime.backup import backup_database, open_store
+from blockytime.dbsync import SyncSchemaError, check_schema, sync_database
 
 BUNDLE_ID = "com.anniapp.Timeblocks"
 DB_FILENAME = "DB.db"
@@ -13,7 +20,7 @@ OUTPUT_DIR = os.path.join(os.path.dirname(__file__), "..", "data", "dynamic")
 OUTPUT_PATH = os.path.join(OUTPUT_DIR, DB_FILENAME)
 
 
-def main() -> None:
+def _pull_from_device(tmp_dir: str) -> None:
     try:
         from pymobiledevice3.lockdown import create_using_usbmux
         from pymobiledevice3.services.house_arrest import HouseArrestService
@@ -43,28 +50,64 @@ def main() -> None:
 
     remote_path = f"Documents/{DB_FILENAME}"
     print(f"Pulling {remote_path}...")
+    try:
+        service.pull(remote_path, tmp_dir)
+    except Exception as e:
+        print(f"Error: Could not pull {remote_path} from app container.\n{e}")
+        sys.exit(1)
 
-    os.makedirs(OUTPUT_DIR, exist_ok=True)
 
-    # Rotate backups before overwriting
-    print("Rotating backups...")
-    rotate_backups(OUTPUT_PATH)
+def _sync(pulled_path: str) -> bool:
+    """Sync pulled_path into OUTPUT_PATH; False if it has to be replaced."""
+    if not os.path.exists(OUTPUT_PATH):
+        return False
+    try:
+        check_schema(OUTPUT_PATH, pulled_path)
+    except SyncSchemaError as e:
+        print(f"{e}, replacing the local DB")
+        return False
+
+    print("Backing up the local DB...")
+    backup_database(open_store(OUTPUT_PATH), OUTPUT_PATH)
+    report = sync_database(OUTPUT_PATH, pulled_path)
+    for table in report.tables:
+        if table.changed:
+            print(
+                f"{table.table}: {table.inserted} inserted, {table.updated} updated, "
+                f"{table.deleted} deleted"
+            )
+    print(
+        f"Synced {len(report.block_dates)} block dates "
+        f"({report.changed_buckets} of {report.buckets} buckets) "
+        f"in {report.seconds:.2f} seconds"
+    )
+    return True
+
 
-    # Pull to a temp file first, then move atomically
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument(
+        "--source", help="Copy of the phone's DB.db to sync from, instead of the device"
+    )
+    args = parser.parse_args()
+
+    os.makedirs(OUTPUT_DIR, exist_ok=True)
+    # Pull to a temp file first, then sync or move atomically
     tmp_dir = tempfile.mkdtemp(dir=OUTPUT_DIR)
     tmp_path = os.path.join(tmp_dir, DB_FILENAME)
     try:
-        service.pull(remote_path, tmp_dir)
-        shutil.move(tmp_path, OUTPUT_PATH)
-    except Exception as e:
-        print(f"Error: Could not pull {remote_path} from app container.\n{e}")
-        shutil.rmtree(tmp_dir, ignore_errors=True)
-        sys.exit(1)
+        if args.source is not None:
+            shutil.copyfile(args.source, tmp_path)
+        else:
+            _pull_from_device(tmp_dir)
+        if not _sync(tmp_path):
+            if os.path.exists(OUTPUT_PATH):
+                print("Backing up the local DB...")
+                backup_database(open_store(OUTPUT_PATH), OUTPUT_PATH)
+            shutil.move(tmp_path, OUTPUT_PATH)
     finally:
         shutil.rmtree(tmp_dir, ignore_errors=True)
 
-    cleanup_overflow(OUTPUT_PATH)
-
     abs_output = os.path.abspath(OUTPUT_PATH)
     size_kb = os.path.getsize(abs_output) / 1024
     print(f"Saved {size_kb:.1f} KB to {abs_output}")
@@ -1,8 +1,8 @@
 """Push local DB.db to a USB-connected iPhone running BlockyTime.
 
-Before pushing, the iPhone's current DB is pulled and saved as a rotating
-pre-push backup (DB.db.pre-push.1 … .N, controlled by BLOCKY_MAX_PUSH_BACKUPS,
-default 10).
+Before pushing, the iPhone's current DB is pulled and saved as a pre-push
+snapshot in the backup store (see backup.py). What is sent is an online copy
+of DB.db, so pushing while the server runs is safe.
 """
 
 import os
@@ -10,13 +10,12 @@ import shutil
 import sys
 import tempfile
 
-from blockytime.backup import MAX_PUSH_BACKUPS, cleanup_overflow, rotate_backups
+from blockytime.backup import PRE_PUSH, backup_database, copy_database, open_store
 
 BUNDLE_ID = "com.anniapp.Timeblocks"
 DB_FILENAME = "DB.db"
 OUTPUT_DIR = os.path.join(os.path.dirname(__file__), "..", "data", "dynamic")
 OUTPUT_PATH = os.path.join(OUTPUT_DIR, DB_FILENAME)
-PRE_PUSH_BACKUP_PATH = os.path.join(OUTPUT_DIR, "DB.db.pre-push")
 
 
 def main() -> None:
@@ -56,30 +55,30 @@ def main() -> None:
 
     # Back up iPhone's current DB before overwriting it
     print("Backing up iPhone DB before push...")
-    rotate_backups(PRE_PUSH_BACKUP_PATH, MAX_PUSH_BACKUPS)
     tmp_dir = tempfile.mkdtemp(dir=OUTPUT_DIR)
     tmp_path = os.path.join(tmp_dir, DB_FILENAME)
+    push_path = os.path.join(tmp_dir, f"{DB_FILENAME}.push")
     try:
-        service.pull(remote_path, tmp_dir)
-        shutil.move(tmp_path, PRE_PUSH_BACKUP_PATH)
-    except Exception as e:
-        print(f"Error: Could not back up iPhone DB before push.\n{e}")
-        shutil.rmtree(tmp_dir, ignore_errors=True)
-        sys.exit(1)
+        try:
+            service.pull(remote_path, tmp_dir)
+            snapshot = backup_database(open_store(OUTPUT_PATH), tmp_path, PRE_PUSH)
+        except Exception as e:
+            print(f"Error: Could not back up iPhone DB before push.\n{e}")
+            sys.exit(1)
+        print(f"iPhone DB backed up as {snapshot.id}")
+
+        # Push a consistent copy of the local DB to the iPhone
+        copy_database(OUTPUT_PATH, push_path)
+        print(f"Pushing {os.path.abspath(OUTPUT_PATH)} → {remote_path} ...")
+        try:
+            service.push(push_path, remote_path)
+        except Exception as e:
+            print(f"Error: Could not push DB to device.\n{e}")
+            sys.exit(1)
+        size_kb = os.path.getsize(push_path) / 1024
     finally:
         shutil.rmtree(tmp_dir, ignore_errors=True)
-    cleanup_overflow(PRE_PUSH_BACKUP_PATH, MAX_PUSH_BACKUPS)
-    print(f"iPhone DB backed up to {os.path.abspath(PRE_PUSH_BACKUP_PATH)}")
-
-    # Push local DB to the iPhone
-    print(f"Pushing {os.path.abspath(OUTPUT_PATH)} → {remote_path} ...")
-    try:
-        service.push(OUTPUT_PATH, remote_path)
-    except Exception as e:
-        print(f"Error: Could not push DB to device.\n{e}")
-        sys.exit(1)
 
-    size_kb = os.path.getsize(OUTPUT_PATH) / 1024
     print(f"Pushed {size_kb:.1f} KB to {lockdown.display_name}")
 
 
@@ -0,0 +1,177 @@
+"""Full-text index over block comments, in a side file next to the database.
+
+The index is an SQLite FTS5 table in DB.db.search with one row per commented
+block, keyed by the block's date. Keeping it out of DB.db leaves the file the
+phone reads and dbsync compares untouched.
+
+Any process may write blocks (the server, ai_tools, a pull from the phone),
+so instead of hooking every write path, the index remembers which version of
+DB.db it reflects: the file's identity and its change counter, which SQLite
+bumps on every committed write. Searches compare that first, which costs a
+stat and a 4-byte read, and only when it moved diff the comments of DB.db,
+read through the partial index ix_Block_commented, against the index and
+apply the difference. rebuild() starts over, e.g. after pull-db swapped in
+another file.
+"""
+
+import logging
+import os
+import re
+import sqlite3
+import time
+from dataclasses import dataclass
+from typing import List, Optional, Tuple
+
+from .database import change_counter
+
+log = logging.getLogger(__name__)
+
+SOURCE = "src"
+MAX_RESULTS = 500
+TOKEN_RE = re.compile(r"\w+", re.UNICODE)
+
+
+@dataclass
+class IndexSync:
+    added: int = 0
+    removed: int = 0
+    rebuilt: bool = False
+    seconds: float = 0.0
+
+
+def match_query(text: str) -> Optional[str]:
+    """FTS5 query finding comments with every word of text, as a prefix.
+
+    Words are quoted, so operators and punctuation in text are not syntax;
+    None if text has no words.
+    """
+    tokens = TOKEN_RE.findall(text)
+    if not tokens:
+        return None
+    return " ".join(f'"{token}"*' for token in tokens)
+
+
+class CommentIndex:
+    def __init__(self, db_path: str):
+        self.db_path = db_path
+        self.path = f"{db_path}.search"
+
+    def _source_version(self) -> str:
+        st = os.stat(self.db_path)
+        counter = change_counter(self.db_path)
+        return f"{st.st_dev}:{st.st_ino}:{st.st_size}:{st.st_mtime_ns}:{counter}"
+
+    def _connect(self) -> sqlite3.Connection:
+        # Autocommit, so ATTACH works and transactions are begun explicitly
+        con = sqlite3.connect(self.path, isolation_level=None, timeout=30)
+        con.execute(
+            "CREATE VIRTUAL TABLE IF NOT EXISTS comments USING fts5("
+            "comment, tokenize = 'unicode61 remove_diacritics 2')"
+        )
+        con.execute(
+            "CREATE TABLE IF NOT EXISTS meta (key TEXT PRIMARY KEY, value TEXT)"
+        )
+        return con
+
+    def _indexed_version(self, con: sqlite3.Connection) -> Optional[str]:
+        row = con.execute("SELECT value FROM meta WHERE key = 'source'").fetchone()
+        return row[0] if row else None
+
+    def _sync(self, con: sqlite3.Connection, rebuild: bool) -> IndexSync:
+        started = time.monotonic()
+        result = IndexSync(rebuilt=rebuild)
+        version = self._source_version()
+        if not rebuild and self._indexed_version(con) == version:
+            return result
+        con.execute(f"ATTACH DATABASE ? AS {SOURCE}", (self.db_path,))
+        try:
+            con.execute("BEGIN IMMEDIATE")
+            try:
+                # Re-check: another thread or process may have synced meanwhile
+                if not rebuild and self._indexed_version(con) == version:
+                    con.execute("COMMIT")
+                    return result
+                commented = (
+                    f"SELECT date, comment FROM {SOURCE}.Block "
+                    "WHERE comment != '' AND date IS NOT NULL"
+                )
+                if rebuild:
+                    result.removed = con.execute("DELETE FROM comments").rowcount
+                    changed = commented
+                else:
+                    # Gone or edited, then new or edited
+                    result.removed = con.execute(
+                        "DELETE FROM comments WHERE rowid IN ("
+                        f"SELECT rowid FROM (SELECT rowid, comment FROM comments "
+                        f"EXCEPT {commented}))"
+                    ).rowcount
+                    changed = f"{commented} EXCEPT SELECT rowid, comment FROM comments"
+                result.added = con.execute(
+                    f"INSERT INTO comments (rowid, comment) {changed}"
+                ).rowcount
+                con.execute(
+                    "INSERT OR REPLACE INTO meta VALUES ('source', ?)", (version,)
+                )
+                con.execute("COMMIT")
+            except BaseException:
+                con.execute("ROLLBACK")
+                raise
+        finally:
+            con.execute(f"DETACH DATABASE {SOURCE}")
+        result.seconds = time.monotonic() - started
+        log.info(
+            f"Synced comment index of {self.db_path} in {result.seconds:.3f} "
+            f"seconds: {result.added} added, {result.removed} removed"
+            + (", rebuilt" if rebuild else "")
+        )
+        return result
+
+    def sync(self) -> IndexSync:
+        """Bring the index up to date with DB.db, if it changed."""
+        con = self._connect()
+        try:
+            return self._sync(con, rebuild=False)
+        finally:
+            con.close()
+
+    def rebuild(self) -> IndexSync:
+        con = self._connect()
+        try:
+            return self._sync(con, rebuild=True)
+        finally:
+            con.close()
+
+    def search(
+        self,
+        text: str,
+        start_ts: Optional[int] = None,
+        end_ts: Optional[int] = None,
+        limit: int = 50,
+    ) -> List[Tuple[int, float]]:
+        """Dates and bm25 ranks (lower is better) of blocks whose comment has
+        every word of text, best first, within [start_ts, end_ts)."""
+        query = match_query(text)
+        if query is None:
+            return []
+        con = self._connect()
+        try:
+            self._sync(con, rebuild=False)
+            where = ["comments MATCH ?"]
+            params: List[object] = [query]
+            if start_ts is not None:
+                where.append("rowid >= ?")
+                params.append(start_ts)
+            if end_ts is not None:
+                where.append("rowid < ?")
+                params.append(end_ts)
+            params.append(min(limit, MAX_RESULTS))
+            return [
+                (date, rank)
+                for date, rank in con.execute(
+                    f"SELECT rowid, rank FROM comments WHERE {' AND '.join(where)} "
+                    "ORDER BY rank, rowid DESC LIMIT ?",
+                    params,
+                )
+            ]
+        finally:
+            con.close()
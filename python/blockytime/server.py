@@ -1,47 +1,54 @@
+import atexit
 import logging
 import os
 import sys
-from typing import TYPE_CHECKING
+import time
+from typing import TYPE_CHECKING, Any, Callable, Dict, Optional, Tuple
 
-from flasgger import Swagger
-from flask import Flask, jsonify, request, send_from_directory
+from flask import Flask, g, jsonify, request, send_from_directory
 from flask import Response as FlaskResponse
-from flask_cors import CORS
 from sqlalchemy import Engine, create_engine, text
 from sqlalchemy.exc import OperationalError
 
+from .apidocs import install_api_docs
+from .backup import backup_database, open_store
+from .constants import (
+    BLOCK_WRITE_DELAY_MS,
+    BLOCK_WRITE_MAX_EDITS,
+    CREATE_INDEXES,
+    SCHEDULER,
+)
+from .database import DatabaseGate, warm_database
+from .instrumentation import instrument_app
+from .interfaces.aggregationserviceinterface import AggregationServiceInterface
 from .interfaces.blockserviceinterface import BlockServiceInterface
 from .interfaces.configdict import ConfigDict
 from .interfaces.configserviceinterface import ConfigServiceInterface
+from .interfaces.exportserviceinterface import ExportServiceInterface
 from .interfaces.projectserviceinterface import ProjectServiceInterface
+from .interfaces.searchserviceinterface import SearchServiceInterface
 from .interfaces.sleepserviceinterface import SleepServiceInterface
 from .interfaces.statisticsserviceinterface import StatisticsServiceInterface
 from .interfaces.trendserviceinterface import TrendServiceInterface
 from .interfaces.typeserviceinterface import TypeServiceInterface
-from .log import ColoredFormatter
-from .paths import DATA_PATH, DB_PATH, LOG_PATH
-from .routes import admin, blocks, configs, sleeps, stats, trends, types
+from .log import configure_logging
+from .maintenance import after_pull, create_scheduler
+from .metrics import START_TIME, STARTUP_SECONDS, instrument_engine
+from .models.block import ensure_indexes
+from .paths import DB_PATH, DYNAMIC_PATH
+from .profiling import capture_statements, install_profiler
+from .responsecache import ResponseCache
+from .routes import admin, blocks, configs, exports, sleeps, stats, trends, types
 from .routes.decorators import RouteReturn
+from .scheduler import Scheduler
+from .search import CommentIndex
 from .services.blockservice import BlockService
 from .services.configservice import ConfigService
 from .services.di import FlaskWithServiceProvider, ServiceProvider
 from .services.projectservice import ProjectService
-from .services.sleepservice import SleepService
-from .services.statisticsservice import StatisticsService
-from .services.trendservice import TrendService
+from .services.searchservice import SearchService
 from .services.typeservice import TypeService
 
-# Configure logging
-logging.basicConfig(
-    level=logging.INFO,
-    format="%(asctime)s - %(name)s - %(levelname)s - %(message)s",
-    handlers=[logging.StreamHandler(sys.stdout), logging.FileHandler(LOG_PATH)],
-)
-
-# Set the custom formatter
-for handler in logging.getLogger().handlers:
-    handler.setFormatter(ColoredFormatter())
-
 log = logging.getLogger(__name__)
 
 
@@ -90,39 +97,136 @@ def define_root_static_files(app: Flask) -> None:
 
 def define_swagger(app: Flask) -> None:
     # Enable CORS
+    from flask_cors import CORS
+
     CORS(app)
 
-    # Configure Swagger
-    app.config["SWAGGER"] = {
-        "title": "BlockyTime API",
-        "uiversion": 3,
-        "version": "1.0.0",
-        "description": """
-        API for viewing and editing BlockyTime time-tracking data.
-
-        This API provides endpoints for:
-        * Reading and writing 15-minute time blocks
-        * Aggregated statistics and trends
-        * Sleep analysis
-        * App configuration
-        """,
-        "termsOfService": "",
-        "contact": {"name": "API Support", "email": "support@example.com"},
-        "license": {
-            "name": "Private License",
-        },
-    }
+    # Swagger UI at /apidocs, built on first request to keep start-up fast
+    install_api_docs(app)
+
+
+def _aggregation_service(engine: Engine) -> AggregationServiceInterface:
+    from .services.aggregationservice import AggregationService
+
+    return AggregationService(engine)
+
+
+def _statistics_service(engine: Engine) -> StatisticsServiceInterface:
+    from .services.statisticsservice import StatisticsService
+
+    return StatisticsService(engine)
+
+
+def _trend_service(engine: Engine) -> TrendServiceInterface:
+    from .services.trendservice import TrendService
+
+    return TrendService(engine)
+
+
+def _sleep_service(engine: Engine) -> SleepServiceInterface:
+    from .services.sleepservice import SleepService
 
-    # Initialize Swagger
-    Swagger(app)
+    return SleepService(engine)
 
 
-def create_app() -> Flask:
+def _export_service(engine: Engine) -> ExportServiceInterface:
+    from .services.exportservice import ExportService
+
+    return ExportService(engine)
+
+
+def _block_service(engine: Engine, db_path: str) -> BlockService:
+    if BLOCK_WRITE_DELAY_MS <= 0:
+        return BlockService(engine)
+    return BlockService(
+        engine,
+        journal_path=f"{db_path}.blocks-journal",
+        write_delay_ms=BLOCK_WRITE_DELAY_MS,
+        write_max_edits=BLOCK_WRITE_MAX_EDITS,
+    )
+
+
+def _database_services(
+    engine: Engine, db_path: str
+) -> Tuple[Dict[Any, Any], Dict[Any, Callable[[], Any]]]:
+    """Services bound to engine: built now, and built on first use."""
+    services: Dict[Any, Any] = {
+        Engine: engine,
+        BlockServiceInterface: _block_service(engine, db_path),
+        TypeServiceInterface: TypeService(engine),
+        ProjectServiceInterface: ProjectService(engine),
+        ConfigServiceInterface: ConfigService(engine),
+        SearchServiceInterface: SearchService(engine, CommentIndex(db_path)),
+    }
+    # numpy-backed services are built (and their modules imported) on first use
+    factories: Dict[Any, Callable[[], Any]] = {
+        StatisticsServiceInterface: lambda: _statistics_service(engine),
+        TrendServiceInterface: lambda: _trend_service(engine),
+        SleepServiceInterface: lambda: _sleep_service(engine),
+        ExportServiceInterface: lambda: _export_service(engine),
+        AggregationServiceInterface: lambda: _aggregation_service(engine),
+    }
+    return services, factories
+
+
+def open_database(db_path: str) -> Engine:
+    """Engine for db_path with indexes, metrics and profiling hooks."""
+    engine: Engine = init_database(db_path, DYNAMIC_PATH)
+    instrument_engine(engine)
+    capture_statements(engine)
+    log.info(f"Database initialized with engine: {engine}")
+    return engine
+
+
+def reload_database(
+    service_provider: ServiceProvider, db_path: str, source_path: Optional[str] = None
+) -> int:
+    """Serve a new database through a new engine, e.g. the file pull-db fetched.
+
+    source_path is renamed over db_path, after the current file was backed
+    up. It is indexed and read into the page cache under its own name
+    first, so requests are only held back (see DatabaseGate) for the rename and
+    the swap of all database services. Without source_path, db_path was
+    already replaced. Optimizing, warming and pruning backups are left to the
+    scheduler. Returns the new generation.
+    """
+    started = time.monotonic()
+    if source_path is not None:
+        engine = init_database(source_path, DYNAMIC_PATH)
+        warm_database(engine)
+        engine.dispose()
+    with service_provider.get(DatabaseGate).exclusive():
+        paused = time.monotonic()
+        # The new BlockService replays the same edit journal, so the old one
+        # must have committed its edits to the old file and stopped queueing
+        service_provider.get(BlockServiceInterface).close()  # type: ignore[type-abstract]
+        if source_path is not None:
+            backup_database(open_store(db_path), db_path, prune=False)
+            os.replace(source_path, db_path)
+        engine = open_database(db_path)
+        warm_database(engine)
+        old = service_provider.replace(*_database_services(engine, db_path))
+        old_engine = old.get(Engine)
+        if old_engine is not None:
+            old_engine.dispose()
+        paused = time.monotonic() - paused
+    after_pull(service_provider.get(Scheduler), db_path)
+    log.info(
+        f"Reloaded {db_path} as generation {service_provider.generation} in "
+        f"{time.monotonic() - started:.3f} seconds, requests held {paused:.3f}"
+    )
+    return service_provider.generation
+
+
+def create_app(
+    db_path: str = DB_PATH, scheduler: bool = SCHEDULER
+) -> FlaskWithServiceProvider:
+    started = time.monotonic()
+    configure_logging()
     # Create and configure service provider and do manual dependency injection
     # Initialize database
     try:
-        engine: Engine = init_database(DB_PATH, DATA_PATH)
-        log.info(f"Database initialized with engine: {engine}")
+        engine = open_database(db_path)
 
         # Verify database connection
         with engine.connect() as conn:
@@ -136,15 +240,25 @@ def create_app() -> Flask:
 
     app = FlaskWithServiceProvider(__name__, service_provider=service_provider)
     load_config(app)
-    # Protocol interfaces cannot be used as Type[T] — structural subtyping is verified at call sites
-    service_provider.register(BlockServiceInterface, BlockService(engine))  # type: ignore[type-abstract]
-    service_provider.register(TypeServiceInterface, TypeService(engine))  # type: ignore[type-abstract]
-    service_provider.register(ProjectServiceInterface, ProjectService(engine))  # type: ignore[type-abstract]
-    service_provider.register(ConfigServiceInterface, ConfigService(engine))  # type: ignore[type-abstract]
-    service_provider.register(StatisticsServiceInterface, StatisticsService(engine))  # type: ignore[type-abstract]
-    service_provider.register(TrendServiceInterface, TrendService(engine))  # type: ignore[type-abstract]
-    service_provider.register(SleepServiceInterface, SleepService(engine))  # type: ignore[type-abstract]
+    instrument_app(app)
+    install_profiler(app, lambda: service_provider.get(Engine))
+    # Everything bound to the engine is registered, and replaced by
+    # reload_database, as one generation
+    service_provider.replace(*_database_services(engine, db_path))
+    # reload_database closes the BlockService it replaces; at exit, whichever
+    # is current commits its queued edits
+    atexit.register(
+        lambda: service_provider.get(BlockServiceInterface).close()  # type: ignore[type-abstract]
+    )
     service_provider.register(ConfigDict, app.config)
+    gate = DatabaseGate()
+    service_provider.register(DatabaseGate, gate)
+    # Entries carry the generation and block revision, so reloads and block
+    # edits need no invalidation
+    service_provider.register(ResponseCache, ResponseCache())
+    # Maintenance jobs run in the background, while no request is running
+    jobs = create_scheduler(service_provider, db_path)
+    service_provider.register(Scheduler, jobs)
 
     # Define static file routes
     define_root_static_files(app)
@@ -160,7 +274,33 @@ def create_app() -> Flask:
     app.register_blueprint(stats.bp)
     app.register_blueprint(trends.bp)
     app.register_blueprint(sleeps.bp)
-    app.register_blueprint(admin.create_admin_blueprint(engine))
+    app.register_blueprint(exports.bp)
+    app.register_blueprint(
+        admin.create_admin_blueprint(
+            db_path,
+            lambda path: reload_database(service_provider, db_path, path),
+            jobs,
+        )
+    )
+
+    @app.before_request
+    def enter_database_gate() -> None:
+        # Admin routes do not read the database, and pull-db swaps it
+        if request.blueprint != "admin":
+            gate.enter()
+            g.database_gate = True
+
+    @app.teardown_request
+    def leave_database_gate(_: Optional[BaseException]) -> None:
+        if g.pop("database_gate", False):
+            gate.leave()
+
+    @app.before_request
+    def flush_block_edits() -> None:
+        # Everything but the edits themselves reads Block, possibly from
+        # another service or a file copy, so commit queued edits first
+        if request.endpoint != "blocks.update_blocks":
+            service_provider.get(BlockServiceInterface).flush()  # type: ignore[type-abstract]
 
     # Register routes
     @app.route("/")
@@ -168,6 +308,13 @@ def create_app() -> Flask:
         """Serve index.html"""
         return send_from_directory("data/static", "index.html")
 
+    if scheduler:
+        jobs.start()
+        atexit.register(jobs.stop)
+
+    STARTUP_SECONDS.set(time.monotonic() - started)
+    START_TIME.set(time.time())
+    log.info(f"create_app took {time.monotonic() - started} seconds")
     return app
 
 
@@ -205,6 +352,9 @@ def init_database(db_path: str, data_path: str) -> Engine:
         # Test database connection
         check_db_connection(engine=engine)
 
+        if CREATE_INDEXES:
+            ensure_indexes(engine)
+
         return engine
 
     except Exception as e:
@@ -0,0 +1,256 @@
+from datetime import date
+from typing import Any, Dict, List, Optional, Sequence, Tuple
+
+import numpy as np
+from sqlalchemy import distinct, func, select
+from sqlalchemy.engine import Engine
+
+from ..calendarindex import CalendarIndex, Granularity, get_calendar_index
+from ..constants import DEFAULT_TZ
+from ..interfaces.aggregationserviceinterface import (
+    AggregationServiceInterface,
+    Dimension,
+)
+from ..models.block import Block
+from ..models.category import Category
+from ..models.project import Project
+from ..models.type_ import Type
+from ..timezones import SECONDS_PER_DAY
+from ..utils import timeit
+
+# HH:MM for every minute of the day, indexed by minute-of-day
+TIME_LABELS = np.array([f"{m // 60:02d}:{m % 60:02d}" for m in range(24 * 60)])
+
+
+# Row key prefix and model of each dimension
+DIMENSIONS: Dict[Dimension, Tuple[str, Any]] = {
+    Dimension.TYPE: ("type", Type),
+    Dimension.PROJECT: ("project", Project),
+    Dimension.CATEGORY: ("category", Category),
+}
+
+
+def day_labels(days: np.ndarray) -> np.ndarray:
+    """YYYY-MM-DD strings for day numbers (days since 1970-01-01)."""
+    return np.datetime_as_string(days.astype("datetime64[D]"), unit="D")
+
+
+class AggregationService(AggregationServiceInterface):
+    """Aggregates pushed down to SQLite, returning only the grouped rows.
+
+    Blocks whose project_uid is 0 or NULL (or points at no Project) are reported
+    with project_uid None, as their BlockDTOs would be.
+    """
+
+    def __init__(self, engine: Engine, timezone: str = DEFAULT_TZ):
+        self._engine = engine
+        self._timezone = timezone
+
+    def _range(
+        self, start_date: date, end_date: date, timezone: Optional[str]
+    ) -> Tuple[CalendarIndex, int, int]:
+        calendar = get_calendar_index(timezone or self._timezone)
+        return calendar, calendar.epoch(start_date), calendar.epoch(end_date)
+
+    @timeit
+    def aggregate(
+        self,
+        start_date: date,
+        end_date: date,
+        group_by: Sequence[Dimension],
+        bucket: Optional[Granularity] = None,
+        type_uids: Optional[List[int]] = None,
+        include_hidden: bool = True,
+        top: Optional[int] = None,
+        timezone: Optional[str] = None,
+    ) -> List[Dict[str, Any]]:
+        calendar, start_ts, end_ts = self._range(start_date, end_date, timezone)
+        dimensions = [DIMENSIONS[d] for d in dict.fromkeys(group_by)]
+        uids = [model.uid for _, model in dimensions]
+        count = func.count(Block.uid)
+        first = func.min(Block.date)
+        query = (
+            select(*uids, *(model.name for _, model in dimensions), count, first)
+            .select_from(Block)
+            .outerjoin(Type, Block.type_uid == Type.uid)
+            .where(Block.date >= start_ts, Block.date < end_ts)
+        )
+        if Dimension.PROJECT in group_by:
+            query = query.outerjoin(Project, Block.project_uid == Project.uid)
+        if Dimension.CATEGORY in group_by:
+            query = query.outerjoin(Category, Type.category_uid == Category.uid)
+        if type_uids:
+            query = query.where(Block.type_uid.in_(type_uids))
+        if not include_hidden:
+            query = query.where(Type.hidden.isnot(True))
+        if bucket is None:
+            # Ties keep the order in which each group first appears
+            query = query.group_by(*uids).order_by(count.desc(), first).limit(top)
+        else:
+            # Per local day here; days are merged into weeks or months below
+            local_day = (
+                calendar.tz.local_expr(Block.date, start_ts, end_ts) // SECONDS_PER_DAY
+            )
+            query = query.add_columns(local_day).group_by(local_day, *uids)
+        n = len(dimensions)
+        with self._engine.connect() as conn:
+            # Without any group, an empty range still gives a row of 0 blocks
+            rows = [row for row in conn.execute(query) if row[2 * n]]
+        if not rows:
+            return []
+
+        names = [dict((row[i], row[n + i]) for row in rows) for i in range(n)]
+        if bucket is None:
+            return [
+                self._row(dimensions, names, row[:n], None, row[2 * n]) for row in rows
+            ]
+
+        columns = [np.array(c) for c in zip(*rows)]
+        # -1 stands for no type, project or category, which have no uid
+        keys = np.stack(
+            [
+                calendar.bucket(calendar.day_epochs(columns[-1]), bucket),
+                *(
+                    np.array([-1 if u is None else u for u in c], dtype=np.int64)
+                    for c in columns[:n]
+                ),
+            ]
+        )
+        unique, inverse = np.unique(keys, axis=1, return_inverse=True)
+        inverse = inverse.ravel()
+        blocks = np.bincount(inverse, weights=columns[2 * n]).astype(np.int64)
+        firsts = np.full(unique.shape[1], np.iinfo(np.int64).max)
+        np.minimum.at(firsts, inverse, columns[2 * n + 1].astype(np.int64))
+        order = np.lexsort((firsts, -blocks, unique[0]))
+        if top is not None:
+            periods = unique[0][order]
+            starts = np.flatnonzero(np.r_[True, periods[1:] != periods[:-1]])
+            rank = np.arange(len(order)) - np.repeat(
+                starts, np.diff(np.r_[starts, len(order)])
+            )
+            order = order[rank < top]
+        period_days = calendar.tz.local_day(calendar.starts(bucket)[unique[0][order]])
+        labels: List[str] = day_labels(period_days).tolist()
+        return [
+            self._row(
+                dimensions,
+                names,
+                [None if u == -1 else int(u) for u in unique[1:, i]],
+                label,
+                int(blocks[i]),
+            )
+            for i, label in zip(order, labels)
+        ]
+
+    @staticmethod
+    def _row(
+        dimensions: List[Tuple[str, Any]],
+        names: List[Dict[Any, str]],
+        uids: Sequence[Optional[int]],
+        period_start: Optional[str],
+        blocks: int,
+    ) -> Dict[str, Any]:
+        row: Dict[str, Any] = (
+            {} if period_start is None else {"period_start": period_start}
+        )
+        for (key, _), dimension_names, uid in zip(dimensions, names, uids):
+            row[f"{key}_uid"] = uid
+            row[key] = dimension_names[uid]
+        row["blocks"] = blocks
+        row["hours"] = round(blocks * 0.25, 2)
+        return row
+
+    @timeit
+    def get_totals(
+        self,
+        start_date: date,
+        end_date: date,
+        type_uids: Optional[List[int]] = None,
+        timezone: Optional[str] = None,
+    ) -> List[Dict[str, Any]]:
+        return self.aggregate(
+            start_date,
+            end_date,
+            [Dimension.TYPE, Dimension.PROJECT],
+            type_uids=type_uids,
+            timezone=timezone,
+        )
+
+    @timeit
+    def get_active_days(
+        self,
+        start_date: date,
+        end_date: date,
+        type_uid: Optional[int] = None,
+        timezone: Optional[str] = None,
+    ) -> List[str]:
+        calendar, start_ts, end_ts = self._range(start_date, end_date, timezone)
+        local_day = (
+            calendar.tz.local_expr(Block.date, start_ts, end_ts) // SECONDS_PER_DAY
+        )
+        query = (
+            select(distinct(local_day))
+            .where(Block.date >= start_ts, Block.date < end_ts)
+            .order_by(local_day)
+        )
+        if type_uid is not None:
+            query = query.where(Block.type_uid == type_uid)
+        with self._engine.connect() as conn:
+            days = np.array(conn.execute(query).scalars().all(), dtype=np.int64)
+        labels: List[str] = day_labels(days).tolist()
+        return labels
+
+    @timeit
+    def get_daily_ledger(
+        self,
+        start_date: date,
+        end_date: date,
+        timezone: Optional[str] = None,
+    ) -> Dict[str, List[Dict[str, Any]]]:
+        calendar, start_ts, end_ts = self._range(start_date, end_date, timezone)
+        query = (
+            select(
+                Block.date,
+                Type.uid,
+                Type.name,
+                Project.uid,
+                Project.name,
+                func.coalesce(Block.comment, ""),
+            )
+            .select_from(Block)
+            .outerjoin(Type, Block.type_uid == Type.uid)
+            .outerjoin(Project, Block.project_uid == Project.uid)
+            .where(Block.date >= start_ts, Block.date < end_ts)
+            .order_by(Block.date)
+        )
+        with self._engine.connect() as conn:
+            rows = conn.execute(query).all()
+        if not rows:
+            return {}
+
+        # Format dates and times for the whole range at once
+        local = calendar.tz.to_local(np.array([row[0] for row in rows]))
+        days, day_index = np.unique(local // SECONDS_PER_DAY, return_inverse=True)
+        day_strs: List[str] = day_labels(days).tolist()
+        times: List[str] = TIME_LABELS[(local % SECONDS_PER_DAY) // 60].tolist()
+
+        ledger: Dict[str, List[Dict[str, Any]]] = {day: [] for day in day_strs}
+        for i, (
+            _,
+            type_uid,
+            type_name,
+            project_uid,
+            project_name,
+            comment,
+        ) in enumerate(rows):
+            ledger[day_strs[day_index[i]]].append(
+                {
+                    "time": times[i],
+                    "type_uid": type_uid,
+                    "type": type_name,
+                    "project_uid": project_uid,
+                    "project": project_name,
+                    "comment": comment,
+                }
+            )
+        return ledger
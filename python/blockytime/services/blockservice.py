@@ -1,34 +1,160 @@
 import logging
-from datetime import datetime, timedelta
-from typing import Dict, List, Sequence, Tuple
+from bisect import bisect_left
+from datetime import date, datetime, timedelta
+from typing import Dict, Iterator, List, Optional, Sequence, Tuple
 
+from blockytime.blockjournal import BlockEdit, BlockWriteQueue
+from blockytime.changelog import ChangeLog
+from blockytime.constants import BLOCK_PAGE_SIZE
+from blockytime.dtos.block_changes_dto import BlockChangesDTO
 from blockytime.dtos.block_dto import BlockDTO
+from blockytime.dtos.block_page_dto import BlockPageDTO
+from blockytime.dtos.blockytimeconfig_dto import BlockyTimeConfig, TimePrecision
+from blockytime.dtos.week_grid_dto import WeekGridDTO
 from blockytime.interfaces.blockserviceinterface import BlockServiceInterface
 from blockytime.models.block import Block
 from blockytime.models.project import Project
 from blockytime.models.type_ import Type
-from sqlalchemy import delete
+from blockytime.utils import timeit
+from sqlalchemy import delete, insert, select
 from sqlalchemy.engine import CursorResult, Engine
 from sqlalchemy.orm import Session
 
 log = logging.getLogger(__name__)
 
+# Dates per DELETE ... IN (...) statement, below SQLite's bound-parameter limit
+BULK_DELETE_BATCH = 500
+WEEK_DAYS = 7
+QUARTERS_PER_DAY = 96
+
+
+def _grid_slot_minutes(config: BlockyTimeConfig) -> int:
+    """Quarter hours are shown as they are only when pixelating is disabled."""
+    if (
+        config.main_time_precision == TimePrecision.QuarterHour
+        and config.disable_pixelate
+    ):
+        return 15
+    return 30
+
+
+def _reduce_quarters(
+    quarters: List[List[int]], slot_minutes: int, first_wins: bool
+) -> List[List[int]]:
+    """Reduce rows of quarter-hour type uids (0 for none) to slot_minutes cells.
+
+    A cell shows the type of most of its quarters, the earliest on a tie; with
+    first_wins (half-hour precision, where the app writes the first quarter)
+    the first quarter that has a block.
+    """
+    per_cell = slot_minutes // 15
+    if per_cell == 1:
+        return quarters
+    cells = []
+    for day in quarters:
+        row = []
+        for i in range(0, len(day), per_cell):
+            uids = [uid for uid in day[i : i + per_cell] if uid]
+            if not uids:
+                row.append(0)
+            elif first_wins:
+                row.append(uids[0])
+            else:
+                row.append(
+                    max(uids, key=lambda uid: (uids.count(uid), -uids.index(uid)))
+                )
+        cells.append(row)
+    return cells
 
-class BlockService(BlockServiceInterface):
-    _cache: Dict[str, Tuple[List[BlockDTO], datetime]] = {}
 
-    def __init__(self, engine: Engine):
+class BlockService(BlockServiceInterface):
+    def __init__(
+        self,
+        engine: Engine,
+        journal_path: Optional[str] = None,
+        write_delay_ms: int = 0,
+        write_max_edits: int = 1,
+    ):
+        """With journal_path, update_blocks returns once edits are journaled and
+        group-commits them in the background (see blockjournal.py); journaled
+        edits left by a previous run are applied here.
+        """
         self.engine = engine
+        # Per instance, so a service built for a new database starts empty.
+        # Entries keep their [start, end) timestamps for record_external_changes
+        self._cache: Dict[str, Tuple[List[BlockDTO], datetime, int, int]] = {}
+        self._changes = ChangeLog()
+        self._write_queue: Optional[BlockWriteQueue] = None
+        if journal_path is not None:
+            self._write_queue = BlockWriteQueue(
+                journal_path, self._apply_edits, write_delay_ms, write_max_edits
+            )
+            self._write_queue.start()
+
+    def flush(self) -> int:
+        if self._write_queue is None:
+            return 0
+        return self._write_queue.flush()
+
+    def close(self) -> None:
+        """Commit queued edits; later updates are written synchronously."""
+        with self._changes.lock:
+            if self._write_queue is not None:
+                self._write_queue.close()
+                self._write_queue = None
+
+    def get_revision(self) -> int:
+        return self._changes.revision
+
+    def reset_changes(self) -> int:
+        self._cache.clear()
+        return self._changes.reset()
+
+    def record_external_changes(self, dates: Sequence[int]) -> int:
+        if not dates:
+            return self._changes.revision
+        ordered = sorted(dates)
+        with self._changes.lock:
+            for key, (_, _, start_ts, end_ts) in list(self._cache.items()):
+                i = bisect_left(ordered, start_ts)
+                if i < len(ordered) and ordered[i] < end_ts:
+                    self._cache.pop(key, None)
+            return self._changes.record(ordered)
+
+    @timeit
+    def get_changes(self, since: int) -> BlockChangesDTO:
+        self.flush()
+        changes = self._changes.since(since)
+        if changes.reset:
+            return BlockChangesDTO(changes.revision, True)
+        with Session(self.engine) as session:
+            blocks: List[Block] = []
+            for i in range(0, len(changes.dates), BULK_DELETE_BATCH):
+                blocks.extend(
+                    session.query(Block)
+                    .filter(Block.date.in_(changes.dates[i : i + BULK_DELETE_BATCH]))
+                    .order_by(Block.date)
+                )
+            present = {b.date for b in blocks}
+            changes_dto = BlockChangesDTO(
+                changes.revision,
+                False,
+                [b.to_dto() for b in blocks],
+                [d for d in changes.dates if d not in present],
+            )
+        return changes_dto
 
     def get_cache_key(self, start_date: datetime, end_date: datetime) -> str:
         return f"{start_date.timestamp()}-{end_date.timestamp()}"
 
+    @timeit
     def get_blocks(
         self, start_date: datetime, end_date: datetime
     ) -> Sequence[BlockDTO]:
+        self.flush()
         cache_key = self.get_cache_key(start_date, end_date)
         if cache_key in self._cache:
-            blocks, timestamp = self._cache[cache_key]
+            blocks, timestamp, _, _ = self._cache[cache_key]
             if timestamp >= datetime.now():
                 return blocks
 
@@ -46,11 +172,117 @@ class BlockService(BlockServiceInterface):
             self._cache[cache_key] = (
                 list(map(lambda b: b.to_dto(), blocks2)),
                 datetime.now() + timedelta(seconds=1),
+                start_ts,
+                end_ts,
             )
 
             return self._cache[cache_key][0]
 
-    def update_blocks(self, blocks: List[BlockDTO]) -> bool:
+    @timeit
+    def get_blocks_page(
+        self,
+        start_date: datetime,
+        end_date: datetime,
+        limit: int,
+        after: Optional[int] = None,
+    ) -> BlockPageDTO:
+        self.flush()
+        start_ts = int(start_date.timestamp())
+        end_ts = int(end_date.timestamp())
+        with Session(self.engine) as session:
+            query = select(Block).where(Block.date >= start_ts, Block.date < end_ts)
+            if after is not None:
+                query = query.where(Block.date > after)
+            # One more than asked for tells whether another page follows
+            blocks = list(session.scalars(query.order_by(Block.date).limit(limit + 1)))
+            more = len(blocks) > limit
+            page = [block.to_dto() for block in blocks[:limit]]
+        return BlockPageDTO(page, page[-1].date if more else None)
+
+    def iter_blocks(
+        self,
+        start_date: datetime,
+        end_date: datetime,
+        page_size: int = BLOCK_PAGE_SIZE,
+    ) -> Iterator[List[BlockDTO]]:
+        after: Optional[int] = None
+        while True:
+            page = self.get_blocks_page(start_date, end_date, page_size, after)
+            if page.blocks:
+                yield page.blocks
+            if page.next_after is None:
+                return
+            after = page.next_after
+
+    @timeit
+    def get_week_grid(
+        self, start_date: datetime, config: BlockyTimeConfig, timezone: str
+    ) -> WeekGridDTO:
+        # Imported here so that numpy loads on the first request, not at start-up
+        from blockytime.timezones import EPOCH_ORDINAL, get_timezone_table
+
+        self.flush()
+        table = get_timezone_table(timezone)
+        first_day = start_date.date().toordinal()
+        start_ts = int(start_date.timestamp())
+        end_ts = int(table.midnight(date.fromordinal(first_day + WEEK_DAYS)))
+        with Session(self.engine) as session:
+            # Just the columns the grid needs, not the blocks' nested DTOs
+            rows = session.execute(
+                select(Block.date, Block.type_uid)
+                .where(Block.date >= start_ts, Block.date < end_ts)
+                .order_by(Block.date)
+            ).all()
+            quarters = [[0] * QUARTERS_PER_DAY for _ in range(WEEK_DAYS)]
+            if rows:
+                dates = [row[0] for row in rows]
+                local = table.to_local(dates)
+                days = table.local_day(dates) - (first_day - EPOCH_ORDINAL)
+                for (_, type_uid), day, seconds in zip(rows, days, local):
+                    quarter = int(seconds % 86400) // 900
+                    if 0 <= day < WEEK_DAYS and type_uid:
+                        quarters[int(day)][quarter] = type_uid
+            slot_minutes = _grid_slot_minutes(config)
+            cells = _reduce_quarters(
+                quarters,
+                slot_minutes,
+                config.main_time_precision == TimePrecision.HalfHour,
+            )
+            used = {uid for row in cells for uid in row if uid}
+            types = {
+                t.uid: {"name": t.name, "color": t.color}
+                for t in session.scalars(select(Type).where(Type.uid.in_(used)))
+            }
+        return WeekGridDTO(
+            start_date=start_date.date().isoformat(),
+            slot_minutes=slot_minutes,
+            cells=cells,
+            types=types,
+        )
+
+    @timeit
+    def update_blocks(
+        self, blocks: List[BlockDTO], expected_revision: Optional[int] = None
+    ) -> bool:
+        return self.update_blocks_with_revision(blocks, expected_revision) is not None
+
+    @timeit
+    def update_blocks_with_revision(
+        self, blocks: List[BlockDTO], expected_revision: Optional[int] = None
+    ) -> Optional[int]:
+        """Like update_blocks, but returns the revision of this change, or None."""
+        dates = [block.date for block in blocks]
+        with self._changes.lock:
+            self._changes.check(dates, expected_revision)
+            if self._write_queue is not None:
+                ok = self._queue_blocks(self._write_queue, blocks)
+            else:
+                ok = self._write_blocks(blocks)
+            if not ok:
+                return None
+            return self._changes.record(dates)
+
+    def _write_blocks(self, blocks: List[BlockDTO]) -> bool:
         try:
             with Session(self.engine) as session:
                 if all(
@@ -116,15 +348,124 @@ class BlockService(BlockServiceInterface):
         finally:
             self._cache.clear()
 
+    def _queue_blocks(self, queue: BlockWriteQueue, blocks: List[BlockDTO]) -> bool:
+        """Validate blocks like update_blocks does, then journal them."""
+        edits = []
+        for block in blocks:
+            if block.operation == "delete":
+                edits.append(BlockEdit(block.date, "delete"))
+            elif (
+                block.operation == "upsert"
+                and block.type_ is not None
+                and block.type_.uid is not None
+            ):
+                edits.append(
+                    BlockEdit(
+                        block.date,
+                        "upsert",
+                        block.type_.uid,
+                        block.project.uid if block.project is not None else None,
+                        block.comment,
+                    )
+                )
+            else:
+                log.error(f"Invalid block: {block}")
+                return False
+        # update_blocks fails on unknown types but lets unknown projects through
+        type_uids = {e.type_uid for e in edits if e.type_uid is not None}
+        try:
+            with self.engine.connect() as conn:
+                known = set(
+                    conn.scalars(select(Type.uid).where(Type.uid.in_(type_uids)))
+                )
+            if known != type_uids:
+                log.error(f"Cannot find types with uids {type_uids - known}")
+                return False
+            queue.submit(edits)
+            return True
+        except Exception as e:
+            log.error(e, exc_info=True)
+            return False
+
+    def _apply_edits(self, edits: List[BlockEdit]) -> None:
+        """Write the final state of each edited date in one transaction."""
+        rows = [
+            {
+                "date": e.date,
+                "type_uid": e.type_uid,
+                "project_uid": e.project_uid,
+                "comment": e.comment,
+            }
+            for e in edits
+            if e.operation == "upsert"
+        ]
+        try:
+            with Session(self.engine) as session:
+                dates = sorted({e.date for e in edits})
+                for i in range(0, len(dates), BULK_DELETE_BATCH):
+                    session.execute(
+                        delete(Block).where(
+                            Block.date.in_(dates[i : i + BULK_DELETE_BATCH])
+                        )
+                    )
+                if rows:
+                    session.execute(insert(Block), rows)
+                session.commit()
+        finally:
+            self._cache.clear()
+
+    @timeit
+    def bulk_upsert(
+        self,
+        dates: Sequence[int],
+        type_uids: Sequence[int],
+        project_uids: Sequence[Optional[int]],
+        comments: Sequence[str],
+    ) -> int:
+        """Overwrite the blocks at the given dates in a single transaction.
+
+        Unlike update_blocks, type and project uids are not looked up per row;
+        callers are expected to have validated them already.
+        """
+        # Queued edits are older, so they must not land on top of these
+        self.flush()
+        rows = [
+            {"date": d, "type_uid": t, "project_uid": p, "comment": c}
+            for d, t, p, c in zip(dates, type_uids, project_uids, comments)
+        ]
+        if not rows:
+            return 0
+        try:
+            with Session(self.engine) as session:
+                unique_dates = sorted(set(dates))
+                for i in range(0, len(unique_dates), BULK_DELETE_BATCH):
+                    session.execute(
+                        delete(Block).where(
+                            Block.date.in_(unique_dates[i : i + BULK_DELETE_BATCH])
+                        )
+                    )
+                session.execute(insert(Block), rows)
+                session.commit()
+                self._changes.record(unique_dates)
+                log.info(f"Bulk upserted {len(rows)} blocks")
+                return len(rows)
+        finally:
+            self._cache.clear()
+
+    @timeit
     def delete_blocks(self, start_date: datetime, end_date: datetime) -> int:
+        self.flush()
         start_ts = int(start_date.timestamp())
         end_ts = int(end_date.timestamp())
         try:
             with Session(self.engine) as session:
+                in_range = (Block.date >= start_ts, Block.date < end_ts)
+                dates = session.scalars(select(Block.date).where(*in_range)).all()
                 result: CursorResult = session.execute(  # type: ignore[assignment]
-                    delete(Block).where(Block.date >= start_ts, Block.date < end_ts)
+                    delete(Block).where(*in_range)
                 )
                 session.commit()
+                self._changes.record(dates)
                 log.info(
                     f"Deleted {result.rowcount} blocks in range [{start_ts}, {end_ts})"
                 )
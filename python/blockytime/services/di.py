@@ -1,5 +1,6 @@
 import logging
-from typing import Any, Dict, Type, TypeVar, cast
+import threading
+from typing import Any, Callable, Dict, Type, TypeVar, cast
 
 from flask import Flask, g
 
@@ -12,17 +13,66 @@ T = TypeVar("T", bound=object)
 class ServiceProvider:
     # Use Any for the Dict key type since we can't use Protocol directly
     _services: Dict[Type[Any], Any]
+    _factories: Dict[Type[Any], Callable[[], Any]]
 
     def __init__(self) -> None:
         self._services = {}
+        self._factories = {}
+        self._lock = threading.Lock()
+        # Bumped by replace(), e.g. when pull-db swaps in a new database
+        self.generation = 0
 
     def register(self, interface: Type[T], implementation: Any) -> None:
         """Register an implementation for an interface"""
         log.info(f"Registering {interface} with {implementation}")
         self._services[interface] = implementation
 
+    def register_factory(self, interface: Type[T], factory: Callable[[], T]) -> None:
+        """Register a factory building the implementation on first get()"""
+        log.info(f"Registering {interface} with lazy factory {factory}")
+        self._factories[interface] = factory
+
+    def replace(
+        self,
+        services: Dict[Type[Any], Any],
+        factories: Dict[Type[Any], Callable[[], Any]],
+    ) -> Dict[Type[Any], Any]:
+        """Atomically swap in a new generation of these registrations.
+
+        Requests that already got an old implementation keep using it; every
+        get() after this returns the new ones. Returns the replaced instances.
+        """
+        with self._lock:
+            old = {
+                interface: self._services[interface]
+                for interface in list(services) + list(factories)
+                if interface in self._services
+            }
+            new_services = {
+                interface: service
+                for interface, service in self._services.items()
+                if interface not in factories
+            }
+            new_services.update(services)
+            new_factories = {
+                interface: factory
+                for interface, factory in self._factories.items()
+                if interface not in services
+            }
+            new_factories.update(factories)
+            # Rebinding whole dicts keeps lock-free readers consistent
+            self._services, self._factories = new_services, new_factories
+            self.generation += 1
+        log.info(f"Replaced {len(old)} services, generation {self.generation}")
+        return old
+
     def get(self, interface: Type[T]) -> T:
         """Get the implementation for an interface"""
+        if interface not in self._services and interface in self._factories:
+            with self._lock:
+                if interface not in self._services:
+                    self._services[interface] = self._factories[interface]()
+                    log.info(f"Built {interface} on first use")
         if interface not in self._services:
             raise KeyError(
                 f"No implementation registered for interface {interface}。 Registered interfaces: {self._services.keys()}"
@@ -0,0 +1,202 @@
+import csv
+import io
+import logging
+from datetime import date
+from typing import IO, Callable, Dict, Iterator, List, Optional
+
+import numpy as np
+from sqlalchemy import func, select
+from sqlalchemy.engine import Engine
+
+from ..calendarindex import Granularity, get_calendar_index
+from ..constants import DEFAULT_TZ
+from ..interfaces.exportserviceinterface import ExportFormat, ExportServiceInterface
+from ..models.block import Block
+from ..timezones import SECONDS_PER_DAY
+from ..utils import timeit
+
+log = logging.getLogger(__name__)
+
+DEFAULT_EXPORT_CHUNK_SIZE = 50_000
+
+Columns = Dict[str, np.ndarray]
+# Column names and types of each export, known before any row is read, so
+# that an empty range still gives a file with a header or schema
+Schema = Dict[str, np.dtype]
+
+BLOCK_SCHEMA: Schema = {
+    "date": np.dtype(np.int64),
+    "type_uid": np.dtype(np.int32),
+    "project_uid": np.dtype(np.int32),
+    "comment": np.dtype(str),
+}
+ROLLUP_SCHEMA: Schema = {
+    "period_start": np.dtype("datetime64[D]"),
+    "type_uid": np.dtype(np.int32),
+    "project_uid": np.dtype(np.int32),
+    "blocks": np.dtype(np.int64),
+    "hours": np.dtype(np.float64),
+}
+
+
+def arrow_available() -> bool:
+    try:
+        import pyarrow  # noqa: F401
+    except ImportError:
+        return False
+    return True
+
+
+def default_export_format() -> ExportFormat:
+    """Arrow IPC when pyarrow is installed, NumPy .npz otherwise."""
+    return ExportFormat.ARROW if arrow_available() else ExportFormat.NPZ
+
+
+def _write_csv(chunks: Iterator[Columns], schema: Schema, out: IO[bytes]) -> int:
+    text = io.TextIOWrapper(out, encoding="utf-8", newline="", write_through=True)
+    writer = csv.writer(text)
+    writer.writerow(schema.keys())
+    rows = 0
+    for columns in chunks:
+        values = [
+            np.datetime_as_string(v) if v.dtype.kind == "M" else v
+            for v in columns.values()
+        ]
+        writer.writerows(zip(*(v.tolist() for v in values)))
+        rows += len(next(iter(columns.values())))
+    text.detach()
+    return rows
+
+
+def _write_npz(chunks: Iterator[Columns], schema: Schema, out: IO[bytes]) -> int:
+    parts: Dict[str, List[np.ndarray]] = {
+        name: [np.empty(0, dtype)] for name, dtype in schema.items()
+    }
+    for columns in chunks:
+        for name, values in columns.items():
+            parts[name].append(values)
+    arrays = {name: np.concatenate(values) for name, values in parts.items()}
+    np.savez_compressed(out, **arrays)
+    return len(next(iter(arrays.values())))
+
+
+def _write_arrow(chunks: Iterator[Columns], schema: Schema, out: IO[bytes]) -> int:
+    import pyarrow as pa
+
+    arrow_schema = pa.schema(
+        [(name, pa.from_numpy_dtype(dtype)) for name, dtype in schema.items()]
+    )
+    rows = 0
+    with pa.ipc.new_file(out, arrow_schema) as writer:
+        for columns in chunks:
+            batch = pa.RecordBatch.from_arrays(
+                [
+                    pa.array(columns[field.name], type=field.type)
+                    for field in arrow_schema
+                ],
+                schema=arrow_schema,
+            )
+            writer.write_batch(batch)
+            rows += batch.num_rows
+    return rows
+
+
+WRITERS: Dict[ExportFormat, Callable[[Iterator[Columns], Schema, IO[bytes]], int]] = {
+    ExportFormat.CSV: _write_csv,
+    ExportFormat.NPZ: _write_npz,
+    ExportFormat.ARROW: _write_arrow,
+}
+
+
+class ExportService(ExportServiceInterface):
+    def __init__(self, engine: Engine, timezone: str = DEFAULT_TZ):
+        self._engine = engine
+        self._timezone = timezone
+
+    def _iter_blocks(
+        self, start_ts: int, end_ts: int, chunk_size: int
+    ) -> Iterator[Columns]:
+        query = (
+            select(
+                Block.date,
+                func.coalesce(Block.type_uid, 0),
+                func.coalesce(Block.project_uid, 0),
+                func.coalesce(Block.comment, ""),
+            )
+            .where(Block.date >= start_ts, Block.date < end_ts)
+            .order_by(Block.date)
+        )
+        with self._engine.connect() as conn:
+            result = conn.execution_options(yield_per=chunk_size).execute(query)
+            for rows in result.partitions():
+                dates, type_uids, project_uids, comments = zip(*rows)
+                yield {
+                    "date": np.array(dates, dtype=np.int64),
+                    "type_uid": np.array(type_uids, dtype=np.int32),
+                    "project_uid": np.array(project_uids, dtype=np.int32),
+                    "comment": np.array(comments, dtype=str),
+                }
+
+    def _iter_rollup(
+        self, start_ts: int, end_ts: int, granularity: Granularity, timezone: str
+    ) -> Iterator[Columns]:
+        calendar = get_calendar_index(timezone)
+        local_day = (
+            calendar.tz.local_expr(Block.date, start_ts, end_ts) // SECONDS_PER_DAY
+        ).label("day")
+        query = (
+            select(
+                local_day,
+                func.coalesce(Block.type_uid, 0),
+                func.coalesce(Block.project_uid, 0),
+                func.count(Block.uid),
+            )
+            .where(Block.date >= start_ts, Block.date < end_ts)
+            .group_by(local_day, Block.type_uid, Block.project_uid)
+        )
+        with self._engine.connect() as conn:
+            rows = conn.execute(query).all()
+        if not rows:
+            return
+        days, type_uids, project_uids, counts = (np.array(c) for c in zip(*rows))
+
+        # Re-bucket the local days into weeks or months, summing duplicates
+        # (NULL and 0 project_uid both mean "no project" and are merged)
+        buckets = calendar.bucket(calendar.day_epochs(days), granularity)
+        keys = np.stack([buckets, type_uids, project_uids])
+        unique, inverse = np.unique(keys, axis=1, return_inverse=True)
+        blocks = np.bincount(inverse.ravel(), weights=counts).astype(np.int64)
+        bucket_days = calendar.tz.local_day(calendar.starts(granularity)[unique[0]])
+        yield {
+            "period_start": bucket_days.astype("datetime64[D]"),
+            "type_uid": unique[1].astype(np.int32),
+            "project_uid": unique[2].astype(np.int32),
+            "blocks": blocks,
+            "hours": blocks * 0.25,
+        }
+
+    @timeit
+    def export_blocks(
+        self,
+        start_date: date,
+        end_date: date,
+        out: IO[bytes],
+        fmt: ExportFormat,
+        rollup: Optional[Granularity] = None,
+        timezone: Optional[str] = None,
+        chunk_size: int = DEFAULT_EXPORT_CHUNK_SIZE,
+    ) -> int:
+        timezone = timezone or self._timezone
+        calendar = get_calendar_index(timezone)
+        start_ts = calendar.epoch(start_date)
+        end_ts = calendar.epoch(end_date)
+        if rollup is None:
+            chunks = self._iter_blocks(start_ts, end_ts, chunk_size)
+            schema = BLOCK_SCHEMA
+        else:
+            chunks = self._iter_rollup(start_ts, end_ts, rollup, timezone)
+            schema = ROLLUP_SCHEMA
+        rows = WRITERS[fmt](chunks, schema, out)
+        kind = "blocks" if rollup is None else f"{rollup.value} rollup rows"
+        log.info(f"Exported {rows} {kind} as {fmt.value} for {start_date} - {end_date}")
+        return rows
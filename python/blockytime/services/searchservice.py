@@ -0,0 +1,54 @@
+from datetime import datetime
+from typing import List, Optional
+
+from sqlalchemy import select
+from sqlalchemy.engine import Engine
+from sqlalchemy.orm import Session
+
+from ..dtos.comment_match_dto import CommentMatchDTO
+from ..interfaces.searchserviceinterface import SearchServiceInterface
+from ..models.block import Block
+from ..search import CommentIndex
+from ..utils import timeit
+
+
+class SearchService(SearchServiceInterface):
+    """Comment search over the side index in search.py, which brings itself
+    up to date with the database before every search."""
+
+    def __init__(self, engine: Engine, index: CommentIndex):
+        self._engine = engine
+        self._index = index
+
+    @timeit
+    def search_comments(
+        self,
+        query: str,
+        start_date: Optional[datetime] = None,
+        end_date: Optional[datetime] = None,
+        limit: int = 50,
+    ) -> List[CommentMatchDTO]:
+        matches = self._index.search(
+            query,
+            int(start_date.timestamp()) if start_date is not None else None,
+            int(end_date.timestamp()) if end_date is not None else None,
+            limit,
+        )
+        if not matches:
+            return []
+        with Session(self._engine) as session:
+            blocks = {
+                block.date: block
+                for block in session.scalars(
+                    select(Block).where(Block.date.in_([date for date, _ in matches]))
+                )
+            }
+            # A block deleted since the index was synced has no match
+            return [
+                CommentMatchDTO(block=blocks[date].to_dto(), rank=rank)
+                for date, rank in matches
+                if date in blocks
+            ]
+
+    def rebuild_index(self) -> int:
+        return self._index.rebuild().added
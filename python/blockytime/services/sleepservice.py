@@ -1,23 +1,25 @@
-from datetime import date, datetime, timedelta
+from datetime import date, timedelta
 from typing import List, cast
 
 import numpy as np
 import pytz
+from blockytime.calendarindex import get_calendar_index
 from blockytime.constants import DEFAULT_TZ
 from blockytime.models.block import Block
 from blockytime.models.type_ import Type
+from blockytime.timezones import SECONDS_PER_DAY, get_timezone_table, zone_name
 from sqlalchemy import func
 from sqlalchemy.engine import Engine
 from sqlalchemy.orm import Session
 
 from ..dtos.sleep_dto import SleepStatsDTO
 from ..interfaces.sleepserviceinterface import SleepServiceInterface
+from ..utils import timeit
 
 
 class SleepService(SleepServiceInterface):
     def __init__(self, engine: Engine):
         self.engine = engine
-        self.timezone = pytz.timezone(DEFAULT_TZ)
 
     def _get_date_boundaries(
         self, date_obj: date, cut_off_hour: int, timezone: pytz.BaseTzInfo
@@ -33,33 +35,14 @@ class SleepService(SleepServiceInterface):
             cut_off_hour: The hour in local time to use as the boundary (0-23)
             timezone: The timezone to use for the cut-off time
         """
-        # Create naive datetime at 00:00:00
-        naive_start_of_day = datetime.combine(date_obj, datetime.min.time())
-
-        # Get UTC offset for this date
-        utc_offset = timezone.utcoffset(naive_start_of_day)
-        if utc_offset is None:
-            raise ValueError("Timezone offset is None")
-        utc_offset_hours = utc_offset.total_seconds() / 3600
-
-        # For start_date: previous day cut_off_hour:00 in local time
-        start_timestamp = int(
-            (
-                naive_start_of_day
-                - timedelta(days=1)
-                + timedelta(hours=cut_off_hour - utc_offset_hours)
-            ).timestamp()
+        calendar = get_calendar_index(zone_name(timezone))
+        start_timestamp = calendar.local_epoch(
+            date_obj - timedelta(days=1), cut_off_hour * 3600
         )
-
-        # For end_date: current day cut_off_hour:00 in local time
-        end_timestamp = int(
-            (
-                naive_start_of_day + timedelta(hours=cut_off_hour - utc_offset_hours)
-            ).timestamp()
-        )
-
+        end_timestamp = calendar.local_epoch(date_obj, cut_off_hour * 3600)
         return start_timestamp, end_timestamp
 
+    @timeit
     def get_sleep_stats(
         self,
         start_date: date,
@@ -76,17 +59,11 @@ class SleepService(SleepServiceInterface):
                 end_date, cut_off_hour, timezone
             )
 
-            # Calculate sleep day (18:00 GMT+8 to next day 18:00 GMT+8)
-            # 14 * 60 * 60 = 14 hours in seconds (18:00 GMT+8 = 10:00 UTC)
-            # 24 * 60 * 60 = 24 hours in seconds
-            utc_offset = self.timezone.utcoffset(datetime.now())
-            if utc_offset is None:
-                raise ValueError("Timezone offset is None")
-            utc_offset_hours = int(utc_offset.total_seconds() / 3600)
-            sleep_day_offset = (
-                24 - cut_off_hour + utc_offset_hours
-            ) * 3600  # Convert hours to seconds
-            sleep_day = (Block.date - sleep_day_offset) // (24 * 60 * 60)
+            # Calculate sleep day ({cut_off_hour}:00 local to next day {cut_off_hour}:00
+            # local), using the UTC offset in effect for each block
+            tz = get_timezone_table(zone_name(timezone))
+            local_date = tz.local_expr(Block.date, start_timestamp, end_timestamp)
+            sleep_day = (local_date - cut_off_hour * 3600) // SECONDS_PER_DAY
 
             results = (
                 session.query(
@@ -118,6 +95,7 @@ class SleepService(SleepServiceInterface):
                 if row.duration / 3600.0 - cast(float, row.count) * 0.25 <= 1.0
             ]
 
+    @timeit
     def calculate_sleep_stats(
         self,
         start_date: date,
@@ -164,59 +142,40 @@ class SleepService(SleepServiceInterface):
                 dates
             )
         """
-        # Calculate UTC offset
-        utc_off = timezone.utcoffset(datetime.now())
-        if utc_off is None:
-            raise ValueError("Cannot calculate utcoffset")
-        utc_offset: int = int(utc_off.total_seconds() / 3600)
-
         # Get sleep stats from service
         sleep_stats: List[SleepStatsDTO] = self.get_sleep_stats(
             start_date, end_date, cut_off_hour=cut_off_hour, timezone=timezone
         )
 
-        # Extract sleep durations
-        sleep_day_tuple = [
-            (
-                stat.date,
-                (
-                    (
-                        stat.start_time
-                        + utc_offset * 3600
-                        - start_time_cut_off_hour * 3600
-                    )
-                    % (24 * 3600)
-                )
-                / 3600.0
-                + start_time_cut_off_hour,  # hour in GMT+8, [8, 24+8)
-                (
-                    (stat.end_time + utc_offset * 3600 - end_time_cut_off_hour * 3600)
-                    % (24 * 3600)
-                )
-                / 3600.0
-                + end_time_cut_off_hour,  # hour in GMT+8, [14, 24+14)
-                stat.duration,
-            )
-            for stat in sleep_stats
-        ]
-
-        # Filtering
-        sleep_day_tuple = [
-            (date, start_hour, end_hour, duration)
-            for date, start_hour, end_hour, duration in sleep_day_tuple
-            if start_hour > filter_start_time_after
-            and end_hour
-            > filter_end_time_after  # (20, 31) ~ 8PM - 7AM, (27, 37) ~ 3AM - 1PM
-        ]
+        tz = get_timezone_table(zone_name(timezone))
+        all_dates = np.array([stat.date for stat in sleep_stats], dtype=np.int64)
+        local_starts = tz.to_local(
+            np.array([stat.start_time for stat in sleep_stats], dtype=np.int64)
+        )
+        local_ends = tz.to_local(
+            np.array([stat.end_time for stat in sleep_stats], dtype=np.int64)
+        )
+        all_durations = np.array([stat.duration for stat in sleep_stats], dtype=float)
+
+        # Local hour of day, [8, 24+8) for start and [14, 24+14) for end
+        all_start_hours = (
+            (local_starts - start_time_cut_off_hour * 3600) % SECONDS_PER_DAY
+        ) / 3600.0 + start_time_cut_off_hour
+        all_end_hours = (
+            (local_ends - end_time_cut_off_hour * 3600) % SECONDS_PER_DAY
+        ) / 3600.0 + end_time_cut_off_hour
+
+        # Filtering: (20, 31) ~ 8PM - 7AM, (27, 37) ~ 3AM - 1PM
+        mask = (all_start_hours > filter_start_time_after) & (
+            all_end_hours > filter_end_time_after
+        )
 
         # Sort by date
-        sleep_day_tuple.sort(key=lambda x: x[0])
-
-        # Separate dates and hours
-        dates = np.array([x[0] for x in sleep_day_tuple])
-        start_hours = np.array([x[1] for x in sleep_day_tuple])
-        end_hours = np.array([x[2] for x in sleep_day_tuple])
-        durations = np.array([x[3] for x in sleep_day_tuple])
+        order = np.argsort(all_dates[mask], kind="stable")
+        dates = all_dates[mask][order]
+        start_hours = all_start_hours[mask][order]
+        end_hours = all_end_hours[mask][order]
+        durations = all_durations[mask][order]
 
         def ewma(data: np.ndarray) -> np.ndarray:
             weights = np.array([decay_factor**i for i in range(window_size)][::-1])
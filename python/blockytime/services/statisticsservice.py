@@ -1,11 +1,11 @@
-from datetime import date, datetime
+from datetime import date
 from typing import Dict, List, Optional, cast
-from zoneinfo import ZoneInfo
 
 from sqlalchemy import func, text
 from sqlalchemy.engine import Engine
 from sqlalchemy.orm import Session
 
+from ..calendarindex import get_calendar_index
 from ..constants import DEFAULT_TZ
 from ..dtos.statistics_dto import StatisticsDTO
 from ..dtos.type_dto import TypeDTO
@@ -14,14 +14,11 @@ from ..models.block import Block
 from ..models.type_ import Type
 from ..utils import timeit
 
-# Server timezone configuration
-SERVER_TZ = ZoneInfo(DEFAULT_TZ)
-SERVER_TZ_OFFSET = 8 * 3600  # 8 hours in seconds (Asia/Hong_Kong does not observe DST)
-
 
 class StatisticsService(StatisticsServiceInterface):
-    def __init__(self, engine: Engine):
+    def __init__(self, engine: Engine, timezone: str = DEFAULT_TZ):
         self._engine = engine
+        self._timezone = timezone
 
     @timeit
     def get_statistics(
@@ -33,6 +30,7 @@ class StatisticsService(StatisticsServiceInterface):
         hour: Optional[int] = None,
         minute: Optional[int] = None,
         day_of_week: Optional[int] = None,
+        timezone: Optional[str] = None,
     ) -> List[StatisticsDTO]:
         if time_slot_minutes not in (15, 30):
             raise ValueError("time_slot_minutes must be either 15 or 30")
@@ -44,25 +42,26 @@ class StatisticsService(StatisticsServiceInterface):
                     f"minute must be a multiple of {time_slot_minutes}. currently it is {minute}"
                 )
 
+        calendar = get_calendar_index(timezone or self._timezone)
+        start_ts = calendar.epoch(start_date)
+        end_ts = calendar.epoch(end_date)
+        # Local wall-clock time of each block, following DST transitions in range
+        local_time = func.datetime(
+            calendar.tz.local_expr(Block.date, start_ts, end_ts), "unixepoch"
+        )
+
         with Session(self._engine) as session:
             query = session.query(Block.type_uid, func.count(Block.uid).label("count"))
 
             # Add time slot filtering if specified
             if hour is not None:
-                # Adjust for HK timezone (UTC+8)
                 query = query.filter(
-                    func.strftime(
-                        "%H", func.datetime(Block.date + SERVER_TZ_OFFSET, "unixepoch")
-                    )
-                    == str(hour).zfill(2)
+                    func.strftime("%H", local_time) == str(hour).zfill(2)
                 )
 
                 if minute is not None:
                     query = query.filter(
-                        func.strftime(
-                            "%M",
-                            func.datetime(Block.date + SERVER_TZ_OFFSET, "unixepoch"),
-                        ).between(
+                        func.strftime("%M", local_time).between(
                             str(minute).zfill(2),
                             str(minute + time_slot_minutes - 1).zfill(2),
                         )
@@ -71,19 +70,11 @@ class StatisticsService(StatisticsServiceInterface):
             # Add day of week filtering if specified
             if day_of_week is not None:
                 query = query.filter(
-                    func.strftime(
-                        "%w", func.datetime(Block.date + SERVER_TZ_OFFSET, "unixepoch")
-                    )
-                    == str(day_of_week)
+                    func.strftime("%w", local_time) == str(day_of_week)
                 )
 
             # Base time filtering
-            query = query.filter(
-                Block.date
-                >= int(datetime.combine(start_date, datetime.min.time()).timestamp()),
-                Block.date
-                < int(datetime.combine(end_date, datetime.min.time()).timestamp()),
-            )
+            query = query.filter(Block.date >= start_ts, Block.date < end_ts)
 
             # Type filtering
             if type_uids:
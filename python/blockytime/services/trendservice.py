@@ -1,121 +1,101 @@
-from datetime import date, datetime
-from typing import Any, Dict, List, cast
-from zoneinfo import ZoneInfo
+from datetime import date
+from typing import Dict, List, Optional, Tuple
 
-from sqlalchemy import and_, func, literal
-from sqlalchemy.engine import Engine, Row
+import numpy as np
+from sqlalchemy import func
+from sqlalchemy.engine import Engine
 from sqlalchemy.orm import Session
 
+from ..calendarindex import CalendarIndex, Granularity, get_calendar_index
 from ..constants import DEFAULT_TZ
 from ..dtos.trenditem_dto import TrendDataDTO, TrendDataPoint
 from ..dtos.type_dto import TypeDTO
 from ..interfaces.trendserviceinterface import TrendGroupBy, TrendServiceInterface
 from ..models.block import Block
 from ..models.type_ import Type
+from ..timezones import SECONDS_PER_DAY
 from ..utils import timeit
 
-# Server timezone configuration
-SERVER_TZ = ZoneInfo(DEFAULT_TZ)
-SERVER_TZ_OFFSET = 8 * 3600  # 8 hours in seconds (Asia/Hong_Kong does not observe DST)
-
-
-def get_local_midnight_timestamp(d: date, tz: ZoneInfo = SERVER_TZ) -> int:
-    """
-    Get Unix timestamp for midnight (00:00:00) of given date in server timezone.
-    """
-    return int(datetime.combine(d, datetime.min.time()).replace(tzinfo=tz).timestamp())
-
 
 @timeit
 def get_trend_data(
     session: Session,
     start_ts: int,
     end_ts: int,
-    time_format_str: str,
-) -> List[Row[Any]]:
+    granularity: Granularity,
+    calendar: CalendarIndex,
+) -> Tuple[List[str], Dict[int, np.ndarray]]:
     """
-    Get trend data with customizable time grouping.
+    Get trend data grouped by calendar bucket.
+
+    Blocks are counted per type and local day in SQL, then the days are bucketed
+    with the calendar index. Only buckets that contain a block within
+    [start_ts, end_ts) are returned, but their totals cover the whole bucket.
 
     Args:
         session: SQLAlchemy session
         start_ts: Start timestamp
         end_ts: End timestamp
-        time_format_str: Format string for the time grouping
-            e.g., for daily: "%Y-%m-%d"
-            e.g., for weekly: "%Y-%W-1"
-            e.g., for monthly: "%Y-%m-01"
+        granularity: Bucket size (day, week or month)
+        calendar: Calendar index of the timezone to bucket in
+
+    Returns:
+        Tuple of (bucket labels, durations in hours per label keyed by type uid)
     """
-    # First, create a subquery for all possible dates in the range
-    date_series = (
-        session.query(
-            func.strftime(
-                time_format_str,
-                func.datetime(Block.date + SERVER_TZ_OFFSET, "unixepoch"),
-            ).label("time")
-        )
-        .where(Block.date >= start_ts, Block.date < end_ts)
-        .group_by("time")
-        .subquery()
+    query_start = calendar.floor(start_ts, granularity)
+    query_end = calendar.ceil(end_ts, granularity)
+    local_day = (
+        calendar.tz.local_expr(Block.date, query_start, query_end) // SECONDS_PER_DAY
     )
-
-    # Then, create a subquery for all types
-    types = session.query(Type).subquery()
-
-    # Create a cross join between dates and types to get all possible combinations
-    base = (
+    rows = (
         session.query(
-            types.c.uid,
-            date_series.c.time,
+            Block.type_uid,
+            local_day.label("day"),
+            func.count(Block.uid).label("count"),
         )
-        .select_from(date_series)
-        .join(types, literal(1) == literal(1))
-        .order_by(types.c.uid, date_series.c.time)
-        .subquery()
+        .filter(Block.date >= query_start, Block.date < query_end)
+        .group_by(Block.type_uid, "day")
+        .all()
     )
+    if not rows:
+        return [], {}
 
-    # As for Blocks, let's group them by type and date.
-    blocks = (
-        session.query(
-            Block.type_uid.label("type_uid"),
-            func.strftime(
-                time_format_str,
-                func.datetime(Block.date + SERVER_TZ_OFFSET, "unixepoch"),
-            ).label("time_label"),
-            func.coalesce((func.count(Block.uid) * 0.25), literal(0.0)).label(
-                "duration"
-            ),
-        )
-        .group_by(Block.type_uid, "time_label")
-        .order_by(Block.type_uid, "time_label")
-        .subquery()
+    type_uids = np.array(
+        [r.type_uid if r.type_uid is not None else -1 for r in rows], dtype=np.int64
     )
-    # Finally, left join with actual block counts
-    results = (
-        session.query(
-            base.c.uid.label("type_uid"),
-            base.c.time.label("time_label"),
-            func.coalesce((func.sum(blocks.c.duration)), literal(0.0)).label(
-                "duration"
-            ),
+    day_epochs = calendar.day_epochs([r.day for r in rows])
+    counts = np.array([r.count for r in rows], dtype=np.int64)
+
+    buckets = calendar.bucket(day_epochs, granularity)
+    in_range = (day_epochs >= start_ts) & (day_epochs < end_ts)
+    labelled = np.unique(buckets[in_range])
+    if len(labelled) == 0:
+        return [], {}
+
+    column = np.clip(np.searchsorted(labelled, buckets), 0, len(labelled) - 1)
+    keep = labelled[column] == buckets
+    durations: Dict[int, np.ndarray] = {}
+    for type_uid in np.unique(type_uids[keep]):
+        mask = keep & (type_uids == type_uid)
+        durations[int(type_uid)] = (
+            np.bincount(column[mask], weights=counts[mask], minlength=len(labelled))
+            * 0.25
         )
-        .outerjoin(
-            blocks,
-            and_(blocks.c.type_uid == base.c.uid, blocks.c.time_label == base.c.time),
-        )
-        .group_by(base.c.uid, base.c.time)
-        .order_by(base.c.uid, base.c.time)
-        .all()
-    )
 
-    return cast(List[Row[Any]], results)
+    return calendar.labels(labelled, granularity), durations
 
 
 class TrendService(TrendServiceInterface):
-    def __init__(self, engine: Engine):
+    def __init__(self, engine: Engine, timezone: str = DEFAULT_TZ):
         self._engine = engine
+        self._timezone = timezone
 
     def get_trends(
-        self, start_date: date, end_date: date, group_by: TrendGroupBy
+        self,
+        start_date: date,
+        end_date: date,
+        group_by: TrendGroupBy,
+        timezone: Optional[str] = None,
     ) -> List[TrendDataDTO]:
         """
         Get trends data grouped by the specified time period.
@@ -124,45 +104,38 @@ class TrendService(TrendServiceInterface):
             start_date: Start date
             end_date: End date
             group_by: TrendGroupBy enum specifying how to group the data
+            timezone: Optional IANA zone, defaults to the service's zone
         """
-        start_ts = get_local_midnight_timestamp(start_date)
-        end_ts = get_local_midnight_timestamp(end_date)
+        calendar = get_calendar_index(timezone or self._timezone)
+        start_ts = calendar.epoch(start_date)
+        end_ts = calendar.epoch(end_date)
 
         with Session(self._engine) as session:
-            time_format_str = {
-                TrendGroupBy.DAY: "%Y-%m-%d",
-                TrendGroupBy.WEEK: "%Y-%W-1",
-                TrendGroupBy.MONTH: "%Y-%m-01",
-            }
-
-            results = get_trend_data(
-                session, start_ts, end_ts, time_format_str[group_by]
+            labels, durations = get_trend_data(
+                session, start_ts, end_ts, Granularity(group_by.value), calendar
             )
-
-            # Process results into TrendData format
-            trends_by_type: Dict[int, List[TrendDataPoint]] = {}
-            type_dict: Dict[int, TypeDTO] = {
-                t.uid: TypeDTO(
-                    uid=t.uid,
-                    name=t.name,
-                    color=t.color,
-                    hidden=t.hidden,
-                    priority=t.priority,
-                    projects=[],
-                )
-                for t in session.query(
-                    Type.uid, Type.name, Type.color, Type.hidden, Type.priority
-                ).all()
-            }  # Just to ensure no projects is loaded. We dont' need that here.
-            for r in results:
-                if r.type_uid not in trends_by_type:
-                    trends_by_type[r.type_uid] = []
-
-                trends_by_type[r.type_uid].append(
-                    TrendDataPoint(time_label=r.time_label, duration=r.duration)
-                )
-
+            if not labels:
+                return []
+
+            # Every type gets a point for every label, even if it has no blocks
+            types = session.query(
+                Type.uid, Type.name, Type.color, Type.hidden, Type.priority
+            ).order_by(Type.uid)
+            zeros = np.zeros(len(labels))
             return [
-                TrendDataDTO(type_=type_dict[type_uid], items=items)
-                for type_uid, items in sorted(trends_by_type.items())
+                TrendDataDTO(
+                    type_=TypeDTO(
+                        uid=t.uid,
+                        name=t.name,
+                        color=t.color,
+                        hidden=t.hidden,
+                        priority=t.priority,
+                        projects=[],
+                    ),
+                    items=[
+                        TrendDataPoint(time_label=label, duration=float(duration))
+                        for label, duration in zip(labels, durations.get(t.uid, zeros))
+                    ],
+                )
+                for t in types
             ]
@@ -0,0 +1,198 @@
+"""Synthetic BlockyTime databases for benchmarks, load tests and experiments.
+
+generate_database writes a database with the app's real schema
+(data/blockytime.sql) holding a plausible routine of 96 blocks a day: sleep
+that drifts a little from night to night, work on weekdays, meals, commutes,
+random interruptions, a few gaps and comments. The output only depends on the
+arguments, so databases generated with the same seed compare equal.
+"""
+
+import logging
+import os
+import sqlite3
+from datetime import date
+from typing import List
+
+import numpy as np
+
+from .constants import DEFAULT_TZ
+from .timezones import EPOCH_ORDINAL, get_timezone_table
+
+log = logging.getLogger(__name__)
+
+SCHEMA_PATH = os.path.join(os.path.dirname(__file__), "data", "blockytime.sql")
+
+# Bump when the generated data changes, so cached databases are regenerated
+VERSION = 1
+
+BLOCKS_PER_DAY = 96
+BLOCK_SECONDS = 15 * 60
+DEFAULT_START = date(2000, 1, 1)
+
+CATEGORIES = [(1, "Rest"), (2, "Productive"), (3, "Life")]
+# uid, category_uid, name, color, hidden, priority
+TYPES = [
+    (1, 1, "Sleep", 0x5B6C8F, 0, 1),
+    (2, 2, "Work", 0xE4572E, 0, 2),
+    (3, 3, "Eat", 0xF3A712, 0, 3),
+    (4, 3, "Commute", 0x8D99AE, 0, 4),
+    (5, 1, "Exercise", 0x29BF12, 0, 5),
+    (6, 2, "Reading", 0x00A5CF, 0, 6),
+    (7, 1, "Leisure", 0xA23B72, 0, 7),
+    (8, 3, "Chores", 0x6C757D, 1, 8),
+]
+SLEEP, WORK, EAT, COMMUTE, EXERCISE, READING, LEISURE, CHORES = range(1, 9)
+# uid, name, abbr, hidden, priority
+PROJECTS = [
+    (1, "BlockyTime", "BT", 0, 1),
+    (2, "Client", "CL", 0, 2),
+    (3, "Archive", "AR", 1, 3),
+]
+WORK_PROJECTS = np.array([0, 1, 2], dtype=np.int64)
+LINKS = [(WORK, 1), (WORK, 2), (READING, 3)]
+CONFIGS = [
+    ("mainTimePrecision", "I_2"),
+    ("disablePixelate", "I_0"),
+    ("specialTimePeriod", "S_0-28,88-96"),
+]
+COMMENTS = [
+    "standup",
+    "code review",
+    "deep work",
+    "lunch with team",
+    "gym",
+    "groceries",
+    "read a paper",
+    "call family",
+]
+
+# Fraction of blocks replaced by a random activity, left empty, or commented
+NOISE_RATE = 0.08
+GAP_RATE = 0.03
+COMMENT_RATE = 0.02
+# Maximum nightly drift of the whole routine, in blocks
+MAX_SHIFT = 4
+
+
+def _routine(*spans: tuple[int, int, int]) -> np.ndarray:
+    """Types of the 96 blocks of a day, from (start hour, end hour, type) spans."""
+    day = np.zeros(BLOCKS_PER_DAY, dtype=np.int64)
+    for start, end, type_uid in spans:
+        day[start * 4 : end * 4] = type_uid
+    return day
+
+
+WEEKDAY = _routine(
+    (0, 7, SLEEP),
+    (7, 8, EAT),
+    (8, 9, COMMUTE),
+    (9, 12, WORK),
+    (12, 13, EAT),
+    (13, 18, WORK),
+    (18, 19, COMMUTE),
+    (19, 20, EAT),
+    (20, 22, READING),
+    (22, 23, LEISURE),
+    (23, 24, SLEEP),
+)
+WEEKEND = _routine(
+    (0, 9, SLEEP),
+    (9, 10, EAT),
+    (10, 12, EXERCISE),
+    (12, 13, EAT),
+    (13, 17, LEISURE),
+    (17, 19, CHORES),
+    (19, 20, EAT),
+    (20, 23, LEISURE),
+    (23, 24, SLEEP),
+)
+NOISE_TYPES = np.array([EAT, EXERCISE, READING, LEISURE, CHORES], dtype=np.int64)
+
+
+def generate_blocks(
+    days: int,
+    start: date = DEFAULT_START,
+    timezone: str = DEFAULT_TZ,
+    seed: int = 0,
+) -> List[tuple[int, int, int, str]]:
+    """(date, type_uid, project_uid, comment) rows for days days from start."""
+    rng = np.random.default_rng(seed)
+    day_numbers = np.arange(days, dtype=np.int64) + (start.toordinal() - EPOCH_ORDINAL)
+    # 1970-01-01 was a Thursday, so day number + 3 is 0 on Mondays
+    weekend = (day_numbers + 3) % 7 >= 5
+    shift = rng.integers(-MAX_SHIFT, MAX_SHIFT + 1, days)
+    slots = np.arange(BLOCKS_PER_DAY)
+    idx = (slots[None, :] - shift[:, None]) % BLOCKS_PER_DAY
+    types = np.where(weekend[:, None], WEEKEND[idx], WEEKDAY[idx])
+
+    noise = (rng.random(types.shape) < NOISE_RATE) & (types != SLEEP)
+    types[noise] = rng.choice(NOISE_TYPES, int(noise.sum()))
+    projects = np.where(
+        types == WORK, rng.choice(WORK_PROJECTS, types.shape), np.int64(0)
+    )
+    comment_idx = np.where(
+        rng.random(types.shape) < COMMENT_RATE,
+        rng.integers(0, len(COMMENTS), types.shape),
+        -1,
+    )
+    present = rng.random(types.shape) >= GAP_RATE
+
+    midnights = get_timezone_table(timezone).day_start(day_numbers)
+    dates = midnights[:, None] + slots[None, :] * BLOCK_SECONDS
+    comments = np.array([""] + COMMENTS, dtype=object)[comment_idx + 1]
+    return list(
+        zip(
+            dates[present].tolist(),
+            types[present].tolist(),
+            projects[present].tolist(),
+            comments[present].tolist(),
+        )
+    )
+
+
+def generate_database(
+    path: str,
+    days: int,
+    start: date = DEFAULT_START,
+    timezone: str = DEFAULT_TZ,
+    seed: int = 0,
+) -> int:
+    """Write a synthetic database to path and return the number of blocks.
+
+    Raises FileExistsError if path exists.
+    """
+    if os.path.exists(path):
+        raise FileExistsError(path)
+    rows = generate_blocks(days, start, timezone, seed)
+    with open(SCHEMA_PATH) as f:
+        schema = f.read()
+    con = sqlite3.connect(path)
+    try:
+        with con:
+            con.executescript(schema)
+            con.executemany(
+                "INSERT INTO Category (uid, name) VALUES (?, ?)", CATEGORIES
+            )
+            con.executemany(
+                "INSERT INTO Type (uid, category_uid, name, color, hidden, priority) "
+                "VALUES (?, ?, ?, ?, ?, ?)",
+                TYPES,
+            )
+            con.executemany(
+                "INSERT INTO Project (uid, name, abbr, hidden, priority) "
+                "VALUES (?, ?, ?, ?, ?)",
+                PROJECTS,
+            )
+            con.executemany(
+                "INSERT INTO Link (type_uid, project_uid) VALUES (?, ?)", LINKS
+            )
+            con.executemany("INSERT INTO Config (key, value) VALUES (?, ?)", CONFIGS)
+            con.executemany(
+                "INSERT INTO Block (date, type_uid, project_uid, comment) "
+                "VALUES (?, ?, ?, ?)",
+                rows,
+            )
+    finally:
+        con.close()
+    log.info(f"Generated {path} with {len(rows)} blocks over {days} days")
+    return len(rows)
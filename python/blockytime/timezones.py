@@ -0,0 +1,182 @@
+"""Vectorised local-time bucketing for IANA timezones.
+
+A TimezoneTable precomputes every UTC-offset transition of a zone over a span of
+years. Converting arrays of Unix timestamps to local time (or local wall-clock
+seconds back to UTC) is then a single ``np.searchsorted`` rather than a per-row
+``datetime`` conversion, and the same table can be rendered as an SQL expression
+so SQLite can bucket ``Block.date`` by local day, hour or weekday in a GROUP BY.
+"""
+
+import logging
+from datetime import date, datetime, timezone
+from functools import lru_cache
+from typing import Any, List, Optional, Sequence, Union
+from zoneinfo import ZoneInfo, ZoneInfoNotFoundError
+
+import numpy as np
+from sqlalchemy import ColumnElement, case, literal
+
+from .constants import DEFAULT_TZ
+
+log = logging.getLogger(__name__)
+
+SECONDS_PER_DAY = 24 * 3600
+EPOCH_ORDINAL = date(1970, 1, 1).toordinal()
+
+# Span covered by the precomputed transition table. Timestamps outside of it
+# fall back to the first/last known offset.
+TABLE_START_YEAR = 2000
+TABLE_END_YEAR = 2060
+
+IntArrayLike = Union[int, Sequence[int], np.ndarray]
+
+
+def zone_name(tz: Any) -> str:
+    """Return the IANA name of a timezone given as str, ZoneInfo or pytz zone."""
+    if isinstance(tz, str):
+        return tz
+    if isinstance(tz, ZoneInfo):
+        return tz.key
+    name = getattr(tz, "zone", None)
+    if isinstance(name, str):
+        return name
+    raise ValueError(f"Cannot determine IANA name of timezone {tz!r}")
+
+
+def validate_zone(name: str) -> str:
+    """Return name unchanged if it is a known IANA zone, otherwise raise ValueError."""
+    try:
+        ZoneInfo(name)
+    except (ZoneInfoNotFoundError, ValueError) as e:
+        raise ValueError(f"Unknown timezone: {name}") from e
+    return name
+
+
+class TimezoneTable:
+    """UTC-offset transitions of one IANA zone as sorted int64 arrays.
+
+    ``transitions[i]`` is the UTC instant from which ``offsets[i]`` (seconds east
+    of UTC) applies, until ``transitions[i + 1]``.
+    """
+
+    def __init__(
+        self,
+        name: str,
+        start_year: int = TABLE_START_YEAR,
+        end_year: int = TABLE_END_YEAR,
+    ):
+        self.name = validate_zone(name)
+        self.zone = ZoneInfo(name)
+        self.start_ts = int(datetime(start_year, 1, 1, tzinfo=timezone.utc).timestamp())
+        self.end_ts = int(datetime(end_year, 1, 1, tzinfo=timezone.utc).timestamp())
+        self.transitions, self.offsets = self._build()
+        log.info(
+            f"Built timezone table for {name} ({start_year}-{end_year}) "
+            f"with {len(self.transitions) - 1} transitions"
+        )
+
+    def _probe(self, ts: int) -> int:
+        utc_offset = datetime.fromtimestamp(ts, self.zone).utcoffset()
+        if utc_offset is None:
+            raise ValueError(f"Timezone offset is None for {self.name}")
+        return int(utc_offset.total_seconds())
+
+    def _build(self) -> tuple[np.ndarray, np.ndarray]:
+        # Probe once a day and bisect down to the second whenever the offset
+        # changes; zones never change offset twice within a day in practice.
+        transitions: List[int] = [self.start_ts]
+        offsets: List[int] = [self._probe(self.start_ts)]
+        prev_ts = self.start_ts
+        for ts in range(
+            self.start_ts + SECONDS_PER_DAY, self.end_ts + 1, SECONDS_PER_DAY
+        ):
+            offset = self._probe(ts)
+            if offset != offsets[-1]:
+                lo, hi = prev_ts, ts
+                while hi - lo > 1:
+                    mid = (lo + hi) // 2
+                    if self._probe(mid) == offsets[-1]:
+                        lo = mid
+                    else:
+                        hi = mid
+                transitions.append(hi)
+                offsets.append(offset)
+            prev_ts = ts
+        return np.array(transitions, dtype=np.int64), np.array(offsets, dtype=np.int64)
+
+    def _index(self, ts: IntArrayLike) -> np.ndarray:
+        idx = np.searchsorted(self.transitions, ts, side="right") - 1
+        return np.clip(idx, 0, None)
+
+    def offset_at(self, ts: IntArrayLike) -> np.ndarray:
+        """UTC offset in seconds in effect at each UTC timestamp."""
+        offsets: np.ndarray = self.offsets[self._index(ts)]
+        return offsets
+
+    def to_local(self, ts: IntArrayLike) -> np.ndarray:
+        """Convert UTC timestamps to local wall-clock seconds since 1970-01-01."""
+        ts_arr = np.asarray(ts, dtype=np.int64)
+        local: np.ndarray = ts_arr + self.offset_at(ts_arr)
+        return local
+
+    def from_local(self, local: IntArrayLike) -> np.ndarray:
+        """Convert local wall-clock seconds since 1970-01-01 to UTC timestamps.
+
+        Wall-clock times that fall into a DST gap are shifted by the gap; ambiguous
+        times resolve to the later offset.
+        """
+        local_arr = np.asarray(local, dtype=np.int64)
+        guess = local_arr - self.offset_at(local_arr)
+        utc: np.ndarray = local_arr - self.offset_at(guess)
+        return utc
+
+    def local_day(self, ts: IntArrayLike) -> np.ndarray:
+        """Local calendar day (days since 1970-01-01) of each UTC timestamp."""
+        return np.floor_divide(self.to_local(ts), SECONDS_PER_DAY)
+
+    def day_start(self, days: IntArrayLike) -> np.ndarray:
+        """UTC timestamp of local midnight for each day number."""
+        return self.from_local(np.asarray(days, dtype=np.int64) * SECONDS_PER_DAY)
+
+    def midnight(self, d: date) -> int:
+        """UTC timestamp of local midnight at the start of the given date."""
+        return int(self.day_start(d.toordinal() - EPOCH_ORDINAL))
+
+    def offset_expr(
+        self,
+        column: Any,
+        start_ts: Optional[int] = None,
+        end_ts: Optional[int] = None,
+    ) -> ColumnElement[Any]:
+        """SQL expression for the UTC offset (seconds) applying to ``column``.
+
+        Only transitions inside [start_ts, end_ts) are emitted, so a zone without
+        DST changes in the queried range collapses to a constant.
+        """
+        first = 0 if start_ts is None else int(self._index(start_ts))
+        last = len(self.offsets) - 1 if end_ts is None else int(self._index(end_ts - 1))
+        if first >= last:
+            return literal(int(self.offsets[first]))
+        return case(
+            *[
+                (column < int(self.transitions[i + 1]), int(self.offsets[i]))
+                for i in range(first, last)
+            ],
+            else_=int(self.offsets[last]),
+        )
+
+    def local_expr(
+        self,
+        column: Any,
+        start_ts: Optional[int] = None,
+        end_ts: Optional[int] = None,
+    ) -> ColumnElement[Any]:
+        """SQL expression for ``column`` shifted to local wall-clock seconds."""
+        expr: ColumnElement[Any] = column + self.offset_expr(column, start_ts, end_ts)
+        return expr
+
+
+@lru_cache(maxsize=None)
+def get_timezone_table(name: str = DEFAULT_TZ) -> TimezoneTable:
+    """Return the shared TimezoneTable for an IANA zone, building it on first use."""
+    return TimezoneTable(name)
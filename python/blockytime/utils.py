@@ -3,6 +3,8 @@ import time
 from functools import wraps
 from typing import Callable, ParamSpec, TypeVar
 
+from .metrics import SERVICE_CALL_SECONDS
+
 P = ParamSpec("P")
 T = TypeVar("T")
 
@@ -11,7 +13,8 @@ log = logging.getLogger(__name__)
 
 def timeit(func: Callable[P, T]) -> Callable[P, T]:
     """
-    Decorator that logs the execution time of a function using time.monotonic().
+    Decorator that logs the execution time of a function using time.monotonic()
+    and records it in the blockytime_service_call_duration_seconds histogram.
 
     Args:
         func: The function to be timed
@@ -20,6 +23,8 @@ def timeit(func: Callable[P, T]) -> Callable[P, T]:
         Wrapped function that logs its execution time
     """
 
+    name = f"{func.__module__.removeprefix('blockytime.')}.{func.__qualname__}"
+
     @wraps(func)
     def wrapper(*args: P.args, **kwargs: P.kwargs) -> T:
         start_time = time.monotonic()
@@ -28,6 +33,7 @@ def timeit(func: Callable[P, T]) -> Callable[P, T]:
             return result
         finally:
             elapsed_time = time.monotonic() - start_time
+            SERVICE_CALL_SECONDS.observe(elapsed_time, function=name)
             log.info(
                 f"{func.__module__}.{func.__qualname__} took {elapsed_time:.3f} seconds"
             )
@@ -0,0 +1,14 @@
+import os
+import sqlite3
+
+from blockytime.synthetic import SCHEMA_PATH
+from pytest import fixture
+
+
+@fixture
+def empty_db_path(tmp_path: str) -> str:
+    """Path of a DB.db in tmp_path with the app's schema and no rows."""
+    db_path = os.path.join(tmp_path, "DB.db")
+    with sqlite3.connect(db_path) as con, open(SCHEMA_PATH) as f:
+        con.executescript(f.read())
+    return db_path
@@ -0,0 +1,146 @@
+import json
+import os
+import sqlite3
+from datetime import date
+
+from blockytime.calendarindex import Granularity
+from blockytime.interfaces.aggregationserviceinterface import Dimension
+from blockytime.scripts import ai_tools
+from blockytime.server import create_app
+from blockytime.services.aggregationservice import AggregationService
+from blockytime.synthetic import generate_database
+from pytest import MonkeyPatch, fixture
+from sqlalchemy import create_engine
+from sqlalchemy.engine import Engine
+
+# 2025-01-01T00:00 in Asia/Hong_Kong
+NEW_YEAR = 1735660800
+
+
+class TestAggregationService:
+    @fixture
+    def service(self, empty_db_path: str) -> AggregationService:
+        with sqlite3.connect(empty_db_path) as con:
+            con.execute("INSERT INTO Category (uid, name) VALUES (4, 'Job')")
+            con.execute("INSERT INTO Category (uid, name) VALUES (5, 'Rest')")
+            con.execute(
+                "INSERT INTO Type (uid, category_uid, name, hidden) "
+                "VALUES (1, 4, 'Work', 0)"
+            )
+            con.execute(
+                "INSERT INTO Type (uid, category_uid, name, hidden) "
+                "VALUES (2, 5, 'Sleep', 1)"
+            )
+            con.execute("INSERT INTO Project (uid, name) VALUES (3, 'Programming')")
+            con.executemany(
+                "INSERT INTO Block (date, type_uid, project_uid, comment) "
+                "VALUES (?, ?, ?, ?)",
+                [
+                    (NEW_YEAR, 2, 0, ""),
+                    (NEW_YEAR + 900, 2, None, ""),
+                    (NEW_YEAR + 9 * 3600, 1, 3, "standup"),
+                    (NEW_YEAR + 2 * 86400 + 9 * 3600, 1, 0, ""),
+                ],
+            )
+        engine: Engine = create_engine(f"sqlite:///{empty_db_path}")
+        return AggregationService(engine, "Asia/Hong_Kong")
+
+    def test_get_totals(self, service: AggregationService) -> None:
+        totals = service.get_totals(date(2025, 1, 1), date(2025, 1, 4))
+        assert [
+            (t["type_uid"], t["project_uid"], t["blocks"], t["hours"]) for t in totals
+        ] == [(2, None, 2, 0.5), (1, 3, 1, 0.25), (1, None, 1, 0.25)]
+        totals = service.get_totals(date(2025, 1, 1), date(2025, 1, 4), [1])
+        assert [t["blocks"] for t in totals] == [1, 1]
+
+    def test_aggregate(self, service: AggregationService) -> None:
+        start, end = date(2025, 1, 1), date(2025, 1, 4)
+        assert service.aggregate(
+            start, end, [Dimension.TYPE, Dimension.PROJECT]
+        ) == service.get_totals(start, end)
+        # Ties keep the order in which each group first appears
+        rows = service.aggregate(start, end, [Dimension.CATEGORY])
+        assert [(r["category_uid"], r["category"], r["blocks"]) for r in rows] == [
+            (5, "Rest", 2),
+            (4, "Job", 2),
+        ]
+        rows = service.aggregate(start, end, [Dimension.CATEGORY], include_hidden=False)
+        assert [(r["category"], r["hours"]) for r in rows] == [("Job", 0.5)]
+        rows = service.aggregate(start, end, [Dimension.TYPE], top=1)
+        assert [r["type"] for r in rows] == ["Sleep"]
+
+        rows = service.aggregate(start, end, [], Granularity.DAY)
+        assert rows == [
+            {"period_start": "2025-01-01", "blocks": 3, "hours": 0.75},
+            {"period_start": "2025-01-03", "blocks": 1, "hours": 0.25},
+        ]
+        rows = service.aggregate(
+            start, end, [Dimension.TYPE, Dimension.PROJECT], Granularity.DAY, top=1
+        )
+        assert [
+            (r["period_start"], r["type"], r["project_uid"], r["blocks"]) for r in rows
+        ] == [("2025-01-01", "Sleep", None, 2), ("2025-01-03", "Work", None, 1)]
+        rows = service.aggregate(start, end, [Dimension.CATEGORY], Granularity.WEEK)
+        # Weeks start on Mondays and years, as in trends and export rollups
+        assert [(r["period_start"], r["category"]) for r in rows] == [
+            ("2025-01-01", "Rest"),
+            ("2025-01-01", "Job"),
+        ]
+        assert service.aggregate(date(2025, 2, 1), date(2025, 2, 2), []) == []
+
+    def test_get_active_days(self, service: AggregationService) -> None:
+        assert service.get_active_days(date(2025, 1, 1), date(2025, 1, 4)) == [
+            "2025-01-01",
+            "2025-01-03",
+        ]
+        assert service.get_active_days(date(2025, 1, 1), date(2025, 1, 4), 2) == [
+            "2025-01-01"
+        ]
+
+    def test_get_daily_ledger(self, service: AggregationService) -> None:
+        ledger = service.get_daily_ledger(date(2025, 1, 1), date(2025, 1, 2))
+        assert [entry["time"] for entry in ledger["2025-01-01"]] == [
+            "00:00",
+            "00:15",
+            "09:00",
+        ]
+        assert ledger["2025-01-01"][2]["project"] == "Programming"
+
+    def test_aggregate_route(self, tmp_path: str, monkeypatch: MonkeyPatch) -> None:
+        db_path = os.path.join(tmp_path, "DB.db")
+        generate_database(db_path, 14)
+        client = create_app(db_path, scheduler=False).test_client()
+        rows = client.get(
+            "/api/v1/stats/aggregate?start_date=2000-01-01&end_date=2000-01-15"
+            "&group_by=category,project&bucket=week&top=2"
+        ).json["data"]
+        periods = [r["period_start"] for r in rows]
+        assert periods == sorted(periods) and len(set(periods)) == 3
+        assert all(periods.count(p) <= 2 for p in periods)
+        assert {"category_uid", "category", "project_uid", "project"} <= set(rows[0])
+        assert (
+            client.get(
+                "/api/v1/stats/aggregate?start_date=2000-01-01&end_date=2000-01-15"
+                "&group_by=colour"
+            ).status_code
+            == 400
+        )
+
+        monkeypatch.setattr(ai_tools, "DB_PATH", db_path)
+        monkeypatch.setattr(ai_tools, "_engine", None)
+        exit_code, stdout, _ = ai_tools.run_command(
+            [
+                "aggregate",
+                "--start-date",
+                "2000-01-01",
+                "--end-date",
+                "2000-01-15",
+                "--group-by",
+                "category",
+                "--exclude-hidden",
+            ]
+        )
+        assert exit_code == 0
+        totals = json.loads(stdout)
+        hours = [r["hours"] for r in totals]
+        assert hours == sorted(hours, reverse=True)
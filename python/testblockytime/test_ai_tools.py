@@ -0,0 +1,91 @@
+import io
+import json
+import os
+import sqlite3
+import sys
+import threading
+from typing import Any, List
+
+from blockytime.scripts import ai_tools
+from pytest import MonkeyPatch, fixture
+
+DAY = ["--start-date", "2025-01-01", "--end-date", "2025-01-02"]
+
+
+class TestBatch:
+    @fixture(autouse=True)
+    def db_path(self, empty_db_path: str, monkeypatch: MonkeyPatch) -> str:
+        with sqlite3.connect(empty_db_path) as con:
+            con.execute("INSERT INTO Type (uid, name) VALUES (1, 'Work')")
+        monkeypatch.setattr(ai_tools, "DB_PATH", empty_db_path)
+        monkeypatch.setattr(ai_tools, "_engine", None)
+        return empty_db_path
+
+    def test_batch_argv(self) -> None:
+        argv = ai_tools.batch_argv(
+            {
+                "command": "set-blocks",
+                "args": {"data": [{"date": 0}], "chunk_size": 10, "progress": True},
+            }
+        )
+        assert argv == [
+            "set-blocks",
+            "--data",
+            '[{"date": 0}]',
+            "--chunk-size",
+            "10",
+            "--progress",
+        ]
+
+    def test_reads_see_earlier_writes(self) -> None:
+        batch: List[Any] = [
+            ["get-stats", *DAY],
+            {
+                "command": "set-blocks",
+                "args": {"data": [{"date": "2025-01-01T09:00", "type_uid": 1}]},
+            },
+            {
+                "command": "get-stats",
+                "args": {
+                    "start_date": "2025-01-01",
+                    "end_date": "2025-01-02",
+                    "type_uids": [1],
+                },
+            },
+            ["get-active-days", *DAY],
+        ]
+        exit_code, stdout, _ = ai_tools.run_command(
+            ["batch", "--data", json.dumps(batch)]
+        )
+        results = json.loads(stdout)
+        assert exit_code == 0
+        assert results[0]["output"] == []
+        assert results[2]["output"][0]["blocks"] == 1
+        assert results[3]["output"] == ["2025-01-01"]
+        assert ai_tools._snapshot_engine.get() is None
+
+    def test_commands_have_their_own_streams(self, tmp_path: str) -> None:
+        both_inside = threading.Barrier(2)
+        outputs = {}
+
+        def command(name: str) -> None:
+            out = io.StringIO()
+            with ai_tools.command_streams(io.StringIO(name), out, io.StringIO()):
+                both_inside.wait(5)
+                print(sys.stdin.read())
+            outputs[name] = out.getvalue()
+
+        threads = [threading.Thread(target=command, args=(n,)) for n in "ab"]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join(5)
+        assert outputs == {"a": "a\n", "b": "b\n"}
+
+        # Relative paths are the caller's, not the process's
+        exit_code, stdout, _ = ai_tools.run_command(
+            ["export", *DAY, "--format", "csv", "--output", "blocks.csv"],
+            cwd=str(tmp_path),
+        )
+        assert exit_code == 0, stdout
+        assert os.path.exists(os.path.join(tmp_path, "blocks.csv"))
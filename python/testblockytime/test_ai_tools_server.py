@@ -0,0 +1,155 @@
+import io
+import json
+import os
+import threading
+import time
+from typing import BinaryIO, Dict, List, Optional, TextIO, Tuple
+
+from blockytime.scripts.ai_tools_client import call
+from blockytime.scripts.ai_tools_server import (
+    OUTPUT_CHUNK_SIZE,
+    CommandDaemon,
+    serve_socket,
+    serve_stdio,
+)
+from pytest import fixture
+
+
+def echo_command(
+    argv: List[str],
+    stdin: Optional[str],
+    stdout: BinaryIO,
+    stderr: TextIO,
+    cwd: Optional[str],
+) -> Tuple[int, bytes, str]:
+    if argv == ["binary"]:
+        stdout.write(b"\x93NUMPY")
+        return 0, b"", ""
+    stdout.write(json.dumps({"argv": argv, "stdin": stdin}).encode())
+    stderr.write("warn\n")
+    return len(argv), b"", ""
+
+
+class TestCommandDaemon:
+    @fixture
+    def daemon(self) -> CommandDaemon:
+        return CommandDaemon(echo_command)
+
+    def test_socket_round_trip(self, daemon: CommandDaemon, tmp_path: str) -> None:
+        path = os.path.join(tmp_path, "ai.sock")
+        thread = threading.Thread(target=serve_socket, args=(daemon, path))
+        thread.start()
+        try:
+            while not os.path.exists(path):
+                time.sleep(0.01)
+            output: Dict[str, bytes] = {"stdout": b"", "stderr": b""}
+
+            def on_output(stream: str, data: bytes) -> None:
+                output[stream] += data
+
+            result = call(
+                "run", {"argv": ["get-types"], "stdin": "[]"}, path, on_output
+            )
+            assert result == {"exit_code": 1}
+            assert json.loads(output["stdout"]) == {
+                "argv": ["get-types"],
+                "stdin": "[]",
+            }
+            assert output["stderr"] == b"warn\n"
+            output["stdout"] = b""
+            call("run", {"argv": ["binary"]}, path, on_output)
+            assert output["stdout"] == b"\x93NUMPY"
+            assert call("ping", path=path)["requests"] == 3
+        finally:
+            call("shutdown", path=path)
+            thread.join(timeout=5)
+        assert not os.path.exists(path)
+
+    def test_commands_run_concurrently(self, tmp_path: str) -> None:
+        release = threading.Event()
+
+        def command(
+            argv: List[str],
+            stdin: Optional[str],
+            stdout: BinaryIO,
+            stderr: TextIO,
+            cwd: Optional[str],
+        ) -> Tuple[int, bytes, str]:
+            if argv == ["slow"]:
+                release.wait(5)
+            stdout.write(argv[0].encode())
+            return 0, b"", ""
+
+        path = os.path.join(tmp_path, "ai.sock")
+        thread = threading.Thread(
+            target=serve_socket, args=(CommandDaemon(command), path)
+        )
+        thread.start()
+        outputs: List[bytes] = []
+        try:
+            while not os.path.exists(path):
+                time.sleep(0.01)
+            slow = threading.Thread(
+                target=call,
+                args=("run", {"argv": ["slow"]}, path),
+                kwargs={"on_output": lambda _, data: outputs.append(data)},
+            )
+            slow.start()
+            time.sleep(0.1)
+            # Not held up by the command still running for the other client
+            call(
+                "run",
+                {"argv": ["fast"]},
+                path,
+                lambda _, data: outputs.append(data),
+            )
+            release.set()
+            slow.join(5)
+        finally:
+            call("shutdown", path=path)
+            thread.join(timeout=5)
+        assert outputs == [b"fast", b"slow"]
+
+    def test_stdio_errors(self, daemon: CommandDaemon) -> None:
+        requests = (
+            b'{"jsonrpc": "2.0", "id": 1, "method": "run", "params": {"argv": "x"}}\n'
+            b"not json\n"
+            b'{"jsonrpc": "2.0", "id": 2, "method": "shutdown"}\n'
+            b'{"jsonrpc": "2.0", "id": 3, "method": "ping"}\n'
+        )
+        out = io.BytesIO()
+        serve_stdio(daemon, io.BytesIO(requests), out)
+        responses = [json.loads(line) for line in out.getvalue().splitlines()]
+        assert [r.get("error", {}).get("code") for r in responses] == [
+            -32602,
+            -32700,
+            None,
+        ]
+
+    def test_output_is_streamed(self) -> None:
+        def pages(
+            argv: List[str],
+            stdin: Optional[str],
+            stdout: BinaryIO,
+            stderr: TextIO,
+            cwd: Optional[str],
+        ) -> Tuple[int, bytes, str]:
+            for _ in range(100):
+                stdout.write(b"x" * 1000)
+            stderr.write("50%\n")
+            stdout.write(b"y")
+            return 0, b"", ""
+
+        request = (
+            b'{"jsonrpc": "2.0", "id": 1, "method": "run", "params": {"argv": []}}'
+        )
+        out = io.BytesIO()
+        serve_stdio(CommandDaemon(pages), io.BytesIO(request), out)
+        messages = [json.loads(line) for line in out.getvalue().splitlines()]
+        outputs = [m["params"] for m in messages[:-1]]
+        # Chunks go out while the command runs, progress as soon as it is written
+        assert [o["stream"] for o in outputs] == ["stdout", "stderr", "stdout"]
+        assert OUTPUT_CHUNK_SIZE // 2 < len(outputs[0]["data"]) <= OUTPUT_CHUNK_SIZE
+        assert outputs[1]["data"] == "50%\n"
+        assert sum(len(o["data"]) for o in outputs) == 100_004 + 1
+        assert messages[-1]["result"] == {"exit_code": 0}
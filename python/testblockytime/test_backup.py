@@ -0,0 +1,105 @@
+import os
+import sqlite3
+import time
+from datetime import datetime, timedelta
+from typing import List, Tuple
+
+from blockytime.backup import (
+    CHUNK_SIZE,
+    RetentionPolicy,
+    Snapshot,
+    backup_database,
+    open_store,
+    retained,
+)
+from blockytime.server import create_app
+from blockytime.synthetic import generate_database
+
+
+def _blocks(path: str) -> List[Tuple]:
+    with sqlite3.connect(path) as con:
+        return con.execute("SELECT * FROM Block ORDER BY uid").fetchall()
+
+
+class TestBackupStore:
+    def test_snapshot_and_restore(self, tmp_path: str) -> None:
+        db_path = os.path.join(tmp_path, "DB.db")
+        generate_database(db_path, 90)
+        store = open_store(db_path)
+        first = backup_database(store, db_path)
+        usage = store.disk_usage()
+
+        with sqlite3.connect(db_path) as con:
+            con.execute("UPDATE Block SET comment = 'edited' WHERE uid = 5")
+        second = backup_database(store, db_path)
+
+        # Only the chunks holding the changed page are new
+        assert len(set(second.chunks) - set(first.chunks)) <= 2
+        assert store.disk_usage() - usage < 4 * CHUNK_SIZE
+        assert [s.id for s in store.snapshots()] == [second.id, first.id]
+
+        restored = os.path.join(tmp_path, "restored.db")
+        store.restore(first.id[:20], restored)
+        with sqlite3.connect(restored) as con:
+            (comment,) = con.execute(
+                "SELECT comment FROM Block WHERE uid = 5"
+            ).fetchone()
+        assert comment != "edited"
+
+        # Pruning to one snapshot drops the chunks only the first one used
+        assert store.prune("pull", RetentionPolicy(1, 0, 0, 0)) == [first]
+        store.restore(second.id, restored)
+        assert _blocks(restored) == _blocks(db_path)
+
+    def test_retained(self) -> None:
+        now = datetime(2024, 6, 30, 12)
+        # Two snapshots a day for 120 days, newest first
+        snapshots = [
+            Snapshot(
+                str(i), "pull", (now - timedelta(hours=12 * i)).timestamp(), 0, "", 0
+            )
+            for i in range(240)
+        ]
+        kept = retained(
+            snapshots, RetentionPolicy(last=3, daily=7, weekly=4, monthly=3)
+        )
+        ages = sorted(int(i) for i in kept)
+
+        assert ages[:3] == [0, 1, 2]
+        # Newest of each of the last 7 days, plus older week and month starts
+        assert {4, 6, 8, 10, 12} <= set(ages)
+        assert 5 not in kept and 11 not in kept
+        assert len(kept) <= 3 + 7 + 4 + 3
+        # Newest of April, the oldest of the last 3 months
+        assert max(ages) == 122
+
+    def test_snapshot_api(self, tmp_path: str) -> None:
+        db_path = os.path.join(tmp_path, "DB.db")
+        generate_database(db_path, 60)
+        client = create_app(db_path).test_client()
+
+        job = client.post("/api/v1/admin/snapshot").json["data"]
+        # Writes go on while the snapshot runs
+        response = client.put(
+            "/api/v1/blocks",
+            json=[{"date": 946684800, "comment": "", "operation": "delete"}],
+        )
+        assert response.status_code == 200
+        deadline = time.monotonic() + 30
+        while job["state"] == "running" and time.monotonic() < deadline:
+            time.sleep(0.05)
+            job = client.get(f"/api/v1/admin/snapshot/{job['id']}").json["data"]
+
+        assert job["state"] == "done", job["error"]
+        assert job["pages"] == job["total_pages"] > 0
+        (listed,) = client.get("/api/v1/admin/snapshots").json["data"]
+        assert listed["id"] == job["snapshot"]["id"]
+        restored = os.path.join(tmp_path, "restored.db")
+        open_store(db_path).restore(listed["id"], restored)
+        with sqlite3.connect(restored) as con:
+            assert con.execute("PRAGMA quick_check").fetchone() == ("ok",)
+        assert client.get("/api/v1/admin/snapshot/99").status_code == 404
+        response = client.post(
+            "/api/v1/admin/snapshot", environ_base={"REMOTE_ADDR": "10.0.0.2"}
+        )
+        assert response.status_code == 403
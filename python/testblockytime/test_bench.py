@@ -0,0 +1,50 @@
+import os
+import sqlite3
+from datetime import timedelta
+
+from blockytime.scripts.bench import Timing, compare, run_benchmarks
+from blockytime.synthetic import BLOCKS_PER_DAY, DEFAULT_START, generate_database
+
+
+class TestBench:
+    def test_generate_database(self, tmp_path: str) -> None:
+        db_path = os.path.join(tmp_path, "DB.db")
+        blocks = generate_database(db_path, 14)
+
+        with sqlite3.connect(db_path) as con:
+            (count,) = con.execute("SELECT count(*) FROM Block").fetchone()
+            (types,) = con.execute(
+                "SELECT count(DISTINCT type_uid) FROM Block"
+            ).fetchone()
+        assert count == blocks
+        # A few blocks per day are left empty
+        assert 0.9 * 14 * BLOCKS_PER_DAY < blocks < 14 * BLOCKS_PER_DAY
+        assert types > 5
+
+    def test_run_benchmarks(self, tmp_path: str) -> None:
+        db_path = os.path.join(tmp_path, "DB.db")
+        generate_database(db_path, 14)
+        end = DEFAULT_START + timedelta(days=14)
+
+        results = run_benchmarks(db_path, DEFAULT_START, end, 1, groups=["service"])
+
+        assert "service.get_blocks.week" in results
+        assert "service.calculate_sleep_stats.all" in results
+        assert all(t.runs == 1 for t in results.values())
+
+    def test_compare(self) -> None:
+        baselines = {"results": {"1y": {"a": {"median": 0.1}, "b": {"median": 0.1}}}}
+        results = {
+            "1y": {
+                "a": Timing(median=0.2, min=0.2, runs=1),
+                "b": Timing(median=0.11, min=0.1, runs=1),
+                "c": Timing(median=0.1, min=0.1, runs=1),
+            }
+        }
+
+        comparisons = {c.key: c for c in compare(results, baselines, 0.25)}
+
+        assert comparisons["1y/a"].regression
+        assert not comparisons["1y/b"].regression
+        assert comparisons["1y/c"].baseline is None
+        assert not comparisons["1y/c"].regression
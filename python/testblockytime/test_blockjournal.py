@@ -0,0 +1,64 @@
+import os
+from datetime import timedelta
+
+from blockytime.blockjournal import read_journal
+from blockytime.calendarindex import parse_local_date
+from blockytime.dtos.block_dto import BlockDTO
+from blockytime.dtos.type_dto import TypeDTO
+from blockytime.services.blockservice import BlockService
+from blockytime.synthetic import DEFAULT_START, generate_database
+from sqlalchemy import create_engine
+
+
+def _block(ts: int, type_uid: int, operation: str = "upsert") -> BlockDTO:
+    return BlockDTO(date=ts, type_=TypeDTO(uid=type_uid), operation=operation)
+
+
+class TestBlockJournal:
+    def test_edits_are_journaled_coalesced_and_committed(self, tmp_path: str) -> None:
+        db_path = os.path.join(tmp_path, "DB.db")
+        journal_path = os.path.join(tmp_path, "DB.db.blocks-journal")
+        generate_database(db_path, 2)
+        engine = create_engine(f"sqlite:///{db_path}")
+        # A long delay, so nothing is committed until the explicit flush
+        service = BlockService(engine, journal_path, 60_000, 1000)
+        start = parse_local_date(DEFAULT_START.isoformat())
+        ts = int(start.timestamp())
+
+        assert service.update_blocks([_block(ts, 2), _block(ts + 900, 2)])
+        assert service.update_blocks([_block(ts, 3)])
+        assert service.update_blocks([_block(ts + 900, 0, "delete")])
+        assert not service.update_blocks([_block(ts, 999)])
+        assert len(read_journal(journal_path)) == 4
+
+        assert service.flush() == 2
+        assert not os.path.exists(journal_path)
+        blocks = service.get_blocks(start, start + timedelta(hours=1))
+        types = {b.date: b.type_.uid if b.type_ else None for b in blocks}
+        assert types[ts] == 3
+        assert ts + 900 not in types
+        service.close()
+
+    def test_journal_is_replayed_on_start(self, tmp_path: str) -> None:
+        db_path = os.path.join(tmp_path, "DB.db")
+        journal_path = os.path.join(tmp_path, "DB.db.blocks-journal")
+        generate_database(db_path, 2)
+        engine = create_engine(f"sqlite:///{db_path}")
+        ts = int(parse_local_date(DEFAULT_START.isoformat()).timestamp())
+        # As left behind by a server killed mid-flush: a rotated journal and a
+        # newer one, ending with a torn line
+        with open(f"{journal_path}.flushing", "w") as f:
+            f.write('[{"date": %d, "operation": "upsert", "type_uid": 5}]\n' % ts)
+        with open(journal_path, "w") as f:
+            f.write('[{"date": %d, "operation": "upsert", "type_uid": 6}]\n' % ts)
+            f.write('[{"date": %d, "oper' % (ts + 900))
+
+        service = BlockService(engine, journal_path, 60_000, 1000)
+
+        assert not os.path.exists(journal_path)
+        assert not os.path.exists(f"{journal_path}.flushing")
+        start = parse_local_date(DEFAULT_START.isoformat())
+        (block,) = service.get_blocks(start, start + timedelta(minutes=15))
+        assert block.type_ is not None and block.type_.uid == 6
+        assert read_journal(journal_path) == []
+        service.close()
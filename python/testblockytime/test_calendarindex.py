@@ -0,0 +1,51 @@
+from datetime import date, datetime
+from zoneinfo import ZoneInfo
+
+import numpy as np
+from blockytime.calendarindex import CalendarIndex, Granularity
+from blockytime.timezones import TimezoneTable
+from pytest import fixture
+
+
+class TestCalendarIndex:
+    @fixture
+    def calendar(self) -> CalendarIndex:
+        return CalendarIndex(TimezoneTable("Europe/London", 2023, 2026), 2023, 2026)
+
+    def test_epoch(self, calendar: CalendarIndex) -> None:
+        zone = ZoneInfo("Europe/London")
+        for d in [date(2024, 3, 31), date(2024, 10, 27), date(2025, 1, 1)]:
+            expected = int(datetime(d.year, d.month, d.day, tzinfo=zone).timestamp())
+            assert calendar.epoch(d) == expected
+
+    def test_bucket_labels(self, calendar: CalendarIndex) -> None:
+        zone = ZoneInfo("Europe/London")
+        timestamps = np.array(
+            [
+                int(datetime(2024, 12, 30, 9, tzinfo=zone).timestamp()),
+                int(datetime(2025, 1, 1, 0, 15, tzinfo=zone).timestamp()),
+                int(datetime(2025, 1, 6, 23, 45, tzinfo=zone).timestamp()),
+            ]
+        )
+        # Weeks are split at the new year, like SQLite's %Y-%W
+        weeks = calendar.bucket(timestamps, Granularity.WEEK)
+        assert calendar.labels(weeks, Granularity.WEEK) == [
+            "2024-53-1",
+            "2025-00-1",
+            "2025-01-1",
+        ]
+        months = calendar.bucket(timestamps, Granularity.MONTH)
+        assert calendar.labels(months, Granularity.MONTH) == [
+            "2024-12-01",
+            "2025-01-01",
+            "2025-01-01",
+        ]
+
+    def test_floor_and_ceil(self, calendar: CalendarIndex) -> None:
+        mid_month = calendar.epoch(date(2024, 7, 15)) + 3600
+        assert calendar.floor(mid_month, Granularity.MONTH) == calendar.epoch(
+            date(2024, 7, 1)
+        )
+        assert calendar.ceil(mid_month, Granularity.MONTH) == calendar.epoch(
+            date(2024, 8, 1)
+        )
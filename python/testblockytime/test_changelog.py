@@ -0,0 +1,80 @@
+import os
+from typing import Any, Dict
+
+from blockytime.calendarindex import parse_local_date
+from blockytime.changelog import ChangeLog, RevisionConflictError
+from blockytime.server import create_app
+from blockytime.synthetic import DEFAULT_START, generate_database
+from pytest import raises
+
+
+def _upsert(ts: int, type_uid: int) -> Dict[str, Any]:
+    return {
+        "date": ts,
+        "type_": {"uid": type_uid},
+        "project": None,
+        "comment": "",
+        "operation": "upsert",
+    }
+
+
+class TestChangeLog:
+    def test_change_log(self) -> None:
+        changes = ChangeLog(max_dates=3)
+        start = changes.revision
+        first = changes.record([10, 20])
+        second = changes.record([20, 30])
+
+        assert first == start + 1 and second == start + 2
+        assert changes.since(start).dates == [10, 20, 30]
+        assert changes.since(first).dates == [20, 30]
+        assert changes.since(second).dates == []
+        changes.check([10], first)
+        with raises(RevisionConflictError) as e:
+            changes.check([10, 20], first)
+        assert e.value.dates == [20]
+
+        # Evicting 10 makes revisions before its change unanswerable
+        changes.record([40])
+        assert changes.since(start).reset
+        assert changes.since(first).dates == [20, 30, 40]
+        assert changes.reset() > second
+        assert changes.since(second).reset
+
+    def test_changes_api(self, tmp_path: str) -> None:
+        db_path = os.path.join(tmp_path, "DB.db")
+        generate_database(db_path, 2)
+        client = create_app(db_path).test_client()
+        ts = int(parse_local_date(DEFAULT_START.isoformat()).timestamp())
+
+        response = client.get(
+            "/api/v1/blocks?start_date=2000-01-01&end_date=2000-01-02"
+        )
+        revision = int(response.headers["X-Blockytime-Revision"])
+        response = client.put(
+            f"/api/v1/blocks?expected_revision={revision}", json=[_upsert(ts, 2)]
+        )
+        assert response.status_code == 200
+        written = response.json["revision"]
+        response = client.put(
+            "/api/v1/blocks",
+            json=[{"date": ts + 900, "comment": "", "operation": "delete"}],
+        )
+        assert response.status_code == 200
+
+        changes = client.get(f"/api/v1/blocks/changes?since={revision}").json["data"]
+        assert changes["reset"] is False
+        assert [(b["date"], b["type_"]["uid"]) for b in changes["blocks"]] == [(ts, 2)]
+        assert changes["deleted"] == [ts + 900]
+        assert client.get("/api/v1/blocks/changes?since=0").json["data"]["reset"]
+
+        # Another tab edited ts after the revision this edit is based on
+        response = client.put(
+            f"/api/v1/blocks?expected_revision={revision}", json=[_upsert(ts, 3)]
+        )
+        assert response.status_code == 409
+        assert response.json["data"]["conflicts"] == [ts]
+        response = client.put(
+            f"/api/v1/blocks?expected_revision={written}", json=[_upsert(ts, 3)]
+        )
+        assert response.status_code == 200
@@ -0,0 +1,110 @@
+import json
+import os
+import sqlite3
+
+from blockytime.scripts import ai_tools
+from blockytime.search import CommentIndex, match_query
+from blockytime.server import create_app
+from blockytime.synthetic import generate_database
+from pytest import MonkeyPatch
+
+# Blocks of 2000-01-01, 08:00 Hong Kong time onwards
+MORNING = 946684800
+QUARTER = 900
+
+
+def set_comment(db_path: str, date: int, comment: str) -> None:
+    with sqlite3.connect(db_path) as con:
+        con.execute("UPDATE Block SET comment = ? WHERE date = ?", (comment, date))
+
+
+class TestCommentIndex:
+    def test_match_query(self) -> None:
+        assert match_query("Dentist, at 9") == '"Dentist"* "at"* "9"*'
+        # FTS5 operators and quotes are words or nothing
+        assert match_query('NEAR("x" OR y') == '"NEAR"* "x"* "OR"* "y"*'
+        assert match_query(" -*() ") is None
+
+    def test_sync(self, tmp_path: str) -> None:
+        db_path = os.path.join(tmp_path, "DB.db")
+        generate_database(db_path, 2)
+        index = CommentIndex(db_path)
+        with sqlite3.connect(db_path) as con:
+            commented = con.execute(
+                "SELECT count(*) FROM Block WHERE comment != ''"
+            ).fetchone()[0]
+        assert index.sync().added == commented
+        # Nothing written since
+        assert index.sync().added == 0 and index.sync().seconds == 0.0
+
+        set_comment(db_path, MORNING, "Dentist appointment")
+        set_comment(db_path, MORNING + QUARTER, "dentist again")
+        assert {date for date, _ in index.search("dent")} == {
+            MORNING,
+            MORNING + QUARTER,
+        }
+        assert [date for date, _ in index.search("dentist appoint")] == [MORNING]
+        assert [
+            date for date, _ in index.search("dent", start_ts=MORNING + QUARTER)
+        ] == [MORNING + QUARTER]
+        assert index.search("dent", end_ts=MORNING) == []
+
+        # Edits and deletions replace and drop matches
+        set_comment(db_path, MORNING, "")
+        with sqlite3.connect(db_path) as con:
+            con.execute("DELETE FROM Block WHERE date = ?", (MORNING + QUARTER,))
+        assert index.search("dentist") == []
+
+        set_comment(db_path, MORNING + 2 * QUARTER, "Dentist")
+        rebuilt = index.rebuild()
+        assert rebuilt.rebuilt and rebuilt.added >= 1
+        assert [date for date, _ in index.search("DENTIST")] == [MORNING + 2 * QUARTER]
+
+    def test_search_route(self, tmp_path: str) -> None:
+        db_path = os.path.join(tmp_path, "DB.db")
+        generate_database(db_path, 2)
+        client = create_app(db_path, scheduler=False).test_client()
+        set_comment(db_path, MORNING, "Dentist appointment")
+
+        matches = client.get("/api/v1/blocks/search?q=dentist").json["data"]
+        assert [m["block"]["date"] for m in matches] == [MORNING]
+        assert matches[0]["block"]["comment"] == "Dentist appointment"
+        assert matches[0]["rank"] < 0
+        assert (
+            client.get("/api/v1/blocks/search?q=dentist&start_date=2000-01-02").json[
+                "data"
+            ]
+            == []
+        )
+        assert client.get("/api/v1/blocks/search").status_code == 400
+        assert client.get("/api/v1/blocks/search?q=x&limit=0").status_code == 400
+
+        # Edits through the API are found by the next search
+        response = client.put(
+            "/api/v1/blocks",
+            json=[
+                {
+                    "date": MORNING + QUARTER,
+                    "comment": "dentist follow-up",
+                    "operation": "upsert",
+                    "type_": {"uid": 1},
+                    "project": None,
+                }
+            ],
+        )
+        assert response.status_code == 200
+        matches = client.get("/api/v1/blocks/search?q=dentist").json["data"]
+        assert {m["block"]["date"] for m in matches} == {MORNING, MORNING + QUARTER}
+
+    def test_ai_tools(self, tmp_path: str, monkeypatch: MonkeyPatch) -> None:
+        db_path = os.path.join(tmp_path, "DB.db")
+        generate_database(db_path, 2)
+        set_comment(db_path, MORNING, "Dentist appointment")
+        monkeypatch.setattr(ai_tools, "DB_PATH", db_path)
+        monkeypatch.setattr(ai_tools, "_engine", None)
+
+        exit_code, stdout, _ = ai_tools.run_command(
+            ["search-comments", "--query", "dentist", "--end-date", "2000-01-02"]
+        )
+        assert exit_code == 0
+        assert [m["block"]["date"] for m in json.loads(stdout)] == [MORNING]
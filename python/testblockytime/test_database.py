@@ -0,0 +1,57 @@
+import atexit
+import os
+import sqlite3
+from typing import Callable, List
+
+import pytest
+from blockytime.backup import open_store
+from blockytime.database import validate_database_file
+from blockytime.interfaces.typeserviceinterface import TypeServiceInterface
+from blockytime.server import create_app, reload_database
+from blockytime.synthetic import generate_database
+from pytest import MonkeyPatch
+from sqlalchemy import Engine
+
+
+class TestDatabase:
+    def test_validate_database_file(self, tmp_path: str) -> None:
+        db_path = os.path.join(tmp_path, "DB.db")
+        generate_database(db_path, 1)
+        validate_database_file(db_path)
+
+        bad_path = os.path.join(tmp_path, "bad.db")
+        with open(bad_path, "wb") as f:
+            f.write(b"not a database" * 100)
+        with pytest.raises(ValueError):
+            validate_database_file(bad_path)
+
+    def test_reload_database(self, tmp_path: str, monkeypatch: MonkeyPatch) -> None:
+        db_path = os.path.join(tmp_path, "DB.db")
+        generate_database(db_path, 2)
+        app = create_app(db_path)
+        provider = app.service_provider
+        client = app.test_client()
+        query = "/api/v1/blocks?start_date=2000-01-01&end_date=2000-01-05"
+        before = len(client.get(query).json["data"])
+        old_engine = provider.get(Engine)
+        old_types = provider.get(TypeServiceInterface)  # type: ignore[type-abstract]
+        generation = provider.generation
+
+        new_path = os.path.join(tmp_path, "new.db")
+        generate_database(new_path, 4, seed=1)
+        exit_hooks: List[Callable[[], None]] = []
+        monkeypatch.setattr(atexit, "register", exit_hooks.append)
+        assert reload_database(provider, db_path, new_path) == generation + 1
+        # The exit hook of create_app closes whichever BlockService is current
+        assert exit_hooks == []
+
+        assert provider.get(Engine) is not old_engine
+        assert provider.get(TypeServiceInterface) is not old_types  # type: ignore[type-abstract]
+        # Cached blocks of the old database are not served
+        assert len(client.get(query).json["data"]) > before
+        assert not os.path.exists(new_path)
+        # The replaced file is kept in the backup store
+        (backup,) = open_store(db_path).snapshots()
+        open_store(db_path).restore(backup.id, f"{db_path}.before")
+        with sqlite3.connect(f"{db_path}.before") as conn:
+            assert conn.execute("SELECT count(*) FROM Block").fetchone()[0]
@@ -0,0 +1,88 @@
+import os
+import shutil
+import sqlite3
+from typing import List, Tuple
+
+import pytest
+from blockytime.backup import backup_database, open_store
+from blockytime.dbsync import SyncSchemaError, check_schema, sync_database
+from blockytime.interfaces.blockserviceinterface import BlockServiceInterface
+from blockytime.server import create_app
+from blockytime.synthetic import generate_database
+
+
+def _rows(path: str, table: str) -> List[Tuple]:
+    with sqlite3.connect(path) as con:
+        return sorted(con.execute(f'SELECT * FROM "{table}"'), key=repr)
+
+
+def _pulled_copy(db_path: str, pulled_path: str) -> int:
+    """Copy db_path and edit the copy like the phone would; returns the last date."""
+    shutil.copyfile(db_path, pulled_path)
+    with sqlite3.connect(pulled_path) as con:
+        (last,) = con.execute("SELECT max(date) FROM Block").fetchone()
+        con.execute(
+            "UPDATE Block SET type_uid = 3, comment = 'pulled' WHERE date > ?",
+            (last - 86400,),
+        )
+        con.execute("DELETE FROM Block WHERE date = ?", (last - 3 * 86400,))
+        con.execute(
+            "INSERT INTO Block (date, type_uid, project_uid, comment) "
+            "VALUES (?, 2, 0, '')",
+            (last + 900,),
+        )
+    return int(last)
+
+
+class TestDbSync:
+    def test_sync_database(self, tmp_path: str) -> None:
+        db_path = os.path.join(tmp_path, "DB.db")
+        pulled_path = os.path.join(tmp_path, "pulled.db")
+        generate_database(db_path, 60)
+        _pulled_copy(db_path, pulled_path)
+        with sqlite3.connect(pulled_path) as con:
+            con.execute("UPDATE Type SET name = 'Renamed' WHERE uid = 2")
+            con.execute("DELETE FROM Link")
+
+        snapshot = backup_database(open_store(db_path), db_path)
+        report = sync_database(db_path, pulled_path)
+
+        assert report.changed and not report.blocks_only
+        assert report.changed_buckets < report.buckets
+        changed = {t.table: t for t in report.tables if t.changed}
+        assert set(changed) == {"Block", "Type", "Link"}
+        assert changed["Block"].inserted == 1 and changed["Block"].deleted == 1
+        assert changed["Link"].replaced
+        for table in ("Block", "Type", "Project", "Link", "Config"):
+            assert _rows(db_path, table) == _rows(pulled_path, table)
+        open_store(db_path).restore(snapshot.id, f"{db_path}.before")
+        assert _rows(f"{db_path}.before", "Block") != _rows(db_path, "Block")
+        assert not sync_database(db_path, pulled_path).changed
+
+        with sqlite3.connect(pulled_path) as con:
+            con.execute("ALTER TABLE Block ADD COLUMN mood integer")
+        with pytest.raises(SyncSchemaError):
+            check_schema(db_path, pulled_path)
+
+    def test_record_external_changes(self, tmp_path: str) -> None:
+        db_path = os.path.join(tmp_path, "DB.db")
+        pulled_path = os.path.join(tmp_path, "pulled.db")
+        generate_database(db_path, 30)
+        app = create_app(db_path)
+        client = app.test_client()
+        block_service = app.service_provider.get(BlockServiceInterface)  # type: ignore[type-abstract]
+        query = "/api/v1/blocks?start_date=2000-01-01&end_date=2000-02-01"
+        before = client.get(query).json["data"]
+        revision = block_service.get_revision()
+
+        last = _pulled_copy(db_path, pulled_path)
+        report = sync_database(db_path, pulled_path)
+        assert report.blocks_only
+        assert block_service.record_external_changes(report.block_dates) > revision
+
+        after = client.get(query).json["data"]
+        assert after != before
+        assert after[-1]["date"] == last + 900
+        changes = client.get(f"/api/v1/blocks/changes?since={revision}").json["data"]
+        assert changes["deleted"] == [last - 3 * 86400]
+        assert len(changes["blocks"]) == len(report.block_dates) - 1
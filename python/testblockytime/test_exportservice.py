@@ -0,0 +1,80 @@
+import io
+import sqlite3
+from datetime import date
+
+import numpy as np
+from blockytime.calendarindex import Granularity
+from blockytime.interfaces.exportserviceinterface import ExportFormat
+from blockytime.services.exportservice import ExportService
+from pytest import fixture, importorskip
+from sqlalchemy import create_engine
+from sqlalchemy.engine import Engine
+
+# 2025-01-01T00:00 in Asia/Hong_Kong
+NEW_YEAR = 1735660800
+
+
+class TestExportService:
+    @fixture
+    def engine(self, empty_db_path: str) -> Engine:
+        with sqlite3.connect(empty_db_path) as con:
+            # Four blocks on Jan 1 and two on Jan 2, one of them with a project
+            con.executemany(
+                "INSERT INTO Block (date, type_uid, project_uid, comment) "
+                "VALUES (?, ?, ?, ?)",
+                [(NEW_YEAR + i * 900, 1, 0, f"b{i}") for i in range(4)]
+                + [(NEW_YEAR + 86400, 2, 3, ""), (NEW_YEAR + 86400 + 900, 2, 0, "")],
+            )
+        return create_engine(f"sqlite:///{empty_db_path}")
+
+    def test_export_npz_in_chunks(self, engine: Engine) -> None:
+        out = io.BytesIO()
+        rows = ExportService(engine, "Asia/Hong_Kong").export_blocks(
+            date(2025, 1, 1), date(2025, 1, 2), out, ExportFormat.NPZ, chunk_size=3
+        )
+        assert rows == 4
+        out.seek(0)
+        data = np.load(out)
+        assert data["date"].tolist() == [NEW_YEAR + i * 900 for i in range(4)]
+        assert data["comment"].tolist() == ["b0", "b1", "b2", "b3"]
+
+    def test_export_daily_rollup_csv(self, engine: Engine) -> None:
+        out = io.BytesIO()
+        ExportService(engine, "Asia/Hong_Kong").export_blocks(
+            date(2025, 1, 1),
+            date(2025, 1, 3),
+            out,
+            ExportFormat.CSV,
+            rollup=Granularity.DAY,
+        )
+        assert out.getvalue().decode().splitlines() == [
+            "period_start,type_uid,project_uid,blocks,hours",
+            "2025-01-01,1,0,4,1.0",
+            "2025-01-02,2,0,1,0.25",
+            "2025-01-02,2,3,1,0.25",
+        ]
+
+    def test_export_empty_range(self, engine: Engine) -> None:
+        pa = importorskip("pyarrow")
+        service = ExportService(engine, "Asia/Hong_Kong")
+        for rollup in (None, Granularity.WEEK):
+            out = io.BytesIO()
+            rows = service.export_blocks(
+                date(2024, 1, 1), date(2024, 1, 2), out, ExportFormat.ARROW, rollup
+            )
+            assert rows == 0
+            table = pa.ipc.open_file(pa.BufferReader(out.getvalue())).read_all()
+            assert table.num_rows == 0
+        assert table.schema.names == [
+            "period_start",
+            "type_uid",
+            "project_uid",
+            "blocks",
+            "hours",
+        ]
+
+        out = io.BytesIO()
+        service.export_blocks(date(2024, 1, 1), date(2024, 1, 2), out, ExportFormat.CSV)
+        assert out.getvalue().decode().splitlines() == [
+            "date,type_uid,project_uid,comment"
+        ]
@@ -0,0 +1,50 @@
+import io
+import sqlite3
+
+import numpy as np
+from blockytime.importer import (
+    BlockImporter,
+    ImportFormat,
+    parse_block_dates,
+    read_records,
+)
+from blockytime.services.blockservice import BlockService
+from blockytime.timezones import TimezoneTable
+from pytest import fixture
+from sqlalchemy import create_engine
+from sqlalchemy.engine import Engine
+
+
+class TestBlockImporter:
+    @fixture
+    def engine(self, empty_db_path: str) -> Engine:
+        with sqlite3.connect(empty_db_path) as con:
+            con.execute("INSERT INTO Type (uid, name) VALUES (1, 'Work')")
+            con.execute("INSERT INTO Project (uid, name) VALUES (2, 'Programming')")
+        return create_engine(f"sqlite:///{empty_db_path}")
+
+    def test_parse_block_dates(self) -> None:
+        tz = TimezoneTable("Asia/Hong_Kong", 2024, 2026)
+        dates = parse_block_dates(
+            [1735660800, "1735661700", "2025-01-01T00:30", "2025-01-01T00:45+08:00"],
+            tz,
+        )
+        assert np.array_equal(dates, [1735660800, 1735661700, 1735662600, 1735663500])
+
+    def test_import_ndjson(self, engine: Engine) -> None:
+        stream = io.StringIO(
+            '{"date": "2025-01-01T00:00", "type_uid": 1, "project_uid": 2}\n'
+            '{"date": "2025-01-01T00:15", "type_uid": 5}\n'
+            '{"date": "2025-01-01T00:00", "type_uid": 1, "comment": "again"}\n'
+        )
+        importer = BlockImporter(
+            engine, BlockService(engine), "Asia/Hong_Kong", chunk_size=2
+        )
+        result = importer.run(read_records(stream, ImportFormat.NDJSON))
+        assert (result.read, result.imported, result.rejected) == (3, 2, 1)
+        assert result.errors == [{"row": 1, "error": "unknown type_uid 5"}]
+        with engine.connect() as conn:
+            rows = conn.exec_driver_sql(
+                "SELECT date, type_uid, project_uid, comment FROM Block"
+            ).all()
+        assert [tuple(row) for row in rows] == [(1735660800, 1, 0, "again")]
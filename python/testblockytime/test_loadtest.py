@@ -0,0 +1,39 @@
+import os
+import threading
+from datetime import timedelta
+
+from blockytime.scripts.loadtest import percentile, run_load
+from blockytime.server import create_app
+from blockytime.synthetic import DEFAULT_START, generate_database
+from werkzeug.serving import make_server
+
+
+class TestLoadTest:
+    def test_percentile(self) -> None:
+        values = [float(i) for i in range(1, 101)]
+        assert percentile(values, 50) == 50.0
+        assert percentile(values, 99) == 99.0
+        assert percentile([], 50) == 0.0
+
+    def test_run_load(self, tmp_path: str) -> None:
+        db_path = os.path.join(tmp_path, "DB.db")
+        generate_database(db_path, 21)
+        server = make_server("127.0.0.1", 0, create_app(db_path), threaded=True)
+        thread = threading.Thread(target=server.serve_forever, daemon=True)
+        thread.start()
+        try:
+            result = run_load(
+                f"http://127.0.0.1:{server.server_port}",
+                DEFAULT_START + timedelta(days=20),
+                users=2,
+                duration=1.0,
+            )
+        finally:
+            server.shutdown()
+
+        summary = result.summary()
+        assert summary["total"]["requests"] > 0
+        assert summary["total"]["error_rate"] == 0
+        endpoints = set(summary) - {"total"}
+        assert endpoints
+        assert all(e.split()[1].startswith("/api/v1/") for e in endpoints)
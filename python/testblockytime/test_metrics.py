@@ -0,0 +1,76 @@
+import os
+
+from blockytime.metrics import (
+    SQL_STATEMENT_ERRORS,
+    MetricsRegistry,
+    instrument_engine,
+    start_sql_tally,
+    stop_sql_tally,
+)
+from blockytime.server import create_app
+from blockytime.synthetic import generate_database
+from pytest import raises
+from sqlalchemy import create_engine, text
+from sqlalchemy.exc import OperationalError
+
+
+class TestMetrics:
+    def test_histogram_render(self) -> None:
+        registry = MetricsRegistry()
+        histogram = registry.histogram(
+            "test_seconds", "Test latency", ["endpoint"], [0.1, 1.0]
+        )
+        histogram.observe(0.1, endpoint="/a")
+        histogram.observe(0.5, endpoint="/a")
+        histogram.observe(2.0, endpoint="/a")
+
+        assert registry.render().splitlines() == [
+            "# HELP test_seconds Test latency",
+            "# TYPE test_seconds histogram",
+            'test_seconds_bucket{endpoint="/a",le="0.1"} 1',
+            'test_seconds_bucket{endpoint="/a",le="1"} 2',
+            'test_seconds_bucket{endpoint="/a",le="+Inf"} 3',
+            'test_seconds_sum{endpoint="/a"} 2.6',
+            'test_seconds_count{endpoint="/a"} 3',
+        ]
+        assert registry.histogram("test_seconds", "Test latency") is histogram
+
+    def test_sql_tally(self) -> None:
+        engine = create_engine("sqlite://")
+        instrument_engine(engine)
+        with engine.connect() as conn:
+            conn.execute(text("SELECT 1"))
+            token = start_sql_tally()
+            conn.execute(text("SELECT 1"))
+            conn.execute(text("SELECT 2"))
+            tally = stop_sql_tally(token)
+            conn.execute(text("SELECT 3"))
+
+        assert tally is not None
+        assert tally.statements == 2
+        assert tally.seconds >= 0
+
+    def test_failed_statement(self) -> None:
+        engine = create_engine("sqlite://")
+        instrument_engine(engine)
+        failures = SQL_STATEMENT_ERRORS.value(operation="SELECT")
+        with engine.connect() as conn:
+            with raises(OperationalError):
+                conn.execute(text("SELECT * FROM missing"))
+            assert conn.info["query_start"] == []
+            conn.execute(text("SELECT 1"))
+            assert conn.info["query_start"] == []
+
+        assert SQL_STATEMENT_ERRORS.value(operation="SELECT") == failures + 1
+
+    def test_metrics_route(self, tmp_path: str) -> None:
+        db_path = os.path.join(tmp_path, "DB.db")
+        generate_database(db_path, 7)
+        client = create_app(db_path).test_client()
+        response = client.get("/api/v1/admin/metrics")
+        assert response.status_code == 200
+        assert b"# TYPE blockytime_sql_statement_duration_seconds" in response.data
+        response = client.get(
+            "/api/v1/admin/metrics", environ_base={"REMOTE_ADDR": "10.0.0.2"}
+        )
+        assert response.status_code == 403
@@ -0,0 +1,61 @@
+import json
+import os
+from datetime import datetime, timezone
+
+from blockytime.scripts import ai_tools
+from blockytime.server import create_app
+from blockytime.services.blockservice import BlockService
+from blockytime.synthetic import generate_database
+from pytest import MonkeyPatch
+from sqlalchemy import create_engine
+
+RANGE = "start_date=2000-01-01&end_date=2000-01-03"
+
+
+class TestPagination:
+    def test_iter_blocks(self, tmp_path: str) -> None:
+        db_path = os.path.join(tmp_path, "DB.db")
+        generate_database(db_path, 3)
+        service = BlockService(create_engine(f"sqlite:///{db_path}"))
+        start = datetime(1999, 12, 31, tzinfo=timezone.utc)
+        end = datetime(2000, 1, 4, tzinfo=timezone.utc)
+
+        blocks = list(service.get_blocks(start, end))
+        pages = list(service.iter_blocks(start, end, 100))
+        assert [len(page) for page in pages[:-1]] == [100] * (len(pages) - 1)
+        assert [b.date for page in pages for b in page] == [b.date for b in blocks]
+
+        page = service.get_blocks_page(start, end, 10, blocks[-11].date)
+        assert [b.date for b in page.blocks] == [b.date for b in blocks[-10:]]
+        assert page.next_after is None
+        assert service.get_blocks_page(start, end, 10).next_after == blocks[9].date
+
+    def test_route(self, tmp_path: str, monkeypatch: MonkeyPatch) -> None:
+        db_path = os.path.join(tmp_path, "DB.db")
+        generate_database(db_path, 3)
+        client = create_app(db_path, scheduler=False).test_client()
+        everything = client.get(f"/api/v1/blocks?{RANGE}").json
+        assert "next" not in everything
+
+        dates = []
+        after = ""
+        while True:
+            page = client.get(f"/api/v1/blocks?{RANGE}&limit=50{after}").json
+            assert len(page["data"]) <= 50
+            dates.extend(b["date"] for b in page["data"])
+            if page["next"] is None:
+                break
+            after = f"&after={page['next']}"
+        assert dates == [b["date"] for b in everything["data"]]
+        assert client.get(f"/api/v1/blocks?{RANGE}&limit=0").status_code == 400
+        assert client.get(f"/api/v1/blocks?{RANGE}&after=x").status_code == 400
+
+        monkeypatch.setattr(ai_tools, "DB_PATH", db_path)
+        monkeypatch.setattr(ai_tools, "_engine", None)
+        argv = ["get-blocks", "--start-date", "2000-01-01", "--end-date", "2000-01-03"]
+        exit_code, stdout, _ = ai_tools.run_command(argv)
+        assert exit_code == 0 and json.loads(stdout) == everything["data"]
+        exit_code, stdout, _ = ai_tools.run_command([*argv, "--limit", "5"])
+        page = json.loads(stdout)
+        assert page["blocks"] == everything["data"][:5]
+        assert page["next"] == everything["data"][4]["date"]
@@ -0,0 +1,51 @@
+from typing import Any
+
+from blockytime import paths, profiling
+from flask import Flask, jsonify
+from pytest import MonkeyPatch, fixture
+from sqlalchemy import create_engine, text
+
+
+class TestProfiling:
+    @fixture
+    def app(self, tmp_path: str, monkeypatch: MonkeyPatch) -> Flask:
+        monkeypatch.setattr(paths, "PROFILES_PATH", str(tmp_path))
+        engine = create_engine("sqlite://")
+        app = Flask(__name__)
+        profiling.capture_statements(engine)
+        profiling.install_profiler(app, lambda: engine)
+
+        @app.route("/count")
+        def count() -> Any:
+            with engine.connect() as conn:
+                conn.execute(text("CREATE TABLE IF NOT EXISTS t (x INTEGER)"))
+                n = conn.execute(text("SELECT count(*) FROM t WHERE x > :x"), {"x": 1})
+                return jsonify({"data": n.scalar(), "error": None})
+
+        return app
+
+    def test_profile_request(self, app: Flask) -> None:
+        client = app.test_client()
+        assert "X-Blockytime-Profile-Id" not in client.get("/count").headers
+
+        response = client.get("/count?__profile=1")
+        assert response.status_code == 200
+        profile_id = response.headers["X-Blockytime-Profile-Id"]
+        assert profiling.list_profile_ids() == [profile_id]
+        assert profiling.profile_stats_path(profile_id) is not None
+
+        report = profiling.load_profile(profile_id)
+        assert report is not None
+        assert report["status"] == 200
+        assert "dispatch_request" in report["profile"]
+        select = report["sql"][-1]
+        assert select["statement"] == "SELECT count(*) FROM t WHERE x > ?"
+        assert select["plan"] == ["SCAN t"]
+
+    def test_admin_only(self, app: Flask) -> None:
+        response = app.test_client().get(
+            "/count?__profile=1", environ_base={"REMOTE_ADDR": "10.0.0.2"}
+        )
+        assert response.status_code == 403
+        assert profiling.list_profile_ids() == []
+        assert profiling.load_profile("../../DB") is None
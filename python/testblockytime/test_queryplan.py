@@ -0,0 +1,48 @@
+import os
+
+from blockytime.queryplan import StatementPlan, block_access, check_plans, run_check
+
+
+class TestQueryPlan:
+    def test_block_access(self) -> None:
+        assert block_access(["SEARCH Block USING INDEX ix_Block_date (date>?)"]) == (
+            "index"
+        )
+        assert block_access(["SEARCH TABLE Block USING INTEGER PRIMARY KEY"]) == (
+            "index"
+        )
+        assert block_access(["SCAN Block", "USE TEMP B-TREE FOR GROUP BY"]) == "scan"
+        assert block_access(["SCAN TABLE Block USING INDEX ix_Block_date"]) == "scan"
+        assert block_access(["SEARCH Type USING INTEGER PRIMARY KEY"]) is None
+
+    def test_check_plans(self) -> None:
+        baseline = {
+            "queries": {
+                "q": [
+                    {
+                        "statement": "SELECT 1",
+                        "plan": ["SEARCH Block USING INDEX ix_Block_date"],
+                        "block_access": "index",
+                    }
+                ]
+            }
+        }
+        scan = StatementPlan("SELECT 2", ["SCAN Block"], "scan")
+        index = StatementPlan("SELECT 1", ["SEARCH Block USING INDEX x"], "index")
+
+        (regression,) = check_plans({"q": [scan]}, baseline)
+        (note,) = check_plans({"q": [index]}, baseline)
+
+        assert regression.regression
+        assert not note.regression
+        assert check_plans({"new": [scan]}, baseline)[0].message == (
+            "not in the baseline"
+        )
+
+    def test_service_plans_use_indexes(self, tmp_path: str) -> None:
+        report = run_check(os.path.join(tmp_path, "DB.db"))
+
+        assert report.regressions == [], "\n".join(
+            f.message for f in report.regressions
+        )
+        assert report.plans["statistics.get_statistics"][-1].block_access == "index"
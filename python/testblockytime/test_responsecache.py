@@ -0,0 +1,99 @@
+import gzip
+import json
+import os
+import sqlite3
+import time
+from datetime import datetime, timedelta
+
+import pytz
+from blockytime.constants import DEFAULT_TZ
+from blockytime.maintenance import (
+    DASHBOARD_LEAD_SECONDS,
+    next_dashboard_warm,
+    warm_dashboard,
+)
+from blockytime.metrics import RESPONSE_CACHE_REQUESTS
+from blockytime.responsecache import ResponseCache, cache_key
+from blockytime.server import create_app
+from blockytime.synthetic import generate_database
+
+
+def _hits(endpoint: str) -> float:
+    return RESPONSE_CACHE_REQUESTS.value(endpoint=endpoint, result="hit")
+
+
+class TestResponseCache:
+    def test_cache_key(self) -> None:
+        assert cache_key("/a", [("b", "2"), ("a", "1"), ("__profile", "1")]) == (
+            "/a?a=1&b=2"
+        )
+
+    def test_next_dashboard_warm(self) -> None:
+        now = time.time()
+        run = next_dashboard_warm(now)
+        assert now < run <= now + 1800
+        local = datetime.fromtimestamp(
+            run + DASHBOARD_LEAD_SECONDS, pytz.timezone(DEFAULT_TZ)
+        )
+        assert local.minute % 30 == 0 and local.second == 0
+
+    def test_warm_dashboard(self, tmp_path: str) -> None:
+        db_path = os.path.join(tmp_path, "DB.db")
+        today = datetime.now(pytz.timezone(DEFAULT_TZ)).date()
+        generate_database(db_path, 120, start=today - timedelta(days=110))
+        app = create_app(db_path, scheduler=False)
+        client = app.test_client()
+        cache = app.service_provider.get(ResponseCache)
+
+        result = warm_dashboard(app.service_provider)
+        assert result["built"] >= 5 and len(cache) == result["built"]
+        assert warm_dashboard(app.service_provider)["built"] == 0
+
+        now = datetime.now(pytz.timezone(DEFAULT_TZ))
+        stats = (
+            f"/api/v1/stats?start_date={today - timedelta(days=100)}"
+            f"&end_date={today}&time_slot_minutes=30"
+            f"&hour={now.hour}&minute={now.minute // 30 * 30}"
+        )
+        monday = today - timedelta(days=today.weekday())
+        blocks = (
+            f"/api/v1/blocks?start_date={monday}&end_date={monday + timedelta(days=7)}"
+        )
+        hits = _hits("/api/v1/stats"), _hits("/api/v1/blocks")
+        response = client.get(stats, headers={"Accept-Encoding": "gzip"})
+        assert response.headers["Content-Encoding"] == "gzip"
+        warmed = json.loads(gzip.decompress(response.data))
+        week = client.get(blocks)
+        assert _hits("/api/v1/stats") == hits[0] + 1
+        assert _hits("/api/v1/blocks") == hits[1] + 1
+        assert warmed["data"] and week.json["data"]
+
+        # Built by the route, the same response
+        cache.clear()
+        assert client.get(stats).json == warmed
+        assert client.get(blocks).json == week.json
+        assert _hits("/api/v1/stats") == hits[0] + 1
+
+        # A block edit changes the revision, so nothing cached is served
+        block = dict(week.json["data"][0], comment="edited", operation="upsert")
+        assert client.put("/api/v1/blocks", json=[block]).status_code == 200
+        after = client.get(blocks)
+        assert _hits("/api/v1/blocks") == hits[1] + 1
+        assert after.json["data"][0]["comment"] == "edited"
+
+    def test_write_by_another_process(self, tmp_path: str) -> None:
+        db_path = os.path.join(tmp_path, "DB.db")
+        generate_database(db_path, 7)
+        client = create_app(db_path, scheduler=False).test_client()
+        query = "/api/v1/blocks?start_date=2000-01-01&end_date=2000-01-02"
+        before = client.get(query).json["data"]
+        client.get(query)
+        hits = _hits("/api/v1/blocks")
+
+        # As ai_tools or the importer would, not through the server
+        with sqlite3.connect(db_path) as con:
+            con.execute("UPDATE Block SET comment = 'edited'")
+        time.sleep(1.1)  # BlockService keeps blocks for a second
+        after = client.get(query).json["data"]
+        assert _hits("/api/v1/blocks") == hits
+        assert after[0]["comment"] == "edited" != before[0]["comment"]
@@ -0,0 +1,138 @@
+import os
+import sqlite3
+import threading
+import time
+
+from blockytime.database import DatabaseGate
+from blockytime.maintenance import OPTIMIZE, WARM_CACHES, optimize_database
+from blockytime.scheduler import Scheduler
+from blockytime.server import create_app, reload_database
+from blockytime.synthetic import generate_database
+from sqlalchemy import Engine, create_engine
+
+
+class TestScheduler:
+    def test_triggered_and_periodic_jobs(self) -> None:
+        busy = threading.Event()
+        busy.set()
+        runs = []
+        scheduler = Scheduler(max_workers=1, busy=busy.is_set, max_defer=0.3)
+        scheduler.add("slow", lambda: time.sleep(0.1) or runs.append("slow"))
+        scheduler.add("tick", lambda: runs.append("tick"), interval=0.2)
+        scheduler.add("fail", lambda: 1 / 0)
+        scheduler.start()
+        try:
+            scheduler.trigger("slow")
+            time.sleep(0.1)
+            # Deferred while busy, until max_defer runs out
+            assert runs == []
+            assert scheduler.wait_idle(5)
+            busy.clear()
+            # A trigger while running runs it once more, never two at once
+            scheduler.trigger("slow")
+            time.sleep(0.05)
+            scheduler.trigger("slow")
+            scheduler.trigger("fail")
+            time.sleep(0.6)
+            assert scheduler.wait_idle(5)
+        finally:
+            scheduler.stop()
+        status = {s["name"]: s for s in scheduler.status()}
+        assert status["slow"]["runs"] == 3 and runs.count("slow") == 3
+        assert status["tick"]["runs"] >= 2 and status["tick"]["next_run"]
+        assert status["fail"]["failures"] == 1
+        assert "division" in status["fail"]["last_error"]
+
+    def test_optimize_database(self, tmp_path: str) -> None:
+        db_path = os.path.join(tmp_path, "DB.db")
+        generate_database(db_path, 60)
+        with sqlite3.connect(db_path) as con:
+            con.execute("DELETE FROM Block WHERE date % 3 = 0")
+        result = optimize_database(create_engine(f"sqlite:///{db_path}"))
+        assert result["analyzed"] and result["vacuumed"]
+        with sqlite3.connect(db_path) as con:
+            assert con.execute("SELECT count(*) FROM sqlite_stat1").fetchone()[0]
+            assert con.execute("PRAGMA freelist_count").fetchone()[0] == 0
+
+    def test_vacuum_waits_for_requests(self, tmp_path: str) -> None:
+        db_path = os.path.join(tmp_path, "DB.db")
+        generate_database(db_path, 60)
+        with sqlite3.connect(db_path) as con:
+            con.execute("DELETE FROM Block WHERE date % 3 = 0")
+        engine = create_engine(f"sqlite:///{db_path}")
+        gate = DatabaseGate()
+        events = []
+
+        def job() -> None:
+            with gate.held():
+                events.append(optimize_database(engine, gate)["vacuumed"])
+
+        # A request in the middle of reading
+        gate.enter()
+        with engine.connect() as conn:
+            conn.exec_driver_sql("BEGIN")
+            first = conn.exec_driver_sql("SELECT count(*) FROM Block").scalar()
+            thread = threading.Thread(target=job)
+            thread.start()
+            time.sleep(0.3)
+            # VACUUM waits for the request rather than failing it or itself
+            assert events == []
+            assert conn.exec_driver_sql("SELECT count(*) FROM Block").scalar() == first
+            conn.exec_driver_sql("COMMIT")
+        gate.leave()
+        thread.join(10)
+        assert events == [True]
+        # Requests get in again once it is done
+        gate.enter()
+        gate.leave()
+
+    def test_jobs_api(self, tmp_path: str) -> None:
+        db_path = os.path.join(tmp_path, "DB.db")
+        generate_database(db_path, 30)
+        client = create_app(db_path).test_client()
+        jobs = client.get("/api/v1/admin/jobs").json["data"]
+        assert {j["name"] for j in jobs} >= {OPTIMIZE, WARM_CACHES}
+        assert client.post("/api/v1/admin/jobs/nope").status_code == 404
+        response = client.post(
+            f"/api/v1/admin/jobs/{OPTIMIZE}", environ_base={"REMOTE_ADDR": "10.0.0.2"}
+        )
+        assert response.status_code == 403
+
+        assert client.post(f"/api/v1/admin/jobs/{WARM_CACHES}").status_code == 200
+        for _ in range(100):
+            jobs = client.get("/api/v1/admin/jobs").json["data"]
+            warm = next(j for j in jobs if j["name"] == WARM_CACHES)
+            if warm["runs"]:
+                break
+            time.sleep(0.05)
+        assert warm["runs"] == 1 and warm["last_error"] is None
+        assert warm["last_result"]["seconds"] >= 0
+
+    def test_reload_waits_for_running_job(self, tmp_path: str) -> None:
+        db_path = os.path.join(tmp_path, "DB.db")
+        generate_database(db_path, 7)
+        app = create_app(db_path, scheduler=False)
+        service_provider = app.service_provider
+        jobs = service_provider.get(Scheduler)
+        started = threading.Event()
+        events = []
+
+        def slow() -> None:
+            engine = service_provider.get(Engine)
+            started.set()
+            time.sleep(0.3)
+            with engine.connect() as conn:
+                conn.exec_driver_sql("SELECT count(*) FROM Block").scalar()
+            events.append(("job done", service_provider.get(Engine) is engine))
+
+        jobs.add("slow", slow)
+        jobs.start()
+        try:
+            jobs.trigger("slow")
+            assert started.wait(5)
+            generation = reload_database(service_provider, db_path)
+            events.append(("reloaded", generation))
+        finally:
+            jobs.stop()
+        # The swap drained the job, which finished on the engine it started on
+        assert events == [("job done", True), ("reloaded", generation)]
@@ -0,0 +1,54 @@
+import json
+import logging
+import os
+import subprocess
+import sys
+from typing import Any, Dict
+
+from pytest import mark
+
+log = logging.getLogger(__name__)
+
+# Loaded on first use only
+LAZY_MODULES = ["numpy", "pytz", "flasgger", "flask_cors", "pymobiledevice3"]
+
+PROBE = """
+import json, os, sys, time
+started = time.perf_counter()
+import {module}
+print(json.dumps({{
+    "seconds": time.perf_counter() - started,
+    "modules": sorted(m for m in sys.modules if m.split(".")[0] in {lazy!r}),
+    "data_path_created": os.path.exists(os.environ["BLOCKYTIME_DATA_PATH"]),
+}}))
+"""
+
+
+def probe_import(module: str, tmp_path: str) -> Dict[str, Any]:
+    env = dict(
+        os.environ,
+        PYTHONPATH=os.pathsep.join(sys.path),
+        BLOCKYTIME_DATA_PATH=os.path.join(tmp_path, "data"),
+    )
+    code = PROBE.format(module=module, lazy=LAZY_MODULES + ["sqlalchemy", "flask"])
+    output = subprocess.run(
+        [sys.executable, "-c", code], env=env, capture_output=True, check=True
+    ).stdout
+    result: Dict[str, Any] = json.loads(output)
+    return result
+
+
+class TestStartup:
+    @mark.parametrize(
+        "module,allowed",
+        [
+            ("blockytime.server", {"sqlalchemy", "flask"}),
+            ("blockytime.scripts.ai_tools_client", set()),
+        ],
+    )
+    def test_lazy_imports(self, module: str, allowed: set, tmp_path: str) -> None:
+        result = probe_import(module, tmp_path)
+        assert {m.split(".")[0] for m in result["modules"]} <= allowed
+        assert not result["data_path_created"]
+        # Timing depends on the machine, so it is reported rather than checked
+        log.info(f"Importing {module} took {result['seconds']:.3f} seconds")
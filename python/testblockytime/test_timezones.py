@@ -0,0 +1,39 @@
+from datetime import date, datetime
+from zoneinfo import ZoneInfo
+
+import numpy as np
+from blockytime.timezones import TimezoneTable
+from pytest import fixture
+
+
+class TestTimezoneTable:
+    @fixture
+    def london(self) -> TimezoneTable:
+        return TimezoneTable("Europe/London", 2023, 2026)
+
+    def test_offset_at_matches_zoneinfo(self, london: TimezoneTable) -> None:
+        zone = ZoneInfo("Europe/London")
+        timestamps = np.arange(london.start_ts, london.end_ts, 3600 * 7 + 13)
+        expected = [
+            int(datetime.fromtimestamp(int(ts), zone).utcoffset().total_seconds())  # type: ignore[union-attr]
+            for ts in timestamps
+        ]
+        assert london.offset_at(timestamps).tolist() == expected
+
+    def test_midnight_across_dst(self, london: TimezoneTable) -> None:
+        zone = ZoneInfo("Europe/London")
+        for d in [date(2024, 3, 31), date(2024, 4, 1), date(2024, 10, 27)]:
+            expected = int(datetime(d.year, d.month, d.day, tzinfo=zone).timestamp())
+            assert london.midnight(d) == expected
+
+    def test_local_day(self, london: TimezoneTable) -> None:
+        # 2024-07-01 00:30 BST is still 2024-06-30 in UTC
+        ts = int(
+            datetime(2024, 7, 1, 0, 30, tzinfo=ZoneInfo("Europe/London")).timestamp()
+        )
+        assert int(london.local_day(ts)) == (date(2024, 7, 1) - date(1970, 1, 1)).days
+
+    def test_offset_expr_collapses_without_transitions(self) -> None:
+        hong_kong = TimezoneTable("Asia/Hong_Kong", 2024, 2026)
+        expr = hong_kong.offset_expr(0, hong_kong.start_ts, hong_kong.end_ts)
+        assert expr.compile().params == {"param_1": 8 * 3600}
@@ -0,0 +1,54 @@
+import os
+import sqlite3
+
+from blockytime.server import create_app
+from blockytime.services.blockservice import _reduce_quarters
+from blockytime.synthetic import generate_database
+
+# 2000-01-03 is a Monday; the synthetic database starts on 2000-01-01
+WEEK = "/api/v1/blocks/week?start_date=2000-01-03"
+
+
+class TestWeekGrid:
+    def test_reduce_quarters(self) -> None:
+        day = [1, 2, 0, 3, 0, 0, 4, 4]
+        assert _reduce_quarters([day], 15, False) == [day]
+        assert _reduce_quarters([day], 30, False) == [[1, 3, 0, 4]]
+        assert _reduce_quarters([[1, 2, 2, 3]], 60, False) == [[2]]
+        assert _reduce_quarters([[0, 2, 1, 1]], 30, True) == [[2, 1]]
+
+    def test_week_grid(self, tmp_path: str) -> None:
+        db_path = os.path.join(tmp_path, "DB.db")
+        generate_database(db_path, 14)
+        client = create_app(db_path, scheduler=False).test_client()
+
+        grid = client.get(WEEK).json["data"]
+        assert grid["startDate"] == "2000-01-03" and grid["slotMinutes"] == 30
+        assert len(grid["cells"]) == 7
+        assert all(len(day) == 48 for day in grid["cells"])
+        blocks = client.get(
+            "/api/v1/blocks?start_date=2000-01-03&end_date=2000-01-10"
+        ).json["data"]
+        # Every cell with a block has its type, and every type has a legend
+        used = {uid for day in grid["cells"] for uid in day if uid}
+        assert used <= {b["type_"]["uid"] for b in blocks}
+        assert {int(uid) for uid in grid["types"]} == used
+        # Hong Kong has no DST, so local quarters are UTC + 8 hours
+        monday = blocks[0]["date"] - (blocks[0]["date"] + 8 * 3600) % 86400
+        quarters = {(b["date"] - monday) // 900: b["type_"]["uid"] for b in blocks}
+        agreeing = [
+            q for q in range(0, 7 * 96, 2) if quarters.get(q) == quarters.get(q + 1)
+        ]
+        assert agreeing
+        for q in agreeing:
+            day, slot = divmod(q // 2, 48)
+            assert grid["cells"][day][slot] == (quarters.get(q) or 0)
+
+        with sqlite3.connect(db_path) as con:
+            con.execute("UPDATE Config SET value = 'I_1' WHERE key = 'disablePixelate'")
+        # Config is read per request; cached responses only go with a new
+        # generation, so this asks for another week
+        grid = client.get("/api/v1/blocks/week?start_date=2000-01-04").json["data"]
+        assert grid["slotMinutes"] == 15
+        assert all(len(day) == 96 for day in grid["cells"])
+        assert client.get("/api/v1/blocks/week").status_code == 400
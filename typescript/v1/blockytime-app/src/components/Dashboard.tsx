@@ -4,6 +4,7 @@ import ArrowBack from '@mui/icons-material/ArrowBack';
 import { useNavigate } from 'react-router-dom';
 import { TimeSlotCharts } from './TimeSlotCharts';
 import { SleepDataSection } from './SleepDataSection';
+import { WeeklyGrid } from './WeeklyGrid';
 import './Dashboard.css';
 
 export const Dashboard: React.FC = () => {
@@ -23,7 +24,7 @@ export const Dashboard: React.FC = () => {
       <div className="dashboard-content">
         <TimeSlotCharts />
         <SleepDataSection />
-        {/* WeeklyGrid will go here */}
+        <WeeklyGrid />
       </div>
     </div>
   );
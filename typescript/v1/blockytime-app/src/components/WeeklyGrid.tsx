@@ -0,0 +1,71 @@
+import React, { useEffect, useState } from 'react';
+import { useBlockService } from '../contexts/ServiceHooks';
+import { WeekGridModel } from '../models/weekgrid';
+import { getColorFromDecimal } from '../utils';
+import './WeeklyGrid.css';
+
+const WEEKDAYS = ['Mon', 'Tue', 'Wed', 'Thu', 'Fri', 'Sat', 'Sun'];
+
+const getMondayOfWeek = (date: Date): Date => {
+  const d = new Date(date);
+  d.setHours(0, 0, 0, 0);
+  const day = d.getDay(); // 0=Sun, 1=Mon, ...
+  d.setDate(d.getDate() + (day === 0 ? -6 : 1 - day));
+  return d;
+};
+
+// Read-only bird's-eye view of the current week, one row per slot
+export const WeeklyGrid: React.FC = () => {
+  const blockService = useBlockService();
+  const [grid, setGrid] = useState<WeekGridModel | null>(null);
+  const [error, setError] = useState<string | null>(null);
+
+  useEffect(() => {
+    blockService.getWeekGrid(getMondayOfWeek(new Date()))
+      .then(setGrid)
+      .catch(err => setError(err instanceof Error ? err.message : 'An error occurred'));
+  }, [blockService]);
+
+  if (error) {
+    return <div className="weekly-grid-section">Error: {error}</div>;
+  }
+  if (!grid) {
+    return <div className="weekly-grid-section">Loading...</div>;
+  }
+
+  const slotsPerDay = grid.cells[0]?.length ?? 0;
+  const slotsPerHour = 60 / grid.slotMinutes;
+
+  return (
+    <div className="weekly-grid-section">
+      <h3>This Week</h3>
+      <div
+        className="weekly-grid"
+        style={{ gridTemplateColumns: `auto repeat(${grid.cells.length}, 1fr)` }}
+      >
+        <div />
+        {WEEKDAYS.map(day => <div key={day} className="weekly-grid-header">{day}</div>)}
+        {Array.from({ length: slotsPerDay }, (_, slot) => (
+          <React.Fragment key={slot}>
+            <div className="weekly-grid-time">
+              {slot % slotsPerHour === 0 ? `${String(slot / slotsPerHour).padStart(2, '0')}:00` : ''}
+            </div>
+            {grid.cells.map((day, i) => {
+              const type = grid.types[String(day[slot])];
+              return (
+                <div
+                  key={i}
+                  className="weekly-grid-cell"
+                  style={{ backgroundColor: getColorFromDecimal(type?.color) }}
+                  title={type?.name}
+                />
+              );
+            })}
+          </React.Fragment>
+        ))}
+      </div>
+    </div>
+  );
+};
+
+export default WeeklyGrid;
@@ -10,4 +10,5 @@ export * from './remind';
 export * from './stamp';
 export * from './stamper';
 export * from './trend_history';
-export * from './type'; 
\ No newline at end of file
+export * from './type';
+export * from './weekgrid';
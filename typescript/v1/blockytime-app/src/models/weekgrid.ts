@@ -0,0 +1,12 @@
+export interface WeekGridTypeModel {
+    name: string;
+    color: number;
+}
+
+// GET /api/v1/blocks/week: cells[day][slot] is a type uid, 0 where empty
+export interface WeekGridModel {
+    startDate: string;
+    slotMinutes: number;
+    cells: number[][];
+    types: Record<string, WeekGridTypeModel>;
+}
@@ -1,9 +1,11 @@
 import { BlockModel } from '../models/block';
+import { WeekGridModel } from '../models/weekgrid';
 
 export interface BlockServiceInterface {
   getBlocks(startDate: Date, endDate: Date): Promise<BlockModel[]>;
   getBlocksByDateString(startDateStr: string, endDateStr: string): Promise<BlockModel[]>;
   updateBlocks(blocks: BlockModel[]): Promise<boolean>;
+  getWeekGrid(monday: Date): Promise<WeekGridModel>;
 }
 
 class BlockCacheEntry {
@@ -83,6 +85,20 @@ export class BlockService implements BlockServiceInterface {
     }
   }
 
+  async getWeekGrid(monday: Date): Promise<WeekGridModel> {
+    const startDateStr =
+      `${monday.getFullYear()}-${String(monday.getMonth() + 1).padStart(2, '0')}-${String(monday.getDate()).padStart(2, '0')}`;
+    const response = await fetch(`${this.apiBaseUrl}/blocks/week?start_date=${startDateStr}`);
+    if (!response.ok) {
+      throw new Error(`HTTP error! Status: ${response.status}`);
+    }
+    const result = await response.json();
+    if (result.error) {
+      throw new Error(result.error);
+    }
+    return result.data as WeekGridModel;
+  }
+
   async updateBlocks(blocks: BlockModel[]): Promise<boolean> {
     try {
       const response = await fetch(`${this.apiBaseUrl}/blocks`, {